@@ -0,0 +1,143 @@
+"""
+Request parameters and cursors of GET /agents.
+
+The list_agents database function filters, sorts and pages an account's
+agents. A page can be requested by number (offset) or with the next_cursor of
+the previous page (keyset): the cursor holds the sort value and agent_id of
+the last agent shown, plus the page number and total, which are not counted
+again. A cursor is only valid for the search, filters, sort and limit it was
+issued for.
+"""
+
+import base64
+import hashlib
+import json
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+SORT_FIELDS = ("name", "created_at", "updated_at", "tools_count")
+DEFAULT_SORT_FIELD = "created_at"
+
+
+class InvalidCursor(ValueError):
+    """The cursor is malformed or was issued for a different query."""
+
+
+def encode_cursor(payload: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """The payload of a cursor, with its fields checked.
+
+    Raises:
+        InvalidCursor: If the cursor cannot be decoded or a field has the wrong type
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(payload, dict):
+        raise InvalidCursor("Invalid cursor")
+
+    def is_int(value, minimum):
+        return isinstance(value, int) and not isinstance(value, bool) and value >= minimum
+
+    valid = (
+        isinstance(payload.get("q"), str)
+        # Sort columns are NOT NULL, so a keyset position always has a value
+        and isinstance(payload.get("v"), str)
+        and isinstance(payload.get("id"), str)
+        and is_int(payload.get("page"), 2)
+        and is_int(payload.get("total"), 0)
+    )
+    if valid:
+        try:
+            uuid.UUID(payload["id"])
+        except ValueError:
+            valid = False
+    if not valid:
+        raise InvalidCursor("Invalid cursor")
+    return payload
+
+
+@dataclass
+class AgentListRequest:
+    """A page request of GET /agents, as list_agents parameters."""
+    params: Dict[str, Any]
+    page: int
+    limit: int
+    digest: str
+    total: Optional[int] = None  # Carried by the cursor; counted by list_agents otherwise
+
+    def next_cursor(self, last_agent: Dict[str, Any], total: int) -> Optional[str]:
+        """Cursor of the page after the one ending with ``last_agent``."""
+        value = last_agent.get(self.params['p_sort_by'])
+        if value is None:
+            return None
+        return encode_cursor({
+            "q": self.digest,
+            "v": str(value),
+            "id": last_agent['agent_id'],
+            "page": self.page + 1,
+            "total": total
+        })
+
+
+def parse_tools(tools: Optional[str]) -> List[str]:
+    return [tool.strip() for tool in tools.split(',') if tool.strip()] if tools else []
+
+
+def build_request(
+    account_id: str,
+    page: int = 1,
+    limit: int = 20,
+    search: Optional[str] = None,
+    sort_by: Optional[str] = DEFAULT_SORT_FIELD,
+    sort_order: Optional[str] = "desc",
+    has_default: Optional[bool] = None,
+    has_mcp_tools: Optional[bool] = None,
+    has_agentpress_tools: Optional[bool] = None,
+    tools: Optional[str] = None,
+    cursor: Optional[str] = None,
+) -> AgentListRequest:
+    """list_agents parameters for a page of an account's agents.
+
+    One more agent than ``limit`` is requested, to tell whether there is a
+    next page.
+
+    Raises:
+        InvalidCursor: If the cursor is malformed or was issued for another query
+    """
+    if sort_by not in SORT_FIELDS:
+        sort_by = DEFAULT_SORT_FIELD
+    tools_filter = parse_tools(tools)
+    query = {
+        'p_search': search or None,
+        'p_sort_by': sort_by,
+        'p_sort_desc': sort_order == "desc",
+        'p_is_default': has_default,
+        'p_has_mcp_tools': has_mcp_tools,
+        'p_has_agentpress_tools': has_agentpress_tools,
+        'p_tools': tools_filter or None,
+    }
+    digest = hashlib.blake2b(json.dumps([query, limit], sort_keys=True).encode(), digest_size=8).hexdigest()
+
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if after["q"] != digest:
+            raise InvalidCursor("Cursor does not match the search, filters, sort or limit")
+        page = after["page"]
+
+    params = {
+        'p_account_id': account_id,
+        'p_limit': limit + 1,
+        'p_offset': (page - 1) * limit,
+        **query,
+        'p_after_value': after["v"] if after else None,
+        'p_after_id': after["id"] if after else None,
+        'p_with_count': after is None,
+    }
+    return AgentListRequest(params=params, page=page, limit=limit, digest=digest, total=after["total"] if after else None)
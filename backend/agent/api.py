@@ -12,15 +12,20 @@ import tempfile
 import os
 
 from agentpress.thread_manager import ThreadManager
+from agent.agent_list import InvalidCursor, build_request as build_agent_list_request
 from services.supabase import DBConnection
 from services import redis
+from services.marketplace_cache import MarketplaceCache, MAX_AGENTS as MARKETPLACE_MAX_AGENTS
 from utils.auth_utils import get_current_user_id_from_jwt, get_user_id_from_stream_auth, verify_thread_access
 from utils.logger import logger
 from services.billing import check_billing_status, can_use_model
 from utils.config import config
-from sandbox.sandbox import create_sandbox, delete_sandbox, get_or_start_sandbox
+from sandbox.sandbox import create_sandbox, delete_sandbox
+from sandbox.registry import sandbox_registry
 from services.llm import make_llm_api_call
-from run_agent_background import run_agent_background, _cleanup_redis_response_list, update_agent_run_status
+from run_agent_background import run_agent_background, _cleanup_redis_response_list, update_agent_run_status, fetch_redis_responses
+from services import run_stream
+from services import run_fanout
 from utils.constants import MODEL_NAME_ALIASES
 from flags.flags import is_enabled
 
@@ -67,12 +72,12 @@ class AgentUpdateRequest(BaseModel):
     avatar: Optional[str] = None
     avatar_color: Optional[str] = None
 
-class AgentResponse(BaseModel):
+class AgentSummaryResponse(BaseModel):
+    """An agent as listed by GET /agents, without its system prompt."""
     agent_id: str
     account_id: str
     name: str
     description: Optional[str]
-    system_prompt: str
     configured_mcps: List[Dict[str, Any]]
     custom_mcps: Optional[List[Dict[str, Any]]] = []
     agentpress_tools: Dict[str, Any]
@@ -86,14 +91,18 @@ class AgentResponse(BaseModel):
     created_at: str
     updated_at: str
 
+class AgentResponse(AgentSummaryResponse):
+    system_prompt: str
+
 class PaginationInfo(BaseModel):
     page: int
     limit: int
     total: int
     pages: int
+    next_cursor: Optional[str] = None  # Pass as `cursor` to get the next page by keyset
 
 class AgentsResponse(BaseModel):
-    agents: List[AgentResponse]
+    agents: List[AgentSummaryResponse]
     pagination: PaginationInfo
 
 class ThreadAgentResponse(BaseModel):
@@ -165,11 +174,9 @@ async def stop_agent_run(agent_run_id: str, error_message: Optional[str] = None)
     final_status = "failed" if error_message else "stopped"
 
     # Attempt to fetch final responses from Redis
-    response_list_key = f"agent_run:{agent_run_id}:responses"
     all_responses = []
     try:
-        all_responses_json = await redis.lrange(response_list_key, 0, -1)
-        all_responses = [json.loads(r) for r in all_responses_json]
+        all_responses = await fetch_redis_responses(agent_run_id)
         logger.info(f"Fetched {len(all_responses)} responses from Redis for DB update on stop/fail: {agent_run_id}")
     except Exception as e:
         logger.error(f"Failed to fetch responses from Redis for {agent_run_id} during stop/fail: {e}")
@@ -187,6 +194,8 @@ async def stop_agent_run(agent_run_id: str, error_message: Optional[str] = None)
     global_control_channel = f"agent_run:{agent_run_id}:control"
     try:
         await redis.publish(global_control_channel, "STOP")
+        if run_stream.use_streams():
+            await run_stream.publish_control(agent_run_id, "STOP")
         logger.debug(f"Published STOP signal to global channel {global_control_channel}")
     except Exception as e:
         logger.error(f"Failed to publish STOP signal to global channel {global_control_channel}: {str(e)}")
@@ -444,7 +453,7 @@ async def start_agent(
             raise HTTPException(status_code=404, detail="No sandbox found for this project")
             
         sandbox_id = sandbox_info['id']
-        sandbox = await get_or_start_sandbox(sandbox_id)
+        sandbox = await sandbox_registry.get(sandbox_id)
         logger.info(f"Successfully started sandbox {sandbox_id} for project {project_id}")
     except Exception as e:
         logger.error(f"Failed to start sandbox for project {project_id}: {str(e)}")
@@ -598,175 +607,65 @@ async def stream_agent_run(
     token: Optional[str] = None,
     request: Request = None
 ):
-    """Stream the responses of an agent run using Redis Lists and Pub/Sub."""
+    """Stream the responses of an agent run through the worker's shared fan-out hub."""
     logger.info(f"Starting stream for agent run: {agent_run_id}")
     client = await db.client
 
     user_id = await get_user_id_from_stream_auth(request, token)
     agent_run_data = await get_agent_run_with_access_check(client, agent_run_id, user_id)
 
-    response_list_key = f"agent_run:{agent_run_id}:responses"
-    response_channel = f"agent_run:{agent_run_id}:new_response"
-    control_channel = f"agent_run:{agent_run_id}:control" # Global control channel
+    async def check_still_running() -> bool:
+        # Check run status *after* the initial data has been yielded
+        run_status = await client.table('agent_runs').select('status').eq("id", agent_run_id).maybe_single().execute()
+        current_status = run_status.data.get('status') if run_status.data else None
+        if current_status != 'running':
+            logger.info(f"Agent run {agent_run_id} is not running (status: {current_status}). Ending stream.")
+            return False
+        return True
 
     async def stream_generator():
-        logger.debug(f"Streaming responses for {agent_run_id} using Redis list {response_list_key} and channel {response_channel}")
-        last_processed_index = -1
-        pubsub_response = None
-        pubsub_control = None
-        listener_task = None
-        terminate_stream = False
+        # Resume after the last response the client saw (EventSource sends Last-Event-ID on reconnect)
+        last_event_id = request.headers.get("last-event-id") if request else None
+        start_seq = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+        logger.debug(f"Streaming responses for {agent_run_id} from index {start_seq} via the shared fan-out hub")
         initial_yield_complete = False
+        still_running = True
 
-        try:
-            # 1. Fetch and yield initial responses from Redis list
-            initial_responses_json = await redis.lrange(response_list_key, 0, -1)
-            initial_responses = []
-            if initial_responses_json:
-                initial_responses = [json.loads(r) for r in initial_responses_json]
-                logger.debug(f"Sending {len(initial_responses)} initial responses for {agent_run_id}")
-                for response in initial_responses:
-                    yield f"data: {json.dumps(response)}\n\n"
-                last_processed_index = len(initial_responses) - 1
+        async def on_backlog_sent() -> bool:
+            nonlocal initial_yield_complete, still_running
             initial_yield_complete = True
+            still_running = await check_still_running()
+            return still_running
 
-            # 2. Check run status *after* yielding initial data
-            run_status = await client.table('agent_runs').select('status').eq("id", agent_run_id).maybe_single().execute()
-            current_status = run_status.data.get('status') if run_status.data else None
-
-            if current_status != 'running':
-                logger.info(f"Agent run {agent_run_id} is not running (status: {current_status}). Ending stream.")
-                yield f"data: {json.dumps({'type': 'status', 'status': 'completed'})}\n\n"
-                return
-
-            # 3. Set up Pub/Sub listeners for new responses and control signals
-            pubsub_response = await redis.create_pubsub()
-            await pubsub_response.subscribe(response_channel)
-            logger.debug(f"Subscribed to response channel: {response_channel}")
-
-            pubsub_control = await redis.create_pubsub()
-            await pubsub_control.subscribe(control_channel)
-            logger.debug(f"Subscribed to control channel: {control_channel}")
-
-            # Queue to communicate between listeners and the main generator loop
-            message_queue = asyncio.Queue()
-
-            async def listen_messages():
-                response_reader = pubsub_response.listen()
-                control_reader = pubsub_control.listen()
-                tasks = [asyncio.create_task(response_reader.__anext__()), asyncio.create_task(control_reader.__anext__())]
-
-                while not terminate_stream:
-                    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
-                    for task in done:
-                        try:
-                            message = task.result()
-                            if message and isinstance(message, dict) and message.get("type") == "message":
-                                channel = message.get("channel")
-                                data = message.get("data")
-                                if isinstance(data, bytes): data = data.decode('utf-8')
-
-                                if channel == response_channel and data == "new":
-                                    await message_queue.put({"type": "new_response"})
-                                elif channel == control_channel and data in ["STOP", "END_STREAM", "ERROR"]:
-                                    logger.info(f"Received control signal '{data}' for {agent_run_id}")
-                                    await message_queue.put({"type": "control", "data": data})
-                                    return # Stop listening on control signal
-
-                        except StopAsyncIteration:
-                            logger.warning(f"Listener {task} stopped.")
-                            # Decide how to handle listener stopping, maybe terminate?
-                            await message_queue.put({"type": "error", "data": "Listener stopped unexpectedly"})
-                            return
-                        except Exception as e:
-                            logger.error(f"Error in listener for {agent_run_id}: {e}")
-                            await message_queue.put({"type": "error", "data": "Listener failed"})
-                            return
-                        finally:
-                            # Reschedule the completed listener task
-                            if task in tasks:
-                                tasks.remove(task)
-                                if message and isinstance(message, dict) and message.get("channel") == response_channel:
-                                     tasks.append(asyncio.create_task(response_reader.__anext__()))
-                                elif message and isinstance(message, dict) and message.get("channel") == control_channel:
-                                     tasks.append(asyncio.create_task(control_reader.__anext__()))
-
-                # Cancel pending listener tasks on exit
-                for p_task in pending: p_task.cancel()
-                for task in tasks: task.cancel()
-
-
-            listener_task = asyncio.create_task(listen_messages())
-
-            # 4. Main loop to process messages from the queue
-            while not terminate_stream:
-                try:
-                    queue_item = await message_queue.get()
-
-                    if queue_item["type"] == "new_response":
-                        # Fetch new responses from Redis list starting after the last processed index
-                        new_start_index = last_processed_index + 1
-                        new_responses_json = await redis.lrange(response_list_key, new_start_index, -1)
-
-                        if new_responses_json:
-                            new_responses = [json.loads(r) for r in new_responses_json]
-                            num_new = len(new_responses)
-                            # logger.debug(f"Received {num_new} new responses for {agent_run_id} (index {new_start_index} onwards)")
-                            for response in new_responses:
-                                yield f"data: {json.dumps(response)}\n\n"
-                                # Check if this response signals completion
-                                if response.get('type') == 'status' and response.get('status') in ['completed', 'failed', 'stopped']:
-                                    logger.info(f"Detected run completion via status message in stream: {response.get('status')}")
-                                    terminate_stream = True
-                                    break # Stop processing further new responses
-                            last_processed_index += num_new
-                        if terminate_stream: break
-
-                    elif queue_item["type"] == "control":
-                        control_signal = queue_item["data"]
-                        terminate_stream = True # Stop the stream on any control signal
+        try:
+            # One Redis follower per run is shared by every viewer in this worker
+            async for seq, response, control_signal in run_fanout.hub.subscribe(agent_run_id, start_seq, on_ready=on_backlog_sent):
+                if control_signal:
+                    if control_signal == "ERROR" and not initial_yield_complete:
+                        yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': 'Failed to start stream'})}\n\n"
+                    else:
                         yield f"data: {json.dumps({'type': 'status', 'status': control_signal})}\n\n"
-                        break
-
-                    elif queue_item["type"] == "error":
-                        logger.error(f"Listener error for {agent_run_id}: {queue_item['data']}")
-                        terminate_stream = True
-                        yield f"data: {json.dumps({'type': 'status', 'status': 'error'})}\n\n"
-                        break
-
-                except asyncio.CancelledError:
-                     logger.info(f"Stream generator main loop cancelled for {agent_run_id}")
-                     terminate_stream = True
-                     break
-                except Exception as loop_err:
-                    logger.error(f"Error in stream generator main loop for {agent_run_id}: {loop_err}", exc_info=True)
-                    terminate_stream = True
-                    yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Stream failed: {loop_err}'})}\n\n"
                     break
 
+                yield f"id: {seq}\ndata: {json.dumps(response)}\n\n"
+                # Check if this response signals completion
+                if initial_yield_complete and response.get('type') == 'status' and response.get('status') in ['completed', 'failed', 'stopped']:
+                    logger.info(f"Detected run completion via status message in stream: {response.get('status')}")
+                    break
+
+            if not still_running:
+                yield f"data: {json.dumps({'type': 'status', 'status': 'completed'})}\n\n"
+
+        except asyncio.CancelledError:
+            logger.info(f"Stream generator cancelled for {agent_run_id}")
+            raise
         except Exception as e:
-            logger.error(f"Error setting up stream for agent run {agent_run_id}: {e}", exc_info=True)
-            # Only yield error if initial yield didn't happen
+            logger.error(f"Error streaming agent run {agent_run_id}: {e}", exc_info=True)
             if not initial_yield_complete:
-                 yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Failed to start stream: {e}'})}\n\n"
+                yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Failed to start stream: {e}'})}\n\n"
+            else:
+                yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Stream failed: {e}'})}\n\n"
         finally:
-            terminate_stream = True
-            # Graceful shutdown order: unsubscribe → close → cancel
-            if pubsub_response: await pubsub_response.unsubscribe(response_channel)
-            if pubsub_control: await pubsub_control.unsubscribe(control_channel)
-            if pubsub_response: await pubsub_response.close()
-            if pubsub_control: await pubsub_control.close()
-
-            if listener_task:
-                listener_task.cancel()
-                try:
-                    await listener_task  # Reap inner tasks & swallow their errors
-                except asyncio.CancelledError:
-                    pass
-                except Exception as e:
-                    logger.debug(f"listener_task ended with: {e}")
-            # Wait briefly for tasks to cancel
-            await asyncio.sleep(0.1)
             logger.debug(f"Streaming cleanup complete for agent run: {agent_run_id}")
 
     return StreamingResponse(stream_generator(), media_type="text/event-stream", headers={
@@ -894,13 +793,13 @@ async def initiate_agent_with_files(
         sandbox_id = None
         try:
           sandbox_pass = str(uuid.uuid4())
-          sandbox = create_sandbox(sandbox_pass, project_id)
+          sandbox = await create_sandbox(sandbox_pass, project_id)
           sandbox_id = sandbox.id
           logger.info(f"Created new sandbox {sandbox_id} for project {project_id}")
           
           # Get preview links
-          vnc_link = sandbox.get_preview_link(6080)
-          website_link = sandbox.get_preview_link(8080)
+          vnc_link = await sandbox.get_preview_link(6080)
+          website_link = await sandbox.get_preview_link(8080)
           vnc_url = vnc_link.url if hasattr(vnc_link, 'url') else str(vnc_link).split("url='")[1].split("'")[0]
           website_url = website_link.url if hasattr(website_link, 'url') else str(website_link).split("url='")[1].split("'")[0]
           token = None
@@ -991,7 +890,7 @@ async def initiate_agent_with_files(
                             try:
                                 await asyncio.sleep(0.2)
                                 parent_dir = os.path.dirname(target_path)
-                                files_in_dir = sandbox.fs.list_files(parent_dir)
+                                files_in_dir = await sandbox.fs.list_files(parent_dir)
                                 file_names_in_dir = [f.name for f in files_in_dir]
                                 if safe_filename in file_names_in_dir:
                                     successful_uploads.append(target_path)
@@ -1077,9 +976,15 @@ async def get_agents(
     has_default: Optional[bool] = Query(None, description="Filter by default agents"),
     has_mcp_tools: Optional[bool] = Query(None, description="Filter by agents with MCP tools"),
     has_agentpress_tools: Optional[bool] = Query(None, description="Filter by agents with AgentPress tools"),
-    tools: Optional[str] = Query(None, description="Comma-separated list of tools to filter by")
+    tools: Optional[str] = Query(None, description="Comma-separated list of tools to filter by"),
+    cursor: Optional[str] = Query(None, description="pagination.next_cursor of the previous page; takes precedence over page")
 ):
-    """Get agents for the current user with pagination, search, sort, and filter support."""
+    """Get agents for the current user with pagination, search, sort, and filter support.
+
+    Filtering, sorting and pagination all happen in the database (list_agents),
+    on indexed columns derived from each agent's tools. Agents are listed
+    without their system prompts; GET /agents/{agent_id} returns the full agent.
+    """
     if not await is_enabled("custom_agents"):
         raise HTTPException(
             status_code=403, 
@@ -1089,132 +994,35 @@ async def get_agents(
     client = await db.client
     
     try:
-        # Calculate offset
-        offset = (page - 1) * limit
-        
-        # Start building the query
-        query = client.table('agents').select('*', count='exact').eq("account_id", user_id)
-        
-        # Apply search filter
-        if search:
-            search_term = f"%{search}%"
-            query = query.or_(f"name.ilike.{search_term},description.ilike.{search_term}")
-        
-        # Apply filters
-        if has_default is not None:
-            query = query.eq("is_default", has_default)
-        
-        # For MCP and AgentPress tools filtering, we'll need to do post-processing
-        # since Supabase doesn't have great JSON array/object filtering
-        
-        # Apply sorting
-        if sort_by == "name":
-            query = query.order("name", desc=(sort_order == "desc"))
-        elif sort_by == "updated_at":
-            query = query.order("updated_at", desc=(sort_order == "desc"))
-        elif sort_by == "created_at":
-            query = query.order("created_at", desc=(sort_order == "desc"))
-        else:
-            # Default to created_at
-            query = query.order("created_at", desc=(sort_order == "desc"))
-        
-        # Execute query to get total count first
-        count_result = await query.execute()
-        total_count = count_result.count
-        
-        # Now get the actual data with pagination
-        query = query.range(offset, offset + limit - 1)
-        agents_result = await query.execute()
-        
-        if not agents_result.data:
-            logger.info(f"No agents found for user: {user_id}")
-            return {
-                "agents": [],
-                "pagination": {
-                    "page": page,
-                    "limit": limit,
-                    "total": 0,
-                    "pages": 0
-                }
-            }
-        
-        # Post-process for tool filtering and tools_count sorting
-        agents_data = agents_result.data
-        
-        # Apply tool-based filters
-        if has_mcp_tools is not None or has_agentpress_tools is not None or tools:
-            filtered_agents = []
-            tools_filter = []
-            if tools:
-                tools_filter = [tool.strip() for tool in tools.split(',') if tool.strip()]
-            
-            for agent in agents_data:
-                # Check MCP tools filter
-                if has_mcp_tools is not None:
-                    has_mcp = bool(agent.get('configured_mcps') and len(agent.get('configured_mcps', [])) > 0)
-                    if has_mcp_tools != has_mcp:
-                        continue
-                
-                # Check AgentPress tools filter
-                if has_agentpress_tools is not None:
-                    agentpress_tools = agent.get('agentpress_tools', {})
-                    has_enabled_tools = any(
-                        tool_data and isinstance(tool_data, dict) and tool_data.get('enabled', False)
-                        for tool_data in agentpress_tools.values()
-                    )
-                    if has_agentpress_tools != has_enabled_tools:
-                        continue
-                
-                # Check specific tools filter
-                if tools_filter:
-                    agent_tools = set()
-                    # Add MCP tools
-                    for mcp in agent.get('configured_mcps', []):
-                        if isinstance(mcp, dict) and 'name' in mcp:
-                            agent_tools.add(f"mcp:{mcp['name']}")
-                    
-                    # Add enabled AgentPress tools
-                    for tool_name, tool_data in agent.get('agentpress_tools', {}).items():
-                        if tool_data and isinstance(tool_data, dict) and tool_data.get('enabled', False):
-                            agent_tools.add(f"agentpress:{tool_name}")
-                    
-                    # Check if any of the requested tools are present
-                    if not any(tool in agent_tools for tool in tools_filter):
-                        continue
-                
-                filtered_agents.append(agent)
-            
-            agents_data = filtered_agents
-        
-        # Handle tools_count sorting (post-processing required)
-        if sort_by == "tools_count":
-            def get_tools_count(agent):
-                mcp_count = len(agent.get('configured_mcps', []))
-                agentpress_count = sum(
-                    1 for tool_data in agent.get('agentpress_tools', {}).values()
-                    if tool_data and isinstance(tool_data, dict) and tool_data.get('enabled', False)
-                )
-                return mcp_count + agentpress_count
-            
-            agents_data.sort(key=get_tools_count, reverse=(sort_order == "desc"))
-        
-        # Apply pagination to filtered results if we did post-processing
-        if has_mcp_tools is not None or has_agentpress_tools is not None or tools or sort_by == "tools_count":
-            total_count = len(agents_data)
-            agents_data = agents_data[offset:offset + limit]
+        try:
+            list_request = build_agent_list_request(
+                user_id, page=page, limit=limit, search=search, sort_by=sort_by, sort_order=sort_order,
+                has_default=has_default, has_mcp_tools=has_mcp_tools,
+                has_agentpress_tools=has_agentpress_tools, tools=tools, cursor=cursor
+            )
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        page = list_request.page
+
+        result = await client.rpc('list_agents', list_request.params).execute()
+
+        agents_data = result.data.get('agents') or []
+        total_count = list_request.total if list_request.total is not None else (result.data.get('total') or 0)
+        has_more = len(agents_data) > limit
+        agents_data = agents_data[:limit]
+        next_cursor = list_request.next_cursor(agents_data[-1], total_count) if has_more else None
         
         # Format the response
         agent_list = []
         for agent in agents_data:
-            agent_list.append(AgentResponse(
+            agent_list.append(AgentSummaryResponse(
                 agent_id=agent['agent_id'],
                 account_id=agent['account_id'],
                 name=agent['name'],
                 description=agent.get('description'),
-                system_prompt=agent['system_prompt'],
-                configured_mcps=agent.get('configured_mcps', []),
-                custom_mcps=agent.get('custom_mcps', []),
-                agentpress_tools=agent.get('agentpress_tools', {}),
+                configured_mcps=agent.get('configured_mcps') or [],
+                custom_mcps=agent.get('custom_mcps') or [],
+                agentpress_tools=agent.get('agentpress_tools') or {},
                 is_default=agent.get('is_default', False),
                 is_public=agent.get('is_public', False),
                 marketplace_published_at=agent.get('marketplace_published_at'),
@@ -1235,10 +1043,13 @@ async def get_agents(
                 "page": page,
                 "limit": limit,
                 "total": total_count,
-                "pages": total_pages
+                "pages": total_pages,
+                "next_cursor": next_cursor
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching agents for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch agents: {str(e)}")
@@ -1429,6 +1240,8 @@ async def update_agent(
             
             if not update_result.data:
                 raise HTTPException(status_code=500, detail="Failed to update agent")
+            if existing_data.get('is_public'):
+                await marketplace_cache.invalidate()
             
             # Fetch the updated agent data
             updated_agent = await client.table('agents').select('*').eq("agent_id", agent_id).eq("account_id", user_id).maybe_single().execute()
@@ -1493,6 +1306,8 @@ async def delete_agent(agent_id: str, user_id: str = Depends(get_current_user_id
         
         # Delete the agent
         await client.table('agents').delete().eq('agent_id', agent_id).execute()
+        if agent.get('is_public'):
+            await marketplace_cache.invalidate()
         
         logger.info(f"Successfully deleted agent: {agent_id}")
         return {"message": "Agent deleted successfully"}
@@ -1526,11 +1341,22 @@ class MarketplaceAgentsResponse(BaseModel):
 class PublishAgentRequest(BaseModel):
     tags: Optional[List[str]] = []
 
+async def _load_marketplace_agents() -> List[Dict[str, Any]]:
+    """All public agents, newest first, for the marketplace snapshot."""
+    client = await db.client
+    result = await client.rpc('get_marketplace_agents', {
+        'p_limit': MARKETPLACE_MAX_AGENTS,
+        'p_offset': 0
+    }).execute()
+    return result.data or []
+
+marketplace_cache = MarketplaceCache(_load_marketplace_agents)
+
 @router.get("/marketplace/agents", response_model=MarketplaceAgentsResponse)
 async def get_marketplace_agents(
     page: Optional[int] = Query(1, ge=1, description="Page number (1-based)"),
     limit: Optional[int] = Query(20, ge=1, le=100, description="Number of items per page"),
-    search: Optional[str] = Query(None, description="Search in name and description"),
+    search: Optional[str] = Query(None, description="Search in name, description and tags"),
     tags: Optional[str] = Query(None, description="Comma-separated string of tags"),
     sort_by: Optional[str] = Query("newest", description="Sort by: newest, popular, most_downloaded, name"),
     creator: Optional[str] = Query(None, description="Filter by creator name")
@@ -1543,7 +1369,6 @@ async def get_marketplace_agents(
         )
     
     logger.info(f"Fetching marketplace agents with page={page}, limit={limit}, search='{search}', tags='{tags}', sort_by={sort_by}")
-    client = await db.client
     
     try:
         offset = (page - 1) * limit
@@ -1551,48 +1376,20 @@ async def get_marketplace_agents(
         if tags:
             tags_array = [tag.strip() for tag in tags.split(',') if tag.strip()]
         
-        result = await client.rpc('get_marketplace_agents', {
-            'p_search': search,
-            'p_tags': tags_array,
-            'p_limit': limit + 1,
-            'p_offset': offset
-        }).execute()
-        
-        if result.data is None:
-            result.data = []
-        
-        has_more = len(result.data) > limit
-        agents_data = result.data[:limit] 
-        if creator:
-            agents_data = [
-                agent for agent in agents_data 
-                if creator.lower() in agent.get('creator_name', '').lower()
-            ]
-
-        if sort_by == "most_downloaded":
-            agents_data = sorted(agents_data, key=lambda x: x.get('download_count', 0), reverse=True)
-        elif sort_by == "popular":
-            agents_data = sorted(agents_data, key=lambda x: x.get('download_count', 0), reverse=True)
-        elif sort_by == "name":
-            agents_data = sorted(agents_data, key=lambda x: x.get('name', '').lower())
-        else:
-            agents_data = sorted(agents_data, key=lambda x: x.get('marketplace_published_at', ''), reverse=True)
-        
-        estimated_total = (page - 1) * limit + len(agents_data)
-        if has_more:
-            estimated_total += 1
-        
-        total_pages = max(page, (estimated_total + limit - 1) // limit)
-        if has_more:
-            total_pages = page + 1
+        # Served from the marketplace snapshot, which is filtered and sorted as a whole
+        snapshot = await marketplace_cache.get_snapshot()
+        agents_data, total = snapshot.query(
+            offset, limit, search=search, tags=tags_array, sort_by=sort_by, creator=creator
+        )
+        total_pages = (total + limit - 1) // limit
         
-        logger.info(f"Found {len(agents_data)} marketplace agents (page {page}, estimated {total_pages} pages)")
+        logger.info(f"Found {len(agents_data)} marketplace agents (page {page}/{total_pages})")
         return {
             "agents": agents_data,
             "pagination": {
                 "page": page,
                 "limit": limit,
-                "total": estimated_total,
+                "total": total,
                 "pages": total_pages
             }
         }
@@ -1637,6 +1434,7 @@ async def publish_agent_to_marketplace(
             update_data['tags'] = publish_data.tags
         
         await client.table('agents').update(update_data).eq('agent_id', agent_id).execute()
+        await marketplace_cache.invalidate()
         
         logger.info(f"Successfully published agent {agent_id} to marketplace")
         return {"message": "Agent published to marketplace successfully"}
@@ -1677,6 +1475,7 @@ async def unpublish_agent_from_marketplace(
             'is_public': False,
             'marketplace_published_at': None
         }).eq('agent_id', agent_id).execute()
+        await marketplace_cache.invalidate()
         
         logger.info(f"Successfully unpublished agent {agent_id} from marketplace")
         return {"message": "Agent removed from marketplace successfully"}
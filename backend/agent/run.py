@@ -1,6 +1,7 @@
 import os
 import json
 import re
+import time
 from uuid import uuid4
 from typing import Optional
 
@@ -23,17 +24,123 @@ from agent.tools.expand_msg_tool import ExpandMessageTool
 from agent.prompt import get_system_prompt
 from utils.logger import logger
 from utils.auth_utils import get_account_id_from_thread
-from services.billing import check_billing_status
+from services.billing import check_billing_gate
 from agent.tools.sb_vision_tool import SandboxVisionTool
 from services.langfuse import langfuse
 from langfuse.client import StatefulTraceClient
 from services.langfuse import langfuse
 from agent.gemini_prompt import get_gemini_system_prompt
 from agent.tools.mcp_tool_wrapper import MCPToolWrapper
+from sandbox.registry import sandbox_registry
 from agentpress.tool import SchemaType
+from agentpress.prompt_cache import prompt_key, system_prompt_cache
 
 load_dotenv()
 
+def _mcp_schemas(mcp_wrapper_instance) -> list:
+    """OpenAPI schemas of the MCP wrapper's tools, which the MCP section of the prompt lists."""
+    return [
+        (method_name, [schema.schema for schema in schema_list if schema.schema_type == SchemaType.OPENAPI])
+        for method_name, schema_list in mcp_wrapper_instance.get_schemas().items()
+        if method_name != 'call_mcp_tool'
+    ]
+
+def _build_system_content(model_name: str, agent_config: Optional[dict], is_agent_builder: bool, mcp_wrapper_instance) -> str:
+    """Assemble the system prompt of a run; MCP tools are listed if a wrapper is given."""
+    # First, get the default system prompt
+    if "gemini-2.5-flash" in model_name.lower():
+        default_system_content = get_gemini_system_prompt()
+    else:
+        # Use the original prompt - the LLM can only use tools that are registered
+        default_system_content = get_system_prompt()
+        
+    # Add sample response for non-anthropic models
+    if "anthropic" not in model_name.lower():
+        sample_response_path = os.path.join(os.path.dirname(__file__), 'sample_responses/1.txt')
+        with open(sample_response_path, 'r') as file:
+            sample_response = file.read()
+        default_system_content = default_system_content + "\n\n <sample_assistant_response>" + sample_response + "</sample_assistant_response>"
+    
+    # Handle custom agent system prompt
+    if agent_config and agent_config.get('system_prompt'):
+        custom_system_prompt = agent_config['system_prompt'].strip()
+        
+        # Completely replace the default system prompt with the custom one
+        # This prevents confusion and tool hallucination
+        system_content = custom_system_prompt
+        logger.info(f"Using ONLY custom agent system prompt for: {agent_config.get('name', 'Unknown')}")
+    elif is_agent_builder:
+        system_content = get_agent_builder_prompt()
+        logger.info("Using agent builder system prompt")
+    else:
+        # Use just the default system prompt
+        system_content = default_system_content
+        logger.info("Using default system prompt only")
+    
+    # Add MCP tool information to system prompt if MCP tools are configured
+    if mcp_wrapper_instance:
+        mcp_info = "\n\n--- MCP Tools Available ---\n"
+        mcp_info += "You have access to external MCP (Model Context Protocol) server tools.\n"
+        mcp_info += "MCP tools can be called directly using their native function names in the standard function calling format:\n"
+        mcp_info += '<function_calls>\n'
+        mcp_info += '<invoke name="{tool_name}">\n'
+        mcp_info += '<parameter name="param1">value1</parameter>\n'
+        mcp_info += '<parameter name="param2">value2</parameter>\n'
+        mcp_info += '</invoke>\n'
+        mcp_info += '</function_calls>\n\n'
+    
+        # List available MCP tools
+        mcp_info += "Available MCP tools:\n"
+        try:
+            # Get the actual registered schemas from the wrapper
+            registered_schemas = mcp_wrapper_instance.get_schemas()
+            for method_name, schema_list in registered_schemas.items():
+                if method_name == 'call_mcp_tool':
+                    continue  # Skip the fallback method
+                
+                # Get the schema info
+                for schema in schema_list:
+                    if schema.schema_type == SchemaType.OPENAPI:
+                        func_info = schema.schema.get('function', {})
+                        description = func_info.get('description', 'No description available')
+                        # Extract server name from description if available
+                        server_match = description.find('(MCP Server: ')
+                        if server_match != -1:
+                            server_end = description.find(')', server_match)
+                            server_info = description[server_match:server_end+1]
+                        else:
+                            server_info = ''
+                    
+                        mcp_info += f"- **{method_name}**: {description}\n"
+                    
+                        # Show parameter info
+                        params = func_info.get('parameters', {})
+                        props = params.get('properties', {})
+                        if props:
+                            mcp_info += f"  Parameters: {', '.join(props.keys())}\n"
+                        
+        except Exception as e:
+            logger.error(f"Error listing MCP tools: {e}")
+            mcp_info += "- Error loading MCP tool list\n"
+    
+        # Add critical instructions for using search results
+        mcp_info += "\n🚨 CRITICAL MCP TOOL RESULT INSTRUCTIONS 🚨\n"
+        mcp_info += "When you use ANY MCP (Model Context Protocol) tools:\n"
+        mcp_info += "1. ALWAYS read and use the EXACT results returned by the MCP tool\n"
+        mcp_info += "2. For search tools: ONLY cite URLs, sources, and information from the actual search results\n"
+        mcp_info += "3. For any tool: Base your response entirely on the tool's output - do NOT add external information\n"
+        mcp_info += "4. DO NOT fabricate, invent, hallucinate, or make up any sources, URLs, or data\n"
+        mcp_info += "5. If you need more information, call the MCP tool again with different parameters\n"
+        mcp_info += "6. When writing reports/summaries: Reference ONLY the data from MCP tool results\n"
+        mcp_info += "7. If the MCP tool doesn't return enough information, explicitly state this limitation\n"
+        mcp_info += "8. Always double-check that every fact, URL, and reference comes from the MCP tool output\n"
+        mcp_info += "\nIMPORTANT: MCP tool results are your PRIMARY and ONLY source of truth for external data!\n"
+        mcp_info += "NEVER supplement MCP results with your training data or make assumptions beyond what the tools provide.\n"
+    
+        system_content += mcp_info
+
+    return system_content
+
 async def run_agent(
     thread_id: str,
     project_id: str,
@@ -75,6 +182,8 @@ async def run_agent(
     sandbox_info = project_data.get('sandbox', {})
     if not sandbox_info.get('id'):
         raise ValueError(f"No sandbox found for project {project_id}")
+    # Sandbox tools look the project up through the shared registry
+    sandbox_registry.remember_project(project_id, sandbox_info)
 
     # Initialize tools with project_id instead of sandbox object
     # This ensures each tool independently verifies it's operating on the correct project
@@ -175,118 +284,45 @@ async def run_agent(
                     # Re-register the updated schemas with the tool registry
                     # This ensures the dynamically created tools are available for function calling
                     updated_schemas = mcp_wrapper_instance.get_schemas()
-                    for method_name, schema_list in updated_schemas.items():
-                        if method_name != 'call_mcp_tool':  # Skip the fallback method
-                            # Register each dynamic tool in the registry
-                            for schema in schema_list:
-                                if schema.schema_type == SchemaType.OPENAPI:
-                                    thread_manager.tool_registry.tools[method_name] = {
-                                        "instance": mcp_wrapper_instance,
-                                        "schema": schema
-                                    }
-                                    logger.debug(f"Registered dynamic MCP tool: {method_name}")
+                    dynamic_schemas = {
+                        method_name: [schema for schema in schema_list if schema.schema_type == SchemaType.OPENAPI]
+                        for method_name, schema_list in updated_schemas.items()
+                        if method_name != 'call_mcp_tool'  # Skip the fallback method
+                    }
+                    # Register the dynamic tools and recompile the registry's dispatch table
+                    thread_manager.tool_registry.register_functions(mcp_wrapper_instance, dynamic_schemas)
+                    logger.debug(f"Registered {len(dynamic_schemas)} dynamic MCP tools")
                 
                 except Exception as e:
                     logger.error(f"Failed to initialize MCP tools: {e}")
                     # Continue without MCP tools if initialization fails
 
-    # Prepare system prompt
-    # First, get the default system prompt
-    if "gemini-2.5-flash" in model_name.lower():
-        default_system_content = get_gemini_system_prompt()
-    else:
-        # Use the original prompt - the LLM can only use tools that are registered
-        default_system_content = get_system_prompt()
-        
-    # Add sample response for non-anthropic models
-    if "anthropic" not in model_name.lower():
-        sample_response_path = os.path.join(os.path.dirname(__file__), 'sample_responses/1.txt')
-        with open(sample_response_path, 'r') as file:
-            sample_response = file.read()
-        default_system_content = default_system_content + "\n\n <sample_assistant_response>" + sample_response + "</sample_assistant_response>"
-    
-    # Handle custom agent system prompt
+    # Prepare system prompt, reusing the assembled prompt of runs with the same configuration
+    use_mcp_info = bool(agent_config and (agent_config.get('configured_mcps') or agent_config.get('custom_mcps')) and mcp_wrapper_instance and mcp_wrapper_instance._initialized)
+    prompt_source = 'default'
     if agent_config and agent_config.get('system_prompt'):
-        custom_system_prompt = agent_config['system_prompt'].strip()
-        
-        # Completely replace the default system prompt with the custom one
-        # This prevents confusion and tool hallucination
-        system_content = custom_system_prompt
-        logger.info(f"Using ONLY custom agent system prompt for: {agent_config.get('name', 'Unknown')}")
+        prompt_source = ('custom', agent_config['system_prompt'].strip())
     elif is_agent_builder:
-        system_content = get_agent_builder_prompt()
-        logger.info("Using agent builder system prompt")
-    else:
-        # Use just the default system prompt
-        system_content = default_system_content
-        logger.info("Using default system prompt only")
-    
-    # Add MCP tool information to system prompt if MCP tools are configured
-    if agent_config and (agent_config.get('configured_mcps') or agent_config.get('custom_mcps')) and mcp_wrapper_instance and mcp_wrapper_instance._initialized:
-        mcp_info = "\n\n--- MCP Tools Available ---\n"
-        mcp_info += "You have access to external MCP (Model Context Protocol) server tools.\n"
-        mcp_info += "MCP tools can be called directly using their native function names in the standard function calling format:\n"
-        mcp_info += '<function_calls>\n'
-        mcp_info += '<invoke name="{tool_name}">\n'
-        mcp_info += '<parameter name="param1">value1</parameter>\n'
-        mcp_info += '<parameter name="param2">value2</parameter>\n'
-        mcp_info += '</invoke>\n'
-        mcp_info += '</function_calls>\n\n'
-        
-        # List available MCP tools
-        mcp_info += "Available MCP tools:\n"
-        try:
-            # Get the actual registered schemas from the wrapper
-            registered_schemas = mcp_wrapper_instance.get_schemas()
-            for method_name, schema_list in registered_schemas.items():
-                if method_name == 'call_mcp_tool':
-                    continue  # Skip the fallback method
-                    
-                # Get the schema info
-                for schema in schema_list:
-                    if schema.schema_type == SchemaType.OPENAPI:
-                        func_info = schema.schema.get('function', {})
-                        description = func_info.get('description', 'No description available')
-                        # Extract server name from description if available
-                        server_match = description.find('(MCP Server: ')
-                        if server_match != -1:
-                            server_end = description.find(')', server_match)
-                            server_info = description[server_match:server_end+1]
-                        else:
-                            server_info = ''
-                        
-                        mcp_info += f"- **{method_name}**: {description}\n"
-                        
-                        # Show parameter info
-                        params = func_info.get('parameters', {})
-                        props = params.get('properties', {})
-                        if props:
-                            mcp_info += f"  Parameters: {', '.join(props.keys())}\n"
-                            
-        except Exception as e:
-            logger.error(f"Error listing MCP tools: {e}")
-            mcp_info += "- Error loading MCP tool list\n"
-        
-        # Add critical instructions for using search results
-        mcp_info += "\n🚨 CRITICAL MCP TOOL RESULT INSTRUCTIONS 🚨\n"
-        mcp_info += "When you use ANY MCP (Model Context Protocol) tools:\n"
-        mcp_info += "1. ALWAYS read and use the EXACT results returned by the MCP tool\n"
-        mcp_info += "2. For search tools: ONLY cite URLs, sources, and information from the actual search results\n"
-        mcp_info += "3. For any tool: Base your response entirely on the tool's output - do NOT add external information\n"
-        mcp_info += "4. DO NOT fabricate, invent, hallucinate, or make up any sources, URLs, or data\n"
-        mcp_info += "5. If you need more information, call the MCP tool again with different parameters\n"
-        mcp_info += "6. When writing reports/summaries: Reference ONLY the data from MCP tool results\n"
-        mcp_info += "7. If the MCP tool doesn't return enough information, explicitly state this limitation\n"
-        mcp_info += "8. Always double-check that every fact, URL, and reference comes from the MCP tool output\n"
-        mcp_info += "\nIMPORTANT: MCP tool results are your PRIMARY and ONLY source of truth for external data!\n"
-        mcp_info += "NEVER supplement MCP results with your training data or make assumptions beyond what the tools provide.\n"
-        
-        system_content += mcp_info
+        prompt_source = 'agent_builder'
+    system_prompt_key = prompt_key(
+        'run_agent',
+        "gemini-2.5-flash" in model_name.lower(),
+        "anthropic" in model_name.lower(),
+        prompt_source,
+        _mcp_schemas(mcp_wrapper_instance) if use_mcp_info else None
+    )
+    cached_system_prompt = system_prompt_cache.get_or_build(
+        system_prompt_key,
+        lambda: _build_system_content(model_name, agent_config, is_agent_builder, mcp_wrapper_instance if use_mcp_info else None)
+    )
+    logger.debug(f"System prompt cache: {system_prompt_cache.hits} hits, {system_prompt_cache.misses} misses")
+    system_content = cached_system_prompt.content
     
     system_message = { "role": "system", "content": system_content }
 
     iteration_count = 0
     continue_execution = True
+    run_started = time.monotonic()
 
     latest_user_message = await client.table('messages').select('*').eq('thread_id', thread_id).eq('type', 'user').order('created_at', desc=True).limit(1).execute()
     if latest_user_message.data and len(latest_user_message.data) > 0:
@@ -299,8 +335,9 @@ async def run_agent(
         iteration_count += 1
         logger.info(f"🔄 Running iteration {iteration_count} of {max_iterations}...")
 
-        # Billing check on each iteration - still needed within the iterations
-        can_run, message, subscription = await check_billing_status(client, account_id)
+        # Billing check on each iteration against the cached plan and usage;
+        # this run is not finished yet, so its own elapsed time is added
+        can_run, message, subscription = await check_billing_gate(client, account_id, active_seconds=time.monotonic() - run_started)
         if not can_run:
             error_msg = f"Billing limit reached: {message}"
             trace.event(name="billing_limit_reached", level="ERROR", status_message=(f"{error_msg}"))
@@ -311,27 +348,24 @@ async def run_agent(
                 "message": error_msg
             }
             break
-        # Check if last message is from assistant using direct Supabase query
-        latest_message = await client.table('messages').select('*').eq('thread_id', thread_id).in_('type', ['assistant', 'tool', 'user']).order('created_at', desc=True).limit(1).execute()
-        if latest_message.data and len(latest_message.data) > 0:
-            message_type = latest_message.data[0].get('type')
-            if message_type == 'assistant':
-                logger.info(f"Last message was from assistant, stopping execution")
-                trace.event(name="last_message_from_assistant", level="DEFAULT", status_message=(f"Last message was from assistant, stopping execution"))
-                continue_execution = False
-                break
+        # Latest message type, browser state, pending image context and new LLM messages in one round trip
+        iteration_context = await thread_manager.get_iteration_context(thread_id)
+
+        # Check if last message is from assistant
+        if iteration_context['latest_message_type'] == 'assistant':
+            logger.info(f"Last message was from assistant, stopping execution")
+            trace.event(name="last_message_from_assistant", level="DEFAULT", status_message=(f"Last message was from assistant, stopping execution"))
+            continue_execution = False
+            break
 
         # ---- Temporary Message Handling (Browser State & Image Context) ----
         temporary_message = None
         temp_message_content_list = [] # List to hold text/image blocks
 
-        # Get the latest browser_state message
-        latest_browser_state_msg = await client.table('messages').select('*').eq('thread_id', thread_id).eq('type', 'browser_state').order('created_at', desc=True).limit(1).execute()
-        if latest_browser_state_msg.data and len(latest_browser_state_msg.data) > 0:
+        # The latest browser_state message
+        browser_content = iteration_context['browser_state']
+        if browser_content:
             try:
-                browser_content = latest_browser_state_msg.data[0]["content"]
-                if isinstance(browser_content, str):
-                    browser_content = json.loads(browser_content)
                 screenshot_base64 = browser_content.get("screenshot_base64")
                 screenshot_url = browser_content.get("image_url")
                 
@@ -378,11 +412,10 @@ async def run_agent(
                 logger.error(f"Error parsing browser state: {e}")
                 trace.event(name="error_parsing_browser_state", level="ERROR", status_message=(f"{e}"))
 
-        # Get the latest image_context message (NEW)
-        latest_image_context_msg = await client.table('messages').select('*').eq('thread_id', thread_id).eq('type', 'image_context').order('created_at', desc=True).limit(1).execute()
-        if latest_image_context_msg.data and len(latest_image_context_msg.data) > 0:
+        # The latest image_context message, already deleted so it is only shown once
+        image_context_content = iteration_context['image_context']
+        if image_context_content:
             try:
-                image_context_content = latest_image_context_msg.data[0]["content"] if isinstance(latest_image_context_msg.data[0]["content"], dict) else json.loads(latest_image_context_msg.data[0]["content"])
                 base64_image = image_context_content.get("base64")
                 mime_type = image_context_content.get("mime_type")
                 file_path = image_context_content.get("file_path", "unknown file")
@@ -400,8 +433,6 @@ async def run_agent(
                     })
                 else:
                     logger.warning(f"Image context found for '{file_path}' but missing base64 or mime_type.")
-
-                await client.table('messages').delete().eq('message_id', latest_image_context_msg.data[0]["message_id"]).execute()
             except Exception as e:
                 logger.error(f"Error parsing image context: {e}")
                 trace.event(name="error_parsing_image_context", level="ERROR", status_message=(f"{e}"))
@@ -1,6 +1,39 @@
+"""
+Base class of the RapidAPI data providers.
+
+Endpoint calls go through one pooled HTTP client shared by all providers
+(see services.http_client), so a slow provider no longer blocks the worker's
+event loop and connections to RapidAPI are reused across calls and runs:
+
+- requests time out after REQUEST_TIMEOUT seconds
+- timeouts, transport errors, 429 and 5xx responses are retried up to
+  MAX_RETRIES times with exponential backoff
+- successful responses are cached in Redis for the provider's ``cache_ttl``
+  seconds, keyed by host, route and payload; a provider with ``cache_ttl``
+  None is not cached
+- call_endpoints fans several calls out concurrently, at most
+  MAX_CONCURRENT_CALLS at a time
+"""
+
+import asyncio
+import hashlib
+import json
 import os
-import requests
-from typing import Dict, Any, Optional, TypedDict, Literal
+from typing import Dict, Any, List, Optional, Tuple, TypedDict, Literal
+
+import httpx
+
+from services import redis
+from services.http_client import get_http_client
+from utils.logger import logger
+
+REQUEST_TIMEOUT = 30.0  # seconds per request
+MAX_RETRIES = 2  # retries after the first attempt
+RETRY_BACKOFF = 0.5  # seconds before the first retry, doubled for each further retry
+MAX_CONCURRENT_CALLS = 5  # concurrent requests of one call_endpoints batch
+RESPONSE_CACHE_TTL = 600  # default seconds a response is cached
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
 
 
 class EndpointSchema(TypedDict):
@@ -12,26 +45,27 @@ class EndpointSchema(TypedDict):
 
 
 class RapidDataProviderBase:
+    cache_ttl: Optional[int] = RESPONSE_CACHE_TTL
+
     def __init__(self, base_url: str, endpoints: Dict[str, EndpointSchema]):
         self.base_url = base_url
         self.endpoints = endpoints
-    
+
     def get_endpoints(self):
         return self.endpoints
-    
-    def call_endpoint(
+
+    async def call_endpoint(
             self,
             route: str,
             payload: Optional[Dict[str, Any]] = None
     ):
         """
         Call an API endpoint with the given parameters and data.
-        
+
         Args:
-            endpoint (EndpointSchema): The endpoint configuration dictionary
-            params (dict, optional): Query parameters for GET requests
-            payload (dict, optional): JSON payload for POST requests
-            
+            route (str): The key of the endpoint to call
+            payload (dict, optional): Query parameters for GET requests, JSON payload for POST requests
+
         Returns:
             dict: The JSON response from the API
         """
@@ -41,21 +75,90 @@ class RapidDataProviderBase:
         endpoint = self.endpoints.get(route)
         if not endpoint:
             raise ValueError(f"Endpoint {route} not found")
-        
+
         url = f"{self.base_url}{endpoint['route']}"
-        
+        host = url.split("//")[1].split("/")[0]
+
+        method = endpoint.get('method', 'GET').upper()
+        if method not in ('GET', 'POST'):
+            raise ValueError(f"Unsupported HTTP method: {method}")
+
+        cache_key = self._cache_key(host, route, payload)
+        if self.cache_ttl:
+            cached = await self._read_cache(cache_key)
+            if cached is not None:
+                return cached
+
         headers = {
             "x-rapidapi-key": os.getenv("RAPID_API_KEY"),
-            "x-rapidapi-host": url.split("//")[1].split("/")[0],
+            "x-rapidapi-host": host,
             "Content-Type": "application/json"
         }
 
-        method = endpoint.get('method', 'GET').upper()
-        
-        if method == 'GET':
-            response = requests.get(url, params=payload, headers=headers)
-        elif method == 'POST':
-            response = requests.post(url, json=payload, headers=headers)
-        else:
-            raise ValueError(f"Unsupported HTTP method: {method}")
-        return response.json()
+        response = await self._request(method, url, payload, headers)
+        result = response.json()
+
+        if self.cache_ttl and response.is_success:
+            await self._write_cache(cache_key, result)
+        return result
+
+    async def call_endpoints(
+            self,
+            calls: List[Tuple[str, Optional[Dict[str, Any]]]]
+    ) -> List[Any]:
+        """
+        Call several endpoints concurrently.
+
+        Args:
+            calls: (route, payload) pairs
+
+        Returns:
+            list: The response of each call in order, or the exception it raised
+        """
+        limit = asyncio.Semaphore(MAX_CONCURRENT_CALLS)
+
+        async def call(route: str, payload: Optional[Dict[str, Any]]):
+            async with limit:
+                return await self.call_endpoint(route, payload)
+
+        return await asyncio.gather(
+            *(call(route, payload) for route, payload in calls),
+            return_exceptions=True
+        )
+
+    async def _request(self, method: str, url: str, payload: Optional[Dict[str, Any]], headers: Dict[str, str]) -> httpx.Response:
+        client = get_http_client("rapidapi", timeout=REQUEST_TIMEOUT)
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                if method == 'GET':
+                    response = await client.get(url, params=payload, headers=headers)
+                else:
+                    response = await client.post(url, json=payload, headers=headers)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == MAX_RETRIES:
+                    return response
+                logger.warning(f"RapidAPI {url} returned {response.status_code}, retrying")
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                logger.warning(f"RapidAPI {url} failed: {str(e)}, retrying")
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+    @staticmethod
+    def _cache_key(host: str, route: str, payload: Optional[Dict[str, Any]]) -> str:
+        payload_json = json.dumps(payload or {}, sort_keys=True, default=str)
+        payload_hash = hashlib.sha256(payload_json.encode()).hexdigest()[:16]
+        return f"rapidapi:{host}:{route}:{payload_hash}"
+
+    async def _read_cache(self, cache_key: str):
+        try:
+            cached = await redis.get(cache_key)
+            return json.loads(cached) if cached else None
+        except Exception as e:
+            logger.warning(f"RapidAPI response cache unavailable: {str(e)}")
+            return None
+
+    async def _write_cache(self, cache_key: str, result: Any) -> None:
+        try:
+            await redis.set(cache_key, json.dumps(result), ex=self.cache_ttl)
+        except Exception as e:
+            logger.warning(f"Failed to cache RapidAPI response {cache_key}: {str(e)}")
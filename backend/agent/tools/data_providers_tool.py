@@ -1,5 +1,5 @@
 import json
-from typing import Union, Dict, Any
+from typing import Union, Dict, Any, List
 
 from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema
 from agent.tools.data_providers.LinkedinProvider import LinkedinProvider
@@ -176,7 +176,7 @@ Use this tool when you need to discover what endpoints are available.
                 return self.fail_response(f"Endpoint '{route}' not found in {service_name} data provider.")
             
             
-            result = data_provider.call_endpoint(route, payload)
+            result = await data_provider.call_endpoint(route, payload)
             return self.success_response(result)
             
         except Exception as e:
@@ -186,3 +186,105 @@ Use this tool when you need to discover what endpoints are available.
             if len(error_message) > 200:
                 simplified_message += "..."
             return self.fail_response(simplified_message)
+
+    @openapi_schema({
+        "type": "function",
+        "function": {
+            "name": "execute_data_provider_batch",
+            "description": "Execute several calls to endpoints of one data provider concurrently",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "service_name": {
+                        "type": "string",
+                        "description": "The name of the API service (e.g., 'zillow')"
+                    },
+                    "calls": {
+                        "type": "array",
+                        "description": "The calls to make, each with the key of the endpoint ('route') and its 'payload'",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "route": {"type": "string"},
+                                "payload": {"type": "object"}
+                            },
+                            "required": ["route"]
+                        }
+                    }
+                },
+                "required": ["service_name", "calls"]
+            }
+        }
+    })
+    @xml_schema(
+        tag_name="execute-data-provider-batch",
+        mappings=[
+            {"param_name": "service_name", "node_type": "attribute", "path": "service_name"},
+            {"param_name": "calls", "node_type": "content", "path": "."}
+        ],
+        example='''
+        <!-- 
+        The execute-data-provider-batch tool makes several requests to endpoints of one data provider at once.
+        Use it instead of several execute-data-provider-call invocations when the calls do not depend on each other.
+        Every route must be a valid endpoint key obtained from get-data-provider-endpoints tool!!
+        -->
+        
+        <!-- Example to get the details of two Zillow properties -->
+        <function_calls>
+        <invoke name="execute_data_provider_batch">
+        <parameter name="service_name">zillow</parameter>
+        <parameter name="calls">[{"route": "propertyV2", "payload": {"zpid": "7594920"}}, {"route": "propertyV2", "payload": {"zpid": "20476226"}}]</parameter>
+        </invoke>
+        </function_calls>
+        '''
+    )
+    async def execute_data_provider_batch(
+        self,
+        service_name: str,
+        calls: Union[List[Dict[str, Any]], str]
+    ) -> ToolResult:
+        """
+        Execute several calls to endpoints of one data provider concurrently.
+        
+        Parameters:
+        - service_name: The name of the data provider (e.g., 'zillow')
+        - calls: List of {"route": ..., "payload": {...}} (list or JSON string)
+        """
+        try:
+            if isinstance(calls, str):
+                try:
+                    calls = json.loads(calls)
+                except json.JSONDecodeError as e:
+                    return self.fail_response(f"Invalid JSON in calls: {str(e)}")
+
+            if not service_name:
+                return self.fail_response("service_name is required.")
+
+            if not calls or not isinstance(calls, list):
+                return self.fail_response("calls must be a non-empty list.")
+                
+            if service_name not in self.register_data_providers:
+                return self.fail_response(f"API '{service_name}' not found. Available APIs: {list(self.register_data_providers.keys())}")
+            
+            data_provider = self.register_data_providers[service_name]
+            endpoints = data_provider.get_endpoints()
+            for call in calls:
+                if not isinstance(call, dict) or call.get("route") not in endpoints:
+                    return self.fail_response(f"Endpoint '{call.get('route') if isinstance(call, dict) else call}' not found in {service_name} data provider.")
+            
+            results = await data_provider.call_endpoints(
+                [(call["route"], call.get("payload") or {}) for call in calls]
+            )
+            return self.success_response([
+                {"route": call["route"], "error": f"Error executing data provider call: {str(result)[:200]}"}
+                if isinstance(result, Exception) else
+                {"route": call["route"], "result": result}
+                for call, result in zip(calls, results)
+            ])
+            
+        except Exception as e:
+            error_message = str(e)
+            simplified_message = f"Error executing data provider batch: {error_message[:200]}"
+            if len(error_message) > 200:
+                simplified_message += "..."
+            return self.fail_response(simplified_message)
@@ -6,16 +6,19 @@ server tool calls through dynamically generated individual function methods.
 """
 
 import json
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema, ToolSchema, SchemaType
-from mcp_local.client import MCPManager
+from mcp_local.client import (
+    MCPManager,
+    format_tool_result,
+    open_sse_session,
+    open_stdio_session,
+    open_streamable_http_session,
+)
+from mcp_local.schema_cache import tool_schema_cache
+from mcp_local.session_pool import mcp_session_pool, session_key, SessionOpener
 from utils.logger import logger
 import inspect
-from mcp import ClientSession
-from mcp.client.sse import sse_client
-from mcp.client.stdio import stdio_client
-from mcp.client.streamable_http import streamablehttp_client
-from mcp import StdioServerParameters
 import asyncio
 
 
@@ -52,202 +55,143 @@ class MCPToolWrapper(Tool):
             standard_configs = [cfg for cfg in self.mcp_configs if not cfg.get('isCustom', False)]
             custom_configs = [cfg for cfg in self.mcp_configs if cfg.get('isCustom', False)]
             
-            # Initialize standard MCPs through MCPManager
-            if standard_configs:
-                for config in standard_configs:
-                    try:
-                        await self.mcp_manager.connect_server(config)
-                    except Exception as e:
-                        logger.error(f"Failed to connect to MCP server {config['qualifiedName']}: {e}")
-            
-            # Initialize custom MCPs directly
-            if custom_configs:
-                await self._initialize_custom_mcps(custom_configs)
+            # Discover standard MCPs through MCPManager and custom MCPs directly, all
+            # servers concurrently; both log and skip servers that fail to connect
+            await asyncio.gather(
+                self.mcp_manager.connect_all(standard_configs),
+                self._initialize_custom_mcps(custom_configs)
+            )
             
             # Create dynamic tools for all connected servers
             await self._create_dynamic_tools()
             self._initialized = True
     
+    @staticmethod
+    def _custom_server(custom_type: str, server_config: Dict[str, Any]) -> Tuple[str, SessionOpener]:
+        """Pool key and session opener of a custom MCP server."""
+        if custom_type == 'sse':
+            url = server_config["url"]
+            headers = server_config.get("headers", {})
+            return session_key("sse", url, {"headers": headers}), lambda: open_sse_session(url, headers)
+        if custom_type == 'http':
+            url = server_config["url"]
+            return session_key("http", url), lambda: open_streamable_http_session(url)
+        if custom_type == 'json':
+            command = server_config["command"]
+            args = server_config.get("args", [])
+            env = server_config.get("env", {})
+            return (
+                session_key("stdio", command, {"args": args, "env": env}),
+                lambda: open_stdio_session(command, args, env)
+            )
+        raise ValueError(f"Unsupported custom MCP type: {custom_type}")
+
+    async def _list_custom_tools(self, custom_type: str, server_config: Dict[str, Any], timeout: float):
+        """Tools of a custom MCP server as dicts, from the shared schema cache if possible."""
+        key, opener = self._custom_server(custom_type, server_config)
+        async with asyncio.timeout(timeout):
+            return await tool_schema_cache.get_tools(key, opener)
+
     async def _connect_sse_server(self, server_name, server_config, all_tools, timeout):
-        url = server_config["url"]
-        headers = server_config.get("headers", {})
+        tools = await self._list_custom_tools('sse', server_config, timeout)
+        tools_info = []
+        for tool in tools:
+            tool_info = {
+                "name": tool["name"],
+                "description": tool["description"],
+                "input_schema": tool["inputSchema"]
+            }
+            tools_info.append(tool_info)
         
-        async with asyncio.timeout(timeout):
-            try:
-                async with sse_client(url, headers=headers) as (read, write):
-                    async with ClientSession(read, write) as session:
-                        await session.initialize()
-                        tools_result = await session.list_tools()
-                        tools_info = []
-                        for tool in tools_result.tools:
-                            tool_info = {
-                                "name": tool.name,
-                                "description": tool.description,
-                                "input_schema": tool.inputSchema
-                            }
-                            tools_info.append(tool_info)
-                        
-                        all_tools[server_name] = {
-                            "status": "connected",
-                            "transport": "sse",
-                            "url": url,
-                            "tools": tools_info
-                        }
-                        
-                        logger.info(f"  {server_name}: Connected via SSE ({len(tools_info)} tools)")
-            except TypeError as e:
-                if "unexpected keyword argument" in str(e):
-                    async with sse_client(url) as (read, write):
-                        async with ClientSession(read, write) as session:
-                            await session.initialize()
-                            tools_result = await session.list_tools()
-                            tools_info = []
-                            for tool in tools_result.tools:
-                                tool_info = {
-                                    "name": tool.name,
-                                    "description": tool.description,
-                                    "input_schema": tool.inputSchema
-                                }
-                                tools_info.append(tool_info)
-                            
-                            all_tools[server_name] = {
-                                "status": "connected",
-                                "transport": "sse",
-                                "url": url,
-                                "tools": tools_info
-                            }
-                            logger.info(f"  {server_name}: Connected via SSE ({len(tools_info)} tools)")
-                else:
-                    raise
+        all_tools[server_name] = {
+            "status": "connected",
+            "transport": "sse",
+            "url": server_config["url"],
+            "tools": tools_info
+        }
+        
+        logger.info(f"  {server_name}: Connected via SSE ({len(tools_info)} tools)")
     
     async def _connect_streamable_http_server(self, url):
-        async with streamablehttp_client(url) as (
-            read_stream,
-            write_stream,
-            _,
-        ):
-            async with ClientSession(read_stream, write_stream) as session:
-                await session.initialize()
-                tool_result = await session.list_tools()
-                print(f"Connected via HTTP ({len(tool_result.tools)} tools)")
-                
-                tools_info = []
-                for tool in tool_result.tools:
-                    tool_info = {
-                        "name": tool.name,
-                        "description": tool.description,
-                        "inputSchema": tool.inputSchema
-                    }
-                    tools_info.append(tool_info)
-                
-                return tools_info
+        tools = await self._list_custom_tools('http', {"url": url}, 15)
+        logger.info(f"Connected via HTTP ({len(tools)} tools)")
+        
+        tools_info = []
+        for tool in tools:
+            tool_info = {
+                "name": tool["name"],
+                "description": tool["description"],
+                "inputSchema": tool["inputSchema"]
+            }
+            tools_info.append(tool_info)
+        
+        return tools_info
         
     async def _connect_stdio_server(self, server_name, server_config, all_tools, timeout):
-        """Connect to a stdio-based MCP server."""
-        server_params = StdioServerParameters(
-            command=server_config["command"],
-            args=server_config.get("args", []),
-            env=server_config.get("env", {})
-        )
+        """Connect to a stdio-based MCP server; the server process stays up in the session pool."""
+        tools = await self._list_custom_tools('json', server_config, timeout)
+        tools_info = []
+        for tool in tools:
+            tool_info = {
+                "name": tool["name"],
+                "description": tool["description"],
+                "input_schema": tool["inputSchema"]
+            }
+            tools_info.append(tool_info)
         
-        async with asyncio.timeout(timeout):
-            async with stdio_client(server_params) as (read, write):
-                async with ClientSession(read, write) as session:
-                    await session.initialize()
-                    tools_result = await session.list_tools()
-                    tools_info = []
-                    for tool in tools_result.tools:
-                        tool_info = {
-                            "name": tool.name,
-                            "description": tool.description,
-                            "input_schema": tool.inputSchema
-                        }
-                        tools_info.append(tool_info)
-                    
-                    all_tools[server_name] = {
-                        "status": "connected",
-                        "transport": "stdio",
-                        "tools": tools_info
-                    }
-                    
-                    logger.info(f"  {server_name}: Connected via stdio ({len(tools_info)} tools)")
+        all_tools[server_name] = {
+            "status": "connected",
+            "transport": "stdio",
+            "tools": tools_info
+        }
+        
+        logger.info(f"  {server_name}: Connected via stdio ({len(tools_info)} tools)")
 
     async def _initialize_custom_mcps(self, custom_configs):
-        """Initialize custom MCP servers."""
-        for config in custom_configs:
-            try:
-                logger.info(f"Initializing custom MCP: {config}")
-                custom_type = config.get('customType', 'sse')
-                server_config = config.get('config', {})
-                enabled_tools = config.get('enabledTools', [])
-                server_name = config.get('name', 'Unknown')
-                
-                logger.info(f"Initializing custom MCP: {server_name} (type: {custom_type})")
-                
-                if custom_type == 'sse':
-                    if 'url' not in server_config:
-                        logger.error(f"Custom MCP {server_name}: Missing 'url' in config")
-                        continue
-                        
-                    url = server_config['url']
-                    logger.info(f"Initializing custom MCP {url} with SSE type")
+        """Initialize custom MCP servers concurrently."""
+        results = await asyncio.gather(*(self._initialize_custom_mcp(config) for config in custom_configs))
+        # Register in configuration order regardless of which server answered first
+        for custom_tools in results:
+            self._custom_tools.update(custom_tools)
+
+    async def _initialize_custom_mcp(self, config) -> Dict[str, Dict[str, Any]]:
+        """Initialize a custom MCP server and return its enabled tools by tool name."""
+        custom_tools = {}
+        try:
+            logger.info(f"Initializing custom MCP: {config}")
+            custom_type = config.get('customType', 'sse')
+            server_config = config.get('config', {})
+            enabled_tools = config.get('enabledTools', [])
+            server_name = config.get('name', 'Unknown')
+            
+            logger.info(f"Initializing custom MCP: {server_name} (type: {custom_type})")
+            
+            if custom_type == 'sse':
+                if 'url' not in server_config:
+                    logger.error(f"Custom MCP {server_name}: Missing 'url' in config")
+                    return custom_tools
                     
-                    try:
-                        # Use the working connect_sse_server method
-                        all_tools = {}
-                        await self._connect_sse_server(server_name, server_config, all_tools, 15)
-                        
-                        # Process the results
-                        if server_name in all_tools and all_tools[server_name].get('status') == 'connected':
-                            tools_info = all_tools[server_name].get('tools', [])
-                            tools_registered = 0
-                            
-                            for tool_info in tools_info:
-                                tool_name_from_server = tool_info['name']
-                                if not enabled_tools or tool_name_from_server in enabled_tools:
-                                    tool_name = f"custom_{server_name.replace(' ', '_').lower()}_{tool_name_from_server}"
-                                    self._custom_tools[tool_name] = {
-                                        'name': tool_name,
-                                        'description': tool_info['description'],
-                                        'parameters': tool_info['input_schema'],
-                                        'server': server_name,
-                                        'original_name': tool_name_from_server,
-                                        'is_custom': True,
-                                        'custom_type': custom_type,
-                                        'custom_config': server_config
-                                    }
-                                    tools_registered += 1
-                                    logger.debug(f"Registered custom tool: {tool_name}")
-                            
-                            logger.info(f"Successfully initialized custom MCP {server_name} with {tools_registered} tools")
-                        else:
-                            logger.error(f"Failed to connect to custom MCP {server_name}")
-                            
-                    except Exception as e:
-                        logger.error(f"Custom MCP {server_name}: Connection failed - {str(e)}")
-                        continue
+                url = server_config['url']
+                logger.info(f"Initializing custom MCP {url} with SSE type")
                 
-                elif custom_type == 'http':
-                    if 'url' not in server_config:
-                        logger.error(f"Custom MCP {server_name}: Missing 'url' in config")
-                        continue
-                        
-                    url = server_config['url']
-                    logger.info(f"Initializing custom MCP {url} with HTTP type")
+                try:
+                    # Use the working connect_sse_server method
+                    all_tools = {}
+                    await self._connect_sse_server(server_name, server_config, all_tools, 15)
                     
-                    try:
-
-                        tools_info = await self._connect_streamable_http_server(url)
+                    # Process the results
+                    if server_name in all_tools and all_tools[server_name].get('status') == 'connected':
+                        tools_info = all_tools[server_name].get('tools', [])
                         tools_registered = 0
                         
                         for tool_info in tools_info:
                             tool_name_from_server = tool_info['name']
                             if not enabled_tools or tool_name_from_server in enabled_tools:
                                 tool_name = f"custom_{server_name.replace(' ', '_').lower()}_{tool_name_from_server}"
-                                self._custom_tools[tool_name] = {
+                                custom_tools[tool_name] = {
                                     'name': tool_name,
                                     'description': tool_info['description'],
-                                    'parameters': tool_info['inputSchema'],
+                                    'parameters': tool_info['input_schema'],
                                     'server': server_name,
                                     'original_name': tool_name_from_server,
                                     'is_custom': True,
@@ -258,60 +202,100 @@ class MCPToolWrapper(Tool):
                                 logger.debug(f"Registered custom tool: {tool_name}")
                         
                         logger.info(f"Successfully initialized custom MCP {server_name} with {tools_registered} tools")
-                            
-                    except Exception as e:
-                        logger.error(f"Custom MCP {server_name}: Connection failed - {str(e)}")
-                        continue
+                    else:
+                        logger.error(f"Failed to connect to custom MCP {server_name}")
                         
-                elif custom_type == 'json':
-                    if 'command' not in server_config:
-                        logger.error(f"Custom MCP {server_name}: Missing 'command' in config")
-                        continue
+                except Exception as e:
+                    logger.error(f"Custom MCP {server_name}: Connection failed - {str(e)}")
+                    return custom_tools
+            
+            elif custom_type == 'http':
+                if 'url' not in server_config:
+                    logger.error(f"Custom MCP {server_name}: Missing 'url' in config")
+                    return custom_tools
+                    
+                url = server_config['url']
+                logger.info(f"Initializing custom MCP {url} with HTTP type")
+                
+                try:
+
+                    tools_info = await self._connect_streamable_http_server(url)
+                    tools_registered = 0
+                    
+                    for tool_info in tools_info:
+                        tool_name_from_server = tool_info['name']
+                        if not enabled_tools or tool_name_from_server in enabled_tools:
+                            tool_name = f"custom_{server_name.replace(' ', '_').lower()}_{tool_name_from_server}"
+                            custom_tools[tool_name] = {
+                                'name': tool_name,
+                                'description': tool_info['description'],
+                                'parameters': tool_info['inputSchema'],
+                                'server': server_name,
+                                'original_name': tool_name_from_server,
+                                'is_custom': True,
+                                'custom_type': custom_type,
+                                'custom_config': server_config
+                            }
+                            tools_registered += 1
+                            logger.debug(f"Registered custom tool: {tool_name}")
+                    
+                    logger.info(f"Successfully initialized custom MCP {server_name} with {tools_registered} tools")
                         
-                    logger.info(f"Initializing custom MCP {server_name} with JSON/stdio type")
+                except Exception as e:
+                    logger.error(f"Custom MCP {server_name}: Connection failed - {str(e)}")
+                    return custom_tools
+                    
+            elif custom_type == 'json':
+                if 'command' not in server_config:
+                    logger.error(f"Custom MCP {server_name}: Missing 'command' in config")
+                    return custom_tools
+                    
+                logger.info(f"Initializing custom MCP {server_name} with JSON/stdio type")
+                
+                try:
+                    # Use the stdio connection method
+                    all_tools = {}
+                    await self._connect_stdio_server(server_name, server_config, all_tools, 15)
                     
-                    try:
-                        # Use the stdio connection method
-                        all_tools = {}
-                        await self._connect_stdio_server(server_name, server_config, all_tools, 15)
+                    # Process the results
+                    if server_name in all_tools and all_tools[server_name].get('status') == 'connected':
+                        tools_info = all_tools[server_name].get('tools', [])
+                        tools_registered = 0
                         
-                        # Process the results
-                        if server_name in all_tools and all_tools[server_name].get('status') == 'connected':
-                            tools_info = all_tools[server_name].get('tools', [])
-                            tools_registered = 0
-                            
-                            for tool_info in tools_info:
-                                tool_name_from_server = tool_info['name']
-                                if not enabled_tools or tool_name_from_server in enabled_tools:
-                                    tool_name = f"custom_{server_name.replace(' ', '_').lower()}_{tool_name_from_server}"
-                                    self._custom_tools[tool_name] = {
-                                        'name': tool_name,
-                                        'description': tool_info['description'],
-                                        'parameters': tool_info['input_schema'],
-                                        'server': server_name,
-                                        'original_name': tool_name_from_server,
-                                        'is_custom': True,
-                                        'custom_type': custom_type,
-                                        'custom_config': server_config
-                                    }
-                                    tools_registered += 1
-                                    logger.debug(f"Registered custom tool: {tool_name}")
-                            
-                            logger.info(f"Successfully initialized custom MCP {server_name} with {tools_registered} tools")
-                        else:
-                            logger.error(f"Failed to connect to custom MCP {server_name}")
-                            
-                    except Exception as e:
-                        logger.error(f"Custom MCP {server_name}: Connection failed - {str(e)}")
-                        continue
+                        for tool_info in tools_info:
+                            tool_name_from_server = tool_info['name']
+                            if not enabled_tools or tool_name_from_server in enabled_tools:
+                                tool_name = f"custom_{server_name.replace(' ', '_').lower()}_{tool_name_from_server}"
+                                custom_tools[tool_name] = {
+                                    'name': tool_name,
+                                    'description': tool_info['description'],
+                                    'parameters': tool_info['input_schema'],
+                                    'server': server_name,
+                                    'original_name': tool_name_from_server,
+                                    'is_custom': True,
+                                    'custom_type': custom_type,
+                                    'custom_config': server_config
+                                }
+                                tools_registered += 1
+                                logger.debug(f"Registered custom tool: {tool_name}")
                         
-                else:
-                    logger.error(f"Custom MCP {server_name}: Unsupported type '{custom_type}', supported types are 'sse', 'http' and 'json'")
-                    continue
+                        logger.info(f"Successfully initialized custom MCP {server_name} with {tools_registered} tools")
+                    else:
+                        logger.error(f"Failed to connect to custom MCP {server_name}")
+                        
+                except Exception as e:
+                    logger.error(f"Custom MCP {server_name}: Connection failed - {str(e)}")
+                    return custom_tools
                     
-            except Exception as e:
-                logger.error(f"Failed to initialize custom MCP {config.get('name', 'Unknown')}: {e}")
-                continue
+            else:
+                logger.error(f"Custom MCP {server_name}: Unsupported type '{custom_type}', supported types are 'sse', 'http' and 'json'")
+                return custom_tools
+                
+        except Exception as e:
+            logger.error(f"Failed to initialize custom MCP {config.get('name', 'Unknown')}: {e}")
+            return custom_tools
+        
+        return custom_tools
     
     async def initialize_and_register_tools(self, tool_registry=None):
         """Initialize MCP tools and optionally update the tool registry.
@@ -494,144 +478,18 @@ class MCPToolWrapper(Tool):
             return self.fail_response(f"Error executing tool: {str(e)}")
     
     async def _execute_custom_mcp_tool(self, tool_name: str, arguments: Dict[str, Any], tool_info: Dict[str, Any]) -> ToolResult:
-        """Execute a custom MCP tool call."""
+        """Execute a custom MCP tool call over the pooled session of its server."""
         try:
             custom_type = tool_info['custom_type']
-            custom_config = tool_info['custom_config']
-            original_tool_name = tool_info['original_name']
-            
-            if custom_type == 'sse':
-                # Execute SSE-based custom MCP using the same pattern as _connect_sse_server
-                url = custom_config['url']
-                headers = custom_config.get('headers', {})
-                
-                async with asyncio.timeout(30):  # 30 second timeout for tool execution
-                    try:
-                        # Try with headers first (same pattern as _connect_sse_server)
-                        async with sse_client(url, headers=headers) as (read, write):
-                            async with ClientSession(read, write) as session:
-                                await session.initialize()
-                                result = await session.call_tool(original_tool_name, arguments)
-                                
-                                # Handle the result properly
-                                if hasattr(result, 'content'):
-                                    content = result.content
-                                    if isinstance(content, list):
-                                        # Extract text from content list
-                                        text_parts = []
-                                        for item in content:
-                                            if hasattr(item, 'text'):
-                                                text_parts.append(item.text)
-                                            else:
-                                                text_parts.append(str(item))
-                                        content_str = "\n".join(text_parts)
-                                    elif hasattr(content, 'text'):
-                                        content_str = content.text
-                                    else:
-                                        content_str = str(content)
-                                    
-                                    return self.success_response(content_str)
-                                else:
-                                    return self.success_response(str(result))
-                                    
-                    except TypeError as e:
-                        if "unexpected keyword argument" in str(e):
-                            # Fallback: try without headers (exact pattern from _connect_sse_server)
-                            async with sse_client(url) as (read, write):
-                                async with ClientSession(read, write) as session:
-                                    await session.initialize()
-                                    result = await session.call_tool(original_tool_name, arguments)
-                                    
-                                    # Handle the result properly
-                                    if hasattr(result, 'content'):
-                                        content = result.content
-                                        if isinstance(content, list):
-                                            # Extract text from content list
-                                            text_parts = []
-                                            for item in content:
-                                                if hasattr(item, 'text'):
-                                                    text_parts.append(item.text)
-                                                else:
-                                                    text_parts.append(str(item))
-                                            content_str = "\n".join(text_parts)
-                                        elif hasattr(content, 'text'):
-                                            content_str = content.text
-                                        else:
-                                            content_str = str(content)
-                                        
-                                        return self.success_response(content_str)
-                                    else:
-                                        return self.success_response(str(result))
-                        else:
-                            raise
-            
-            elif custom_type == 'http':
-                # Execute HTTP-based custom MCP
-                url = custom_config['url']
-                
-                async with asyncio.timeout(30):  # 30 second timeout for tool execution
-                    async with streamablehttp_client(url) as (read, write, _):
-                        async with ClientSession(read, write) as session:
-                            await session.initialize()
-                            result = await session.call_tool(original_tool_name, arguments)
-                            
-                            # Handle the result properly
-                            if hasattr(result, 'content'):
-                                content = result.content
-                                if isinstance(content, list):
-                                    # Extract text from content list
-                                    text_parts = []
-                                    for item in content:
-                                        if hasattr(item, 'text'):
-                                            text_parts.append(item.text)
-                                        else:
-                                            text_parts.append(str(item))
-                                    content_str = "\n".join(text_parts)
-                                elif hasattr(content, 'text'):
-                                    content_str = content.text
-                                else:
-                                    content_str = str(content)
-                                
-                                return self.success_response(content_str)
-                            else:
-                                return self.success_response(str(result))
-                                
-            elif custom_type == 'json':
-                # Execute stdio-based custom MCP using the same pattern as _connect_stdio_server
-                server_params = StdioServerParameters(
-                    command=custom_config["command"],
-                    args=custom_config.get("args", []),
-                    env=custom_config.get("env", {})
-                )
-                
-                async with asyncio.timeout(30):  # 30 second timeout for tool execution
-                    async with stdio_client(server_params) as (read, write):
-                        async with ClientSession(read, write) as session:
-                            await session.initialize()
-                            result = await session.call_tool(original_tool_name, arguments)
-                            
-                            # Handle the result properly
-                            if hasattr(result, 'content'):
-                                content = result.content
-                                if isinstance(content, list):
-                                    # Extract text from content list
-                                    text_parts = []
-                                    for item in content:
-                                        if hasattr(item, 'text'):
-                                            text_parts.append(item.text)
-                                        else:
-                                            text_parts.append(str(item))
-                                    content_str = "\n".join(text_parts)
-                                elif hasattr(content, 'text'):
-                                    content_str = content.text
-                                else:
-                                    content_str = str(content)
-                                
-                                return self.success_response(content_str)
-                            else:
-                                return self.success_response(str(result))
-            else:
+            if custom_type not in ('sse', 'http', 'json'):
                 return self.fail_response(f"Unsupported custom MCP type: {custom_type}")
+
+            key, opener = self._custom_server(custom_type, tool_info['custom_config'])
+            async with asyncio.timeout(30):  # 30 second timeout for tool execution
+                result = await mcp_session_pool.call_tool(key, opener, tool_info['original_name'], arguments)
+
+            content_str, _ = format_tool_result(result)
+            return self.success_response(content_str)
                                 
         except asyncio.TimeoutError:
             return self.fail_response(f"Tool execution timeout for {tool_name}")
@@ -1,14 +1,17 @@
+import asyncio
 import traceback
 import json
-import base64
-import io
-from PIL import Image
 
 from agentpress.tool import ToolResult, openapi_schema, xml_schema
 from agentpress.thread_manager import ThreadManager
+from sandbox.browser_channel import BrowserChannel, BrowserChannelUnavailable, BrowserActionFailed
 from sandbox.tool_base import SandboxToolsBase
 from utils.logger import logger
-from utils.s3_upload_utils import upload_base64_image
+from utils.image_utils import decode_base64_image, image_hash_distance
+from utils.s3_upload_utils import upload_image_bytes
+
+# Screenshots whose perceptual hashes differ in at most this many of their 256 bits are the same
+SCREENSHOT_HASH_MAX_DISTANCE = 3
 
 
 class SandboxBrowserTool(SandboxToolsBase):
@@ -17,95 +20,46 @@ class SandboxBrowserTool(SandboxToolsBase):
     def __init__(self, project_id: str, thread_id: str, thread_manager: ThreadManager):
         super().__init__(project_id, thread_manager)
         self.thread_id = thread_id
-
-    def _validate_base64_image(self, base64_string: str, max_size_mb: int = 10) -> tuple[bool, str]:
-        """
-        Comprehensive validation of base64 image data.
+        # URL, perceptual hash and stored image URL of the last uploaded screenshot
+        self._last_screenshot = None
+
+    def _is_unchanged_screenshot(self, result: dict, screenshot_hash: str) -> bool:
+        """Whether the result's screenshot shows the same page as the last uploaded one"""
+        if not screenshot_hash or not self._last_screenshot:
+            return False
+        if result.get("url") != self._last_screenshot["url"]:
+            return False
+        # Only a delta with no changes means the interactive elements are the same
+        delta = result.get("interactive_elements_delta")
+        if not delta or delta.get("changed") or delta.get("removed"):
+            return False
+        return image_hash_distance(screenshot_hash, self._last_screenshot["hash"]) <= SCREENSHOT_HASH_MAX_DISTANCE
+
+    async def _curl_browser_action(self, endpoint: str, params: dict = None, method: str = "POST"):
+        """Call the browser API with curl inside the sandbox; fallback for the direct channel"""
+        url = f"http://localhost:8003/api/automation/{endpoint}"
         
-        Args:
-            base64_string (str): The base64 encoded image data
-            max_size_mb (int): Maximum allowed image size in megabytes
-            
-        Returns:
-            tuple[bool, str]: (is_valid, error_message)
-        """
-        try:
-            # Check if data exists and has reasonable length
-            if not base64_string or len(base64_string) < 10:
-                return False, "Base64 string is empty or too short"
-            
-            # Remove data URL prefix if present (data:image/jpeg;base64,...)
-            if base64_string.startswith('data:'):
-                try:
-                    base64_string = base64_string.split(',', 1)[1]
-                except (IndexError, ValueError):
-                    return False, "Invalid data URL format"
-            
-            # Check if string contains only valid base64 characters
-            # Base64 alphabet: A-Z, a-z, 0-9, +, /, = (padding)
-            import re
-            if not re.match(r'^[A-Za-z0-9+/]*={0,2}$', base64_string):
-                return False, "Invalid base64 characters detected"
-            
-            # Check if base64 string length is valid (must be multiple of 4)
-            if len(base64_string) % 4 != 0:
-                return False, "Invalid base64 string length"
-            
-            # Attempt to decode base64
-            try:
-                image_data = base64.b64decode(base64_string, validate=True)
-            except Exception as e:
-                return False, f"Base64 decoding failed: {str(e)}"
-            
-            # Check decoded data size
-            if len(image_data) == 0:
-                return False, "Decoded image data is empty"
-            
-            # Check if decoded data size exceeds limit
-            max_size_bytes = max_size_mb * 1024 * 1024
-            if len(image_data) > max_size_bytes:
-                return False, f"Image size ({len(image_data)} bytes) exceeds limit ({max_size_bytes} bytes)"
-            
-            # Validate that decoded data is actually a valid image using PIL
-            try:
-                image_stream = io.BytesIO(image_data)
-                with Image.open(image_stream) as img:
-                    # Verify the image by attempting to load it
-                    img.verify()
-                    
-                    # Check if image format is supported
-                    supported_formats = {'JPEG', 'PNG', 'GIF', 'BMP', 'WEBP', 'TIFF'}
-                    if img.format not in supported_formats:
-                        return False, f"Unsupported image format: {img.format}"
-                    
-                    # Re-open for dimension checks (verify() closes the image)
-                    image_stream.seek(0)
-                    with Image.open(image_stream) as img_check:
-                        width, height = img_check.size
-                        
-                        # Check reasonable dimension limits
-                        max_dimension = 8192  # 8K resolution limit
-                        if width > max_dimension or height > max_dimension:
-                            return False, f"Image dimensions ({width}x{height}) exceed limit ({max_dimension}x{max_dimension})"
-                        
-                        # Check minimum dimensions
-                        if width < 1 or height < 1:
-                            return False, f"Invalid image dimensions: {width}x{height}"
-                        
-                        logger.debug(f"Valid image detected: {img.format}, {width}x{height}, {len(image_data)} bytes")
-                        
-            except Exception as e:
-                return False, f"Invalid image data: {str(e)}"
-            
-            return True, "Valid image"
-            
-        except Exception as e:
-            logger.error(f"Unexpected error during base64 image validation: {e}")
-            return False, f"Validation error: {str(e)}"
+        if method == "GET" and params:
+            query_params = "&".join([f"{k}={v}" for k, v in params.items()])
+            url = f"{url}?{query_params}"
+            curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
+        else:
+            curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
+            if params:
+                json_data = json.dumps(params)
+                curl_cmd += f" -d '{json_data}'"
+        
+        logger.debug("\033[95mExecuting curl command:\033[0m")
+        logger.debug(f"{curl_cmd}")
+        
+        return await self.sandbox.process.exec(curl_cmd, timeout=30)
 
     async def _execute_browser_action(self, endpoint: str, params: dict = None, method: str = "POST") -> ToolResult:
         """Execute a browser automation action through the API
         
+        The browser API is called directly over the sandbox preview link; if it
+        cannot be reached that way, the request is sent with curl inside the sandbox.
+        
         Args:
             endpoint (str): The API endpoint to call
             params (dict, optional): Parameters to send. Defaults to None.
@@ -118,100 +72,104 @@ class SandboxBrowserTool(SandboxToolsBase):
             # Ensure sandbox is initialized
             await self._ensure_sandbox()
             
-            # Build the curl command
-            url = f"http://localhost:8003/api/automation/{endpoint}"
-            
-            if method == "GET" and params:
-                query_params = "&".join([f"{k}={v}" for k, v in params.items()])
-                url = f"{url}?{query_params}"
-                curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
-            else:
-                curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
-                if params:
-                    json_data = json.dumps(params)
-                    curl_cmd += f" -d '{json_data}'"
-            
-            logger.debug("\033[95mExecuting curl command:\033[0m")
-            logger.debug(f"{curl_cmd}")
-            
-            response = self.sandbox.process.exec(curl_cmd, timeout=30)
-            
-            if response.exit_code == 0:
+            try:
+                result = await BrowserChannel(self.sandbox).request(endpoint, params, method)
+            except BrowserActionFailed as e:
+                # The action may have run; it is not sent again over curl
+                logger.error(str(e))
+                return self.fail_response(str(e))
+            except BrowserChannelUnavailable as e:
+                logger.debug(f"Direct browser channel unavailable, falling back to curl: {e}")
+                response = await self._curl_browser_action(endpoint, params, method)
+                if response.exit_code != 0:
+                    logger.error(f"Browser automation request failed 2: {response}")
+                    return self.fail_response(f"Browser automation request failed 2: {response}")
                 try:
                     result = json.loads(response.result)
+                except json.JSONDecodeError as e:
+                    logger.error(f"Failed to parse response JSON: {response.result} {e}")
+                    return self.fail_response(f"Failed to parse response JSON: {response.result} {e}")
 
-                    if not "content" in result:
-                        result["content"] = ""
-                    
-                    if not "role" in result:
-                        result["role"] = "assistant"
-
-                    logger.info("Browser automation request completed successfully")
-
-                    if "screenshot_base64" in result:
-                        try:
-                            # Comprehensive validation of the base64 image data
-                            screenshot_data = result["screenshot_base64"]
-                            is_valid, validation_message = self._validate_base64_image(screenshot_data)
-                            
-                            if is_valid:
-                                logger.debug(f"Screenshot validation passed: {validation_message}")
-                                image_url = await upload_base64_image(screenshot_data)
-                                result["image_url"] = image_url
-                                logger.debug(f"Uploaded screenshot to {image_url}")
-                            else:
-                                logger.warning(f"Screenshot validation failed: {validation_message}")
-                                result["image_validation_error"] = validation_message
-                                
-                            # Remove base64 data from result to keep it clean
-                            del result["screenshot_base64"]
-                            
-                        except Exception as e:
-                            logger.error(f"Failed to process screenshot: {e}")
-                            result["image_upload_error"] = str(e)
-
-                    added_message = await self.thread_manager.add_message(
-                        thread_id=self.thread_id,
-                        type="browser_state",
-                        content=result,
-                        is_llm_message=False
-                    )
+            if not "content" in result:
+                result["content"] = ""
+            
+            if not "role" in result:
+                result["role"] = "assistant"
 
-                    success_response = {}
+            logger.info("Browser automation request completed successfully")
 
-                    if result.get("success"):
-                        success_response["success"] = result["success"]
-                        success_response["message"] = result.get("message", "Browser action completed successfully")
+            screenshot_hash = result.pop("screenshot_hash", None)
+            if "screenshot_base64" in result and self._is_unchanged_screenshot(result, screenshot_hash):
+                # Same page, no element changes and a visually identical screenshot:
+                # point at the stored screenshot instead of uploading another copy
+                del result["screenshot_base64"]
+                result["image_url"] = self._last_screenshot["image_url"]
+                result["screenshot_unchanged"] = True
+                logger.debug(f"Screenshot unchanged, reusing {result['image_url']}")
+            elif "screenshot_base64" in result:
+                try:
+                    # Decode and validate the screenshot once, off the event loop,
+                    # and upload the decoded bytes
+                    screenshot_data = result["screenshot_base64"]
+                    try:
+                        image_data, image_format = await asyncio.get_running_loop().run_in_executor(
+                            None, decode_base64_image, screenshot_data
+                        )
+                    except ValueError as e:
+                        logger.warning(f"Screenshot validation failed: {e}")
+                        result["image_validation_error"] = str(e)
                     else:
-                        success_response["success"] = False
-                        success_response["message"] = result.get("message", "Browser action failed")
+                        image_url = await upload_image_bytes(image_data, image_format)
+                        result["image_url"] = image_url
+                        logger.debug(f"Uploaded screenshot to {image_url}")
+                        if screenshot_hash:
+                            self._last_screenshot = {"url": result.get("url"), "hash": screenshot_hash, "image_url": image_url}
+                        
+                    # Remove base64 data from result to keep it clean
+                    del result["screenshot_base64"]
+                    
+                except Exception as e:
+                    logger.error(f"Failed to process screenshot: {e}")
+                    result["image_upload_error"] = str(e)
 
-                    if added_message and 'message_id' in added_message:
-                        success_response['message_id'] = added_message['message_id']
-                    if result.get("url"):
-                        success_response["url"] = result["url"]
-                    if result.get("title"):
-                        success_response["title"] = result["title"]
-                    if result.get("element_count"):
-                        success_response["elements_found"] = result["element_count"]
-                    if result.get("pixels_below"):
-                        success_response["scrollable_content"] = result["pixels_below"] > 0
-                    if result.get("ocr_text"):
-                        success_response["ocr_text"] = result["ocr_text"]
-                    if result.get("image_url"):
-                        success_response["image_url"] = result["image_url"]
+            # Unset fields (e.g. interactive_elements when only a delta was sent) are not stored
+            result = {key: value for key, value in result.items() if value is not None}
 
-                    if success_response.get("success"):
-                        return self.success_response(success_response)
-                    else:
-                        return self.fail_response(success_response)
+            added_message = await self.thread_manager.add_message(
+                thread_id=self.thread_id,
+                type="browser_state",
+                content=result,
+                is_llm_message=False
+            )
 
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse response JSON: {response.result} {e}")
-                    return self.fail_response(f"Failed to parse response JSON: {response.result} {e}")
+            success_response = {}
+
+            if result.get("success"):
+                success_response["success"] = result["success"]
+                success_response["message"] = result.get("message", "Browser action completed successfully")
+            else:
+                success_response["success"] = False
+                success_response["message"] = result.get("message", "Browser action failed")
+
+            if added_message and 'message_id' in added_message:
+                success_response['message_id'] = added_message['message_id']
+            if result.get("url"):
+                success_response["url"] = result["url"]
+            if result.get("title"):
+                success_response["title"] = result["title"]
+            if result.get("element_count"):
+                success_response["elements_found"] = result["element_count"]
+            if result.get("pixels_below"):
+                success_response["scrollable_content"] = result["pixels_below"] > 0
+            if result.get("ocr_text"):
+                success_response["ocr_text"] = result["ocr_text"]
+            if result.get("image_url"):
+                success_response["image_url"] = result["image_url"]
+
+            if success_response.get("success"):
+                return self.success_response(success_response)
             else:
-                logger.error(f"Browser automation request failed 2: {response}")
-                return self.fail_response(f"Browser automation request failed 2: {response}")
+                return self.fail_response(success_response)
 
         except Exception as e:
             logger.error(f"Error executing browser action: {e}")
@@ -5,6 +5,9 @@ from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema
 from utils.config import config
 from sandbox.tool_base import SandboxToolsBase
 from agentpress.thread_manager import ThreadManager
+from services.http_client import get_http_client
+from services.web_cache import WebResultCache
+import hashlib
 import json
 import os
 import datetime
@@ -13,6 +16,15 @@ import logging
 
 # TODO: add subpages, etc... in filters as sometimes its necessary 
 
+SEARCH_CACHE_TTL = 900  # seconds identical searches are answered from the cache
+SCRAPE_CACHE_TTL = 3600  # seconds a scraped page is served from the cache
+MAX_CONCURRENT_SCRAPES = 5  # pages scraped at once by one scrape_webpage call
+FIRECRAWL_TIMEOUT = 120  # seconds per Firecrawl request
+
+# Shared by all runs and workers
+search_cache = WebResultCache("search", ttl=SEARCH_CACHE_TTL)
+scrape_cache = WebResultCache("scrape", ttl=SCRAPE_CACHE_TTL)
+
 class SandboxWebSearchTool(SandboxToolsBase):
     """Tool for performing web searches using Tavily API and web scraping using Firecrawl."""
 
@@ -104,15 +116,23 @@ class SandboxWebSearchTool(SandboxToolsBase):
             else:
                 num_results = 20
 
-            # Execute the search with Tavily
-            logging.info(f"Executing web search for query: '{query}' with {num_results} results")
-            search_response = await self.tavily_client.search(
-                query=query,
-                max_results=num_results,
-                include_images=True,
-                include_answer="advanced",
-                search_depth="advanced",
-            )
+            search_request = {
+                "query": query,
+                "max_results": num_results,
+                "include_images": True,
+                "include_answer": "advanced",
+                "search_depth": "advanced",
+            }
+
+            # Execute the search with Tavily unless an identical search was made recently
+            search_response = await search_cache.get(search_request)
+            if search_response is not None:
+                logging.info(f"Using cached web search results for query: '{query}'")
+            else:
+                logging.info(f"Executing web search for query: '{query}' with {num_results} results")
+                search_response = await self.tavily_client.search(**search_request)
+                if search_response.get('results') or (search_response.get('answer') or '').strip():
+                    await search_cache.put(search_request, search_response)
             
             # Check if we have actual results or an answer
             results = search_response.get('results', [])
@@ -208,28 +228,26 @@ class SandboxWebSearchTool(SandboxToolsBase):
             if len(url_list) == 1:
                 logging.warning("Only a single URL provided - for efficiency you should scrape multiple URLs at once")
             
+            # Add protocol if missing
+            url_list = [
+                url if url.startswith('http://') or url.startswith('https://') else 'https://' + url
+                for url in url_list
+            ]
+            
             logging.info(f"Processing {len(url_list)} URLs: {url_list}")
             
-            # Process each URL and collect results
-            results = []
-            for url in url_list:
-                try:
-                    # Add protocol if missing
-                    if not (url.startswith('http://') or url.startswith('https://')):
-                        url = 'https://' + url
-                        logging.info(f"Added https:// protocol to URL: {url}")
-                    
-                    # Scrape this URL
-                    result = await self._scrape_single_url(url)
-                    results.append(result)
-                    
-                except Exception as e:
-                    logging.error(f"Error processing URL {url}: {str(e)}")
-                    results.append({
-                        "url": url,
-                        "success": False,
-                        "error": str(e)
-                    })
+            # Save results to files in the /workspace/scrape directory
+            scrape_dir = f"{self.workspace_path}/scrape"
+            await self.sandbox.fs.create_folder(scrape_dir, "755")
+            
+            # Scrape the URLs concurrently, keeping the results in input order
+            limit = asyncio.Semaphore(MAX_CONCURRENT_SCRAPES)
+
+            async def scrape(url: str) -> dict:
+                async with limit:
+                    return await self._scrape_single_url(url, scrape_dir)
+
+            results = await asyncio.gather(*(scrape(url) for url in url_list))
             
             # Summarize results
             successful = sum(1 for r in results if r.get("success", False))
@@ -264,55 +282,64 @@ class SandboxWebSearchTool(SandboxToolsBase):
             logging.error(f"Error in scrape_webpage: {error_message}")
             return self.fail_response(f"Error processing scrape request: {error_message[:200]}")
     
-    async def _scrape_single_url(self, url: str) -> dict:
+    async def _firecrawl_scrape(self, payload: dict) -> dict:
         """
-        Helper function to scrape a single URL and return the result information.
+        Scrape a page with the Firecrawl scrape endpoint over the shared HTTP client.
+        """
+        logging.info(f"Sending request to Firecrawl for URL: {payload['url']}")
+        headers = {
+            "Authorization": f"Bearer {self.firecrawl_api_key}",
+            "Content-Type": "application/json",
+        }
+        # Use longer timeout and retry logic for more reliability
+        max_retries = 3
+        timeout_seconds = FIRECRAWL_TIMEOUT
+        retry_count = 0
+        
+        client = get_http_client("firecrawl", timeout=FIRECRAWL_TIMEOUT, http2=True)
+        while retry_count < max_retries:
+            try:
+                logging.info(f"Sending request to Firecrawl (attempt {retry_count + 1}/{max_retries})")
+                response = await client.post(
+                    f"{self.firecrawl_url}/v1/scrape",
+                    json=payload,
+                    headers=headers,
+                    timeout=timeout_seconds,
+                )
+                response.raise_for_status()
+                data = response.json()
+                logging.info(f"Successfully received response from Firecrawl for {payload['url']}")
+                return data
+            except (httpx.ReadTimeout, httpx.ConnectTimeout, httpx.ReadError) as timeout_err:
+                retry_count += 1
+                logging.warning(f"Request timed out (attempt {retry_count}/{max_retries}): {str(timeout_err)}")
+                if retry_count >= max_retries:
+                    raise Exception(f"Request timed out after {max_retries} attempts with {timeout_seconds}s timeout")
+                # Exponential backoff
+                logging.info(f"Waiting {2 ** retry_count}s before retry")
+                await asyncio.sleep(2 ** retry_count)
+            except Exception as e:
+                # Don't retry on non-timeout errors
+                logging.error(f"Error during scraping: {str(e)}")
+                raise e
+
+    async def _scrape_single_url(self, url: str, scrape_dir: str) -> dict:
+        """
+        Helper function to scrape a single URL into scrape_dir and return the result information.
         """
         logging.info(f"Scraping single URL: {url}")
         
         try:
-            # ---------- Firecrawl scrape endpoint ----------
-            logging.info(f"Sending request to Firecrawl for URL: {url}")
-            async with httpx.AsyncClient() as client:
-                headers = {
-                    "Authorization": f"Bearer {self.firecrawl_api_key}",
-                    "Content-Type": "application/json",
-                }
-                payload = {
-                    "url": url,
-                    "formats": ["markdown"]
-                }
-                
-                # Use longer timeout and retry logic for more reliability
-                max_retries = 3
-                timeout_seconds = 120
-                retry_count = 0
-                
-                while retry_count < max_retries:
-                    try:
-                        logging.info(f"Sending request to Firecrawl (attempt {retry_count + 1}/{max_retries})")
-                        response = await client.post(
-                            f"{self.firecrawl_url}/v1/scrape",
-                            json=payload,
-                            headers=headers,
-                            timeout=timeout_seconds,
-                        )
-                        response.raise_for_status()
-                        data = response.json()
-                        logging.info(f"Successfully received response from Firecrawl for {url}")
-                        break
-                    except (httpx.ReadTimeout, httpx.ConnectTimeout, httpx.ReadError) as timeout_err:
-                        retry_count += 1
-                        logging.warning(f"Request timed out (attempt {retry_count}/{max_retries}): {str(timeout_err)}")
-                        if retry_count >= max_retries:
-                            raise Exception(f"Request timed out after {max_retries} attempts with {timeout_seconds}s timeout")
-                        # Exponential backoff
-                        logging.info(f"Waiting {2 ** retry_count}s before retry")
-                        await asyncio.sleep(2 ** retry_count)
-                    except Exception as e:
-                        # Don't retry on non-timeout errors
-                        logging.error(f"Error during scraping: {str(e)}")
-                        raise e
+            payload = {
+                "url": url,
+                "formats": ["markdown"]
+            }
+            data = await scrape_cache.get(payload)
+            if data is not None:
+                logging.info(f"Using cached Firecrawl response for {url}")
+            else:
+                data = await self._firecrawl_scrape(payload)
+                await scrape_cache.put(payload, data)
 
             # Format the response
             title = data.get("data", {}).get("metadata", {}).get("title", "")
@@ -330,8 +357,10 @@ class SandboxWebSearchTool(SandboxToolsBase):
                 formatted_result["metadata"] = data["data"]["metadata"]
                 logging.info(f"Added metadata: {data['data']['metadata'].keys()}")
             
-            # Create a simple filename from the URL domain and date
+            # Create a simple filename from the URL domain, date and a short URL hash,
+            # as pages of one domain may be scraped in the same second
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            url_hash = hashlib.sha256(url.encode()).hexdigest()[:8]
             
             # Extract domain from URL for the filename
             from urllib.parse import urlparse
@@ -340,19 +369,15 @@ class SandboxWebSearchTool(SandboxToolsBase):
             
             # Clean up domain for filename
             domain = "".join([c if c.isalnum() else "_" for c in domain])
-            safe_filename = f"{timestamp}_{domain}.json"
+            safe_filename = f"{timestamp}_{domain}_{url_hash}.json"
             
             logging.info(f"Generated filename: {safe_filename}")
             
-            # Save results to a file in the /workspace/scrape directory
-            scrape_dir = f"{self.workspace_path}/scrape"
-            self.sandbox.fs.create_folder(scrape_dir, "755")
-            
             results_file_path = f"{scrape_dir}/{safe_filename}"
             json_content = json.dumps(formatted_result, ensure_ascii=False, indent=2)
             logging.info(f"Saving content to file: {results_file_path}, size: {len(json_content)} bytes")
             
-            self.sandbox.fs.upload_file(
+            await self.sandbox.fs.upload_file(
                 json_content.encode(),
                 results_file_path,
             )
@@ -10,6 +10,7 @@ from typing import List, Dict, Any, Optional
 
 from litellm import token_counter, completion_cost
 from services.supabase import DBConnection
+from agentpress.message_cache import ThreadMessageCache, copy_message
 from services.llm import make_llm_api_call
 from utils.logger import logger
 
@@ -21,14 +22,16 @@ RESERVE_TOKENS = 5000            # Reserve tokens for new messages
 class ContextManager:
     """Manages thread context including token counting and summarization."""
     
-    def __init__(self, token_threshold: int = DEFAULT_TOKEN_THRESHOLD):
+    def __init__(self, token_threshold: int = DEFAULT_TOKEN_THRESHOLD, message_cache: Optional[ThreadMessageCache] = None):
         """Initialize the ContextManager.
         
         Args:
             token_threshold: Token count threshold to trigger summarization
+            message_cache: Optional per-run message cache shared with the ThreadManager
         """
         self.db = DBConnection()
         self.token_threshold = token_threshold
+        self.message_cache = message_cache
     
     async def get_thread_token_count(self, thread_id: str) -> int:
         """Get the current token count for a thread using LiteLLM.
@@ -74,6 +77,9 @@ class ContextManager:
             List of message objects to summarize
         """
         logger.debug(f"Getting messages for summarization for thread {thread_id}")
+        if self.message_cache is not None:
+            return await self._get_cached_messages_for_summarization(thread_id)
+
         client = await self.db.client
         
         try:
@@ -139,6 +145,34 @@ class ContextManager:
             logger.error(f"Error getting messages for summarization: {str(e)}", exc_info=True)
             return []
     
+    async def _get_cached_messages_for_summarization(self, thread_id: str) -> List[Dict[str, Any]]:
+        """Same selection as get_messages_for_summarization, served from the message cache."""
+        try:
+            rows = await self.message_cache.get_rows(thread_id)
+
+            # Only messages after the most recent summary
+            start = 0
+            for index in range(len(rows) - 1, -1, -1):
+                if rows[index]['type'] == 'summary':
+                    start = index + 1
+                    break
+
+            messages = []
+            for row in rows[start:]:
+                content = row['content']
+                if isinstance(content, dict):
+                    content = copy_message(content)
+                if 'role' not in content and row['type'] in ('assistant', 'user', 'system', 'tool'):
+                    content = {'role': row['type'], 'content': content}
+                messages.append(content)
+
+            logger.info(f"Got {len(messages)} messages to summarize for thread {thread_id}")
+            return messages
+
+        except Exception as e:
+            logger.error(f"Error getting messages for summarization: {str(e)}", exc_info=True)
+            return []
+
     async def create_summary(
         self, 
         thread_id: str, 
@@ -0,0 +1,212 @@
+"""
+Incremental cache of a thread's LLM messages for one agent run.
+
+Every agent iteration used to re-select all LLM messages of the thread and
+re-parse their JSON content. The cache keeps the parsed rows for the lifetime
+of a ThreadManager (one agent run) and only fetches rows created after the
+newest row it has seen. Messages added through ThreadManager.add_message are
+written through, so the run's own output is never read back from the
+database. Adding a summary invalidates the thread, forcing a full reload.
+
+Each agent iteration starts with get_iteration_context, which reads the new
+rows together with the rest of the iteration's context (latest message type,
+browser state, pending image context) in one database round trip; the next
+get_rows call is then answered from the cache.
+
+Rows are only fetched incrementally by ``created_at``, so a row inserted by
+another writer with an older timestamp than the cursor would be missed. During
+a run all LLM messages of the thread are written through the run's
+ThreadManager, which keeps the cursor consistent.
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from utils.logger import logger
+
+MESSAGE_COLUMNS = 'message_id, type, content, created_at'
+
+
+def _parse_timestamp(value: str) -> datetime:
+    # Postgres trims trailing zeros of fractional seconds, so compare parsed values
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _parse_content(content: Any) -> Any:
+    if isinstance(content, str):
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            pass  # Keep as string; readers decide how to handle it
+    return content
+
+
+def _parse_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Cache entry for a messages row with its content parsed once."""
+    return {
+        'message_id': row.get('message_id'),
+        'type': row.get('type'),
+        'created_at': row.get('created_at'),
+        'content': _parse_content(row.get('content')),
+    }
+
+
+def copy_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a cached message deep enough that LLM request preparation can modify it.
+
+    make_llm_api_call adds cache_control markers to messages and to the text
+    blocks of list contents in place, so both levels are copied.
+    """
+    message = message.copy()
+    content = message.get('content')
+    if isinstance(content, list):
+        message['content'] = [item.copy() if isinstance(item, dict) else item for item in content]
+    return message
+
+
+class _CachedThread:
+    __slots__ = ('rows', 'message_ids', 'cursor', 'prefetched')
+
+    def __init__(self):
+        self.rows: List[Dict[str, Any]] = []
+        self.message_ids: Set[str] = set()
+        # created_at of the newest row seen
+        self.cursor: Optional[str] = None
+        # New rows were just fetched with the iteration context
+        self.prefetched = False
+
+    def add(self, row: Dict[str, Any]) -> None:
+        message_id = row.get('message_id')
+        if message_id in self.message_ids:
+            return
+        entry = _parse_row(row)
+        created_at = entry['created_at']
+        out_of_order = bool(created_at and self.cursor and _parse_timestamp(created_at) < _parse_timestamp(self.cursor))
+
+        self.rows.append(entry)
+        self.message_ids.add(message_id)
+        if out_of_order:
+            self.rows.sort(key=lambda r: _parse_timestamp(r['created_at']) if r['created_at'] else datetime.min)
+        elif created_at:
+            self.cursor = created_at
+
+
+class ThreadMessageCache:
+    """Per-run cache of LLM message rows, keyed by thread_id.
+
+    Args:
+        db: DBConnection used to fetch rows
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._threads: Dict[str, _CachedThread] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get_rows(self, thread_id: str) -> List[Dict[str, Any]]:
+        """Get all LLM message rows of a thread in created_at order.
+
+        Each row has ``message_id``, ``type``, ``created_at`` and the parsed
+        ``content``. Rows are shared with the cache and must not be modified.
+        """
+        cached = self._threads.get(thread_id)
+        if cached is not None and cached.prefetched:
+            cached.prefetched = False
+            self.hits += 1
+            return cached.rows
+
+        client = await self.db.client
+        query = client.table('messages').select(MESSAGE_COLUMNS).eq('thread_id', thread_id).eq('is_llm_message', True)
+
+        if cached is None:
+            self.misses += 1
+            cached = _CachedThread()
+        else:
+            self.hits += 1
+            if cached.cursor:
+                query = query.gt('created_at', cached.cursor)
+
+        result = await query.order('created_at').execute()
+        for row in result.data or []:
+            cached.add(row)
+        # Only keep the thread once the fetch succeeded
+        self._threads[thread_id] = cached
+
+        logger.debug(f"Message cache for thread {thread_id}: fetched {len(result.data or [])} new rows, {len(cached.rows)} cached ({self.hits} hits, {self.misses} misses)")
+        return cached.rows
+
+    async def get_iteration_context(self, thread_id: str) -> Dict[str, Any]:
+        """Read what an agent iteration needs before its LLM call in one round trip.
+
+        Calls the get_agent_iteration_context function, which also returns the
+        rows created since the cursor; they are added to the cache and serve
+        the next get_rows call. The pending image context is consumed: it is
+        deleted as it is read. Falls back to separate queries if the call fails.
+
+        Returns:
+            Dict with ``latest_message_type`` (type of the latest assistant, tool
+            or user message), ``browser_state`` and ``image_context`` (parsed
+            contents, or None)
+        """
+        cached = self._threads.get(thread_id) or _CachedThread()
+        client = await self.db.client
+        try:
+            result = await client.rpc('get_agent_iteration_context', {
+                'p_thread_id': thread_id,
+                'p_since': cached.cursor
+            }).execute()
+            context = result.data or {}
+        except Exception as e:
+            logger.warning(f"Failed to get iteration context of thread {thread_id} in one call, using separate queries: {str(e)}")
+            return await self._get_iteration_context_separately(client, thread_id)
+
+        if thread_id in self._threads:
+            self.hits += 1
+        else:
+            self.misses += 1
+        for row in context.get('messages') or []:
+            cached.add(row)
+        cached.prefetched = True
+        self._threads[thread_id] = cached
+
+        return {
+            'latest_message_type': context.get('latest_message_type'),
+            'browser_state': _parse_content(context.get('browser_state')),
+            'image_context': _parse_content(context.get('image_context')),
+        }
+
+    async def _get_iteration_context_separately(self, client, thread_id: str) -> Dict[str, Any]:
+        """get_iteration_context with one query per item, for databases without the function."""
+        context = {'latest_message_type': None, 'browser_state': None, 'image_context': None}
+
+        latest_message = await client.table('messages').select('type').eq('thread_id', thread_id).in_('type', ['assistant', 'tool', 'user']).order('created_at', desc=True).limit(1).execute()
+        if latest_message.data:
+            context['latest_message_type'] = latest_message.data[0].get('type')
+        if context['latest_message_type'] == 'assistant':
+            return context
+
+        browser_state = await client.table('messages').select('content').eq('thread_id', thread_id).eq('type', 'browser_state').order('created_at', desc=True).limit(1).execute()
+        if browser_state.data:
+            context['browser_state'] = _parse_content(browser_state.data[0]['content'])
+
+        image_context = await client.table('messages').select('message_id, content').eq('thread_id', thread_id).eq('type', 'image_context').order('created_at', desc=True).limit(1).execute()
+        if image_context.data:
+            context['image_context'] = _parse_content(image_context.data[0]['content'])
+            await client.table('messages').delete().eq('message_id', image_context.data[0]['message_id']).execute()
+
+        return context
+
+    def add_row(self, thread_id: str, row: Dict[str, Any]) -> None:
+        """Write through a row inserted by this run."""
+        cached = self._threads.get(thread_id)
+        if cached is not None and row.get('message_id'):
+            cached.add(row)
+
+    def invalidate(self, thread_id: Optional[str] = None) -> None:
+        """Drop the cached rows of one thread, or of every thread."""
+        if thread_id is None:
+            self._threads.clear()
+        else:
+            self._threads.pop(thread_id, None)
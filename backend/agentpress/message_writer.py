@@ -0,0 +1,189 @@
+"""
+Write-behind persistence for thread messages.
+
+The ResponseProcessor saves a status row for every run start, assistant
+response start and tool start/completion/error, one HTTP insert each. The
+MessageWriter assigns message IDs and timestamps client-side, so a status row
+can be returned to the caller (and streamed to the client) before it is
+stored. Every row of the run gets its created_at from the same strictly
+increasing clock, so threads ordered by created_at keep status rows between
+the assistant and tool rows around them, whatever the skew between the
+worker and the database. Status rows are buffered and stored with one bulk
+insert when:
+
+- the flush interval elapses,
+- the batch is full,
+- an LLM-visible or other non-status message is added (pending rows are
+  flushed first; if that fails the message is inserted anyway and the rows
+  stay pending), or
+- a terminal status is added and durability is "terminal", or
+- the writer is closed; ThreadManager.run_thread closes it when the run's
+  response stream ends or is closed.
+
+A batch that cannot be stored after retries is put back in the buffer and
+sent again with the next flush.
+
+With durability "sync" nothing is buffered and every message is inserted
+before add_message returns.
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Union
+
+from utils.logger import logger
+from utils.retry import retry
+
+DURABILITY_TERMINAL = "terminal"
+DURABILITY_SYNC = "sync"
+
+# Status types that end a turn or a run; stored before add_message returns
+TERMINAL_STATUS_TYPES = frozenset({"finish", "error", "thread_run_end"})
+
+DEFAULT_FLUSH_INTERVAL = 0.2  # seconds a status row may stay buffered
+DEFAULT_MAX_BATCH_SIZE = 50
+
+
+def is_terminal_status(row: Dict[str, Any]) -> bool:
+    content = row.get('content')
+    return isinstance(content, dict) and content.get('status_type') in TERMINAL_STATUS_TYPES
+
+
+class MessageWriter:
+    """Buffers status rows of a run and bulk-inserts them.
+
+    Args:
+        db: DBConnection used for inserts
+        durability: "terminal" or "sync", see module docstring
+        flush_interval: Seconds before a buffered row is flushed
+        max_batch_size: Buffered rows that trigger an immediate flush
+    """
+
+    def __init__(
+        self,
+        db,
+        durability: str = DURABILITY_TERMINAL,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    ):
+        self.db = db
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._last_timestamp: Optional[datetime] = None
+        self.rows_written = 0
+        self.batches_written = 0
+
+    def build_row(
+        self,
+        thread_id: str,
+        type: str,
+        content: Union[Dict[str, Any], List[Any], str],
+        is_llm_message: bool,
+        metadata: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """Full messages row with a client-side message_id and timestamps."""
+        row = {
+            'message_id': str(uuid.uuid4()),
+            'thread_id': thread_id,
+            'type': type,
+            'content': content,
+            'is_llm_message': is_llm_message,
+            'metadata': metadata or {},
+        }
+        timestamp = self._next_timestamp()
+        row['created_at'] = timestamp
+        row['updated_at'] = timestamp
+        return row
+
+    def _next_timestamp(self) -> str:
+        # Strictly increasing, so rows keep their order when sorted by created_at
+        now = datetime.now(timezone.utc)
+        if self._last_timestamp and now <= self._last_timestamp:
+            now = self._last_timestamp + timedelta(microseconds=1)
+        self._last_timestamp = now
+        return now.isoformat()
+
+    def defers(self, row: Dict[str, Any]) -> bool:
+        """Whether a row may be buffered instead of inserted immediately."""
+        return (
+            self.durability != DURABILITY_SYNC
+            and not row['is_llm_message']
+            and row['type'] == 'status'
+        )
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def enqueue(self, row: Dict[str, Any]) -> None:
+        """Buffer a status row; terminal statuses and full batches flush immediately."""
+        self._pending.append(row)
+        if is_terminal_status(row) or len(self._pending) >= self.max_batch_size:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def insert(self, row: Dict[str, Any]):
+        """Flush buffered rows, then insert ``row`` and return the insert result.
+
+        Buffered rows that cannot be stored stay pending; they do not fail the insert.
+        """
+        async with self._lock:
+            try:
+                await self._flush_pending()
+            except Exception:
+                # Already logged; the rows keep their timestamps, so they still sort before ``row``
+                pass
+            client = await self.db.client
+            return await client.table('messages').insert(row, returning='representation').execute()
+
+    async def flush(self) -> None:
+        """Store all buffered rows."""
+        async with self._lock:
+            await self._flush_pending()
+
+    async def close(self) -> None:
+        """Flush buffered rows and stop the flush timer."""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        self._flush_task = None
+        await self.flush()
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Background flush of status messages failed: {str(e)}", exc_info=True)
+
+    async def _flush_pending(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        client = await self.db.client
+
+        async def send():
+            # Upsert so a retried batch whose first attempt did land is not rejected
+            return await client.table('messages').upsert(
+                batch, on_conflict='message_id', ignore_duplicates=True, returning='minimal'
+            ).execute()
+
+        try:
+            await retry(send)
+        except Exception as e:
+            # Keep the rows, ahead of any buffered meanwhile, for the next flush
+            self._pending[:0] = batch
+            logger.error(f"Failed to store {len(batch)} status messages: {str(e)}", exc_info=True)
+            raise
+        self.rows_written += len(batch)
+        self.batches_written += 1
+        logger.debug(f"Stored {len(batch)} status messages in one insert ({self.rows_written} rows in {self.batches_written} batches)")
@@ -0,0 +1,99 @@
+"""
+Process-wide cache of assembled system prompts.
+
+Every agent run used to assemble its system prompt from scratch: the base
+prompt for the model family, the sample response read from disk, the listing
+of MCP tools, and the XML examples of all registered tools appended by
+run_thread. The system prompt was also tokenized again for each run.
+
+SystemPromptCache stores the finished prompt text under a key describing
+everything it was built from (model family, prompt source, enabled tools, MCP
+tool schemas, ...), together with its token count per model. Runs with the
+same configuration reuse the byte-identical prompt, which also keeps the
+Anthropic prompt cache prefix stable across runs.
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+DEFAULT_MAX_ENTRIES = 128
+
+
+def prompt_key(*parts: Any) -> str:
+    """Stable digest of the inputs a prompt is built from."""
+    serialized = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.blake2b(serialized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class CachedSystemPrompt:
+    """A finished system prompt and its token counts per model."""
+
+    __slots__ = ("content", "_token_counts")
+
+    def __init__(self, content: str):
+        self.content = content
+        self._token_counts: Dict[str, int] = {}
+
+    def message(self) -> Dict[str, Any]:
+        """A new system message dict; callers may modify it, the content string is shared."""
+        return {"role": "system", "content": self.content}
+
+    def count_tokens(self, model: str, token_counter: Callable[..., int]) -> int:
+        """Token count of the system message for ``model``, computed once per model.
+
+        Args:
+            model: Model whose tokenizer is used
+            token_counter: Callable with litellm's ``token_counter(model=..., messages=[...])`` signature
+        """
+        tokens = self._token_counts.get(model)
+        if tokens is None:
+            tokens = token_counter(model=model, messages=[self.message()])
+            self._token_counts[model] = tokens
+        return tokens
+
+
+class SystemPromptCache:
+    """LRU cache of CachedSystemPrompt objects, keyed by prompt_key digests.
+
+    Args:
+        max_entries: Maximum number of prompts kept before the least recently
+                     used ones are evicted
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedSystemPrompt]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_build(self, key: str, build: Callable[[], str]) -> CachedSystemPrompt:
+        """The cached prompt for ``key``, calling ``build`` to create its content on a miss."""
+        cached = self._entries.get(key)
+        if cached is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        cached = CachedSystemPrompt(build())
+        self._entries[key] = cached
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return cached
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# Shared by all runs in the process
+system_prompt_cache = SystemPromptCache()
+
+
+def content_digest(content: str) -> str:
+    """Digest of a prompt text, to key prompts built on top of it."""
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
@@ -11,17 +11,22 @@ This module provides comprehensive conversation management, including:
 """
 
 import json
-from typing import List, Dict, Any, Optional, Type, Union, AsyncGenerator, Literal
+from typing import List, Dict, Any, Optional, Tuple, Type, Union, AsyncGenerator, Literal
 from services.llm import make_llm_api_call
 from agentpress.tool import Tool
 from agentpress.tool_registry import ToolRegistry
 from agentpress.context_manager import ContextManager
+from agentpress.token_cache import MessageTokenCache
+from agentpress.message_cache import ThreadMessageCache, copy_message
+from agentpress.prompt_cache import prompt_key, content_digest, system_prompt_cache
+from agentpress.message_writer import MessageWriter, DURABILITY_TERMINAL
 from agentpress.response_processor import (
     ResponseProcessor,
     ProcessorConfig
 )
 from services.supabase import DBConnection
 from utils.logger import logger
+from utils.config import config
 from langfuse.client import StatefulGenerationClient, StatefulTraceClient
 from services.langfuse import langfuse
 import datetime
@@ -60,7 +65,10 @@ class ThreadManager:
             is_agent_builder=self.is_agent_builder,
             target_agent_id=self.target_agent_id
         )
-        self.context_manager = ContextManager()
+        self.message_cache = ThreadMessageCache(self.db)
+        self.message_writer = MessageWriter(self.db, durability=config.MESSAGE_DURABILITY or DURABILITY_TERMINAL)
+        self.context_manager = ContextManager(message_cache=self.message_cache)
+        self.token_cache = MessageTokenCache(token_counter)
 
     def _is_tool_result_message(self, msg: Dict[str, Any]) -> bool:
         if not ("content" in msg and msg['content']):
@@ -103,70 +111,6 @@ class ThreadManager:
             else:
                 return msg_content
   
-    def _compress_tool_result_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int], token_threshold: Optional[int] = 1000) -> List[Dict[str, Any]]:
-        """Compress the tool result messages except the most recent one."""
-        uncompressed_total_token_count = token_counter(model=llm_model, messages=messages)
-
-        if uncompressed_total_token_count > (max_tokens or (100 * 1000)):
-            _i = 0 # Count the number of ToolResult messages
-            for msg in reversed(messages): # Start from the end and work backwards
-                if self._is_tool_result_message(msg): # Only compress ToolResult messages
-                    _i += 1 # Count the number of ToolResult messages
-                    msg_token_count = token_counter(messages=[msg]) # Count the number of tokens in the message
-                    if msg_token_count > token_threshold: # If the message is too long
-                        if _i > 1: # If this is not the most recent ToolResult message
-                            message_id = msg.get('message_id') # Get the message_id
-                            if message_id:
-                                msg["content"] = self._compress_message(msg["content"], message_id, token_threshold * 3)
-                            else:
-                                logger.warning(f"UNEXPECTED: Message has no message_id {str(msg)[:100]}")
-                        else:
-                            msg["content"] = self._safe_truncate(msg["content"], int(max_tokens * 2))
-        return messages
-
-    def _compress_user_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int], token_threshold: Optional[int] = 1000) -> List[Dict[str, Any]]:
-        """Compress the user messages except the most recent one."""
-        uncompressed_total_token_count = token_counter(model=llm_model, messages=messages)
-
-        if uncompressed_total_token_count > (max_tokens or (100 * 1000)):
-            _i = 0 # Count the number of User messages
-            for msg in reversed(messages): # Start from the end and work backwards
-                if msg.get('role') == 'user': # Only compress User messages
-                    _i += 1 # Count the number of User messages
-                    msg_token_count = token_counter(messages=[msg]) # Count the number of tokens in the message
-                    if msg_token_count > token_threshold: # If the message is too long
-                        if _i > 1: # If this is not the most recent User message
-                            message_id = msg.get('message_id') # Get the message_id
-                            if message_id:
-                                msg["content"] = self._compress_message(msg["content"], message_id, token_threshold * 3)
-                            else:
-                                logger.warning(f"UNEXPECTED: Message has no message_id {str(msg)[:100]}")
-                        else:
-                            msg["content"] = self._safe_truncate(msg["content"], int(max_tokens * 2))
-        return messages
-
-    def _compress_assistant_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int], token_threshold: Optional[int] = 1000) -> List[Dict[str, Any]]:
-        """Compress the assistant messages except the most recent one."""
-        uncompressed_total_token_count = token_counter(model=llm_model, messages=messages)
-        if uncompressed_total_token_count > (max_tokens or (100 * 1000)):
-            _i = 0 # Count the number of Assistant messages
-            for msg in reversed(messages): # Start from the end and work backwards
-                if msg.get('role') == 'assistant': # Only compress Assistant messages
-                    _i += 1 # Count the number of Assistant messages
-                    msg_token_count = token_counter(messages=[msg]) # Count the number of tokens in the message
-                    if msg_token_count > token_threshold: # If the message is too long
-                        if _i > 1: # If this is not the most recent Assistant message
-                            message_id = msg.get('message_id') # Get the message_id
-                            if message_id:
-                                msg["content"] = self._compress_message(msg["content"], message_id, token_threshold * 3)
-                            else:
-                                logger.warning(f"UNEXPECTED: Message has no message_id {str(msg)[:100]}")
-                        else:
-                            msg["content"] = self._safe_truncate(msg["content"], int(max_tokens * 2))
-                            
-        return messages
-
-
     def _remove_meta_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Remove meta messages from the messages."""
         result: List[Dict[str, Any]] = []
@@ -192,9 +136,65 @@ class ThreadManager:
                 result.append(msg)
         return result
 
+    def _message_kinds(self, msg: Dict[str, Any]) -> Tuple[bool, bool, bool]:
+        """Which compression passes (tool result, user, assistant) apply to a message."""
+        return (self._is_tool_result_message(msg), msg.get('role') == 'user', msg.get('role') == 'assistant')
+
+    def _plan_compression(self, messages: List[Dict[str, Any]], counts: List[int], kinds: List[Tuple[bool, bool, bool]], llm_model: str, max_tokens: int, token_threshold: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Pick truncations for one threshold in a single pass over the messages.
+
+        Tool results, then user messages, then assistant messages are compressed
+        (newest first) while the running total exceeds max_tokens. Only messages
+        that get truncated are re-counted; the total is updated incrementally.
+        The input messages are never modified.
+
+        Returns:
+            The compressed message list and its token count
+        """
+        result = list(messages)
+        counts = list(counts)
+        total = sum(counts)
+        truncated = set()
+
+        for kind in range(3):
+            if total <= max_tokens:
+                break
+            _i = 0 # Count the number of messages of this kind
+            for index in range(len(result) - 1, -1, -1): # Start from the end and work backwards
+                if not kinds[index][kind]:
+                    continue
+                _i += 1
+                if index in truncated or counts[index] <= token_threshold:
+                    continue
+                msg = result[index]
+                if _i > 1: # If this is not the most recent message of this kind
+                    message_id = msg.get('message_id')
+                    if not message_id:
+                        logger.warning(f"UNEXPECTED: Message has no message_id {str(msg)[:100]}")
+                        continue
+                    content = self._compress_message(msg["content"], message_id, token_threshold * 3)
+                else:
+                    content = self._safe_truncate(msg["content"], int(max_tokens * 2))
+                if content is None or content is msg["content"]: # Unchanged or not compressible (e.g. image lists)
+                    continue
+
+                compressed_msg = msg.copy()
+                compressed_msg["content"] = content
+                compressed_count = self.token_cache.count(llm_model, compressed_msg)
+                total += compressed_count - counts[index]
+                counts[index] = compressed_count
+                result[index] = compressed_msg
+                truncated.add(index)
+
+        return result, total
+
     def _compress_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int] = 41000, token_threshold: Optional[int] = 4096, max_iterations: int = 5) -> List[Dict[str, Any]]:
         """Compress the messages.
             token_threshold: must be a power of 2
+
+        Per-message token counts come from the token cache, so messages that
+        are unchanged since the previous call are not re-tokenized. Each
+        attempt halves token_threshold until the result fits in max_tokens.
         """
 
         if 'sonnet' in llm_model.lower():
@@ -212,22 +212,22 @@ class ThreadManager:
             logger.warning(f"_compress_messages: Max iterations reached, returning uncompressed messages")
             return messages
 
-        result = messages
-        result = self._remove_meta_messages(result)
-
-        uncompressed_total_token_count = token_counter(model=llm_model, messages=result)
+        base = self._remove_meta_messages(messages)
+        counts = [self.token_cache.count(llm_model, msg) for msg in base]
+        kinds = [self._message_kinds(msg) for msg in base]
+        uncompressed_total_token_count = sum(counts)
 
-        result = self._compress_tool_result_messages(result, llm_model, max_tokens, token_threshold)
-        result = self._compress_user_messages(result, llm_model, max_tokens, token_threshold)
-        result = self._compress_assistant_messages(result, llm_model, max_tokens, token_threshold)
-
-        compressed_token_count = token_counter(model=llm_model, messages=result)
-
-        logger.info(f"_compress_messages: {uncompressed_total_token_count} -> {compressed_token_count}") # Log the token compression for debugging later
-
-        if (compressed_token_count > max_tokens):
+        result, compressed_token_count = base, uncompressed_total_token_count
+        for _ in range(max_iterations):
+            result, compressed_token_count = self._plan_compression(base, counts, kinds, llm_model, max_tokens, token_threshold)
+            if compressed_token_count <= max_tokens:
+                break
             logger.warning(f"Further token compression is needed: {compressed_token_count} > {max_tokens}")
-            result = self._compress_messages(messages, llm_model, max_tokens, int(token_threshold / 2), max_iterations - 1)
+            token_threshold = int(token_threshold / 2)
+        else:
+            logger.warning(f"_compress_messages: Max iterations reached, returning most compressed messages")
+
+        logger.info(f"_compress_messages: {uncompressed_total_token_count} -> {compressed_token_count} (token cache: {self.token_cache.hits} hits, {self.token_cache.misses} misses)") # Log the token compression for debugging later
 
         return result
 
@@ -245,6 +245,10 @@ class ThreadManager:
     ):
         """Add a message to the thread in the database.
 
+        Non-LLM status messages are buffered by the message writer and stored
+        in batches (see agentpress.message_writer); all other messages are
+        inserted before this returns.
+
         Args:
             thread_id: The ID of the thread to add the message to.
             type: The type of the message (e.g., 'text', 'image_url', 'tool_call', 'tool', 'user', 'assistant').
@@ -256,23 +260,26 @@ class ThreadManager:
                       Defaults to None, stored as an empty JSONB object if None.
         """
         logger.debug(f"Adding message of type '{type}' to thread {thread_id}")
-        client = await self.db.client
 
-        # Prepare data for insertion
-        data_to_insert = {
-            'thread_id': thread_id,
-            'type': type,
-            'content': content,
-            'is_llm_message': is_llm_message,
-            'metadata': metadata or {},
-        }
+        # Prepare data for insertion; message_id and created_at are assigned client-side
+        data_to_insert = self.message_writer.build_row(thread_id, type, content, is_llm_message, metadata)
 
         try:
+            if self.message_writer.defers(data_to_insert):
+                # Status rows are written behind and batched; the row is returned as it will be stored
+                await self.message_writer.enqueue(data_to_insert)
+                return data_to_insert
+
             # Add returning='representation' to get the inserted row data including the id
-            result = await client.table('messages').insert(data_to_insert, returning='representation').execute()
+            result = await self.message_writer.insert(data_to_insert)
             logger.info(f"Successfully added message to thread {thread_id}")
 
             if result.data and len(result.data) > 0 and isinstance(result.data[0], dict) and 'message_id' in result.data[0]:
+                if type == 'summary':
+                    # Summaries change which messages the LLM sees; reload the thread
+                    self.message_cache.invalidate(thread_id)
+                elif is_llm_message:
+                    self.message_cache.add_row(thread_id, result.data[0])
                 return result.data[0]
             else:
                 logger.error(f"Insert operation failed or did not return expected data structure for thread {thread_id}. Result data: {result.data}")
@@ -281,11 +288,39 @@ class ThreadManager:
             logger.error(f"Failed to add message to thread {thread_id}: {str(e)}", exc_info=True)
             raise
 
+    def _xml_examples_content(self) -> str:
+        """XML tool calling instructions with the examples of all registered XML tools, or "" if there are none."""
+        xml_examples = self.tool_registry.get_xml_examples()
+        if not xml_examples:
+            return ""
+
+        examples_content = """
+--- XML TOOL CALLING ---
+
+In this environment you have access to a set of tools you can use to answer the user's question. The tools are specified in XML format.
+Format your tool calls using the specified XML tags. Place parameters marked as 'attribute' within the opening tag (e.g., `<tag attribute='value'>`). Place parameters marked as 'content' between the opening and closing tags. Place parameters marked as 'element' within their own child tags (e.g., `<tag><element>value</element></tag>`). Refer to the examples provided below for the exact structure of each tool.
+String and scalar parameters should be specified as attributes, while content goes between tags.
+Note that spaces for string values are not stripped. The output is parsed with regular expressions.
+
+Here are the XML tools available with examples:
+"""
+        for tag_name, example in xml_examples.items():
+            examples_content += f"<{tag_name}> Example: {example}\\n"
+        return examples_content
+
+    async def get_iteration_context(self, thread_id: str) -> Dict[str, Any]:
+        """Get the latest message type, browser state and pending image context of a thread.
+
+        One database round trip, which also prefetches the LLM messages for the
+        next get_llm_messages call. The image context is consumed.
+        """
+        return await self.message_cache.get_iteration_context(thread_id)
+
     async def get_llm_messages(self, thread_id: str) -> List[Dict[str, Any]]:
         """Get all messages for a thread.
 
-        This method uses the SQL function which handles context truncation
-        by considering summary messages.
+        Rows come from the run's message cache, which only fetches messages
+        created since the previous call.
 
         Args:
             thread_id: The ID of the thread to get messages for.
@@ -294,30 +329,21 @@ class ThreadManager:
             List of message objects.
         """
         logger.debug(f"Getting messages for thread {thread_id}")
-        client = await self.db.client
 
         try:
             # result = await client.rpc('get_llm_formatted_messages', {'p_thread_id': thread_id}).execute()
-            result = await client.table('messages').select('message_id, content').eq('thread_id', thread_id).eq('is_llm_message', True).order('created_at').execute()
-
-            # Parse the returned data which might be stringified JSON
-            if not result.data:
-                return []
+            rows = await self.message_cache.get_rows(thread_id)
 
-            # Return properly parsed JSON objects
+            # Return copies of the parsed JSON objects; the LLM call modifies them in place
             messages = []
-            for item in result.data:
-                if isinstance(item['content'], str):
-                    try:
-                        parsed_item = json.loads(item['content'])
-                        parsed_item['message_id'] = item['message_id']
-                        messages.append(parsed_item)
-                    except json.JSONDecodeError:
-                        logger.error(f"Failed to parse message: {item['content']}")
+            for row in rows:
+                content = row['content']
+                if isinstance(content, dict):
+                    message = copy_message(content)
+                    message['message_id'] = row['message_id']
+                    messages.append(message)
                 else:
-                    content = item['content']
-                    content['message_id'] = item['message_id']
-                    messages.append(content)
+                    logger.error(f"Failed to parse message: {content}")
 
             return messages
 
@@ -383,49 +409,34 @@ class ThreadManager:
 
         # Create a working copy of the system prompt to potentially modify
         working_system_prompt = system_prompt.copy()
-
-        # Add XML examples to system prompt if requested, do this only ONCE before the loop
-        if include_xml_examples and processor_config.xml_tool_calling:
-            xml_examples = self.tool_registry.get_xml_examples()
-            if xml_examples:
-                examples_content = """
---- XML TOOL CALLING ---
-
-In this environment you have access to a set of tools you can use to answer the user's question. The tools are specified in XML format.
-Format your tool calls using the specified XML tags. Place parameters marked as 'attribute' within the opening tag (e.g., `<tag attribute='value'>`). Place parameters marked as 'content' between the opening and closing tags. Place parameters marked as 'element' within their own child tags (e.g., `<tag><element>value</element></tag>`). Refer to the examples provided below for the exact structure of each tool.
-String and scalar parameters should be specified as attributes, while content goes between tags.
-Note that spaces for string values are not stripped. The output is parsed with regular expressions.
-
-Here are the XML tools available with examples:
-"""
-                for tag_name, example in xml_examples.items():
-                    examples_content += f"<{tag_name}> Example: {example}\\n"
-
-                # # Save examples content to a file
-                # try:
-                #     with open('xml_examples.txt', 'w') as f:
-                #         f.write(examples_content)
-                #     logger.debug("Saved XML examples to xml_examples.txt")
-                # except Exception as e:
-                #     logger.error(f"Failed to save XML examples to file: {e}")
-
-                system_content = working_system_prompt.get('content')
-
-                if isinstance(system_content, str):
-                    working_system_prompt['content'] += examples_content
-                    logger.debug("Appended XML examples to string system prompt content.")
-                elif isinstance(system_content, list):
-                    appended = False
-                    for item in working_system_prompt['content']: # Modify the copy
-                        if isinstance(item, dict) and item.get('type') == 'text' and 'text' in item:
-                            item['text'] += examples_content
-                            logger.debug("Appended XML examples to the first text block in list system prompt content.")
-                            appended = True
-                            break
-                    if not appended:
-                        logger.warning("System prompt content is a list but no text block found to append XML examples.")
-                else:
-                    logger.warning(f"System prompt content is of unexpected type ({type(system_content)}), cannot add XML examples.")
+        add_xml_examples = include_xml_examples and processor_config.xml_tool_calling
+        cached_system_prompt = None
+
+        if isinstance(system_prompt.get('content'), str):
+            # Prompts with the same text and XML tools are assembled and tokenized once per process
+            xml_tags = list(self.tool_registry.xml_tools.keys()) if add_xml_examples else []
+            prompt_cache_key = prompt_key('run_thread', content_digest(system_prompt['content']), xml_tags)
+            cached_system_prompt = system_prompt_cache.get_or_build(
+                prompt_cache_key,
+                lambda: system_prompt['content'] + (self._xml_examples_content() if add_xml_examples else "")
+            )
+            working_system_prompt['content'] = cached_system_prompt.content
+        elif add_xml_examples:
+            # Add XML examples to system prompt, do this only ONCE before the loop
+            examples_content = self._xml_examples_content()
+            if examples_content and isinstance(working_system_prompt.get('content'), list):
+                working_system_prompt['content'] = [item.copy() if isinstance(item, dict) else item for item in working_system_prompt['content']]
+                appended = False
+                for item in working_system_prompt['content']: # Modify the copy
+                    if isinstance(item, dict) and item.get('type') == 'text' and 'text' in item:
+                        item['text'] += examples_content
+                        logger.debug("Appended XML examples to the first text block in list system prompt content.")
+                        appended = True
+                        break
+                if not appended:
+                    logger.warning("System prompt content is a list but no text block found to append XML examples.")
+            elif examples_content:
+                logger.warning(f"System prompt content is of unexpected type ({type(working_system_prompt.get('content'))}), cannot add XML examples.")
         # Control whether we need to auto-continue due to tool_calls finish reason
         auto_continue = True
         auto_continue_count = 0
@@ -444,7 +455,11 @@ Here are the XML tools available with examples:
                 token_count = 0
                 try:
                     # Use the potentially modified working_system_prompt for token counting
-                    token_count = token_counter(model=llm_model, messages=[working_system_prompt] + messages)
+                    if cached_system_prompt is not None:
+                        system_tokens = cached_system_prompt.count_tokens(llm_model, token_counter)
+                    else:
+                        system_tokens = self.token_cache.count(llm_model, working_system_prompt)
+                    token_count = system_tokens + self.token_cache.count_messages(llm_model, messages)
                     token_threshold = self.context_manager.token_threshold
                     logger.info(f"Thread {thread_id} token count: {token_count}/{token_threshold} ({(token_count/token_threshold)*100:.1f}%)")
 
@@ -643,7 +658,19 @@ Here are the XML tools available with examples:
         if native_max_auto_continues == 0:
             logger.info("Auto-continue is disabled (native_max_auto_continues=0)")
             # Pass the potentially modified system prompt and temp message
-            return await _run_once(temporary_message)
+            response = await _run_once(temporary_message)
+            return self._flush_messages_on_close(response) if hasattr(response, '__aiter__') else response
 
         # Otherwise return the auto-continue wrapper generator
-        return auto_continue_wrapper()
+        return self._flush_messages_on_close(auto_continue_wrapper())
+
+    async def _flush_messages_on_close(self, response_gen: AsyncGenerator) -> AsyncGenerator:
+        """Yield from response_gen, storing buffered status rows once it ends, fails or is closed (e.g. a stopped run)."""
+        try:
+            async for chunk in response_gen:
+                yield chunk
+        finally:
+            try:
+                await self.message_writer.close()
+            except Exception as e:
+                logger.error(f"Failed to store buffered status messages: {str(e)}", exc_info=True)
@@ -0,0 +1,70 @@
+"""
+Message-level token count cache for context compression.
+
+Counting tokens for a long thread is expensive, and the same messages are
+counted again before every LLM call. The cache stores one count per message,
+keyed by the message_id, a hash of the message and the model whose tokenizer
+produced the count. Messages that have not changed are never re-tokenized, and
+truncated variants of a message get their own entries.
+
+Per-message counts are summed to get thread totals. Each count includes the
+tokenizer's per-request priming tokens, so the sum slightly over-estimates the
+true total, which errs on the safe side for compression decisions.
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+DEFAULT_MAX_ENTRIES = 10000
+
+
+def message_digest(message: Dict[str, Any]) -> str:
+    """Stable hash of a message's full contents (role, content, tool calls, ...)."""
+    serialized = json.dumps(message, sort_keys=True, default=str)
+    return hashlib.blake2b(serialized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class MessageTokenCache:
+    """LRU cache of per-message token counts.
+
+    Args:
+        token_counter: Callable with litellm's ``token_counter(model=..., messages=[...])``
+                       signature, used to count cache misses
+        max_entries: Maximum number of cached counts before the least recently
+                     used ones are evicted
+    """
+
+    def __init__(self, token_counter: Callable[..., int], max_entries: int = DEFAULT_MAX_ENTRIES):
+        self._token_counter = token_counter
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, str], int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def count(self, model: str, message: Dict[str, Any]) -> int:
+        """Token count of a single message for ``model``."""
+        key = (str(message.get("message_id") or ""), message_digest(message), model)
+        cached = self._entries.get(key)
+        if cached is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        tokens = self._token_counter(model=model, messages=[message])
+        self._entries[key] = tokens
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return tokens
+
+    def count_messages(self, model: str, messages: Iterable[Dict[str, Any]]) -> int:
+        """Total token count of ``messages`` for ``model``."""
+        return sum(self.count(model, message) for message in messages)
+
+    def clear(self) -> None:
+        self._entries.clear()
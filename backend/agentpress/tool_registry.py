@@ -1,20 +1,53 @@
-from typing import Dict, Type, Any, List, Optional, Callable
-from agentpress.tool import Tool, SchemaType
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Type, Any, List, Optional, Callable, FrozenSet, Mapping, Tuple
+from agentpress.tool import Tool, SchemaType, ToolSchema, XMLNodeMapping
 from utils.logger import logger
 
 
+@dataclass(frozen=True)
+class ToolEntry:
+    """Compiled dispatch entry of a tool function.
+    
+    Attributes:
+        name (str): Function name
+        function (Callable): Bound method to call
+        instance (Tool): Tool instance the method belongs to
+        parameters (FrozenSet[str]): Parameter names from the OpenAPI schema
+        required (Tuple[str, ...]): Required parameters from the OpenAPI schema
+        xml_tag_name (str, optional): XML tag of the function, if it has one
+        xml_mappings (Tuple[XMLNodeMapping, ...]): XML node to parameter mappings
+    """
+    name: str
+    function: Callable
+    instance: Tool
+    parameters: FrozenSet[str] = frozenset()
+    required: Tuple[str, ...] = ()
+    xml_tag_name: Optional[str] = None
+    xml_mappings: Tuple[XMLNodeMapping, ...] = ()
+
+
 class ToolRegistry:
     """Registry for managing and accessing tools.
     
     Maintains a collection of tool instances and their schemas, allowing for
     selective registration of tool functions and easy access to tool capabilities.
     
+    The registered tools are compiled into an immutable dispatch table of
+    ToolEntry objects (bound methods with their parameter metadata and XML
+    mappings), so looking up a function for a tool call is a single dict
+    lookup. The table is compiled on the first lookup after a registration.
+    
     Attributes:
         tools (Dict[str, Dict[str, Any]]): OpenAPI-style tools and schemas
         xml_tools (Dict[str, Dict[str, Any]]): XML-style tools and schemas
+        compile_seconds (float): Time spent compiling the dispatch table so far
         
     Methods:
         register_tool: Register a tool with optional function filtering
+        register_functions: Register schemas of an existing tool instance
+        get_entry: Get the compiled dispatch entry of a function
         get_tool: Get a specific tool by name
         get_xml_tool: Get a tool by XML tag name
         get_openapi_schemas: Get OpenAPI schemas for function calling
@@ -25,6 +58,10 @@ class ToolRegistry:
         """Initialize a new ToolRegistry instance."""
         self.tools = {}
         self.xml_tools = {}
+        self._entries: Mapping[str, ToolEntry] = MappingProxyType({})
+        self._functions: Mapping[str, Callable] = MappingProxyType({})
+        self._stale = False
+        self.compile_seconds = 0.0
         logger.debug("Initialized new ToolRegistry instance")
     
     def register_tool(self, tool_class: Type[Tool], function_names: Optional[List[str]] = None, **kwargs):
@@ -41,8 +78,21 @@ class ToolRegistry:
         """
         logger.debug(f"Registering tool class: {tool_class.__name__}")
         tool_instance = tool_class(**kwargs)
-        schemas = tool_instance.get_schemas()
+        self.register_functions(tool_instance, tool_instance.get_schemas(), function_names)
+
+    def register_functions(self, tool_instance: Tool, schemas: Dict[str, List[ToolSchema]], function_names: Optional[List[str]] = None):
+        """Register schemas of an existing tool instance.
         
+        Used by register_tool, and for functions a tool adds after registration
+        (e.g. MCP tools discovered at runtime); the dispatch table is recompiled
+        on the next lookup.
+        
+        Args:
+            tool_instance: The tool instance the functions belong to
+            schemas: Schemas by function name, as returned by Tool.get_schemas
+            function_names: Optional list of specific functions to register
+        """
+        tool_class = tool_instance.__class__
         logger.debug(f"Available schemas for {tool_class.__name__}: {list(schemas.keys())}")
         
         registered_openapi = 0
@@ -69,31 +119,66 @@ class ToolRegistry:
                         logger.debug(f"Registered XML tag {schema.xml_schema.tag_name} -> {func_name} from {tool_class.__name__}")
         
         logger.debug(f"Tool registration complete for {tool_class.__name__}: {registered_openapi} OpenAPI functions, {registered_xml} XML tags")
+        self._stale = True
 
-    def get_available_functions(self) -> Dict[str, Callable]:
-        """Get all available tool functions.
+    def _compile(self):
+        """Rebuild the dispatch table from the registered tools.
         
-        Returns:
-            Dict mapping function names to their implementations
+        Methods are resolved with getattr once here rather than on every tool
+        call, which matters for MCPToolWrapper, whose dynamic methods are found
+        through a linear __getattr__ search.
         """
-        available_functions = {}
-        
-        # Get OpenAPI tool functions
-        for tool_name, tool_info in self.tools.items():
-            tool_instance = tool_info['instance']
-            function_name = tool_name
-            function = getattr(tool_instance, function_name)
-            available_functions[function_name] = function
-            
-        # Get XML tool functions
+        start = time.perf_counter()
+        entries: Dict[str, Dict[str, Any]] = {}
+        
+        for function_name, tool_info in self.tools.items():
+            function_schema = tool_info['schema'].schema.get('function', {})
+            parameters = function_schema.get('parameters') or {}
+            entries[function_name] = {
+                'instance': tool_info['instance'],
+                'parameters': frozenset((parameters.get('properties') or {}).keys()),
+                'required': tuple(parameters.get('required') or ()),
+            }
+        
         for tag_name, tool_info in self.xml_tools.items():
-            tool_instance = tool_info['instance']
-            method_name = tool_info['method']
-            function = getattr(tool_instance, method_name)
-            available_functions[method_name] = function
+            entry = entries.setdefault(tool_info['method'], {'instance': tool_info['instance']})
+            entry['xml_tag_name'] = tag_name
+            entry['xml_mappings'] = tuple(tool_info['schema'].xml_schema.mappings)
+        
+        compiled = {
+            name: ToolEntry(name=name, function=getattr(entry['instance'], name), **entry)
+            for name, entry in entries.items()
+        }
+        self._entries = MappingProxyType(compiled)
+        self._functions = MappingProxyType({name: entry.function for name, entry in compiled.items()})
+        self._stale = False
+        
+        elapsed = time.perf_counter() - start
+        self.compile_seconds += elapsed
+        logger.debug(f"Compiled tool dispatch table with {len(compiled)} functions in {elapsed * 1000:.2f} ms")
+
+    def get_entry(self, function_name: str) -> Optional[ToolEntry]:
+        """Get the compiled dispatch entry of a function.
+        
+        Args:
+            function_name: Name of the tool function
             
-        logger.debug(f"Retrieved {len(available_functions)} available functions")
-        return available_functions
+        Returns:
+            ToolEntry, or None if no such function is registered
+        """
+        if self._stale:
+            self._compile()
+        return self._entries.get(function_name)
+
+    def get_available_functions(self) -> Mapping[str, Callable]:
+        """Get all available tool functions.
+        
+        Returns:
+            Read-only mapping of function names to their implementations
+        """
+        if self._stale:
+            self._compile()
+        return self._functions
 
     def get_tool(self, tool_name: str) -> Dict[str, Any]:
         """Get a specific tool by name.
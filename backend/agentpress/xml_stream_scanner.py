@@ -0,0 +1,261 @@
+"""
+Incremental XML tool call scanner for streamed LLM output.
+
+The scanner is fed content deltas as they arrive and returns every complete
+tool call block exactly once. It keeps its cursor and any partially received
+tag between calls, so each character of the stream is inspected a bounded
+number of times instead of rescanning the accumulated buffer on every delta.
+
+Two block formats are recognized in a single pass:
+
+- The current Cursor-style format: ``<function_calls> ... </function_calls>``
+- Legacy tool tags registered in the ToolRegistry: ``<tag-name ...> ... </tag-name>``
+
+Openers are matched with a trie that is built once from the registered tag
+names, so the number of registered tools does not affect scanning cost.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+FUNCTION_CALLS_TAG = "function_calls"
+FUNCTION_CALLS_OPEN = "<function_calls>"
+FUNCTION_CALLS_CLOSE = "</function_calls>"
+
+# Characters that may follow a legacy tag name in its opening tag
+_TAG_BOUNDARY = frozenset(" \t\r\n>/")
+
+# Results of matching an opener at a '<' position
+_NO_MATCH = 0
+_PARTIAL = 1
+_MATCH = 2
+
+
+class _TrieNode:
+    """Node of the opener trie."""
+
+    __slots__ = ("children", "tag", "is_function_calls")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        # Legacy tag name ending at this node (requires a boundary character)
+        self.tag: Optional[str] = None
+        # True when this node completes the literal "<function_calls>" opener
+        self.is_function_calls = False
+
+
+class XMLStreamScanner:
+    """
+    Stateful scanner that extracts complete XML tool call blocks from a stream.
+
+    Usage:
+        scanner = XMLStreamScanner(tool_registry.xml_tools.keys())
+        for delta in stream:
+            for xml_chunk in scanner.feed(delta):
+                ...
+
+    Rules:
+        - A ``<function_calls>`` block ends at the first ``</function_calls>``.
+        - A legacy tag block ends at its matching closing tag, counting nested
+          openers of the same tag.
+        - Openers inside an open block are treated as content, except that a
+          ``<function_calls>`` opener supersedes an unfinished legacy block,
+          mirroring the precedence the non-incremental extractor gives the
+          new format.
+    """
+
+    def __init__(self, xml_tag_names: Iterable[str] = ()):
+        """
+        Initialize the scanner.
+
+        Args:
+            xml_tag_names: Legacy XML tag names to recognize in addition to
+                           the ``<function_calls>`` format.
+        """
+        self._root = _TrieNode()
+        self._insert(FUNCTION_CALLS_OPEN[1:], is_function_calls=True)
+        for tag_name in xml_tag_names:
+            if tag_name and tag_name != FUNCTION_CALLS_TAG:
+                self._insert(tag_name)
+
+        # Text received but not yet classified. In search mode it starts at a
+        # possible partial opener; in block mode it holds the unscanned tail
+        # of the open block.
+        self._pending = ""
+        self._pos = 0
+        # Open block state
+        self._block_parts: List[str] = []
+        self._block_tag: Optional[str] = None
+        self._closer = ""
+        self._nested_opener: Optional[str] = None
+        self._depth = 0
+
+    def _insert(self, word: str, is_function_calls: bool = False) -> None:
+        node = self._root
+        for char in word:
+            node = node.children.setdefault(char, _TrieNode())
+        if is_function_calls:
+            node.is_function_calls = True
+        else:
+            node.tag = word
+
+    def feed(self, text: str) -> List[str]:
+        """
+        Feed a content delta into the scanner.
+
+        Args:
+            text: The newly streamed content
+
+        Returns:
+            List of XML blocks completed by this delta, in stream order
+        """
+        if not text:
+            return []
+
+        self._pending += text
+        chunks = []
+        while True:
+            if self._block_tag is None:
+                if not self._seek_opener():
+                    break
+            else:
+                chunk = self._seek_closer()
+                if chunk is None:
+                    break
+                chunks.append(chunk)
+
+        return chunks
+
+    def _match_opener(self, text: str, start: int) -> Tuple[int, Optional[str], int]:
+        """
+        Match an opener at ``text[start] == '<'``.
+
+        Returns:
+            Tuple of (result, tag, end) where end is the index just past the
+            matched opener prefix (the tag name for legacy tags).
+        """
+        node = self._root
+        index = start + 1
+        length = len(text)
+        while True:
+            if node.is_function_calls:
+                return _MATCH, FUNCTION_CALLS_TAG, index
+            if index >= length:
+                return _PARTIAL, None, index
+            char = text[index]
+            child = node.children.get(char)
+            if node.tag is not None and child is None and char in _TAG_BOUNDARY:
+                return _MATCH, node.tag, index
+            if child is None:
+                return _NO_MATCH, None, index
+            node = child
+            index += 1
+
+    def _open_block(self, tag: str, start: int, end: int) -> None:
+        self._pending = self._pending[start:]
+        self._pos = end - start
+        self._block_parts = []
+        self._block_tag = tag
+        self._depth = 1
+        if tag == FUNCTION_CALLS_TAG:
+            self._closer = FUNCTION_CALLS_CLOSE
+            self._nested_opener = None
+        else:
+            self._closer = f"</{tag}>"
+            self._nested_opener = f"<{tag}"
+
+    def _close_block(self, end: int) -> str:
+        pending = self._pending
+        self._block_parts.append(pending[:end])
+        chunk = "".join(self._block_parts)
+        self._pending = pending[end:]
+        self._pos = 0
+        self._block_parts = []
+        self._block_tag = None
+        self._nested_opener = None
+        self._depth = 0
+        return chunk
+
+    def _seek_opener(self) -> bool:
+        """Look for the next opener. Returns True if a block was opened."""
+        text = self._pending
+        position = text.find("<", self._pos)
+        while position != -1:
+            result, tag, end = self._match_opener(text, position)
+            if result == _MATCH:
+                self._open_block(tag, position, end)
+                return True
+            if result == _PARTIAL:
+                # Keep the possible opener and wait for more content
+                self._pending = text[position:]
+                self._pos = 0
+                return False
+            position = text.find("<", position + 1)
+
+        # Nothing here can start a block; drop the scanned text
+        self._pending = ""
+        self._pos = 0
+        return False
+
+    def _find_nested_opener(self, text: str, start: int, stop: int) -> Tuple[int, bool]:
+        """
+        Find a nested opener of the current legacy tag in ``text[start:stop]``.
+
+        Returns:
+            Tuple of (index, complete). ``complete`` is False when the opener
+            sits at the very end of the text and its boundary is not known yet.
+        """
+        opener = self._nested_opener
+        index = text.find(opener, start, stop)
+        while index != -1:
+            after = index + len(opener)
+            if after >= len(text):
+                return index, False
+            if text[after] in _TAG_BOUNDARY:
+                return index, True
+            index = text.find(opener, index + 1, stop)
+        return -1, True
+
+    def _seek_closer(self) -> Optional[str]:
+        """Advance inside the open block. Returns the block once it closes."""
+        text = self._pending
+        closer = self._closer
+        pos = self._pos
+
+        while True:
+            end = text.find(closer, pos)
+            stop = end if end != -1 else len(text)
+
+            if self._nested_opener is not None:
+                # A new-format block supersedes an unfinished legacy block
+                fc_start = text.find(FUNCTION_CALLS_OPEN, pos, stop)
+                if fc_start != -1:
+                    self._block_parts = []
+                    self._open_block(FUNCTION_CALLS_TAG, fc_start, fc_start + len(FUNCTION_CALLS_OPEN))
+                    return self._seek_closer()
+
+                nested, complete = self._find_nested_opener(text, pos, stop)
+                if nested != -1 and complete:
+                    self._depth += 1
+                    pos = nested + len(self._nested_opener)
+                    continue
+            else:
+                nested, complete = -1, True
+
+            if end != -1:
+                self._depth -= 1
+                pos = end + len(closer)
+                if self._depth == 0:
+                    return self._close_block(pos)
+                continue
+
+            # No closer yet: move scanned text into the block and keep only a
+            # tail long enough to hold a partially received closer or opener.
+            keep = max(len(closer), len(FUNCTION_CALLS_OPEN)) - 1
+            cut = max(pos, len(text) - keep)
+            if nested != -1 and not complete:
+                cut = min(cut, nested)
+            if cut > 0:
+                self._block_parts.append(text[:cut])
+                self._pending = text[cut:]
+            self._pos = max(pos - cut, 0)
+            return None
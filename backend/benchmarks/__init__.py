@@ -0,0 +1 @@
+# Benchmarks for AgentPress hot paths
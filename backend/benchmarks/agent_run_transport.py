@@ -0,0 +1,138 @@
+"""
+Benchmark: list + pub/sub vs. Redis Streams transport for agent run output.
+
+Simulates one agent run producing responses while hundreds of SSE viewers
+follow it, the way stream_agent_run does, and reports end-to-end delivery
+latency and the number of Redis commands each transport needs.
+
+- list:   each viewer subscribes to the response and control channels and
+          runs LRANGE last+1..-1 on every "new" notification
+- stream: each viewer follows the run's stream with XREAD BLOCK from its
+          last seen entry ID
+
+Requires a reachable Redis (REDIS_HOST / REDIS_PORT / REDIS_PASSWORD / REDIS_SSL,
+same as the backend). Usage (from the backend directory):
+    python -m benchmarks.agent_run_transport --viewers 300 --responses 1000
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from typing import Dict, List
+
+from services import redis
+from services import run_stream
+from services.response_writer import RunResponseWriter
+
+
+async def _command_stats() -> Dict[str, int]:
+    client = await redis.get_client()
+    info = await client.info("commandstats")
+    return {name.replace("cmdstat_", ""): stats["calls"] for name, stats in info.items()}
+
+
+async def _produce(writer: RunResponseWriter, responses: int, interval: float) -> None:
+    for i in range(responses):
+        await writer.write({"type": "assistant", "sequence": i, "sent_at": time.time(), "content": "x" * 80})
+        if interval:
+            await asyncio.sleep(interval)
+    await writer.write({"type": "status", "status": "completed", "sent_at": time.time()})
+    await writer.close()
+
+
+async def _list_viewer(agent_run_id: str, latencies: List[float], ready: asyncio.Event) -> int:
+    list_key = f"agent_run:{agent_run_id}:responses"
+    pubsub_response = await redis.create_pubsub()
+    await pubsub_response.subscribe(f"agent_run:{agent_run_id}:new_response")
+    pubsub_control = await redis.create_pubsub()
+    await pubsub_control.subscribe(f"agent_run:{agent_run_id}:control")
+    ready.set()
+
+    received = 0
+    try:
+        async for message in pubsub_response.listen():
+            if message.get("type") != "message":
+                continue
+            for raw in await redis.lrange(list_key, received, -1):
+                response = json.loads(raw)
+                received += 1
+                latencies.append(time.time() - response["sent_at"])
+                if response.get("type") == "status":
+                    return received
+    finally:
+        await pubsub_response.aclose()
+        await pubsub_control.aclose()
+    return received
+
+
+async def _stream_viewer(agent_run_id: str, latencies: List[float], ready: asyncio.Event) -> int:
+    ready.set()
+    received = 0
+    async for _, response, control in run_stream.read_responses(agent_run_id, "0"):
+        if control:
+            break
+        received += 1
+        latencies.append(time.time() - response["sent_at"])
+        if response.get("type") == "status":
+            break
+    return received
+
+
+async def run_transport(transport: str, viewers: int, responses: int, interval: float) -> None:
+    agent_run_id = f"bench-{uuid.uuid4()}"
+    if transport == "stream":
+        writer = run_stream.RunStreamWriter(agent_run_id)
+        viewer_fn = _stream_viewer
+    else:
+        writer = RunResponseWriter(f"agent_run:{agent_run_id}:responses", f"agent_run:{agent_run_id}:new_response")
+        viewer_fn = _list_viewer
+
+    latencies: List[float] = []
+    ready_events = [asyncio.Event() for _ in range(viewers)]
+    viewer_tasks = [asyncio.create_task(viewer_fn(agent_run_id, latencies, ready)) for ready in ready_events]
+    await asyncio.gather(*(ready.wait() for ready in ready_events))
+
+    before = await _command_stats()
+    started = time.perf_counter()
+    await _produce(writer, responses, interval)
+    counts = await asyncio.gather(*viewer_tasks)
+    elapsed = time.perf_counter() - started
+    after = await _command_stats()
+
+    for key in (f"agent_run:{agent_run_id}:responses", run_stream.response_stream_key(agent_run_id)):
+        await redis.delete(key)
+
+    commands = {name: after.get(name, 0) - before.get(name, 0) for name in after}
+    busy = {name: count for name, count in sorted(commands.items(), key=lambda kv: -kv[1]) if count > 0}
+    latencies.sort()
+    print(f"\n[{transport}] {viewers} viewers x {responses} responses in {elapsed:.2f}s "
+          f"(writer batches: {writer.batches_written}, avg {writer.average_batch_size:.1f})")
+    print(f"  delivered: {sum(counts)} / {viewers * (responses + 1)}")
+    print(f"  latency p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+    print(f"  redis commands: {sum(busy.values())} {dict(list(busy.items())[:6])}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--viewers", type=int, default=200)
+    parser.add_argument("--responses", type=int, default=500)
+    parser.add_argument("--interval", type=float, default=0.002, help="Seconds between produced responses")
+    parser.add_argument("--transport", choices=["list", "stream", "both"], default="both")
+    args = parser.parse_args()
+
+    await redis.initialize_async()
+    # Every viewer holds a connection (pub/sub or blocking XREAD)
+    (await redis.get_client()).connection_pool.max_connections = args.viewers * 2 + 50
+
+    transports = ["list", "stream"] if args.transport == "both" else [args.transport]
+    for transport in transports:
+        await run_transport(transport, args.viewers, args.responses, args.interval)
+    await redis.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Benchmark: browser action latency over the direct channel vs. curl in the sandbox.
+
+Sends the same browser API request to a running sandbox both ways and reports
+per-request latency:
+
+- curl:    ``curl`` run inside the sandbox through Daytona ``process.exec``,
+           the screenshot returned as process stdout (the fallback path)
+- channel: BrowserChannel over the sandbox's preview link with the pooled,
+           gzip-enabled HTTP client
+
+The default action is ``wait`` with 0 seconds, which returns a full browser
+state with screenshot without changing the page. Requires Daytona credentials
+(DAYTONA_API_KEY / DAYTONA_SERVER_URL / DAYTONA_TARGET, same as the backend)
+and a sandbox whose browser API is running. Usage (from the backend directory):
+    python -m benchmarks.browser_channel --sandbox-id <id> --iterations 20
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+from sandbox.async_sandbox import AsyncSandbox
+from sandbox.browser_channel import BrowserChannel
+from sandbox.sandbox import get_or_start_sandbox
+
+
+async def _curl(sandbox: AsyncSandbox, endpoint: str, params: dict) -> dict:
+    curl_cmd = (
+        f"curl -s -X POST 'http://localhost:8003/api/automation/{endpoint}' "
+        f"-H 'Content-Type: application/json' -d '{json.dumps(params)}'"
+    )
+    response = await sandbox.process.exec(curl_cmd, timeout=60)
+    return json.loads(response.result)
+
+
+async def _time(request: Callable[[], Awaitable[dict]], iterations: int) -> List[float]:
+    await request()  # warm up: preview link lookup, connection setup
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = await request()
+        timings.append((time.perf_counter() - start) * 1000)
+        assert "screenshot_base64" in result or "success" in result, result
+    return timings
+
+
+def _report(name: str, timings: List[float]) -> None:
+    timings = sorted(timings)
+    p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+    print(f"{name:<8} mean {statistics.mean(timings):8.1f} ms   p50 {statistics.median(timings):8.1f} ms   p95 {p95:8.1f} ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sandbox-id", required=True)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--endpoint", default="wait")
+    parser.add_argument("--params", default='{"seconds": 0}', help="JSON body of the request")
+    args = parser.parse_args()
+
+    params = json.loads(args.params)
+    sandbox = await get_or_start_sandbox(args.sandbox_id)
+    channel = BrowserChannel(sandbox)
+
+    print(f"{args.endpoint} {params}, {args.iterations} iterations")
+    _report("curl", await _time(lambda: _curl(sandbox, args.endpoint, params), args.iterations))
+    _report("channel", await _time(lambda: channel.request(args.endpoint, params), args.iterations))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
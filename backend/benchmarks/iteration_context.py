@@ -0,0 +1,102 @@
+"""
+Benchmark: database round trips per agent iteration before the LLM call.
+
+Every iteration of run_agent reads the latest message type, the latest
+browser_state, the pending image_context (and deletes it) and the thread's new
+LLM messages. This compares:
+
+- separate: one query each, as before (ThreadMessageCache's fallback path),
+  followed by get_rows' own incremental select
+- combined: one get_agent_iteration_context call, whose rows also answer the
+  following get_rows
+
+The database is simulated with a fixed round-trip time per request, so the
+numbers show the effect of the number of round trips, not of Postgres itself.
+
+Usage (from the backend directory):
+    python -m benchmarks.iteration_context --rtt 20 --iterations 50
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+from agentpress.message_cache import ThreadMessageCache
+
+
+class _Request:
+    def __init__(self, client, data):
+        self.client = client
+        self.data = data
+
+    def __getattr__(self, name):
+        # Query builder methods (select, eq, order, ...) return the same request
+        return lambda *args, **kwargs: self
+
+    async def execute(self):
+        self.client.round_trips += 1
+        await asyncio.sleep(self.client.rtt)
+        return type("Result", (), {"data": self.data})()
+
+
+class _SimulatedClient:
+    def __init__(self, rtt: float, with_image: bool):
+        self.rtt = rtt
+        self.with_image = with_image
+        self.round_trips = 0
+
+    def table(self, name):
+        row = {"message_id": "m-image", "type": "tool", "content": {"base64": "", "mime_type": "image/png"}}
+        return _Request(self, [row] if self.with_image else [])
+
+    def rpc(self, name, params):
+        return _Request(self, {"latest_message_type": "tool", "messages": [], "browser_state": None, "image_context": None})
+
+
+class _SimulatedDB:
+    def __init__(self, client):
+        self._client = client
+
+    @property
+    async def client(self):
+        return self._client
+
+
+async def _separate(cache: ThreadMessageCache, client) -> None:
+    await cache._get_iteration_context_separately(client, "thread")
+    await cache.get_rows("thread")
+
+
+async def _combined(cache: ThreadMessageCache, client) -> None:
+    await cache.get_iteration_context("thread")
+    await cache.get_rows("thread")
+
+
+async def _run(name: str, iteration, rtt: float, iterations: int, with_image: bool) -> None:
+    client = _SimulatedClient(rtt, with_image)
+    cache = ThreadMessageCache(_SimulatedDB(client))
+    timings: List[float] = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await iteration(cache, client)
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"{name:<9} {client.round_trips / iterations:4.1f} round trips   "
+          f"mean {statistics.mean(timings):7.1f} ms   p50 {statistics.median(timings):7.1f} ms per iteration")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rtt", type=float, default=20.0, help="Simulated database round-trip time in ms")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--with-image", action="store_true", help="An image context is pending every iteration")
+    args = parser.parse_args()
+
+    print(f"rtt {args.rtt} ms, {args.iterations} iterations")
+    await _run("separate", _separate, args.rtt / 1000, args.iterations, args.with_image)
+    await _run("combined", _combined, args.rtt / 1000, args.iterations, args.with_image)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
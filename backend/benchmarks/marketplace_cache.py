@@ -0,0 +1,80 @@
+"""
+Benchmark: marketplace browse requests served from the snapshot.
+
+GET /marketplace/agents used to call get_marketplace_agents once per request.
+It is now answered from the in-memory MarketplaceSnapshot, whose sort orders,
+tag index and search text are computed once when the snapshot is built. This
+reports, for a marketplace of --agents public agents:
+
+- build: time to precompute a snapshot (once per rebuild and worker)
+- query: time to filter, sort and page the snapshot for typical requests,
+  compared with the simulated database round trip it replaces
+
+Usage (from the backend directory):
+    python -m benchmarks.marketplace_cache --agents 2000 --rtt 20
+"""
+
+import argparse
+import random
+import statistics
+import time
+from typing import List
+
+from services.marketplace_cache import MarketplaceSnapshot
+
+TAGS = ["research", "dev", "data", "writing", "sales", "support", "finance", "design"]
+WORDS = ["agent", "helper", "analyst", "writer", "coder", "planner", "scout", "tutor"]
+
+
+def _agents(count: int) -> List[dict]:
+    rng = random.Random(0)
+    return [{
+        "agent_id": str(i),
+        "name": f"{rng.choice(WORDS).title()} {i}",
+        "description": " ".join(rng.choices(WORDS, k=12)),
+        "system_prompt": "x" * 2000,
+        "tags": rng.sample(TAGS, 2),
+        "download_count": rng.randint(0, 1000),
+        "marketplace_published_at": f"2025-05-{rng.randint(1, 31):02d}T{rng.randint(0, 23):02d}:00:00+00:00",
+        "creator_name": f"creator {rng.randint(0, 50)}",
+    } for i in range(count)]
+
+
+def _report(name: str, timings: List[float], unit: str = "ms") -> None:
+    print(f"{name:<30} mean {statistics.mean(timings):8.3f} {unit}   p50 {statistics.median(timings):8.3f} {unit}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=2000)
+    parser.add_argument("--rtt", type=float, default=20.0, help="Database round trip replaced by the snapshot, in ms")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    agents = _agents(args.agents)
+    builds = []
+    for _ in range(10):
+        start = time.perf_counter()
+        snapshot = MarketplaceSnapshot(agents, version=0, built_at=time.time())
+        builds.append((time.perf_counter() - start) * 1000)
+    _report("build", builds)
+
+    requests = {
+        "query newest, page 1": dict(),
+        "query most_downloaded, page 5": dict(sort_by="most_downloaded", page=5),
+        "query tag + name sort": dict(tags=["data"], sort_by="name"),
+        "query search": dict(search="planner"),
+    }
+    for name, request in requests.items():
+        page = request.pop("page", 1)
+        timings = []
+        for _ in range(args.queries):
+            start = time.perf_counter()
+            snapshot.query((page - 1) * 20, 20, **request)
+            timings.append((time.perf_counter() - start) * 1000)
+        _report(name, timings)
+    print(f"{'database round trip':<30} {args.rtt:8.3f} ms (simulated)")
+
+
+if __name__ == "__main__":
+    main()
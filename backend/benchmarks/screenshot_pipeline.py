@@ -0,0 +1,146 @@
+"""
+Benchmark: per-action screenshot handling before and after single-pass decoding.
+
+For every browser action the backend receives a base64 JPEG screenshot,
+validates it and uploads it. This compares the CPU time spent per screenshot:
+
+- previous: regex scan of the base64 string, a decode for validation, a PIL
+  open + verify, a second PIL open for the dimensions, and another decode in
+  upload_base64_image
+- single-pass: decode_base64_image (one strict decode, one PIL open) whose
+  bytes are uploaded as-is
+
+Optionally (--ocr) it also times the browser API's OCR inline vs. in the
+OCRWorker process pool while the event loop keeps serving other work; this
+needs pytesseract and the tesseract binary, as in the sandbox image.
+
+Usage (from the backend directory):
+    python -m benchmarks.screenshot_pipeline --iterations 200
+    python -m benchmarks.screenshot_pipeline --ocr
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import random
+import re
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+from PIL import Image, ImageDraw
+
+from utils.image_utils import decode_base64_image
+
+
+def _screenshot(seed: int = 0) -> str:
+    """A 1024x768 JPEG at quality 60 with text-like noise, base64 encoded like the browser API's."""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (1024, 768), "white")
+    draw = ImageDraw.Draw(image)
+    for y in range(10, 760, 18):
+        x = 10
+        while x < 1000:
+            word = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 9)))
+            draw.text((x, y), word, fill=(rng.randint(0, 80),) * 3)
+            x += 8 * len(word) + 6
+    for _ in range(30):
+        x, y = rng.randint(0, 900), rng.randint(0, 700)
+        draw.rectangle((x, y, x + rng.randint(20, 120), y + rng.randint(10, 60)), fill=tuple(rng.randint(0, 255) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=60)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def previous(base64_string: str) -> bytes:
+    """The former _validate_base64_image followed by upload_base64_image's decode."""
+    if not re.match(r'^[A-Za-z0-9+/]*={0,2}$', base64_string) or len(base64_string) % 4 != 0:
+        raise ValueError("invalid")
+    image_data = base64.b64decode(base64_string, validate=True)
+    image_stream = io.BytesIO(image_data)
+    with Image.open(image_stream) as img:
+        img.verify()
+        image_stream.seek(0)
+        with Image.open(image_stream) as img_check:
+            img_check.size
+    return base64.b64decode(base64_string)
+
+
+def single_pass(base64_string: str) -> bytes:
+    image_data, _ = decode_base64_image(base64_string)
+    return image_data
+
+
+def _time(fn: Callable[[str], bytes], data: str, iterations: int) -> List[float]:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(data)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _report(name: str, timings: List[float]) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:<12} mean {statistics.mean(timings):7.2f} ms   p50 {statistics.median(timings):7.2f} ms   p95 {p95:7.2f} ms")
+
+
+async def _ocr(data: str, iterations: int) -> None:
+    sys.path.insert(0, "sandbox/docker")
+    from ocr_worker import OCRWorker, image_to_text
+
+    image_bytes = base64.b64decode(data)
+
+    async def ticker(stop: asyncio.Event) -> List[float]:
+        # Measures how late the event loop wakes up while OCR runs
+        lags = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append((time.perf_counter() - start - 0.01) * 1000)
+        return lags
+
+    async def inline(worker: OCRWorker, payload: bytes) -> str:
+        # The previous behaviour: OCR on the event loop
+        return image_to_text(payload)
+
+    async def pool(worker: OCRWorker, payload: bytes) -> str:
+        return await worker.extract_text(payload)
+
+    for name, extract in (("inline", inline), ("pool", pool)):
+        worker = OCRWorker(cache_size=0)
+        stop = asyncio.Event()
+        lag_task = asyncio.ensure_future(ticker(stop))
+        start = time.perf_counter()
+        for i in range(iterations):
+            # A distinct screenshot per action so the OCR cache does not answer
+            await extract(worker, image_bytes + bytes([i % 256]))
+        elapsed = (time.perf_counter() - start) * 1000 / iterations
+        stop.set()
+        lags = await lag_task
+        worker.shutdown()
+        print(f"ocr {name:<8} {elapsed:7.1f} ms per screenshot   max event loop lag {max(lags or [0]):7.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--ocr", action="store_true", help="Also benchmark OCR inline vs. in the process pool")
+    args = parser.parse_args()
+
+    data = _screenshot()
+    print(f"screenshot: {len(data) / 1024:.0f} KiB base64, {args.iterations} iterations")
+    assert previous(data) == single_pass(data)
+
+    _report("previous", _time(previous, data, args.iterations))
+    _report("single-pass", _time(single_pass, data, args.iterations))
+
+    if args.ocr:
+        asyncio.run(_ocr(data, max(1, args.iterations // 20)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark: tool function lookup per tool call, and registration cost.
+
+ResponseProcessor._execute_tool used to call get_available_functions() for
+every tool call, which rebuilt a dict of all OpenAPI and XML functions with
+getattr on each tool (a linear __getattr__ search for MCP tools). The
+registry now compiles a dispatch table once after registration and looks functions up
+with a single dict access. This reports, for a registry shaped like an agent
+run's (regular tools plus an MCP-like tool with dynamic functions):
+
+- registration: time to register the tools and compile the table (on the
+  first lookup), measured separately from lookups
+- lookup: previous rebuild-per-call vs. get_entry
+
+Usage (from the backend directory):
+    python -m benchmarks.tool_dispatch --tools 15 --functions 12 --mcp-functions 40
+"""
+
+import argparse
+import logging
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from agentpress.tool import Tool, ToolSchema, SchemaType, XMLTagSchema, XMLNodeMapping
+from agentpress.tool_registry import ToolRegistry
+
+
+def _schemas(name: str) -> List[ToolSchema]:
+    return [
+        ToolSchema(schema_type=SchemaType.OPENAPI, schema={"type": "function", "function": {
+            "name": name,
+            "parameters": {"type": "object", "properties": {"value": {"type": "string"}}, "required": ["value"]}
+        }}),
+        ToolSchema(schema_type=SchemaType.OPENAPI, schema={}, xml_schema=XMLTagSchema(
+            tag_name=name.replace("_", "-"),
+            mappings=[XMLNodeMapping(param_name="value", node_type="content")]
+        )),
+    ]
+
+
+def _tool_class(index: int, functions: int) -> type:
+    async def function(self, value: str):
+        return value
+
+    attributes = {}
+    for i in range(functions):
+        method = lambda self, value, _f=function: _f(self, value)
+        method.tool_schemas = _schemas(f"tool{index}_function{i}")
+        attributes[f"tool{index}_function{i}"] = method
+    return type(f"Tool{index}", (Tool,), attributes)
+
+
+class _MCPLikeTool(Tool):
+    """Dynamic functions resolved through a linear __getattr__ search, like MCPToolWrapper."""
+
+    def __init__(self, functions: int):
+        self._dynamic = [(f"mcp_function{i}", self._make(i)) for i in range(functions)]
+        super().__init__()
+        for name, _ in self._dynamic:
+            self._schemas[name] = _schemas(name)[:1]
+
+    @staticmethod
+    def _make(index: int) -> Callable:
+        async def function(**kwargs):
+            return index
+        return function
+
+    def __getattr__(self, name: str):
+        for method_name, method in self.__dict__.get("_dynamic", ()):
+            if method_name == name:
+                return method
+        raise AttributeError(name)
+
+
+def previous_get_available_functions(registry: ToolRegistry) -> Dict[str, Callable]:
+    """get_available_functions as it was: rebuilt on every call."""
+    available_functions = {}
+    for tool_name, tool_info in registry.tools.items():
+        available_functions[tool_name] = getattr(tool_info['instance'], tool_name)
+    for tag_name, tool_info in registry.xml_tools.items():
+        method_name = tool_info['method']
+        available_functions[method_name] = getattr(tool_info['instance'], method_name)
+    logging.getLogger("benchmark").debug(f"Retrieved {len(available_functions)} available functions")
+    return available_functions
+
+
+def _report(name: str, timings: List[float], unit: str = "us") -> None:
+    print(f"{name:<22} mean {statistics.mean(timings):9.2f} {unit}   p50 {statistics.median(timings):9.2f} {unit}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tools", type=int, default=15)
+    parser.add_argument("--functions", type=int, default=12, help="Functions per regular tool")
+    parser.add_argument("--mcp-functions", type=int, default=40)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    classes = [_tool_class(i, args.functions) for i in range(args.tools)]
+    registrations = []
+    for _ in range(20):
+        registry = ToolRegistry()
+        start = time.perf_counter()
+        for tool_class in classes:
+            registry.register_tool(tool_class)
+        mcp_tool = _MCPLikeTool(args.mcp_functions)
+        registry.register_functions(mcp_tool, mcp_tool.get_schemas())
+        registry.get_available_functions()
+        registrations.append((time.perf_counter() - start) * 1000)
+
+    names = list(registry.get_available_functions())
+    print(f"{len(names)} functions; compiling the dispatch table took {registry.compile_seconds * 1000:.2f} ms")
+    _report("registration", registrations, "ms")
+
+    previous, compiled = [], []
+    for i in range(args.lookups):
+        name = names[i % len(names)]
+        start = time.perf_counter()
+        previous_get_available_functions(registry).get(name)
+        previous.append((time.perf_counter() - start) * 1e6)
+        start = time.perf_counter()
+        registry.get_entry(name)
+        compiled.append((time.perf_counter() - start) * 1e6)
+    _report("lookup previous", previous)
+    _report("lookup compiled", compiled)
+
+
+if __name__ == "__main__":
+    main()
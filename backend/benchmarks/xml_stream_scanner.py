@@ -0,0 +1,154 @@
+"""
+Benchmark: incremental XML scanning vs. rescanning the accumulated buffer.
+
+Replays a recorded ~200 KB LLM stream delta by delta, the way
+ResponseProcessor.process_streaming_response consumes it, and compares:
+
+- rescan: the previous approach, which re-extracted chunks from the whole
+  buffered content on every delta and looped over every registered tag
+- incremental: XMLStreamScanner.feed() on each delta
+
+Usage (from the backend directory):
+    python -m benchmarks.xml_stream_scanner
+    python -m benchmarks.xml_stream_scanner --recording path/to/stream.jsonl
+
+A recording is a JSONL file with one JSON-encoded content delta per line. If
+none is given, one is synthesized from agent/sample_responses, split into
+token-sized deltas with a fixed seed.
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from typing import List
+
+from agentpress.xml_stream_scanner import XMLStreamScanner
+
+SAMPLE_DIR = os.path.join(os.path.dirname(__file__), "..", "agent", "sample_responses")
+
+# Tag names registered by the default agent toolset
+LEGACY_TAGS = [
+    "execute-command", "check-command-output", "terminate-command", "list-commands",
+    "create-file", "str-replace", "full-file-rewrite", "delete-file",
+    "browser-navigate-to", "browser-click-element", "browser-input-text", "browser-scroll-down",
+    "web-search", "scrape-webpage", "see-image", "expose-port", "deploy",
+    "ask", "complete", "web-browser-takeover", "execute-data-provider-call",
+    "get-data-provider-endpoints", "expand-message",
+]
+
+
+def record_stream(target_bytes: int = 200 * 1024, seed: int = 7) -> List[str]:
+    """Build a replayable stream of deltas from the sample responses."""
+    samples = []
+    for name in sorted(os.listdir(SAMPLE_DIR)):
+        with open(os.path.join(SAMPLE_DIR, name), "r") as f:
+            # The samples omit closing tags; close each block after its invoke
+            samples.append(f.read().replace("</invoke>\n", "</invoke>\n</function_calls>\n"))
+
+    content = ""
+    while len(content) < target_bytes:
+        content += "".join(samples)
+    content = content[:target_bytes]
+
+    rng = random.Random(seed)
+    deltas = []
+    pos = 0
+    while pos < len(content):
+        size = rng.randint(1, 24)
+        deltas.append(content[pos:pos + size])
+        pos += size
+    return deltas
+
+
+def load_recording(path: str) -> List[str]:
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _rescan_extract(content: str, tags: List[str]) -> List[str]:
+    """The previous extractor: scan from offset 0, new format first, then each tag."""
+    chunks = []
+    pos = 0
+    while True:
+        start = content.find("<function_calls>", pos)
+        if start == -1:
+            break
+        end = content.find("</function_calls>", start)
+        if end == -1:
+            break
+        chunks.append(content[start:end + len("</function_calls>")])
+        pos = end + len("</function_calls>")
+    if chunks:
+        return chunks
+
+    pos = 0
+    while pos < len(content):
+        next_start, current = -1, None
+        for tag in tags:
+            found = content.find(f"<{tag}", pos)
+            if found != -1 and (next_start == -1 or found < next_start):
+                next_start, current = found, tag
+        if current is None:
+            break
+        end = content.find(f"</{current}>", next_start)
+        if end == -1:
+            break
+        pos = end + len(f"</{current}>")
+        chunks.append(content[next_start:pos])
+    return chunks
+
+
+def replay_rescan(deltas: List[str]) -> List[str]:
+    buffer = ""
+    found = []
+    for delta in deltas:
+        buffer += delta
+        for chunk in _rescan_extract(buffer, LEGACY_TAGS):
+            buffer = buffer.replace(chunk, "", 1)
+            found.append(chunk)
+    return found
+
+
+def replay_incremental(deltas: List[str]) -> List[str]:
+    scanner = XMLStreamScanner(LEGACY_TAGS)
+    found = []
+    for delta in deltas:
+        found.extend(scanner.feed(delta))
+    return found
+
+
+def _time(fn, deltas: List[str], repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(deltas)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recording", help="JSONL file with one content delta per line")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    deltas = load_recording(args.recording) if args.recording else record_stream()
+    total_bytes = sum(len(d) for d in deltas)
+    print(f"Replaying {len(deltas)} deltas, {total_bytes / 1024:.1f} KB")
+
+    rescan_time, rescan_chunks = _time(replay_rescan, deltas, args.repeat)
+    incremental_time, incremental_chunks = _time(replay_incremental, deltas, args.repeat)
+
+    if rescan_chunks != incremental_chunks:
+        print(f"WARNING: outputs differ ({len(rescan_chunks)} vs {len(incremental_chunks)} blocks)")
+
+    print(f"rescan:      {rescan_time * 1000:9.2f} ms  ({len(rescan_chunks)} blocks)")
+    print(f"incremental: {incremental_time * 1000:9.2f} ms  ({len(incremental_chunks)} blocks)")
+    print(f"speedup:     {rescan_time / max(incremental_time, 1e-9):9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,11 +10,14 @@ This module handles:
 import asyncio
 import json
 import base64
+from contextlib import asynccontextmanager
 from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass
 
 # Import MCP components according to the official SDK
-from mcp import ClientSession
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.sse import sse_client
+from mcp.client.stdio import stdio_client
 try:
     from mcp.client.streamable_http import streamablehttp_client
 except ImportError:
@@ -42,12 +45,79 @@ except ImportError:
         ToolResult = Any
 
 from utils.logger import logger
+from mcp_local.session_pool import mcp_session_pool, session_key, SessionOpener
+from mcp_local.schema_cache import tool_schema_cache
 import os
 
 # Get Smithery API key from environment
 SMITHERY_API_KEY = os.getenv("SMITHERY_API_KEY")
 SMITHERY_SERVER_BASE_URL = "https://server.smithery.ai"
 
+@asynccontextmanager
+async def open_streamable_http_session(url: str):
+    """Open and initialize a session with a streamable HTTP MCP server"""
+    async with streamablehttp_client(url) as (read_stream, write_stream, _):
+        async with ClientSession(read_stream, write_stream) as session:
+            await session.initialize()
+            yield session
+
+@asynccontextmanager
+async def open_sse_session(url: str, headers: Optional[Dict[str, str]] = None):
+    """Open and initialize a session with an SSE MCP server"""
+    try:
+        transport = sse_client(url, headers=headers or {})
+    except TypeError as e:
+        # Older SDK versions do not accept headers
+        if "unexpected keyword argument" not in str(e):
+            raise
+        transport = sse_client(url)
+    async with transport as (read_stream, write_stream):
+        async with ClientSession(read_stream, write_stream) as session:
+            await session.initialize()
+            yield session
+
+@asynccontextmanager
+async def open_stdio_session(command: str, args: Optional[List[str]] = None, env: Optional[Dict[str, str]] = None):
+    """Start a stdio MCP server and open and initialize a session with it"""
+    server_params = StdioServerParameters(command=command, args=args or [], env=env or {})
+    async with stdio_client(server_params) as (read_stream, write_stream):
+        async with ClientSession(read_stream, write_stream) as session:
+            await session.initialize()
+            yield session
+
+def format_tool_result(result: Any) -> Tuple[str, bool]:
+    """
+    Convert an MCP tool call result to text
+    
+    Returns:
+        (content, is_error)
+    """
+    if not hasattr(result, 'content'):
+        return str(result), False
+
+    # Handle content which might be a list of TextContent objects
+    content = result.content
+    if isinstance(content, list):
+        # Extract text from TextContent objects
+        text_parts = []
+        for item in content:
+            if hasattr(item, 'text'):
+                text_parts.append(item.text)
+            elif hasattr(item, 'content'):
+                text_parts.append(str(item.content))
+            else:
+                text_parts.append(str(item))
+        content_str = "\n".join(text_parts)
+    elif hasattr(content, 'text'):
+        # Single TextContent object
+        content_str = content.text
+    elif hasattr(content, 'content'):
+        content_str = str(content.content)
+    else:
+        content_str = str(content)
+
+    return content_str, getattr(result, 'isError', False)
+
 @dataclass
 class MCPConnection:
     """Represents a connection to an MCP server"""
@@ -65,6 +135,18 @@ class MCPManager:
         self.connections: Dict[str, MCPConnection] = {}
         self._sessions: Dict[str, Tuple[Any, Any, Any]] = {}  # Store streams for cleanup
         
+    def _smithery_server(self, qualified_name: str, config: Dict[str, Any]) -> Tuple[str, SessionOpener]:
+        """Pool key and session opener of a Smithery-hosted MCP server"""
+        # Encode config in base64
+        config_json = json.dumps(config)
+        config_b64 = base64.b64encode(config_json.encode()).decode()
+        
+        # Create server URL
+        server_url = f"{SMITHERY_SERVER_BASE_URL}/{qualified_name}/mcp"
+        url = f"{server_url}?config={config_b64}&api_key={SMITHERY_API_KEY}"
+        
+        return session_key("http", server_url, config), lambda: open_streamable_http_session(url)
+        
     async def connect_server(self, mcp_config: Dict[str, Any]) -> MCPConnection:
         """
         Connect to an MCP server using configuration
@@ -95,33 +177,20 @@ class MCPManager:
             )
         
         try:
-            # Encode config in base64
-            config_json = json.dumps(mcp_config["config"])
-            config_b64 = base64.b64encode(config_json.encode()).decode()
-            
-            # Create server URL
-            url = f"{SMITHERY_SERVER_BASE_URL}/{qualified_name}/mcp?config={config_b64}&api_key={SMITHERY_API_KEY}"
-            
-            # Test connection and get available tools
-            async with streamablehttp_client(url) as (read_stream, write_stream, _):
-                async with ClientSession(read_stream, write_stream) as session:
-                    # Initialize the connection
-                    await session.initialize()
-                    logger.info(f"MCP session initialized for {qualified_name}")
-                    
-                    # List available tools
-                    tools_result = await session.list_tools()
-            tools = tools_result.tools if hasattr(tools_result, 'tools') else tools_result
+            # Get available tools from the shared schema cache, listing them over the
+            # pooled session (which stays open for tool calls) if they are not cached
+            key, opener = self._smithery_server(qualified_name, mcp_config["config"])
+            tools = [Tool(**tool) for tool in await tool_schema_cache.get_tools(key, opener)]
             
             logger.info(f"Available tools from {qualified_name}: {[t.name for t in tools]}")
             
-            # Create connection object (without persistent session)
+            # Create connection object (the session itself lives in mcp_session_pool)
             connection = MCPConnection(
                 qualified_name=qualified_name,
                 name=mcp_config["name"],
                 config=mcp_config["config"],
                 enabled_tools=mcp_config.get("enabledTools", []),
-                session=None,  # No persistent session
+                session=None,
                 tools=tools
             )
             
@@ -133,13 +202,20 @@ class MCPManager:
             raise
             
     async def connect_all(self, mcp_configs: List[Dict[str, Any]]) -> None:
-        """Connect to all MCP servers in the configuration"""
-        for config in mcp_configs:
-            try:
-                await self.connect_server(config)
-            except Exception as e:
-                logger.error(f"Failed to connect to {config['qualifiedName']}: {str(e)}")
+        """Connect to all MCP servers in the configuration concurrently"""
+        results = await asyncio.gather(
+            *(self.connect_server(config) for config in mcp_configs),
+            return_exceptions=True
+        )
+        for config, result in zip(mcp_configs, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to connect to {config['qualifiedName']}: {str(result)}")
                 # Continue with other servers even if one fails
+        
+        # Keep the tools in configuration order regardless of which server answered first
+        ordered = [config["qualifiedName"] for config in mcp_configs if config["qualifiedName"] in self.connections]
+        ordered += [name for name in self.connections if name not in ordered]
+        self.connections = {name: self.connections[name] for name in ordered}
                 
     def get_all_tools_openapi(self) -> List[Dict[str, Any]]:
         """
@@ -211,52 +287,15 @@ class MCPManager:
             raise ValueError("SMITHERY_API_KEY environment variable is not set")
         
         try:
-            # Create fresh connection for this tool call
-            config_json = json.dumps(conn.config)
-            config_b64 = base64.b64encode(config_json.encode()).decode()
-            url = f"{SMITHERY_SERVER_BASE_URL}/{qualified_name}/mcp?config={config_b64}&api_key={SMITHERY_API_KEY}"
+            # Call the tool over the pooled session of this server
+            key, opener = self._smithery_server(qualified_name, conn.config)
+            result = await mcp_session_pool.call_tool(key, opener, original_tool_name, arguments)
+            content_str, is_error = format_tool_result(result)
             
-            # Use the documented pattern with proper context management
-            async with streamablehttp_client(url) as (read_stream, write_stream, _):
-                async with ClientSession(read_stream, write_stream) as session:
-                    # Initialize the connection
-                    await session.initialize()
-                    
-                    # Call the tool
-                    result = await session.call_tool(original_tool_name, arguments)
-            
-                    # Convert result to dict - handle MCP response properly
-                    if hasattr(result, 'content'):
-                        # Handle content which might be a list of TextContent objects
-                        content = result.content
-                        if isinstance(content, list):
-                            # Extract text from TextContent objects
-                            text_parts = []
-                            for item in content:
-                                if hasattr(item, 'text'):
-                                    text_parts.append(item.text)
-                                elif hasattr(item, 'content'):
-                                    text_parts.append(str(item.content))
-                                else:
-                                    text_parts.append(str(item))
-                            content_str = "\n".join(text_parts)
-                        elif hasattr(content, 'text'):
-                            # Single TextContent object
-                            content_str = content.text
-                        elif hasattr(content, 'content'):
-                            content_str = str(content.content)
-                        else:
-                            content_str = str(content)
-                        
-                        is_error = getattr(result, 'isError', False)
-                    else:
-                        content_str = str(result)
-                        is_error = False
-                        
-                return {
-                        "content": content_str,
-                        "isError": is_error
-                }
+            return {
+                "content": content_str,
+                "isError": is_error
+            }
                 
         except Exception as e:
             logger.error(f"Error executing MCP tool {tool_name}: {str(e)}")
@@ -266,7 +305,11 @@ class MCPManager:
             }
             
     async def disconnect_all(self):
-        """Disconnect all MCP servers (clear stored configurations)"""
+        """
+        Disconnect all MCP servers (clear stored configurations)
+        
+        Pooled sessions are shared with other runs and closed by the pool once idle.
+        """
         for qualified_name in list(self.connections.keys()):
             try:
                 del self.connections[qualified_name]
@@ -0,0 +1,101 @@
+"""
+Cross-run cache of MCP tool schemas.
+
+Every agent run with MCP servers configured listed the tools of each server
+before its first LLM call. Tool lists change rarely, so they are cached in
+Redis under the server's pool key (transport, URL or command and a hash of the
+server config, see mcp_local.session_pool.session_key):
+
+- a cached list is served for up to SCHEMA_TTL seconds
+- a list older than REFRESH_AFTER seconds is still served, and refreshed in
+  the background for the next run
+- concurrent misses for one server in a process share a single listing
+
+Tools are cached as plain dicts with ``name``, ``description`` and
+``inputSchema``.
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+from mcp_local.session_pool import mcp_session_pool, SessionOpener
+from services import redis
+from utils.logger import logger
+
+SCHEMA_TTL = 3600  # seconds a cached tool list may be served
+REFRESH_AFTER = 600  # seconds after which a cached tool list is refreshed in the background
+
+
+def _cache_key(server_key: str) -> str:
+    return f"mcp:tools:{server_key}"
+
+
+class ToolSchemaCache:
+    """Redis-backed cache of the tool lists of MCP servers."""
+
+    def __init__(self, ttl: int = SCHEMA_TTL, refresh_after: int = REFRESH_AFTER):
+        self.ttl = ttl
+        self.refresh_after = refresh_after
+        self._listing: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get_tools(self, server_key: str, opener: SessionOpener) -> List[Dict[str, Any]]:
+        """Get the tools of an MCP server, listing them only if they are not cached."""
+        cached = await self._read(server_key)
+        if cached is not None:
+            self.hits += 1
+            if time.time() - cached["fetched_at"] > self.refresh_after:
+                self._list(server_key, opener)
+            return cached["tools"]
+
+        self.misses += 1
+        # A cancelled caller must not cancel the listing other callers are waiting on
+        return await asyncio.shield(self._list(server_key, opener))
+
+    def _list(self, server_key: str, opener: SessionOpener) -> asyncio.Future:
+        listing = self._listing.get(server_key)
+        if listing is None:
+            listing = asyncio.ensure_future(self._fetch(server_key, opener))
+            self._listing[server_key] = listing
+            listing.add_done_callback(lambda done: self._done(server_key, done))
+        return listing
+
+    def _done(self, server_key: str, listing: asyncio.Future) -> None:
+        self._listing.pop(server_key, None)
+        if not listing.cancelled() and listing.exception() is not None:
+            logger.warning(f"Failed to list tools of MCP server {server_key}: {str(listing.exception())}")
+
+    async def _fetch(self, server_key: str, opener: SessionOpener) -> List[Dict[str, Any]]:
+        tools_result = await mcp_session_pool.list_tools(server_key, opener)
+        tools = [
+            {
+                "name": tool.name,
+                "description": tool.description,
+                "inputSchema": tool.inputSchema
+            }
+            for tool in tools_result.tools
+        ]
+        try:
+            entry = json.dumps({"fetched_at": time.time(), "tools": tools})
+            await redis.set(_cache_key(server_key), entry, ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Failed to cache tools of MCP server {server_key}: {str(e)}")
+        return tools
+
+    async def _read(self, server_key: str):
+        try:
+            cached = await redis.get(_cache_key(server_key))
+            return json.loads(cached) if cached else None
+        except Exception as e:
+            logger.warning(f"MCP tool cache unavailable: {str(e)}")
+            return None
+
+    async def invalidate(self, server_key: str) -> None:
+        await redis.delete(_cache_key(server_key))
+
+
+# Shared cache for this process
+tool_schema_cache = ToolSchemaCache()
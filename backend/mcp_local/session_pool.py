@@ -0,0 +1,264 @@
+"""
+Pool of persistent MCP client sessions.
+
+Opening an MCP session costs a transport handshake plus an ``initialize``
+round trip, and for stdio servers a new subprocess. The pool keeps one
+initialized session per server, keyed by transport, server URL or command and
+a hash of the server config, and shares it between tool listings, tool calls
+and agent runs in the process:
+
+- a session is opened on first use and kept for IDLE_TIMEOUT seconds after
+  its last use; at most MAX_SESSIONS are kept, least recently used first out
+- a session that has been idle for HEALTH_CHECK_INTERVAL seconds is pinged
+  before it is handed out and reopened if the ping fails
+- at most MAX_CALLS_PER_SESSION requests run concurrently on one session
+- a session whose transport fails during a call is dropped; the next call
+  opens a new one
+
+MCP transports are anyio context managers that must be entered and exited by
+the same task, so every session is owned by a background task that opens it,
+publishes it and closes it when asked to.
+
+Openers are zero-argument callables returning an async context manager that
+yields an initialized ``ClientSession`` (see mcp_local.client).
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncContextManager, AsyncIterator, Callable, Dict, Optional
+
+from utils.logger import logger
+
+try:
+    from mcp.shared.exceptions import McpError
+except ImportError:
+    # The pool itself only needs the sessions handed to it by openers
+    class McpError(Exception):
+        pass
+
+MAX_SESSIONS = 64  # open sessions per process
+MAX_CALLS_PER_SESSION = 4  # concurrent requests on one session
+IDLE_TIMEOUT = 300  # seconds an unused session is kept open
+HEALTH_CHECK_INTERVAL = 60  # seconds of inactivity after which a session is pinged before use
+CONNECT_TIMEOUT = 15  # seconds to open and initialize a session
+CLOSE_TIMEOUT = 5  # seconds to wait for a session to close
+
+SessionOpener = Callable[[], AsyncContextManager[Any]]
+
+
+def session_key(transport: str, target: str, config: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Pool key of an MCP server.
+
+    Args:
+        transport: "http", "sse" or "stdio"
+        target: Server URL or command, without credentials
+        config: Everything else that selects the server: config, headers, args, env
+    """
+    config_json = json.dumps(config or {}, sort_keys=True, default=str)
+    config_hash = hashlib.sha256(config_json.encode()).hexdigest()[:16]
+    return f"{transport}:{target}:{config_hash}"
+
+
+class _PooledSession:
+    """An MCP session held open by a background task."""
+
+    def __init__(self, key: str, opener: SessionOpener, max_calls: int):
+        self.key = key
+        self.opener = opener
+        self.session = None
+        self.error: Optional[BaseException] = None
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self.calls = asyncio.Semaphore(max_calls)
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def open(self, timeout: float) -> None:
+        self._task = asyncio.create_task(self._hold(), name=f"mcp-session:{self.key}")
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise
+        if self.session is None:
+            raise self.error or ConnectionError(f"MCP session {self.key} closed while opening")
+
+    async def _hold(self) -> None:
+        try:
+            async with self.opener() as session:
+                self.session = session
+                self._ready.set()
+                await self._closing.wait()
+        except Exception as e:
+            self.error = e
+            logger.debug(f"MCP session {self.key} ended: {str(e)}")
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def close(self) -> None:
+        self._closing.set()
+        if self._task is None or self._task.done():
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), CLOSE_TIMEOUT)
+        except (asyncio.TimeoutError, Exception):
+            self._task.cancel()
+
+
+class MCPSessionPool:
+    """Process-wide pool of initialized MCP client sessions."""
+
+    def __init__(
+        self,
+        max_sessions: int = MAX_SESSIONS,
+        max_calls_per_session: int = MAX_CALLS_PER_SESSION,
+        idle_timeout: float = IDLE_TIMEOUT,
+        health_check_interval: float = HEALTH_CHECK_INTERVAL,
+        connect_timeout: float = CONNECT_TIMEOUT,
+    ):
+        self.max_sessions = max_sessions
+        self.max_calls_per_session = max_calls_per_session
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.connect_timeout = connect_timeout
+        self._sessions: "OrderedDict[str, _PooledSession]" = OrderedDict()
+        self._opening: Dict[str, asyncio.Future] = {}
+        self._reaper: Optional[asyncio.Task] = None
+        self.opened = 0
+        self.reused = 0
+
+    @asynccontextmanager
+    async def session(self, key: str, opener: SessionOpener) -> AsyncIterator[Any]:
+        """
+        Borrow the pooled session of a server, opening it if needed.
+
+        The session is dropped if the body fails with anything but an MCP
+        protocol error, since the transport may be broken.
+        """
+        entry = await self._acquire(key, opener)
+        entry.in_use += 1
+        try:
+            async with entry.calls:
+                yield entry.session
+        except Exception as e:
+            if not _is_protocol_error(e):
+                logger.warning(f"Dropping MCP session {key} after error: {str(e)}")
+                await self._evict(key, entry)
+            raise
+        finally:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+
+    async def list_tools(self, key: str, opener: SessionOpener):
+        async with self.session(key, opener) as session:
+            return await session.list_tools()
+
+    async def call_tool(self, key: str, opener: SessionOpener, tool_name: str, arguments: Dict[str, Any]):
+        async with self.session(key, opener) as session:
+            return await session.call_tool(tool_name, arguments)
+
+    async def _acquire(self, key: str, opener: SessionOpener) -> _PooledSession:
+        entry = self._sessions.get(key)
+        if entry is not None and entry.alive and await self._healthy(entry):
+            self._sessions.move_to_end(key)
+            self.reused += 1
+            return entry
+        if entry is not None:
+            await self._evict(key, entry)
+
+        opening = self._opening.get(key)
+        if opening is None:
+            opening = asyncio.ensure_future(self._open(key, opener))
+            self._opening[key] = opening
+            opening.add_done_callback(lambda _: self._opening.pop(key, None))
+        # A cancelled caller must not cancel the handshake other callers are waiting on
+        return await asyncio.shield(opening)
+
+    async def _open(self, key: str, opener: SessionOpener) -> _PooledSession:
+        entry = _PooledSession(key, opener, self.max_calls_per_session)
+        await entry.open(self.connect_timeout)
+        self.opened += 1
+        self._sessions[key] = entry
+        logger.debug(f"Opened MCP session {key} ({len(self._sessions)} pooled)")
+        self._ensure_reaper()
+        await self._trim()
+        return entry
+
+    async def _healthy(self, entry: _PooledSession) -> bool:
+        if time.monotonic() - entry.last_used < self.health_check_interval:
+            return True
+        try:
+            await asyncio.wait_for(entry.session.send_ping(), self.connect_timeout)
+            entry.last_used = time.monotonic()
+            return True
+        except Exception as e:
+            logger.info(f"MCP session {entry.key} failed its health check: {str(e)}")
+            return False
+
+    async def _evict(self, key: str, entry: _PooledSession) -> None:
+        if self._sessions.get(key) is entry:
+            del self._sessions[key]
+        await entry.close()
+
+    async def _trim(self) -> None:
+        """Close least recently used idle sessions above max_sessions."""
+        for key, entry in list(self._sessions.items()):
+            if len(self._sessions) <= self.max_sessions:
+                break
+            if entry.in_use == 0:
+                await self._evict(key, entry)
+
+    async def evict_idle(self) -> int:
+        """Close sessions unused for idle_timeout seconds. Returns the number closed."""
+        now = time.monotonic()
+        idle = [
+            (key, entry) for key, entry in self._sessions.items()
+            if entry.in_use == 0 and (now - entry.last_used > self.idle_timeout or not entry.alive)
+        ]
+        for key, entry in idle:
+            await self._evict(key, entry)
+        return len(idle)
+
+    def _ensure_reaper(self) -> None:
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap())
+
+    async def _reap(self) -> None:
+        while self._sessions:
+            await asyncio.sleep(min(self.idle_timeout, self.health_check_interval))
+            try:
+                closed = await self.evict_idle()
+                if closed:
+                    logger.debug(f"Closed {closed} idle MCP sessions")
+            except Exception as e:
+                logger.error(f"Error evicting idle MCP sessions: {str(e)}")
+
+    async def close_all(self) -> None:
+        for key, entry in list(self._sessions.items()):
+            await self._evict(key, entry)
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+def _is_protocol_error(error: BaseException) -> bool:
+    """Whether the server answered with an MCP error, i.e. the session itself is fine."""
+    return isinstance(error, McpError)
+
+
+# Shared pool for this process
+mcp_session_pool = MCPSessionPool()
@@ -15,7 +15,11 @@ from services import redis
 from dramatiq.brokers.rabbitmq import RabbitmqBroker
 import os
 from services.langfuse import langfuse
+from services.response_writer import RunResponseWriter
+from services import run_stream
+from services.run_control import run_control
 from utils.retry import retry
+from services.billing import record_run_usage
 
 # RabbitMQ broker configuration - supports both URL and individual parameters
 rabbitmq_url = os.getenv('RABBITMQ_URL')
@@ -92,6 +96,7 @@ async def initialize():
         instance_id = str(uuid.uuid4())[:8]
     await retry(lambda: redis.initialize_async())
     await db.initialize()
+    run_control.instance_id = instance_id
 
     _initialized = True
     logger.info(f"Initialized agent API with instance ID: {instance_id}")
@@ -146,11 +151,6 @@ async def run_agent_background(
         logger.info(f"Using custom agent: {agent_config.get('name', 'Unknown')}")
 
     client = await db.client
-    start_time = datetime.now(timezone.utc)
-    total_responses = 0
-    pubsub = None
-    stop_checker = None
-    stop_signal_received = False
 
     # Define Redis keys and channels
     response_list_key = f"agent_run:{agent_run_id}:responses"
@@ -159,30 +159,6 @@ async def run_agent_background(
     global_control_channel = f"agent_run:{agent_run_id}:control"
     instance_active_key = f"active_run:{instance_id}:{agent_run_id}"
 
-    async def check_for_stop_signal():
-        nonlocal stop_signal_received
-        if not pubsub: return
-        try:
-            while not stop_signal_received:
-                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0.5)
-                if message and message.get("type") == "message":
-                    data = message.get("data")
-                    if isinstance(data, bytes): data = data.decode('utf-8')
-                    if data == "STOP":
-                        logger.info(f"Received STOP signal for agent run {agent_run_id} (Instance: {instance_id})")
-                        stop_signal_received = True
-                        break
-                # Periodically refresh the active run key TTL
-                if total_responses % 50 == 0: # Refresh every 50 responses or so
-                    try: await redis.expire(instance_active_key, redis.REDIS_KEY_TTL)
-                    except Exception as ttl_err: logger.warning(f"Failed to refresh TTL for {instance_active_key}: {ttl_err}")
-                await asyncio.sleep(0.1) # Short sleep to prevent tight loop
-        except asyncio.CancelledError:
-            logger.info(f"Stop signal checker cancelled for {agent_run_id} (Instance: {instance_id})")
-        except Exception as e:
-            logger.error(f"Error in stop signal checker for {agent_run_id}: {e}", exc_info=True)
-            stop_signal_received = True # Stop the run if the checker fails
-
     trace = langfuse.trace(name="agent_run", id=agent_run_id, session_id=thread_id, metadata={"project_id": project_id, "instance_id": instance_id})
     
     # Add timeout wrapper for the entire agent run
@@ -207,8 +183,9 @@ async def run_agent_background(
         # Push timeout error to Redis
         timeout_response = {"type": "status", "status": "error", "message": error_message}
         try:
-            await redis.rpush(response_list_key, json.dumps(timeout_response))
-            await redis.publish(response_channel, "new")
+            timeout_writer = _create_response_writer(agent_run_id)
+            await timeout_writer.write(timeout_response)
+            await timeout_writer.close()
         except Exception as redis_err:
             logger.error(f"Failed to push timeout error to Redis for {agent_run_id}: {redis_err}")
         
@@ -247,45 +224,14 @@ async def _run_agent_with_timeout(
     client = await db.client
     start_time = datetime.now(timezone.utc)
     
-    pubsub = None
-    stop_checker = None
-    stop_signal_received = False
+    stop_event = None
     total_responses = 0
-    async def check_for_stop_signal():
-        nonlocal stop_signal_received
-        if not pubsub: return
-        try:
-            while not stop_signal_received:
-                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0.5)
-                if message and message.get("type") == "message":
-                    data = message.get("data")
-                    if isinstance(data, bytes): data = data.decode('utf-8')
-                    if data == "STOP":
-                        logger.info(f"Received STOP signal for agent run {agent_run_id} (Instance: {instance_id})")
-                        stop_signal_received = True
-                        break
-                # Periodically refresh the active run key TTL
-                if total_responses % 50 == 0: # Refresh every 50 responses or so
-                    try: await redis.expire(instance_active_key, redis.REDIS_KEY_TTL)
-                    except Exception as ttl_err: logger.warning(f"Failed to refresh TTL for {instance_active_key}: {ttl_err}")
-                await asyncio.sleep(0.1) # Short sleep to prevent tight loop
-        except asyncio.CancelledError:
-            logger.info(f"Stop signal checker cancelled for {agent_run_id} (Instance: {instance_id})")
-        except Exception as e:
-            logger.error(f"Error in stop signal checker for {agent_run_id}: {e}", exc_info=True)
-            stop_signal_received = True # Stop the run if the checker fails
+    response_writer = _create_response_writer(agent_run_id)
 
     try:
-        # Setup Pub/Sub listener for control signals
-        pubsub = await redis.create_pubsub()
-        try:
-            await retry(lambda: pubsub.subscribe(instance_control_channel, global_control_channel))
-        except Exception as e:
-            logger.error(f"Redis failed to subscribe to control channels: {e}", exc_info=True)
-            raise e
-
-        logger.debug(f"Subscribed to control channels: {instance_control_channel}, {global_control_channel}")
-        stop_checker = asyncio.create_task(check_for_stop_signal())
+        # Register with the worker's shared control-channel listener (one pattern subscription per process)
+        stop_event = await run_control.register(agent_run_id, instance_active_key)
+        logger.debug(f"Listening for control signals on {instance_control_channel}, {global_control_channel}")
 
         # Ensure active run key exists and has TTL
         await redis.set(instance_active_key, "running", ex=redis.REDIS_KEY_TTL)
@@ -304,19 +250,16 @@ async def _run_agent_with_timeout(
 
         final_status = "running"
         error_message = None
-        pending_redis_operations = []
 
         async for response in agent_gen:
-            if stop_signal_received:
+            if stop_event.is_set():
                 logger.info(f"Agent run {agent_run_id} stopped by signal.")
                 final_status = "stopped"
                 trace.span(name="agent_run_stopped").end(status_message="agent_run_stopped", level="WARNING")
                 break
 
-            # Store response in Redis list and publish notification
-            response_json = json.dumps(response)
-            pending_redis_operations.append(asyncio.create_task(redis.rpush(response_list_key, response_json)))
-            pending_redis_operations.append(asyncio.create_task(redis.publish(response_channel, "new")))
+            # Store response in Redis list and publish notification (batched, terminal statuses flush immediately)
+            await response_writer.write(response)
             total_responses += 1
 
             # Check for agent-signaled completion or error
@@ -336,12 +279,11 @@ async def _run_agent_with_timeout(
              logger.info(f"Agent run {agent_run_id} completed normally (duration: {duration:.2f}s, responses: {total_responses})")
              completion_message = {"type": "status", "status": "completed", "message": "Agent run completed successfully"}
              trace.span(name="agent_run_completed").end(status_message="agent_run_completed")
-             await redis.rpush(response_list_key, json.dumps(completion_message))
-             await redis.publish(response_channel, "new") # Notify about the completion message
+             await response_writer.write(completion_message) # Terminal status, flushed before returning
 
-        # Fetch final responses from Redis for DB update
-        all_responses_json = await redis.lrange(response_list_key, 0, -1)
-        all_responses = [json.loads(r) for r in all_responses_json]
+        # Make sure every buffered response is in Redis, then fetch them for the DB update
+        await response_writer.flush()
+        all_responses = await fetch_redis_responses(agent_run_id)
 
         # Update DB status
         await update_agent_run_status(client, agent_run_id, final_status, error=error_message, responses=all_responses)
@@ -350,6 +292,8 @@ async def _run_agent_with_timeout(
         control_signal = "END_STREAM" if final_status == "completed" else "ERROR" if final_status == "failed" else "STOP"
         try:
             await redis.publish(global_control_channel, control_signal)
+            if run_stream.use_streams():
+                await run_stream.publish_control(agent_run_id, control_signal)
             # No need to publish to instance channel as the run is ending on this instance
             logger.debug(f"Published final control signal '{control_signal}' to {global_control_channel}")
         except Exception as e:
@@ -366,16 +310,14 @@ async def _run_agent_with_timeout(
         # Push error message to Redis list
         error_response = {"type": "status", "status": "error", "message": error_message}
         try:
-            await redis.rpush(response_list_key, json.dumps(error_response))
-            await redis.publish(response_channel, "new")
+            await response_writer.write(error_response)
         except Exception as redis_err:
              logger.error(f"Failed to push error response to Redis for {agent_run_id}: {redis_err}")
 
         # Fetch final responses (including the error)
         all_responses = []
         try:
-             all_responses_json = await redis.lrange(response_list_key, 0, -1)
-             all_responses = [json.loads(r) for r in all_responses_json]
+             all_responses = await fetch_redis_responses(agent_run_id)
         except Exception as fetch_err:
              logger.error(f"Failed to fetch responses from Redis after error for {agent_run_id}: {fetch_err}")
              all_responses = [error_response] # Use the error message we tried to push
@@ -386,26 +328,27 @@ async def _run_agent_with_timeout(
         # Publish ERROR signal
         try:
             await redis.publish(global_control_channel, "ERROR")
+            if run_stream.use_streams():
+                await run_stream.publish_control(agent_run_id, "ERROR")
             logger.debug(f"Published ERROR signal to {global_control_channel}")
         except Exception as e:
             logger.warning(f"Failed to publish ERROR signal: {str(e)}")
 
     finally:
-        # Cleanup stop checker task
-        if stop_checker and not stop_checker.done():
-            stop_checker.cancel()
-            try: await stop_checker
-            except asyncio.CancelledError: pass
-            except Exception as e: logger.warning(f"Error during stop_checker cancellation: {e}")
-
-        # Close pubsub connection
-        if pubsub:
+        # Flush any responses still buffered by the writer
+        try:
+            await asyncio.wait_for(response_writer.close(), timeout=30.0)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timeout flushing buffered responses for {agent_run_id}")
+        except Exception as e:
+            logger.warning(f"Error flushing buffered responses for {agent_run_id}: {str(e)}")
+
+        # Stop receiving control signals for this run
+        if stop_event is not None:
             try:
-                await pubsub.unsubscribe()
-                await pubsub.close()
-                logger.debug(f"Closed pubsub connection for {agent_run_id}")
+                await run_control.unregister(agent_run_id)
             except Exception as e:
-                logger.warning(f"Error closing pubsub for {agent_run_id}: {str(e)}")
+                logger.warning(f"Error unregistering control listener for {agent_run_id}: {str(e)}")
 
         # Set TTL on the response list in Redis
         await _cleanup_redis_response_list(agent_run_id)
@@ -416,12 +359,6 @@ async def _run_agent_with_timeout(
         # Clean up the run lock
         await _cleanup_redis_run_lock(agent_run_id)
 
-        # Wait for all pending redis operations to complete, with timeout
-        try:
-            await asyncio.wait_for(asyncio.gather(*pending_redis_operations), timeout=30.0)
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout waiting for pending Redis operations for {agent_run_id}")
-
         logger.info(f"Agent run background task fully completed for: {agent_run_id} (Instance: {instance_id}) with final status: {final_status}")
 
 async def _cleanup_redis_instance_key(agent_run_id: str):
@@ -451,14 +388,29 @@ async def _cleanup_redis_run_lock(agent_run_id: str):
 REDIS_RESPONSE_LIST_TTL = 3600 * 24
 
 async def _cleanup_redis_response_list(agent_run_id: str):
-    """Set TTL on the Redis response list."""
+    """Set TTL on the Redis response list (or stream)."""
     response_list_key = f"agent_run:{agent_run_id}:responses"
+    if run_stream.use_streams():
+        response_list_key = run_stream.response_stream_key(agent_run_id)
     try:
         await redis.expire(response_list_key, REDIS_RESPONSE_LIST_TTL)
         logger.debug(f"Set TTL ({REDIS_RESPONSE_LIST_TTL}s) on response list: {response_list_key}")
     except Exception as e:
         logger.warning(f"Failed to set TTL on response list {response_list_key}: {str(e)}")
 
+def _create_response_writer(agent_run_id: str) -> RunResponseWriter:
+    """Create the response writer for the configured run output transport."""
+    if run_stream.use_streams():
+        return run_stream.RunStreamWriter(agent_run_id)
+    return RunResponseWriter(f"agent_run:{agent_run_id}:responses", f"agent_run:{agent_run_id}:new_response")
+
+async def fetch_redis_responses(agent_run_id: str) -> list:
+    """Fetch all responses of an agent run from the configured transport."""
+    if run_stream.use_streams():
+        return await run_stream.read_all_responses(agent_run_id)
+    all_responses_json = await redis.lrange(f"agent_run:{agent_run_id}:responses", 0, -1)
+    return [json.loads(r) for r in all_responses_json]
+
 async def update_agent_run_status(
     client,
     agent_run_id: str,
@@ -497,6 +449,8 @@ async def update_agent_run_status(
                         actual_status = verify_result.data[0].get('status')
                         completed_at = verify_result.data[0].get('completed_at')
                         logger.info(f"Verified agent run update: status={actual_status}, completed_at={completed_at}")
+
+                    await record_run_usage(client, agent_run_id)
                     return True
                 else:
                     logger.warning(f"Database update returned no data for agent run {agent_run_id} on retry {retry}: {update_result}")
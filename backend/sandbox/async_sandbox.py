@@ -0,0 +1,137 @@
+"""
+Non-blocking access to the synchronous Daytona SDK.
+
+Every Daytona SDK call is a blocking HTTP request. Called directly from async
+code it freezes the event loop, and with it every other agent run in the
+worker. This module runs SDK calls in a bounded thread pool, limits how many
+calls may be in flight against a single sandbox, and records call latency.
+
+AsyncSandbox wraps an SDK Sandbox and exposes the same ``fs`` and ``process``
+methods as coroutines:
+
+    sandbox = AsyncSandbox(daytona.get(sandbox_id))
+    content = await sandbox.fs.download_file(path)
+    response = await sandbox.process.exec(command, timeout=30)
+"""
+
+import asyncio
+import functools
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from daytona_sdk import Sandbox
+from prometheus_client import Counter, Histogram
+
+from utils.logger import logger
+
+T = TypeVar("T")
+
+MAX_WORKERS = 32  # concurrent Daytona calls per worker process
+MAX_CALLS_PER_SANDBOX = 8  # concurrent Daytona calls against one sandbox
+
+SANDBOX_CALL_SECONDS = Histogram(
+    "daytona_call_seconds",
+    "Latency of Daytona SDK calls",
+    ["operation"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+SANDBOX_CALL_FAILURES = Counter(
+    "daytona_call_failures_total",
+    "Daytona SDK calls that raised",
+    ["operation"],
+)
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="daytona")
+
+# Semaphores are dropped once no call against the sandbox holds one
+_sandbox_limits: "weakref.WeakValueDictionary[str, asyncio.Semaphore]" = weakref.WeakValueDictionary()
+
+
+def _sandbox_limit(sandbox_id: str) -> asyncio.Semaphore:
+    limit = _sandbox_limits.get(sandbox_id)
+    if limit is None:
+        limit = asyncio.Semaphore(MAX_CALLS_PER_SANDBOX)
+        _sandbox_limits[sandbox_id] = limit
+    return limit
+
+
+async def run_sync(operation: str, fn: Callable[..., T], *args, sandbox_id: Optional[str] = None, **kwargs) -> T:
+    """
+    Run a blocking Daytona SDK call in the shared thread pool.
+
+    Args:
+        operation: Name recorded in the latency metrics, e.g. "fs.upload_file"
+        fn: The SDK callable
+        sandbox_id: Sandbox the call targets, if any; calls against one
+                    sandbox are limited to MAX_CALLS_PER_SANDBOX at a time
+
+    Returns:
+        The result of ``fn(*args, **kwargs)``
+    """
+    limit = _sandbox_limit(sandbox_id) if sandbox_id else None
+    if limit is not None:
+        await limit.acquire()
+    start = time.monotonic()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+    except Exception as e:
+        SANDBOX_CALL_FAILURES.labels(operation).inc()
+        logger.debug(f"Daytona call {operation} failed: {str(e)}")
+        raise
+    finally:
+        SANDBOX_CALL_SECONDS.labels(operation).observe(time.monotonic() - start)
+        if limit is not None:
+            limit.release()
+
+
+class _AsyncNamespace:
+    """Exposes the methods of an SDK namespace (``fs``, ``process``) as coroutines."""
+
+    def __init__(self, name: str, target: Any, sandbox_id: str):
+        self._name = name
+        self._target = target
+        self._sandbox_id = sandbox_id
+
+    def __getattr__(self, attr: str):
+        value = getattr(self._target, attr)
+        if not callable(value):
+            return value
+
+        operation = f"{self._name}.{attr}"
+
+        async def call(*args, **kwargs):
+            return await run_sync(operation, value, *args, sandbox_id=self._sandbox_id, **kwargs)
+
+        call.__name__ = attr
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, attr, call)
+        return call
+
+
+class AsyncSandbox:
+    """Coroutine-based view of a Daytona Sandbox."""
+
+    def __init__(self, sandbox: Sandbox):
+        self.sdk_sandbox = sandbox
+        self.fs = _AsyncNamespace("fs", sandbox.fs, sandbox.id)
+        self.process = _AsyncNamespace("process", sandbox.process, sandbox.id)
+
+    @property
+    def id(self) -> str:
+        return self.sdk_sandbox.id
+
+    @property
+    def state(self):
+        return self.sdk_sandbox.state
+
+    async def get_preview_link(self, port: int):
+        return await run_sync("get_preview_link", self.sdk_sandbox.get_preview_link, port, sandbox_id=self.id)
+
+    async def info(self):
+        return await run_sync("info", self.sdk_sandbox.info, sandbox_id=self.id)
+
+    async def archive(self):
+        return await run_sync("archive", self.sdk_sandbox.archive, sandbox_id=self.id)
@@ -0,0 +1,122 @@
+"""
+Direct HTTP channel to the browser automation API in a sandbox.
+
+Browser actions used to run ``curl`` inside the sandbox through
+``process.exec``: a Daytona exec round trip and a shell spawn per action, with
+the screenshot coming back as process stdout. BrowserChannel instead calls the
+browser API (port 8003) through the sandbox's Daytona preview link over the
+shared, pooled HTTP client:
+
+- the preview link and its token are resolved once per sandbox and reused
+  for PREVIEW_LINK_TTL seconds
+- responses are streamed and gzip-compressed by the browser API, and at
+  most MAX_RESPONSE_BYTES are read
+- if the request was never forwarded to the browser API (preview link
+  lookup, connect errors, the proxy rejecting the token),
+  BrowserChannelUnavailable is raised and the channel of that sandbox is
+  skipped for RETRY_AFTER seconds; callers fall back to curl
+- a 5xx response raises BrowserActionFailed. A 502 or 504 from the proxy may
+  come after the request reached the browser API, so it is not sent again:
+  actions such as clicks are not idempotent
+"""
+
+import json
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from sandbox.async_sandbox import AsyncSandbox
+from services.http_client import get_http_client
+from utils.logger import logger
+
+BROWSER_API_PORT = 8003
+REQUEST_TIMEOUT = 60.0  # seconds per browser action
+PREVIEW_LINK_TTL = 600  # seconds a sandbox's preview link is reused
+RETRY_AFTER = 60  # seconds the channel of a sandbox is skipped after it failed
+MAX_RESPONSE_BYTES = 64 * 1024 * 1024
+
+# Status codes of the Daytona proxy when it rejects the request without forwarding it
+PROXY_REJECTED_CODES = {401, 403}
+
+_preview_links: Dict[str, Tuple[str, Optional[str], float]] = {}
+_unavailable_until: Dict[str, float] = {}
+
+
+class BrowserChannelUnavailable(Exception):
+    """The browser API could not be reached directly; the action was not sent."""
+
+
+class BrowserActionFailed(Exception):
+    """The browser API or the proxy returned a server error; the action may have run."""
+
+
+class BrowserChannel:
+    """Calls the browser API of one sandbox over its preview link."""
+
+    def __init__(self, sandbox: AsyncSandbox):
+        self.sandbox = sandbox
+
+    @property
+    def available(self) -> bool:
+        return _unavailable_until.get(self.sandbox.id, 0) <= time.monotonic()
+
+    async def request(self, endpoint: str, params: Optional[Dict[str, Any]] = None, method: str = "POST") -> Any:
+        """
+        Call ``/api/automation/{endpoint}`` and return the decoded JSON response.
+
+        Raises:
+            BrowserChannelUnavailable: If the request did not reach the browser API
+            BrowserActionFailed: On a 5xx response
+        """
+        if not self.available:
+            raise BrowserChannelUnavailable(f"Direct browser channel of sandbox {self.sandbox.id} is disabled")
+
+        try:
+            base_url, token = await self._preview_link()
+        except Exception as e:
+            self._disable(f"preview link lookup failed: {str(e)}")
+            raise BrowserChannelUnavailable(str(e))
+
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["x-daytona-preview-token"] = token
+        url = f"{base_url}/api/automation/{endpoint}"
+        request_args = {"params": params} if method == "GET" else {"json": params}
+
+        client = get_http_client("sandbox-browser", timeout=REQUEST_TIMEOUT)
+        try:
+            async with client.stream(method, url, headers=headers, **request_args) as response:
+                if response.status_code in PROXY_REJECTED_CODES:
+                    self._disable(f"proxy returned {response.status_code}")
+                    _preview_links.pop(self.sandbox.id, None)
+                    raise BrowserChannelUnavailable(f"Browser API unreachable: HTTP {response.status_code}")
+                if response.status_code >= 500:
+                    detail = (await response.aread())[:500].decode(errors="replace")
+                    raise BrowserActionFailed(f"Browser API request failed: HTTP {response.status_code} {detail}")
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    body.extend(chunk)
+                    if len(body) > MAX_RESPONSE_BYTES:
+                        raise ValueError(f"Browser API response exceeds {MAX_RESPONSE_BYTES} bytes")
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            self._disable(f"connect failed: {str(e)}")
+            _preview_links.pop(self.sandbox.id, None)
+            raise BrowserChannelUnavailable(str(e))
+
+        return json.loads(body)
+
+    async def _preview_link(self) -> Tuple[str, Optional[str]]:
+        cached = _preview_links.get(self.sandbox.id)
+        if cached and cached[2] > time.monotonic():
+            return cached[0], cached[1]
+
+        link = await self.sandbox.get_preview_link(BROWSER_API_PORT)
+        url = link.url if hasattr(link, 'url') else str(link).split("url='")[1].split("'")[0]
+        token = getattr(link, 'token', None)
+        _preview_links[self.sandbox.id] = (url.rstrip('/'), token, time.monotonic() + PREVIEW_LINK_TTL)
+        return url.rstrip('/'), token
+
+    def _disable(self, reason: str) -> None:
+        logger.warning(f"Direct browser channel of sandbox {self.sandbox.id} unavailable ({reason}), using curl for {RETRY_AFTER}s")
+        _unavailable_until[self.sandbox.id] = time.monotonic() + RETRY_AFTER
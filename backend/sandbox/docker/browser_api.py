@@ -1,4 +1,5 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Body
+from fastapi.middleware.gzip import GZipMiddleware
 from playwright.async_api import async_playwright, Browser, BrowserContext, Page
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
@@ -6,15 +7,16 @@ import asyncio
 import json
 import logging
 import base64
+import hashlib
+import io
 from dataclasses import dataclass, field
 from datetime import datetime
 import os
 import random
 from functools import cached_property
 import traceback
-import pytesseract
 from PIL import Image
-import io
+from ocr_worker import OCRWorker
 
 #######################################################
 # Action model definitions
@@ -99,6 +101,19 @@ class HashedDomElement:
     attributes: Dict[str, str]
     is_visible: bool
     page_coordinates: Optional[CoordinateSet] = None
+    text: str = ""
+
+    def digest(self) -> str:
+        """Short stable digest used to tell whether an element changed between two states"""
+        coordinates = None
+        if self.page_coordinates:
+            c = self.page_coordinates
+            coordinates = [round(c.x), round(c.y), round(c.width), round(c.height)]
+        payload = json.dumps(
+            [self.tag_name, sorted(self.attributes.items()), self.is_visible, coordinates, self.text],
+            separators=(',', ':')
+        )
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=8).hexdigest()
 
 @dataclass
 class DOMBaseNode:
@@ -159,7 +174,8 @@ class DOMElementNode(DOMBaseNode):
             tag_name=self.tag_name,
             attributes=self.attributes,
             is_visible=self.is_visible,
-            page_coordinates=self.page_coordinates
+            page_coordinates=self.page_coordinates,
+            text=self.get_all_text_till_next_clickable_element()
         )
     
     def get_all_text_till_next_clickable_element(self, max_depth: int = -1) -> str:
@@ -246,6 +262,28 @@ class DOMState:
     pixels_above: int = 0
     pixels_below: int = 0
 
+SCREENSHOT_HASH_SIZE = 16  # the perceptual hash has SCREENSHOT_HASH_SIZE ** 2 bits
+
+def screenshot_hash(image_bytes: bytes) -> str:
+    """Perceptual (difference) hash of a screenshot as a hex string.
+
+    Visually identical screenshots get the same or a nearby hash even if their
+    JPEG bytes differ, so the backend can skip storing unchanged screenshots.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        # Let the JPEG decoder downscale while decoding instead of decoding the full frame
+        image.draft('L', (SCREENSHOT_HASH_SIZE * 4, SCREENSHOT_HASH_SIZE * 4))
+        small = image.convert('L').resize((SCREENSHOT_HASH_SIZE + 1, SCREENSHOT_HASH_SIZE), Image.Resampling.BILINEAR)
+        pixels = list(small.getdata())
+    bits = 0
+    width = SCREENSHOT_HASH_SIZE + 1
+    for row in range(SCREENSHOT_HASH_SIZE):
+        for col in range(SCREENSHOT_HASH_SIZE):
+            left = pixels[row * width + col]
+            right = pixels[row * width + col + 1]
+            bits = (bits << 1) | (1 if right > left else 0)
+    return f"{bits:0{SCREENSHOT_HASH_SIZE ** 2 // 4}x}"
+
 #######################################################
 # Browser Action Result Model
 #######################################################
@@ -267,7 +305,9 @@ class BrowserActionResult(BaseModel):
     
     # Additional metadata
     element_count: int = 0  # Number of interactive elements found
-    interactive_elements: Optional[List[Dict[str, Any]]] = None  # Simplified list of interactive elements
+    interactive_elements: Optional[List[Dict[str, Any]]] = None  # Simplified list of interactive elements (full snapshot)
+    interactive_elements_delta: Optional[Dict[str, Any]] = None  # Changes versus the previous state of the same page
+    screenshot_hash: Optional[str] = None  # Perceptual hash of the screenshot
     viewport_width: Optional[int] = None
     viewport_height: Optional[int] = None
     
@@ -289,6 +329,9 @@ class BrowserAutomation:
         self.include_attributes = ["id", "href", "src", "alt", "aria-label", "placeholder", "name", "role", "title", "value"]
         self.screenshot_dir = os.path.join(os.getcwd(), "screenshots")
         os.makedirs(self.screenshot_dir, exist_ok=True)
+        self.ocr = OCRWorker()
+        # URL and {index: (element digest, in viewport)} of the last reported state, for element deltas
+        self._element_snapshot: tuple = ("", {})
         
         # Register routes
         self.router.on_startup.append(self.startup)
@@ -382,6 +425,7 @@ class BrowserAutomation:
             
     async def shutdown(self):
         """Clean up browser instance on shutdown"""
+        self.ocr.shutdown()
         if self.browser_context:
             await self.browser_context.close()
         if self.browser:
@@ -635,6 +679,11 @@ class BrowserAutomation:
     
     async def take_screenshot(self) -> str:
         """Take a screenshot and return as base64 encoded string"""
+        screenshot_bytes = await self.capture_screenshot()
+        return base64.b64encode(screenshot_bytes).decode('utf-8') if screenshot_bytes else ""
+
+    async def capture_screenshot(self) -> bytes:
+        """Take a screenshot and return the JPEG bytes"""
         try:
             page = await self.get_current_page()
             
@@ -656,12 +705,12 @@ class BrowserAutomation:
                 scale='device'  # Use device scale factor
             )
             
-            return base64.b64encode(screenshot_bytes).decode('utf-8')
+            return screenshot_bytes
         except Exception as e:
             print(f"Error taking screenshot: {e}")
             traceback.print_exc()
-            # Return an empty string rather than failing
-            return ""
+            # Return no bytes rather than failing
+            return b""
     
     async def save_screenshot_to_file(self) -> str:
         """Take a screenshot and save to file, returning the path"""
@@ -679,22 +728,12 @@ class BrowserAutomation:
             return ""
     
     async def extract_ocr_text_from_screenshot(self, screenshot_base64: str) -> str:
-        """Extract text from screenshot using OCR"""
+        """Extract text from screenshot using OCR in the OCR worker pool"""
         if not screenshot_base64:
             return ""
             
         try:
-            # Decode base64 to image
-            image_bytes = base64.b64decode(screenshot_base64)
-            image = Image.open(io.BytesIO(image_bytes))
-            
-            # Extract text using pytesseract
-            ocr_text = pytesseract.image_to_string(image)
-            
-            # Clean up the text
-            ocr_text = ocr_text.strip()
-            
-            return ocr_text
+            return await self.ocr.extract_text(base64.b64decode(screenshot_base64))
         except Exception as e:
             print(f"Error performing OCR: {e}")
             traceback.print_exc()
@@ -704,13 +743,19 @@ class BrowserAutomation:
         """Helper method to get updated browser state after any action
         Returns a tuple of (dom_state, screenshot, elements, metadata)
         """
+        ocr_task = None
         try:
             # Wait a moment for any potential async processes to settle
             await asyncio.sleep(0.5)
             
             # Get updated state
             dom_state = await self.get_current_dom_state()
-            screenshot = await self.take_screenshot()
+            screenshot_bytes = await self.capture_screenshot()
+            screenshot = base64.b64encode(screenshot_bytes).decode('utf-8') if screenshot_bytes else ""
+            
+            # OCR the screenshot in a worker process while the rest of the state is collected
+            if screenshot_bytes:
+                ocr_task = asyncio.ensure_future(self.ocr.extract_text(screenshot_bytes))
             
             # Format elements for output
             elements = dom_state.element_tree.clickable_elements_to_string(
@@ -724,24 +769,16 @@ class BrowserAutomation:
             # Get element count
             metadata['element_count'] = len(dom_state.selector_map)
             
-            # Create simplified interactive elements list
-            interactive_elements = []
-            for idx, element in dom_state.selector_map.items():
-                element_info = {
-                    'index': idx,
-                    'tag_name': element.tag_name,
-                    'text': element.get_all_text_till_next_clickable_element(),
-                    'is_in_viewport': element.is_in_viewport
-                }
-                
-                # Add key attributes
-                for attr_name in ['id', 'href', 'src', 'alt', 'placeholder', 'name', 'role', 'title', 'type']:
-                    if attr_name in element.attributes:
-                        element_info[attr_name] = element.attributes[attr_name]
-                
-                interactive_elements.append(element_info)
+            # Report interactive elements as a delta versus the previous state of the same page
+            metadata.update(self.diff_interactive_elements(dom_state))
             
-            metadata['interactive_elements'] = interactive_elements
+            if screenshot_bytes:
+                try:
+                    metadata['screenshot_hash'] = await asyncio.get_running_loop().run_in_executor(
+                        None, screenshot_hash, screenshot_bytes
+                    )
+                except Exception as e:
+                    print(f"Error hashing screenshot: {e}")
             
             # Get viewport dimensions - Fix syntax error in JavaScript
             try:
@@ -760,20 +797,61 @@ class BrowserAutomation:
                 metadata['viewport_width'] = 0
                 metadata['viewport_height'] = 0
             
-            # Extract OCR text from screenshot if available
-            ocr_text = ""
-            if screenshot:
-                ocr_text = await self.extract_ocr_text_from_screenshot(screenshot)
-                metadata['ocr_text'] = ocr_text
+            # Collect the OCR text of the screenshot if available
+            if ocr_task is not None:
+                metadata['ocr_text'] = await ocr_task
             
             print(f"Got updated state after {action_name}: {len(dom_state.selector_map)} elements")
             return dom_state, screenshot, elements, metadata
         except Exception as e:
+            if ocr_task is not None:
+                ocr_task.cancel()
             print(f"Error getting updated state after {action_name}: {e}")
             traceback.print_exc()
             # Return empty values in case of error
             return None, "", "", {}
 
+    def diff_interactive_elements(self, dom_state: DOMState) -> dict:
+        """Simplified interactive elements, as a full list or as changes since the last state
+
+        Elements are compared by the digest of their HashedDomElement. The full
+        list is returned for the first state of a page; after that only added or
+        changed elements and the indices of removed ones are returned.
+        """
+        previous_url, previous = self._element_snapshot
+        full = dom_state.url != previous_url or not previous
+        
+        snapshot = {}
+        changed = []
+        for idx, element in dom_state.selector_map.items():
+            key = (element.hash.digest(), element.is_in_viewport)
+            snapshot[idx] = key
+            if full or previous.get(idx) != key:
+                element_info = {
+                    'index': idx,
+                    'tag_name': element.tag_name,
+                    'text': element.hash.text,
+                    'is_in_viewport': element.is_in_viewport
+                }
+                
+                # Add key attributes
+                for attr_name in ['id', 'href', 'src', 'alt', 'placeholder', 'name', 'role', 'title', 'type']:
+                    if attr_name in element.attributes:
+                        element_info[attr_name] = element.attributes[attr_name]
+                
+                changed.append(element_info)
+        
+        self._element_snapshot = (dom_state.url, snapshot)
+        if full:
+            return {'interactive_elements': changed}
+        return {
+            'interactive_elements_delta': {
+                'changed': changed,
+                'removed': sorted(set(previous) - set(snapshot)),
+                'unchanged': len(snapshot) - len(changed)
+            }
+        }
+
     def build_action_result(self, success: bool, message: str, dom_state, screenshot: str, 
                               elements: str, metadata: dict, error: str = "", content: str = None,
                               fallback_url: str = None) -> BrowserActionResult:
@@ -795,7 +873,9 @@ class BrowserAutomation:
             content=content,
             ocr_text=metadata.get('ocr_text', ""),
             element_count=metadata.get('element_count', 0),
-            interactive_elements=metadata.get('interactive_elements', []),
+            interactive_elements=metadata.get('interactive_elements'),
+            interactive_elements_delta=metadata.get('interactive_elements_delta'),
+            screenshot_hash=metadata.get('screenshot_hash'),
             viewport_width=metadata.get('viewport_width', 0),
             viewport_height=metadata.get('viewport_height', 0)
         )
@@ -1843,6 +1923,8 @@ automation_service = BrowserAutomation()
 
 # Create API app
 api_app = FastAPI()
+# Screenshots dominate responses; clients asking for gzip (the backend's direct channel) get them compressed
+api_app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 @api_app.get("/api")
 async def health_check():
@@ -0,0 +1,88 @@
+"""
+OCR of browser screenshots in a process pool.
+
+Tesseract takes hundreds of milliseconds per screenshot and, run inline, held
+up the browser API's event loop after every action. OCRWorker runs it in
+worker processes started on first use, and remembers the text of the last
+OCR_CACHE_SIZE screenshots so unchanged pages are not OCRed again.
+
+Workers are spawned, not forked, since forking the browser API with a running
+event loop and Playwright threads is unsafe. Spawn re-runs the main script
+(/app/browser_api.py) as __mp_main__ in every worker: each worker imports
+Playwright and FastAPI and builds the module-level BrowserAutomation, but not
+the server, which is started under ``if __name__ == '__main__'``. This is paid
+once per worker, as the pool is kept for the life of the browser API.
+"""
+
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from PIL import Image
+
+OCR_ENABLED = os.getenv("BROWSER_OCR", "true").lower() not in ("0", "false", "off")
+OCR_WORKERS = int(os.getenv("BROWSER_OCR_WORKERS", "2"))
+OCR_CACHE_SIZE = 32  # screenshots whose text is remembered
+
+
+def image_to_text(image_bytes: bytes) -> str:
+    """OCR an encoded image. Runs in a worker process."""
+    import pytesseract
+
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        return pytesseract.image_to_string(image).strip()
+
+
+class OCRWorker:
+    """Process pool running OCR on screenshots, started on first use."""
+
+    def __init__(self, workers: int = OCR_WORKERS, cache_size: int = OCR_CACHE_SIZE):
+        self.workers = workers
+        self.cache_size = cache_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+
+    async def extract_text(self, image_bytes: bytes) -> str:
+        """Text in an encoded image, or "" if OCR is disabled or fails."""
+        if not OCR_ENABLED or not image_bytes:
+            return ""
+
+        digest = hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+        cached = self._cache.get(digest)
+        if cached is not None:
+            self._cache.move_to_end(digest)
+            return cached
+
+        if self._executor is None:
+            # Forking the browser API with a running event loop and Playwright threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        try:
+            loop = asyncio.get_running_loop()
+            text = await loop.run_in_executor(self._executor, image_to_text, image_bytes)
+        except BrokenProcessPool as e:
+            # A worker died; start a new pool on the next call
+            print(f"OCR worker pool broke: {e}")
+            self._executor = None
+            return ""
+        except Exception as e:
+            print(f"Error performing OCR: {e}")
+            return ""
+
+        self._cache[digest] = text
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return text
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,124 @@
+"""
+Process-wide registry of sandbox handles.
+
+Every sandbox tool of a run used to look up the project row and call
+``daytona.get`` on its own, so one run made the same project query and
+Daytona request once per tool. The registry is shared by all tools and all
+runs in a worker process:
+
+- project_id -> sandbox info (from the ``projects`` row), cached for
+  PROJECT_TTL seconds and seeded by run_agent, which already has the row
+- sandbox_id -> started AsyncSandbox handle, cached for SANDBOX_TTL seconds
+
+Concurrent requests for a sandbox that is not cached share a single
+get-or-start call, so a stopped or archived sandbox is only started once.
+Handles are cached only when the sandbox is in the started state; the TTL is
+kept well below the sandbox auto-stop interval.
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from daytona_sdk import SandboxState
+
+from sandbox.async_sandbox import AsyncSandbox
+from sandbox.sandbox import get_or_start_sandbox
+from utils.logger import logger
+
+SANDBOX_TTL = 120  # seconds a started sandbox handle is reused without asking Daytona
+PROJECT_TTL = 600  # seconds a project's sandbox info is reused
+
+
+class _SandboxEntry:
+    __slots__ = ("sandbox", "state", "expires_at")
+
+    def __init__(self, sandbox: AsyncSandbox, ttl: float):
+        self.sandbox = sandbox
+        self.state = sandbox.state
+        self.expires_at = time.monotonic() + ttl
+
+
+class SandboxRegistry:
+    """Shared cache of project sandbox info and started sandbox handles."""
+
+    def __init__(self, sandbox_ttl: float = SANDBOX_TTL, project_ttl: float = PROJECT_TTL):
+        self.sandbox_ttl = sandbox_ttl
+        self.project_ttl = project_ttl
+        self._sandboxes: Dict[str, _SandboxEntry] = {}
+        self._projects: Dict[str, Tuple[Dict[str, Any], float]] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def remember_project(self, project_id: str, sandbox_info: Dict[str, Any]) -> None:
+        """Cache a project's sandbox info read elsewhere (e.g. by run_agent)."""
+        if sandbox_info and sandbox_info.get('id'):
+            self._projects[project_id] = (sandbox_info, time.monotonic() + self.project_ttl)
+
+    async def get_project_sandbox_info(self, project_id: str, db) -> Dict[str, Any]:
+        """
+        Get the ``sandbox`` info of a project.
+
+        Args:
+            project_id: The project to look up
+            db: DBConnection used on a cache miss
+
+        Raises:
+            ValueError: If the project does not exist or has no sandbox
+        """
+        cached = self._projects.get(project_id)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+
+        client = await db.client
+        project = await client.table('projects').select('sandbox').eq('project_id', project_id).execute()
+        if not project.data or len(project.data) == 0:
+            raise ValueError(f"Project {project_id} not found")
+
+        sandbox_info = project.data[0].get('sandbox') or {}
+        if not sandbox_info.get('id'):
+            raise ValueError(f"No sandbox found for project {project_id}")
+
+        self.remember_project(project_id, sandbox_info)
+        return sandbox_info
+
+    async def get(self, sandbox_id: str) -> AsyncSandbox:
+        """Get a started sandbox, starting it if it is stopped or archived."""
+        entry = self._sandboxes.get(sandbox_id)
+        if entry and entry.state == SandboxState.STARTED and entry.expires_at > time.monotonic():
+            self.hits += 1
+            return entry.sandbox
+
+        self.misses += 1
+        loading = self._loading.get(sandbox_id)
+        if loading is None:
+            loading = asyncio.ensure_future(self._load(sandbox_id))
+            self._loading[sandbox_id] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(sandbox_id, None))
+        else:
+            logger.debug(f"Waiting for in-flight get-or-start of sandbox {sandbox_id}")
+        # A cancelled caller must not cancel the start other callers are waiting on
+        return await asyncio.shield(loading)
+
+    async def _load(self, sandbox_id: str) -> AsyncSandbox:
+        self._sandboxes.pop(sandbox_id, None)
+        sandbox = await get_or_start_sandbox(sandbox_id)
+        if sandbox.state == SandboxState.STARTED:
+            self._sandboxes[sandbox_id] = _SandboxEntry(sandbox, self.sandbox_ttl)
+        else:
+            logger.debug(f"Not caching sandbox {sandbox_id} in state {sandbox.state}")
+        return sandbox
+
+    def state(self, sandbox_id: str) -> Optional[SandboxState]:
+        """Last known state of a sandbox, if it is cached."""
+        entry = self._sandboxes.get(sandbox_id)
+        return entry.state if entry else None
+
+    def invalidate(self, sandbox_id: str) -> None:
+        """Forget a sandbox handle, e.g. after it was stopped, archived or deleted."""
+        self._sandboxes.pop(sandbox_id, None)
+
+
+# Shared registry for this worker process
+sandbox_registry = SandboxRegistry()
@@ -1,8 +1,9 @@
-from daytona_sdk import Daytona, DaytonaConfig, CreateSandboxFromImageParams, Sandbox, SessionExecuteRequest, Resources, SandboxState
+from daytona_sdk import Daytona, DaytonaConfig, CreateSandboxFromImageParams, SessionExecuteRequest, Resources, SandboxState
 from dotenv import load_dotenv
 from utils.logger import logger
 from utils.config import config
 from utils.config import Configuration
+from sandbox.async_sandbox import AsyncSandbox, run_sync
 
 load_dotenv()
 
@@ -31,26 +32,26 @@ else:
 daytona = Daytona(daytona_config)
 logger.debug("Daytona client initialized")
 
-async def get_or_start_sandbox(sandbox_id: str):
+async def get_or_start_sandbox(sandbox_id: str) -> AsyncSandbox:
     """Retrieve a sandbox by ID, check its state, and start it if needed."""
     
     logger.info(f"Getting or starting sandbox with ID: {sandbox_id}")
     
     try:
-        sandbox = daytona.get(sandbox_id)
+        sandbox = AsyncSandbox(await run_sync("get", daytona.get, sandbox_id))
         
         # Check if sandbox needs to be started
         if sandbox.state == SandboxState.ARCHIVED or sandbox.state == SandboxState.STOPPED:
             logger.info(f"Sandbox is in {sandbox.state} state. Starting...")
             try:
-                daytona.start(sandbox)
+                await run_sync("start", daytona.start, sandbox.sdk_sandbox, sandbox_id=sandbox_id)
                 # Wait a moment for the sandbox to initialize
                 # sleep(5)
                 # Refresh sandbox state after starting
-                sandbox = daytona.get(sandbox_id)
+                sandbox = AsyncSandbox(await run_sync("get", daytona.get, sandbox_id))
                 
                 # Start supervisord in a session when restarting
-                start_supervisord_session(sandbox)
+                await start_supervisord_session(sandbox)
             except Exception as e:
                 logger.error(f"Error starting sandbox: {e}")
                 raise e
@@ -62,15 +63,15 @@ async def get_or_start_sandbox(sandbox_id: str):
         logger.error(f"Error retrieving or starting sandbox: {str(e)}")
         raise e
 
-def start_supervisord_session(sandbox: Sandbox):
+async def start_supervisord_session(sandbox: AsyncSandbox):
     """Start supervisord in a session."""
     session_id = "supervisord-session"
     try:
         logger.info(f"Creating session {session_id} for supervisord")
-        sandbox.process.create_session(session_id)
+        await sandbox.process.create_session(session_id)
         
         # Execute supervisord command
-        sandbox.process.execute_session_command(session_id, SessionExecuteRequest(
+        await sandbox.process.execute_session_command(session_id, SessionExecuteRequest(
             command="exec /usr/bin/supervisord -n -c /etc/supervisor/conf.d/supervisord.conf",
             var_async=True
         ))
@@ -79,7 +80,7 @@ def start_supervisord_session(sandbox: Sandbox):
         logger.error(f"Error starting supervisord session: {str(e)}")
         raise e
 
-def create_sandbox(password: str, project_id: str = None):
+async def create_sandbox(password: str, project_id: str = None) -> AsyncSandbox:
     """Create a new sandbox with all required services configured and running."""
     
     logger.debug("Creating new Daytona sandbox environment")
@@ -117,11 +118,11 @@ def create_sandbox(password: str, project_id: str = None):
     )
     
     # Create the sandbox
-    sandbox = daytona.create(params)
+    sandbox = AsyncSandbox(await run_sync("create", daytona.create, params))
     logger.debug(f"Sandbox created with ID: {sandbox.id}")
     
     # Start supervisord in a session for new sandbox
-    start_supervisord_session(sandbox)
+    await start_supervisord_session(sandbox)
     
     logger.debug(f"Sandbox environment successfully initialized")
     return sandbox
@@ -132,10 +133,10 @@ async def delete_sandbox(sandbox_id: str):
     
     try:
         # Get the sandbox
-        sandbox = daytona.get(sandbox_id)
+        sandbox = await run_sync("get", daytona.get, sandbox_id)
         
         # Delete the sandbox
-        daytona.remove(sandbox)
+        await run_sync("remove", daytona.remove, sandbox, sandbox_id=sandbox_id)
         
         logger.info(f"Successfully deleted sandbox {sandbox_id}")
         return True
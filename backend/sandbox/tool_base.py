@@ -3,8 +3,8 @@ from typing import Optional
 
 from agentpress.thread_manager import ThreadManager
 from agentpress.tool import Tool
-from daytona_sdk import Sandbox
-from sandbox.sandbox import get_or_start_sandbox
+from sandbox.async_sandbox import AsyncSandbox
+from sandbox.registry import sandbox_registry
 from utils.logger import logger
 from utils.files_utils import clean_path
 
@@ -23,30 +23,19 @@ class SandboxToolsBase(Tool):
         self._sandbox_id = None
         self._sandbox_pass = None
 
-    async def _ensure_sandbox(self) -> Sandbox:
+    async def _ensure_sandbox(self) -> AsyncSandbox:
         """Ensure we have a valid sandbox instance, retrieving it from the project if needed."""
         if self._sandbox is None:
             try:
-                # Get database client
-                client = await self.thread_manager.db.client
-                
-                # Get project data
-                project = await client.table('projects').select('*').eq('project_id', self.project_id).execute()
-                if not project.data or len(project.data) == 0:
-                    raise ValueError(f"Project {self.project_id} not found")
-                
-                project_data = project.data[0]
-                sandbox_info = project_data.get('sandbox', {})
-                
-                if not sandbox_info.get('id'):
-                    raise ValueError(f"No sandbox found for project {self.project_id}")
+                # Get the project's sandbox info (shared across tools and runs)
+                sandbox_info = await sandbox_registry.get_project_sandbox_info(self.project_id, self.thread_manager.db)
                 
                 # Store sandbox info
                 self._sandbox_id = sandbox_info['id']
                 self._sandbox_pass = sandbox_info.get('pass')
                 
-                # Get or start the sandbox
-                self._sandbox = await get_or_start_sandbox(self._sandbox_id)
+                # Get or start the sandbox; concurrent starts are deduplicated
+                self._sandbox = await sandbox_registry.get(self._sandbox_id)
                 
                 # # Log URLs if not already printed
                 # if not SandboxToolsBase._urls_printed:
@@ -69,8 +58,12 @@ class SandboxToolsBase(Tool):
         return self._sandbox
 
     @property
-    def sandbox(self) -> Sandbox:
-        """Get the sandbox instance, ensuring it exists."""
+    def sandbox(self) -> AsyncSandbox:
+        """Get the sandbox instance, ensuring it exists.
+
+        SDK calls on the returned sandbox (``fs.*``, ``process.*``,
+        ``get_preview_link``) are coroutines and must be awaited.
+        """
         if self._sandbox is None:
             raise RuntimeError("Sandbox not initialized. Call _ensure_sandbox() first.")
         return self._sandbox
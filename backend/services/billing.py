@@ -5,15 +5,18 @@ stripe listen --forward-to localhost:8000/api/billing/webhook
 """
 
 from fastapi import APIRouter, HTTPException, Depends, Request
-from typing import Optional, Dict, Tuple
+from typing import Optional, Dict, List, Tuple
 import stripe
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 from utils.logger import logger
 from utils.config import config, EnvMode
 from services.supabase import DBConnection
 from utils.auth_utils import get_current_user_id_from_jwt
 from pydantic import BaseModel
 from utils.constants import MODEL_ACCESS_TIERS, MODEL_NAME_ALIASES
+from services import billing_gate
+from services import stripe_client
+from services.stripe_client import subscription_cache
 import os
 
 # Initialize Stripe
@@ -71,10 +74,21 @@ async def get_stripe_customer_id(client, user_id: str) -> Optional[str]:
         return result.data[0]['id']
     return None
 
+async def get_account_id_for_customer(client, customer_id: str) -> Optional[str]:
+    """Get the account ID of a Stripe customer."""
+    result = await client.schema('basejump').from_('billing_customers') \
+        .select('account_id') \
+        .eq('id', customer_id) \
+        .execute()
+
+    if result.data and len(result.data) > 0:
+        return result.data[0]['account_id']
+    return None
+
 async def create_stripe_customer(client, user_id: str, email: str) -> str:
     """Create a new Stripe customer for a user."""
     # Create customer in Stripe
-    customer = stripe.Customer.create(
+    customer = await stripe_client.run_sync("Customer.create", stripe.Customer.create,
         email=email,
         metadata={"user_id": user_id}
     )
@@ -100,20 +114,16 @@ async def get_user_subscription(user_id: str) -> Optional[Dict]:
         if not customer_id:
             return None
             
-        # Get all active subscriptions for the customer
-        subscriptions = stripe.Subscription.list(
-            customer=customer_id,
-            status='active'
-        )
-        # print("Found subscriptions:", subscriptions)
+        # Get all active subscriptions for the customer (cached, see services.stripe_client)
+        subscriptions = await subscription_cache.list_active(customer_id)
         
         # Check if we have any subscriptions
-        if not subscriptions or not subscriptions.get('data'):
+        if not subscriptions:
             return None
             
         # Filter subscriptions to only include our product's subscriptions
         our_subscriptions = []
-        for sub in subscriptions['data']:
+        for sub in subscriptions:
             # Get the first subscription item
             if sub.get('items') and sub['items'].get('data') and len(sub['items']['data']) > 0:
                 item = sub['items']['data'][0]
@@ -143,7 +153,7 @@ async def get_user_subscription(user_id: str) -> Optional[Dict]:
             for sub in our_subscriptions:
                 if sub['id'] != most_recent['id']:
                     try:
-                        stripe.Subscription.modify(
+                        await stripe_client.run_sync("Subscription.modify", stripe.Subscription.modify,
                             sub['id'],
                             cancel_at_period_end=True
                         )
@@ -159,90 +169,112 @@ async def get_user_subscription(user_id: str) -> Optional[Dict]:
         logger.error(f"Error getting subscription from Stripe: {str(e)}")
         return None
 
-async def calculate_monthly_usage(client, user_id: str) -> float:
-    """Calculate total agent run minutes for the current month for a user."""
+async def calculate_monthly_usage(client, user_id: str, include_active: bool = True) -> float:
+    """
+    Calculate total agent run minutes for the current month for a user.
+
+    Finished runs are read from the monthly_usage ledger, which is updated
+    as runs finish (record_run_usage) and rebuilt by
+    utils/scripts/reconcile_usage_ledger.py. With include_active=True runs
+    that are still going are added, capped at 30 minutes each; the user's
+    runs stuck for more than an hour are marked as failed instead, so they
+    are cleaned up even when the reconciliation script is not scheduled.
+    """
     # Get start of current month in UTC
     now = datetime.now(timezone.utc)
     start_of_month = datetime(now.year, now.month, 1, tzinfo=timezone.utc)
-    
-    # First get all threads for this user
-    threads_result = await client.table('threads') \
-        .select('thread_id') \
+
+    ledger_result = await client.table('monthly_usage') \
+        .select('seconds') \
         .eq('account_id', user_id) \
+        .eq('month', start_of_month.date().isoformat()) \
         .execute()
-    
-    if not threads_result.data:
-        return 0.0
-    
-    thread_ids = [t['thread_id'] for t in threads_result.data]
-    
-    # Then get all agent runs for these threads in current month
-    runs_result = await client.table('agent_runs') \
-        .select('id, started_at, completed_at, status') \
-        .in_('thread_id', thread_ids) \
-        .gte('started_at', start_of_month.isoformat()) \
-        .execute()
-    
-    if not runs_result.data:
-        return 0.0
-    
-    # Calculate total minutes
-    total_seconds = 0
-    now_ts = now.timestamp()
-    stuck_runs_found = []
-    
-    for run in runs_result.data:
-        run_id = run['id']
-        status = run['status']
-        start_time = datetime.fromisoformat(run['started_at'].replace('Z', '+00:00')).timestamp()
-        
-        # Only count completed runs and truly active running runs
-        if run['completed_at'] and status in ['completed', 'failed', 'stopped']:
-            # Use actual completion time for finished runs
-            end_time = datetime.fromisoformat(run['completed_at'].replace('Z', '+00:00')).timestamp()
-            duration = end_time - start_time
-            
-            # Sanity check: skip runs longer than 4 hours (clearly errors)
-            if duration > 14400:  # 4 hours
-                logger.warning(f"Skipping agent run {run_id} with suspicious duration: {duration/60:.1f} minutes")
-                continue
-                
-            total_seconds += duration
-            
-        elif status == 'running':
-            # For running jobs, check if they're stuck
+
+    total_seconds = ledger_result.data[0]['seconds'] if ledger_result.data else 0.0
+
+    if include_active:
+        running_result = await client.table('agent_runs') \
+            .select('id, started_at, threads!inner(account_id)') \
+            .eq('threads.account_id', user_id) \
+            .eq('status', 'running') \
+            .gte('started_at', start_of_month.isoformat()) \
+            .execute()
+
+        now_ts = now.timestamp()
+        stuck_runs_found = []
+        for run in running_result.data or []:
+            start_time = datetime.fromisoformat(run['started_at'].replace('Z', '+00:00')).timestamp()
             time_since_start = now_ts - start_time
-            
+
             if time_since_start > 3600:  # 1 hour limit for "running" jobs
                 # This is a stuck run - mark it as failed and don't count usage
-                stuck_runs_found.append(run_id)
-                logger.warning(f"Found stuck agent run {run_id} that started {time_since_start/60:.1f} minutes ago")
+                stuck_runs_found.append(run['id'])
+                logger.warning(f"Found stuck agent run {run['id']} that started {time_since_start/60:.1f} minutes ago")
                 continue
-            else:
-                # Truly active run - count current duration but cap at reasonable limit
-                duration = time_since_start
-                if duration > 1800:  # Cap active runs at 30 minutes for billing
-                    duration = 1800
-                total_seconds += duration
-        
-        # Skip other statuses (failed, stopped without completion time, etc.)
-    
-    # Clean up stuck runs asynchronously (don't wait for this)
-    if stuck_runs_found:
-        logger.info(f"Marking {len(stuck_runs_found)} stuck runs as failed")
-        try:
-            await client.table('agent_runs').update({
-                'status': 'failed',
-                'completed_at': now.isoformat(),
-                'error': 'Agent run exceeded time limit and was marked as stuck'
-            }).in_('id', stuck_runs_found).execute()
-        except Exception as e:
-            logger.error(f"Failed to update stuck agent runs: {e}")
-    
+
+            # Truly active run - count current duration but cap at reasonable limit
+            total_seconds += min(time_since_start, 1800)  # Cap active runs at 30 minutes for billing
+
+        # Only this user's runs found above are updated; other accounts are left to the reconciliation script
+        if stuck_runs_found:
+            try:
+                await fail_stuck_agent_runs(client, run_ids=stuck_runs_found)
+            except Exception as e:
+                logger.error(f"Failed to update stuck agent runs: {e}")
+
     total_minutes = total_seconds / 60
     logger.info(f"Calculated {total_minutes:.2f} minutes of usage for user {user_id} this month")
     return total_minutes
 
+async def fail_stuck_agent_runs(client, run_ids: Optional[List[str]] = None) -> int:
+    """
+    Mark agent runs that have been 'running' for more than an hour as failed.
+
+    Args:
+        client: The Supabase client
+        run_ids: Only consider these runs, defaults to all runs
+
+    Returns:
+        int: The number of runs marked as failed
+    """
+    now = datetime.now(timezone.utc)
+    one_hour_ago = now - timedelta(hours=1)
+
+    query = client.table('agent_runs').update({
+        'status': 'failed',
+        'completed_at': now.isoformat(),
+        'error': 'Agent run exceeded time limit and was marked as stuck'
+    }).eq('status', 'running').lt('started_at', one_hour_ago.isoformat())
+    if run_ids is not None:
+        query = query.in_('id', run_ids)
+    result = await query.execute()
+
+    stuck_count = len(result.data or [])
+    if stuck_count:
+        logger.info(f"Marked {stuck_count} stuck agent runs as failed")
+    return stuck_count
+
+async def rebuild_monthly_usage(client, month: Optional[date] = None, account_id: Optional[str] = None) -> int:
+    """
+    Rebuild the monthly_usage ledger from agent_runs.
+
+    Args:
+        client: The Supabase client
+        month: Any day of the month to rebuild, defaults to the current month
+        account_id: Only rebuild this account's usage
+
+    Returns:
+        int: The number of accounts with usage in that month
+    """
+    month = month or datetime.now(timezone.utc).date()
+    result = await client.rpc('rebuild_monthly_usage', {
+        'p_month': month.replace(day=1).isoformat(),
+        'p_account_id': account_id
+    }).execute()
+    if account_id:
+        await billing_gate.invalidate_usage(account_id)
+    return result.data or 0
+
 async def get_allowed_models_for_user(client, user_id: str):
     """
     Get the list of models allowed for a user based on their subscription tier.
@@ -326,6 +358,28 @@ async def check_billing_status(client, user_id: str) -> Tuple[bool, str, Optiona
             "minutes_limit": "no limit"
         }
     
+    plan, subscription = await resolve_billing_plan(client, user_id)
+    if plan['minutes_limit'] == billing_gate.UNLIMITED:
+        return True, "Custom subscription active", plan
+
+    # Calculate current month's usage
+    current_usage = await calculate_monthly_usage(client, user_id)
+    
+    # Check if within limits
+    if current_usage >= plan['minutes_limit']:
+        return False, f"Monthly limit of {plan['minutes_limit']} minutes reached. Please upgrade your plan or wait until next month.", subscription
+    
+    return True, "OK", subscription
+
+async def resolve_billing_plan(client, user_id: str) -> Tuple[Dict, Dict]:
+    """
+    Resolve the plan a user is billed on.
+
+    Returns:
+        Tuple[Dict, Dict]: (plan, subscription) where plan has price_id,
+        plan_name and minutes_limit ('unlimited' for custom plans) and
+        subscription is the Stripe subscription or the plan it falls back to
+    """
     # Get current subscription
     subscription = await get_user_subscription(user_id)
     # print("Current subscription:", subscription)
@@ -344,11 +398,12 @@ async def check_billing_status(client, user_id: str) -> Tuple[bool, str, Optiona
             supabase_sub = supabase_subscription_result.data[0]
             plan_name = supabase_sub.get('plan_name', 'custom')
             
-            return True, "Custom subscription active", {
+            plan = {
                 'price_id': plan_name,
                 'plan_name': plan_name,
-                'minutes_limit': 'unlimited'
+                'minutes_limit': billing_gate.UNLIMITED
             }
+            return plan, plan
     
     # If no subscription, they can use free tier
     if not subscription:
@@ -370,14 +425,66 @@ async def check_billing_status(client, user_id: str) -> Tuple[bool, str, Optiona
         logger.warning(f"Unknown subscription tier: {price_id}, defaulting to free tier")
         tier_info = SUBSCRIPTION_TIERS[config.STRIPE_FREE_TIER_ID]
     
-    # Calculate current month's usage
-    current_usage = await calculate_monthly_usage(client, user_id)
-    
-    # Check if within limits
-    if current_usage >= tier_info['minutes']:
-        return False, f"Monthly limit of {tier_info['minutes']} minutes reached. Please upgrade your plan or wait until next month.", subscription
-    
-    return True, "OK", subscription
+    plan = {
+        'price_id': price_id,
+        'plan_name': tier_info['name'],
+        'minutes_limit': tier_info['minutes']
+    }
+    return plan, subscription
+
+async def check_billing_gate(client, user_id: str, active_seconds: float = 0.0) -> Tuple[bool, str, Optional[Dict]]:
+    """
+    Cached variant of check_billing_status for checks repeated during a run.
+
+    The plan and the month-to-date usage of finished runs are read from
+    Redis (see services.billing_gate) and only recomputed when they are not
+    cached.
+
+    Args:
+        client: The Supabase client
+        user_id: The account to check
+        active_seconds: How long the caller's own run has been going
+
+    Returns:
+        Tuple[bool, str, Optional[Dict]]: (can_run, message, plan)
+    """
+    if config.ENV_MODE == EnvMode.LOCAL:
+        return True, "Local development mode - billing disabled", {
+            "price_id": "local_dev",
+            "plan_name": "Local Development",
+            "minutes_limit": "no limit"
+        }
+
+    try:
+        plan, used_seconds = await billing_gate.read_state(user_id)
+    except Exception as e:
+        logger.warning(f"Billing cache unavailable, checking billing status directly: {str(e)}")
+        return await check_billing_status(client, user_id)
+
+    if plan is None:
+        plan, _ = await resolve_billing_plan(client, user_id)
+        await billing_gate.store_plan(user_id, plan)
+    if used_seconds is None and plan['minutes_limit'] != billing_gate.UNLIMITED:
+        used_minutes = await calculate_monthly_usage(client, user_id, include_active=False)
+        used_seconds = await billing_gate.seed_usage(user_id, used_minutes * 60)
+
+    return billing_gate.evaluate(plan, used_seconds or 0.0, active_seconds)
+
+async def record_run_usage(client, agent_run_id: str) -> None:
+    """
+    Add a finished agent run to the monthly_usage ledger and to the cached
+    month-to-date usage of its account. Runs are recorded once.
+    """
+    try:
+        result = await client.rpc('record_agent_run_usage', {'p_agent_run_id': agent_run_id}).execute()
+        recorded = result.data
+        if not recorded:
+            return
+
+        started_at = datetime.fromisoformat(recorded['started_at'].replace('Z', '+00:00'))
+        await billing_gate.add_run_usage(recorded['account_id'], started_at, recorded['seconds'])
+    except Exception as e:
+        logger.warning(f"Failed to record usage of agent run {agent_run_id}: {str(e)}")
 
 # API endpoints
 @router.post("/create-checkout-session")
@@ -402,7 +509,7 @@ async def create_checkout_session(
          
         # Get the target price and product ID
         try:
-            price = stripe.Price.retrieve(request.price_id, expand=['product'])
+            price = await stripe_client.run_sync("Price.retrieve", stripe.Price.retrieve, request.price_id, expand=['product'])
             product_id = price['product']['id']
         except stripe.error.InvalidRequestError:
             raise HTTPException(status_code=400, detail=f"Invalid price ID: {request.price_id}")
@@ -439,13 +546,13 @@ async def create_checkout_session(
                     }
                 
                 # Get current and new price details
-                current_price = stripe.Price.retrieve(current_price_id)
+                current_price = await stripe_client.run_sync("Price.retrieve", stripe.Price.retrieve, current_price_id)
                 new_price = price # Already retrieved
                 is_upgrade = new_price['unit_amount'] > current_price['unit_amount']
 
                 if is_upgrade:
                     # --- Handle Upgrade --- Immediate modification
-                    updated_subscription = stripe.Subscription.modify(
+                    updated_subscription = await stripe_client.run_sync("Subscription.modify", stripe.Subscription.modify,
                         subscription_id,
                         items=[{
                             'id': subscription_item['id'],
@@ -454,6 +561,7 @@ async def create_checkout_session(
                         proration_behavior='always_invoice', # Prorate and charge immediately
                         billing_cycle_anchor='now' # Reset billing cycle
                     )
+                    await subscription_cache.invalidate(customer_id)
                     
                     # Update active status in database to true (customer has active subscription)
                     await client.schema('basejump').from_('billing_customers').update(
@@ -463,7 +571,7 @@ async def create_checkout_session(
                     
                     latest_invoice = None
                     if updated_subscription.get('latest_invoice'):
-                       latest_invoice = stripe.Invoice.retrieve(updated_subscription['latest_invoice']) 
+                       latest_invoice = await stripe_client.run_sync("Invoice.retrieve", stripe.Invoice.retrieve, updated_subscription['latest_invoice']) 
                     
                     return {
                         "subscription_id": updated_subscription['id'],
@@ -489,12 +597,12 @@ async def create_checkout_session(
                         
                         # Retrieve the subscription again to get the schedule ID if it exists
                         # This ensures we have the latest state before creating/modifying schedule
-                        sub_with_schedule = stripe.Subscription.retrieve(subscription_id)
+                        sub_with_schedule = await stripe_client.run_sync("Subscription.retrieve", stripe.Subscription.retrieve, subscription_id)
                         schedule_id = sub_with_schedule.get('schedule')
 
                         # Get the current phase configuration from the schedule or subscription
                         if schedule_id:
-                            schedule = stripe.SubscriptionSchedule.retrieve(schedule_id)
+                            schedule = await stripe_client.run_sync("SubscriptionSchedule.retrieve", stripe.SubscriptionSchedule.retrieve, schedule_id)
                             # Find the current phase in the schedule
                             # This logic assumes simple schedules; might need refinement for complex ones
                             current_phase = None
@@ -559,7 +667,7 @@ async def create_checkout_session(
                             logger.info(f"Updating existing schedule {schedule_id} for subscription {subscription_id}")
                             logger.debug(f"Current phase data: {current_phase_update_data}")
                             logger.debug(f"New phase data: {new_downgrade_phase_data}")
-                            updated_schedule = stripe.SubscriptionSchedule.modify(
+                            updated_schedule = await stripe_client.run_sync("SubscriptionSchedule.modify", stripe.SubscriptionSchedule.modify,
                                 schedule_id,
                                 phases=[current_phase_update_data, new_downgrade_phase_data],
                                 end_behavior='release' 
@@ -574,7 +682,7 @@ async def create_checkout_session(
                             logger.debug(f"Current price: {current_price_id}, New price: {request.price_id}")
                             
                             try:
-                                updated_schedule = stripe.SubscriptionSchedule.create(
+                                updated_schedule = await stripe_client.run_sync("SubscriptionSchedule.create", stripe.SubscriptionSchedule.create,
                                     from_subscription=subscription_id,
                                     phases=[
                                         {
@@ -606,13 +714,14 @@ async def create_checkout_session(
                                 # print(f"Created new schedule {updated_schedule['id']} from subscription {subscription_id}")
                                 
                                 # Verify the schedule was created correctly
-                                fetched_schedule = stripe.SubscriptionSchedule.retrieve(updated_schedule['id'])
+                                fetched_schedule = await stripe_client.run_sync("SubscriptionSchedule.retrieve", stripe.SubscriptionSchedule.retrieve, updated_schedule['id'])
                                 logger.info(f"Schedule verification - Status: {fetched_schedule.get('status')}, Phase Count: {len(fetched_schedule.get('phases', []))}")
                                 logger.debug(f"Schedule details: {fetched_schedule}")
                             except Exception as schedule_error:
                                 logger.exception(f"Failed to create schedule: {str(schedule_error)}")
                                 raise schedule_error  # Re-raise to be caught by the outer try-except
                         
+                        await subscription_cache.invalidate(customer_id)
                         return {
                             "subscription_id": subscription_id,
                             "schedule_id": updated_schedule['id'],
@@ -634,7 +743,7 @@ async def create_checkout_session(
                 raise HTTPException(status_code=500, detail=f"Error updating subscription: {str(e)}")
         else:
             
-            session = stripe.checkout.Session.create(
+            session = await stripe_client.run_sync("checkout.Session.create", stripe.checkout.Session.create,
                 customer=customer_id,
                 payment_method_types=['card'],
                     line_items=[{'price': request.price_id, 'quantity': 1}],
@@ -686,7 +795,7 @@ async def create_portal_session(
         # Ensure the portal configuration has subscription_update enabled
         try:
             # First, check if we have a configuration that already enables subscription update
-            configurations = stripe.billing_portal.Configuration.list(limit=100)
+            configurations = await stripe_client.run_sync("billing_portal.Configuration.list", stripe.billing_portal.Configuration.list, limit=100)
             active_config = None
             
             # Look for a configuration with subscription_update enabled
@@ -705,7 +814,7 @@ async def create_portal_session(
                     default_config = configurations['data'][0]
                     logger.info(f"Updating default portal configuration: {default_config['id']} to enable subscription_update")
                     
-                    active_config = stripe.billing_portal.Configuration.update(
+                    active_config = await stripe_client.run_sync("billing_portal.Configuration.update", stripe.billing_portal.Configuration.update,
                         default_config['id'],
                         features={
                             'subscription_update': {
@@ -722,7 +831,7 @@ async def create_portal_session(
                 else:
                     # Create a new configuration with subscription_update enabled
                     logger.info("Creating new portal configuration with subscription_update enabled")
-                    active_config = stripe.billing_portal.Configuration.create(
+                    active_config = await stripe_client.run_sync("billing_portal.Configuration.create", stripe.billing_portal.Configuration.create,
                         business_profile={
                             'headline': 'Subscription Management',
                             'privacy_policy_url': config.FRONTEND_URL + '/privacy',
@@ -760,7 +869,7 @@ async def create_portal_session(
             portal_params["configuration"] = active_config['id']
         
         # Create the session
-        session = stripe.billing_portal.Session.create(**portal_params)
+        session = await stripe_client.run_sync("billing_portal.Session.create", stripe.billing_portal.Session.create, **portal_params)
         
         return {"url": session.url}
         
@@ -859,7 +968,7 @@ async def get_subscription(
         schedule_id = subscription.get('schedule')
         if schedule_id:
             try:
-                schedule = stripe.SubscriptionSchedule.retrieve(schedule_id)
+                schedule = await stripe_client.run_sync("SubscriptionSchedule.retrieve", stripe.SubscriptionSchedule.retrieve, schedule_id)
                 # Find the *next* phase after the current one
                 next_phase = None
                 current_phase_end = current_item['current_period_end']
@@ -944,6 +1053,9 @@ async def stripe_webhook(request: Request):
                 logger.warning(f"No customer ID found in subscription event: {event.type}")
                 return {"status": "error", "message": "No customer ID found"}
             
+            # Drop the cached subscriptions; the lookups below reload them from Stripe
+            await subscription_cache.invalidate(customer_id)
+            
             # Get database connection
             db = DBConnection()
             client = await db.client
@@ -959,11 +1071,7 @@ async def stripe_webhook(request: Request):
                 else:
                     # Subscription is not active (e.g., past_due, canceled, etc.)
                     # Check if customer has any other active subscriptions before updating status
-                    has_active = len(stripe.Subscription.list(
-                        customer=customer_id,
-                        status='active',
-                        limit=1
-                    ).get('data', [])) > 0
+                    has_active = len(await subscription_cache.list_active(customer_id)) > 0
                     
                     if not has_active:
                         await client.schema('basejump').from_('billing_customers').update(
@@ -973,11 +1081,7 @@ async def stripe_webhook(request: Request):
             
             elif event.type == 'customer.subscription.deleted':
                 # Check if customer has any other active subscriptions
-                has_active = len(stripe.Subscription.list(
-                    customer=customer_id,
-                    status='active',
-                    limit=1
-                ).get('data', [])) > 0
+                has_active = len(await subscription_cache.list_active(customer_id)) > 0
                 
                 if not has_active:
                     # If no active subscriptions left, set active to false
@@ -986,6 +1090,10 @@ async def stripe_webhook(request: Request):
                     ).eq('id', customer_id).execute()
                     logger.info(f"Webhook: Updated customer {customer_id} active status to FALSE after subscription deletion")
             
+            account_id = await get_account_id_for_customer(client, customer_id)
+            if account_id:
+                await billing_gate.invalidate_plan(account_id)
+
             logger.info(f"Processed {event.type} event for customer {customer_id}")
         
         return {"status": "success"}
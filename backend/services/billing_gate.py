@@ -0,0 +1,140 @@
+"""
+Cached billing state for the per-iteration billing gate.
+
+check_billing_status asks Stripe for the account's subscription and sums the
+durations of every agent run of the month. run_agent used to call it before
+every iteration. The gate keeps the two inputs in Redis instead:
+
+- billing:{account_id}:plan - the account's plan (price_id, plan_name and
+  minutes_limit). The Stripe webhook deletes it when a subscription of the
+  account changes; PLAN_TTL bounds how long a missed event can go unnoticed.
+- billing:{account_id}:usage:{YYYY-MM} - seconds used by finished agent runs
+  this month. Seeded from the monthly_usage ledger on a miss and incremented
+  as runs are recorded in the ledger. USAGE_TTL bounds the drift from runs
+  that finished while the counter was being seeded.
+
+Runs that are still going are not in the counter; callers add the elapsed
+time of their own run, capped at ACTIVE_RUN_CAP seconds like the database
+calculation does.
+"""
+
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from services import redis
+from utils.logger import logger
+
+PLAN_TTL = 900  # seconds a cached plan is trusted without a webhook
+USAGE_TTL = 3600  # seconds before the usage counter is re-seeded from the database
+ACTIVE_RUN_CAP = 1800  # seconds of an unfinished run that count towards usage
+
+UNLIMITED = 'unlimited'
+
+
+def plan_key(account_id: str) -> str:
+    return f"billing:{account_id}:plan"
+
+
+def usage_key(account_id: str, now: Optional[datetime] = None) -> str:
+    now = now or datetime.now(timezone.utc)
+    return f"billing:{account_id}:usage:{now.strftime('%Y-%m')}"
+
+
+async def read_state(account_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[float]]:
+    """
+    Read the cached plan and month-to-date usage of an account in one round trip.
+
+    Returns:
+        (plan, used_seconds); either is None when it is not cached
+    """
+    pipe = await redis.pipeline()
+    pipe.get(plan_key(account_id))
+    pipe.get(usage_key(account_id))
+    plan_json, used = await pipe.execute()
+    plan = json.loads(plan_json) if plan_json else None
+    return plan, float(used) if used is not None else None
+
+
+async def store_plan(account_id: str, plan: Dict[str, Any]) -> None:
+    await redis.set(plan_key(account_id), json.dumps(plan, default=str), ex=PLAN_TTL)
+
+
+async def invalidate_plan(account_id: str) -> None:
+    """Drop the cached plan of an account, e.g. after a subscription change."""
+    await redis.delete(plan_key(account_id))
+    logger.debug(f"Invalidated cached billing plan for account {account_id}")
+
+
+async def seed_usage(account_id: str, used_seconds: float) -> float:
+    """
+    Store the month-to-date usage computed from the database.
+
+    A counter seeded concurrently by another worker wins; its value is returned.
+    """
+    key = usage_key(account_id)
+    pipe = await redis.pipeline()
+    pipe.set(key, used_seconds, ex=USAGE_TTL, nx=True)
+    pipe.get(key)
+    _, current = await pipe.execute()
+    return float(current) if current is not None else used_seconds
+
+
+async def invalidate_usage(account_id: str) -> None:
+    """Drop the usage counter of an account so it is re-seeded from the ledger."""
+    await redis.delete(usage_key(account_id))
+
+
+# Increments a seeded counter only. The counter keeps the TTL set by its seed,
+# so USAGE_TTL still bounds its drift; a counter without one gets USAGE_TTL.
+_ADD_RUN_USAGE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('INCRBYFLOAT', KEYS[1], ARGV[1])
+if redis.call('TTL', KEYS[1]) < 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 1
+"""
+
+
+async def add_run_usage(account_id: str, started_at: datetime, seconds: float) -> bool:
+    """
+    Add the duration of a finished run to the usage counter of the month it started in.
+
+    A counter that is not seeded is left alone, the next seed includes the run.
+
+    Returns:
+        True if the counter was incremented
+    """
+    if seconds <= 0:
+        return False
+
+    key = usage_key(account_id, started_at)
+    # Checked and incremented in one step: INCRBYFLOAT on a counter that expired
+    # in between would create a key without TTL that seed_usage never replaces
+    incremented = await redis.eval(_ADD_RUN_USAGE_SCRIPT, [key], [seconds, USAGE_TTL])
+    return bool(incremented)
+
+
+def evaluate(plan: Dict[str, Any], used_seconds: float, active_seconds: float = 0.0) -> Tuple[bool, str, Dict[str, Any]]:
+    """
+    Decide whether an account may keep running agents.
+
+    Args:
+        plan: The cached plan
+        used_seconds: Month-to-date usage of finished runs
+        active_seconds: Elapsed time of the caller's own unfinished run
+
+    Returns:
+        Tuple[bool, str, Dict]: (can_run, message, plan), like check_billing_status
+    """
+    minutes_limit = plan.get('minutes_limit')
+    if minutes_limit == UNLIMITED or minutes_limit is None:
+        return True, "OK", plan
+
+    used_seconds += min(max(active_seconds, 0.0), ACTIVE_RUN_CAP)
+    if used_seconds / 60 >= minutes_limit:
+        return False, f"Monthly limit of {minutes_limit} minutes reached. Please upgrade your plan or wait until next month.", plan
+    return True, "OK", plan
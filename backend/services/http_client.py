@@ -0,0 +1,54 @@
+"""
+Shared, pooled HTTP clients.
+
+Creating an ``httpx.AsyncClient`` per request pays a new TCP and TLS handshake
+every time. get_http_client keeps one client per name and event loop (clients
+cannot be shared between loops) so connections to an upstream API are reused
+by every tool call and agent run in the process:
+
+    client = get_http_client("firecrawl", timeout=120, http2=True)
+    response = await client.post(url, json=payload)
+
+HTTP/2 is only enabled when the optional ``h2`` package is installed;
+otherwise the client falls back to HTTP/1.1 keep-alive connections.
+"""
+
+import asyncio
+import importlib.util
+from typing import Dict, Tuple
+
+import httpx
+
+from utils.logger import logger
+
+MAX_CONNECTIONS = 50  # pooled connections per client
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_clients: Dict[Tuple[str, asyncio.AbstractEventLoop], httpx.AsyncClient] = {}
+
+
+def get_http_client(name: str, timeout: float = 30.0, http2: bool = False) -> httpx.AsyncClient:
+    """
+    Shared HTTP client ``name`` of the running event loop.
+
+    Args:
+        name: Client name, e.g. the upstream API; the first call's options win
+        timeout: Default timeout of requests in seconds
+        http2: Negotiate HTTP/2 if the h2 package is installed
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get((name, loop))
+    if client is None or client.is_closed:
+        # Drop clients of event loops that have finished
+        for stale in [key for key in _clients if key[1].is_closed()]:
+            del _clients[stale]
+        if http2 and not HTTP2_AVAILABLE:
+            logger.debug(f"h2 is not installed, HTTP client {name} uses HTTP/1.1")
+        client = httpx.AsyncClient(
+            timeout=timeout,
+            http2=http2 and HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+        )
+        _clients[(name, loop)] = client
+    return client
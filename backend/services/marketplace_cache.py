@@ -0,0 +1,207 @@
+"""
+Read model of the agent marketplace.
+
+GET /marketplace/agents used to call get_marketplace_agents for every browse
+request, and then sorted and filtered only the page it got back. Marketplace
+content changes rarely, so every public agent is kept in one denormalized
+snapshot instead:
+
+- marketplace:snapshot - JSON of all public agents (as returned by
+  get_marketplace_agents), shared by all workers. Rebuilt from the database
+  when it is missing, outdated or older than SNAPSHOT_TTL; a lock makes one
+  worker rebuild it while the others keep serving their copy.
+- marketplace:version - incremented by invalidate() when an agent is
+  published or unpublished. Snapshots record the version they were built at.
+
+Each worker keeps the snapshot in memory with its sort orders, tag index and
+search text precomputed, and checks marketplace:version at most every
+VERSION_CHECK_INTERVAL seconds. Browse requests are then answered without
+database queries. Download counts change as agents are added to libraries;
+they are refreshed with the snapshot, within SNAPSHOT_TTL.
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from services import redis
+from utils.logger import logger
+
+SNAPSHOT_TTL = 300  # seconds before the snapshot is rebuilt from the database
+VERSION_CHECK_INTERVAL = 5  # seconds a worker serves its copy without checking for invalidations
+REBUILD_LOCK_TTL = 30  # seconds a worker may take to rebuild the snapshot
+MAX_AGENTS = 5000  # public agents loaded into the snapshot
+
+SNAPSHOT_KEY = "marketplace:snapshot"
+VERSION_KEY = "marketplace:version"
+REBUILD_LOCK_KEY = "marketplace:snapshot:lock"
+
+SORT_ORDERS = ("newest", "popular", "most_downloaded", "name")
+
+
+class MarketplaceSnapshot:
+    """All public agents with their sort orders, tag index and search text precomputed."""
+
+    def __init__(self, agents: List[Dict[str, Any]], version: int, built_at: float):
+        self.agents = agents
+        self.version = version
+        self.built_at = built_at
+        self.checked_at = time.monotonic()
+
+        indexes = range(len(agents))
+        newest = sorted(indexes, key=lambda i: agents[i].get('marketplace_published_at') or '', reverse=True)
+        most_downloaded = sorted(newest, key=lambda i: agents[i].get('download_count') or 0, reverse=True)
+        self._orders = {
+            "newest": newest,
+            "popular": most_downloaded,
+            "most_downloaded": most_downloaded,
+            "name": sorted(indexes, key=lambda i: (agents[i].get('name') or '').lower()),
+        }
+
+        self._tags: Dict[str, Set[int]] = {}
+        self._search_text: List[str] = []
+        self._creators: List[str] = []
+        for i, agent in enumerate(agents):
+            tags = agent.get('tags') or []
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(i)
+            self._search_text.append("\n".join([agent.get('name') or '', agent.get('description') or '', *tags]).lower())
+            self._creators.append((agent.get('creator_name') or '').lower())
+
+    def query(
+        self,
+        offset: int,
+        limit: int,
+        search: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        sort_by: str = "newest",
+        creator: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        A page of the agents matching the filters, in sort order.
+
+        Args:
+            offset: Number of matching agents to skip
+            limit: Maximum number of agents to return
+            search: Case-insensitive text searched in name, description and tags
+            tags: Agents with any of these tags
+            sort_by: One of SORT_ORDERS; unknown values sort by newest
+            creator: Case-insensitive text searched in the creator's name
+
+        Returns:
+            (agents, total) - the page and the number of matching agents
+        """
+        candidates = None
+        if tags:
+            candidates = set().union(*(self._tags.get(tag, ()) for tag in tags))
+        search = search.lower() if search else None
+        creator = creator.lower() if creator else None
+
+        matches = [
+            i for i in self._orders.get(sort_by, self._orders["newest"])
+            if (candidates is None or i in candidates)
+            and (search is None or search in self._search_text[i])
+            and (creator is None or creator in self._creators[i])
+        ]
+        return [self.agents[i] for i in matches[offset:offset + limit]], len(matches)
+
+
+class MarketplaceCache:
+    """
+    Per-worker copy of the marketplace snapshot, backed by Redis.
+
+    Args:
+        load_agents: Loads all public agents from the database
+    """
+
+    def __init__(self, load_agents: Callable[[], Awaitable[List[Dict[str, Any]]]]):
+        self.load_agents = load_agents
+        self._snapshot: Optional[MarketplaceSnapshot] = None
+        self._lock = asyncio.Lock()
+        self.rebuilds = 0
+
+    async def get_snapshot(self) -> MarketplaceSnapshot:
+        """The current snapshot, refreshed from Redis or the database when it is outdated."""
+        snapshot = self._snapshot
+        if snapshot and time.monotonic() - snapshot.checked_at < VERSION_CHECK_INTERVAL:
+            return snapshot
+
+        async with self._lock:
+            snapshot = self._snapshot
+            if snapshot and time.monotonic() - snapshot.checked_at < VERSION_CHECK_INTERVAL:
+                return snapshot
+            self._snapshot = await self._refresh(snapshot)
+            return self._snapshot
+
+    async def _refresh(self, snapshot: Optional[MarketplaceSnapshot]) -> MarketplaceSnapshot:
+        try:
+            pipe = await redis.pipeline()
+            pipe.get(VERSION_KEY)
+            pipe.get(SNAPSHOT_KEY)
+            version, stored = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Marketplace cache unavailable: {str(e)}")
+            if snapshot and time.time() - snapshot.built_at < SNAPSHOT_TTL:
+                snapshot.checked_at = time.monotonic()
+                return snapshot
+            return await self._build(version=0, store=False)
+
+        version = int(version or 0)
+        if snapshot and snapshot.version == version and time.time() - snapshot.built_at < SNAPSHOT_TTL:
+            snapshot.checked_at = time.monotonic()
+            return snapshot
+
+        if stored:
+            stored = json.loads(stored)
+            if stored['version'] == version and time.time() - stored['built_at'] < SNAPSHOT_TTL:
+                return MarketplaceSnapshot(stored['agents'], version, stored['built_at'])
+
+        # One worker rebuilds the snapshot; the others keep serving their copy meanwhile
+        try:
+            locked = await redis.set(REBUILD_LOCK_KEY, "1", ex=REBUILD_LOCK_TTL, nx=True)
+        except Exception as e:
+            logger.warning(f"Failed to lock marketplace snapshot rebuild: {str(e)}")
+            locked = False
+        if locked:
+            try:
+                return await self._build(version, store=True)
+            finally:
+                try:
+                    await redis.delete(REBUILD_LOCK_KEY)
+                except Exception as e:
+                    logger.warning(f"Failed to unlock marketplace snapshot rebuild: {str(e)}")
+        if snapshot:
+            snapshot.checked_at = time.monotonic()
+            return snapshot
+        return await self._build(version, store=False)
+
+    async def _build(self, version: int, store: bool) -> MarketplaceSnapshot:
+        agents = await self.load_agents()
+        if len(agents) >= MAX_AGENTS:
+            logger.warning(f"Marketplace snapshot holds only the newest {MAX_AGENTS} public agents")
+        snapshot = MarketplaceSnapshot(agents, version, time.time())
+        self.rebuilds += 1
+        if store:
+            try:
+                # A version bumped while loading makes the stored snapshot outdated, so it is rebuilt
+                await redis.set(SNAPSHOT_KEY, json.dumps({
+                    'version': version,
+                    'built_at': snapshot.built_at,
+                    'agents': agents
+                }, default=str), ex=SNAPSHOT_TTL)
+            except Exception as e:
+                logger.warning(f"Failed to store marketplace snapshot: {str(e)}")
+        logger.info(f"Built marketplace snapshot of {len(agents)} agents (version {version})")
+        return snapshot
+
+    async def invalidate(self) -> None:
+        """Make all workers rebuild the snapshot, e.g. after an agent is published or unpublished."""
+        self._snapshot = None
+        try:
+            pipe = await redis.pipeline()
+            pipe.incr(VERSION_KEY)
+            pipe.delete(SNAPSHOT_KEY)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to invalidate marketplace snapshot: {str(e)}")
@@ -132,6 +132,12 @@ async def create_pubsub():
     return redis_client.pubsub()
 
 
+async def pipeline(transaction: bool = False):
+    """Create a Redis pipeline for sending several commands in one round-trip."""
+    redis_client = await get_client()
+    return redis_client.pipeline(transaction=transaction)
+
+
 # List operations
 async def rpush(key: str, *values: Any):
     """Append one or more values to a list."""
@@ -151,6 +157,32 @@ async def llen(key: str) -> int:
     return await redis_client.llen(key)
 
 
+# Stream operations
+async def xadd(key: str, fields: dict, maxlen: int = None, approximate: bool = True) -> str:
+    """Append an entry to a stream."""
+    redis_client = await get_client()
+    return await redis_client.xadd(key, fields, maxlen=maxlen, approximate=approximate)
+
+
+async def xrange(key: str, min: str = "-", max: str = "+", count: int = None) -> List[Any]:
+    """Get a range of entries from a stream."""
+    redis_client = await get_client()
+    return await redis_client.xrange(key, min=min, max=max, count=count)
+
+
+async def xread(streams: dict, count: int = None, block: int = None) -> List[Any]:
+    """Read entries newer than the given IDs from one or more streams."""
+    redis_client = await get_client()
+    return await redis_client.xread(streams, count=count, block=block)
+
+
+# Scripting
+async def eval(script: str, keys: List[str], args: List[Any]) -> Any:
+    """Run a Lua script atomically on the server."""
+    redis_client = await get_client()
+    return await redis_client.eval(script, len(keys), *keys, *args)
+
+
 # Key management
 async def expire(key: str, time: int):
     """Set a key's time to live in seconds."""
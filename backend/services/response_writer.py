@@ -0,0 +1,213 @@
+"""
+Batched Redis writer for streamed agent run responses.
+
+Every response yielded by an agent run is appended to the run's Redis list and
+announced on its notification channel. Instead of one RPUSH and one PUBLISH per
+response, RunResponseWriter coalesces responses that arrive within a short
+window into a single pipelined RPUSH + PUBLISH.
+
+Guarantees:
+- Ordering: batches are sent one at a time, in the order responses were written.
+- Backpressure: write() flushes inline once too many responses are buffered.
+- Terminal statuses (completed/failed/stopped/error) are flushed before write()
+  returns, so subscribers see the final status as soon as the run ends.
+- Failures: a batch that cannot be sent after retries stays at the front of the
+  buffer, and the next write() or close() raises the error, so the run fails
+  instead of continuing with a gap in its response list.
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional, Union
+
+from prometheus_client import Counter, Histogram
+
+from services import redis
+from utils.logger import logger
+from utils.retry import retry
+
+TERMINAL_STATUSES = {"completed", "failed", "stopped", "error"}
+
+RESPONSE_BATCH_SIZE = Histogram(
+    "agent_run_response_batch_size",
+    "Number of responses sent per pipelined RPUSH+PUBLISH batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+RESPONSE_FLUSH_SECONDS = Histogram(
+    "agent_run_response_flush_seconds",
+    "Latency of a pipelined response batch flush",
+)
+RESPONSE_FLUSH_FAILURES = Counter(
+    "agent_run_response_flush_failures_total",
+    "Response batches that could not be written to Redis",
+)
+
+
+def is_terminal_response(response: Dict[str, Any]) -> bool:
+    """Check whether a response marks the end of an agent run."""
+    return response.get("type") == "status" and response.get("status") in TERMINAL_STATUSES
+
+
+class RunResponseWriter:
+    """
+    Per-run writer that coalesces responses into pipelined Redis batches.
+
+    Usage:
+        writer = RunResponseWriter(response_list_key, response_channel)
+        async for response in agent_gen:
+            await writer.write(response)
+        await writer.close()
+    """
+
+    def __init__(
+        self,
+        response_list_key: str,
+        response_channel: Optional[str],
+        max_batch_size: int = 64,
+        flush_interval: float = 0.005,
+        max_pending: int = 512,
+    ):
+        """
+        Initialize the writer.
+
+        Args:
+            response_list_key: Redis list holding the run's responses
+            response_channel: Channel notified with "new" after each batch (None to skip)
+            max_batch_size: Maximum number of responses per RPUSH
+            flush_interval: Seconds to wait for more responses before flushing
+            max_pending: Buffered responses at which write() flushes inline
+        """
+        self.response_list_key = response_list_key
+        self.response_channel = response_channel
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max(max_pending, max_batch_size)
+
+        self._buffer: List[str] = []
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._closed = False
+        self._error: Optional[Exception] = None
+
+        # Batch statistics for this run
+        self.responses_written = 0
+        self.batches_written = 0
+        self.max_batch_written = 0
+        self.failed_batches = 0
+
+    async def write(self, response: Union[Dict[str, Any], str]) -> None:
+        """
+        Queue a response for the next batch.
+
+        Args:
+            response: The response dict (or its JSON string)
+        """
+        if self._closed:
+            raise RuntimeError("Cannot write to a closed response writer")
+        if self._error:
+            raise self._error
+
+        if isinstance(response, str):
+            response_json = response
+            terminal = False
+        else:
+            response_json = json.dumps(response)
+            terminal = is_terminal_response(response)
+
+        self._buffer.append(response_json)
+
+        if terminal or len(self._buffer) >= self.max_pending:
+            await self.flush()
+            return
+
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+        self._wakeup.set()
+
+    async def flush(self) -> None:
+        """Send everything buffered so far and wait for Redis to acknowledge it.
+
+        Also retries a batch that failed before, in order.
+        """
+        async with self._flush_lock:
+            await self._flush_buffer()
+
+    async def close(self) -> None:
+        """
+        Flush remaining responses and stop the background flusher.
+
+        Raises:
+            The error of a batch that failed earlier, even if it was sent now
+        """
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._flusher and not self._flusher.done():
+            # Only cancel the flusher between sends, never in the middle of one
+            async with self._flush_lock:
+                self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+
+        try:
+            await self.flush()
+            if self._error:
+                raise self._error
+        finally:
+            logger.info(
+                f"Response writer for {self.response_list_key} closed: {self.responses_written} responses "
+                f"in {self.batches_written} batches (avg {self.average_batch_size:.1f}, max {self.max_batch_written}, "
+                f"failed {self.failed_batches})"
+            )
+
+    @property
+    def average_batch_size(self) -> float:
+        return self.responses_written / self.batches_written if self.batches_written else 0.0
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            # Give the generator a short window to produce more responses
+            if len(self._buffer) < self.max_batch_size:
+                await asyncio.sleep(self.flush_interval)
+
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush responses to {self.response_list_key}: {str(e)}")
+
+    async def _flush_buffer(self) -> None:
+        while self._buffer:
+            batch = self._buffer[:self.max_batch_size]
+            del self._buffer[:self.max_batch_size]
+
+            started = time.monotonic()
+            try:
+                await retry(lambda: self._send_batch(batch), max_attempts=3, delay_seconds=1)
+            except Exception as e:
+                # Keep the batch, ahead of responses written meanwhile, for the next flush
+                self._buffer[:0] = batch
+                self._error = e
+                self.failed_batches += 1
+                RESPONSE_FLUSH_FAILURES.inc()
+                raise
+
+            RESPONSE_FLUSH_SECONDS.observe(time.monotonic() - started)
+            RESPONSE_BATCH_SIZE.observe(len(batch))
+            self.responses_written += len(batch)
+            self.batches_written += 1
+            self.max_batch_written = max(self.max_batch_written, len(batch))
+
+    async def _send_batch(self, batch: List[str]) -> None:
+        pipe = await redis.pipeline(transaction=True)
+        pipe.rpush(self.response_list_key, *batch)
+        if self.response_channel:
+            pipe.publish(self.response_channel, "new")
+        await pipe.execute()
@@ -0,0 +1,175 @@
+"""
+Process-wide control-channel multiplexer for agent runs.
+
+Instead of one pub/sub connection and one polling coroutine per running agent,
+each worker process pattern-subscribes once to ``agent_run:*:control*`` and
+dispatches STOP signals to the matching run through an asyncio.Event. A single
+heartbeat refreshes the TTL of every active run key in one pipelined request.
+"""
+
+import asyncio
+from typing import Dict, Optional
+
+from services import redis
+from utils.logger import logger
+from utils.retry import retry
+
+CONTROL_PATTERN = "agent_run:*:control*"
+HEARTBEAT_INTERVAL = 60  # seconds between TTL refreshes of active run keys
+RECONNECT_DELAY = 1  # seconds before resubscribing after a listener failure
+
+
+class _ActiveRun:
+    __slots__ = ("stop_event", "active_key")
+
+    def __init__(self, active_key: Optional[str]):
+        self.stop_event = asyncio.Event()
+        self.active_key = active_key
+
+
+class RunControlMultiplexer:
+    """
+    Shares one pattern subscription and one heartbeat across all runs in a worker.
+
+    Usage:
+        stop_event = await run_control.register(agent_run_id, instance_active_key)
+        try:
+            ...  # check stop_event.is_set() between responses
+        finally:
+            await run_control.unregister(agent_run_id)
+    """
+
+    def __init__(self, instance_id: str = "single"):
+        self.instance_id = instance_id
+        self._runs: Dict[str, _ActiveRun] = {}
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def active_runs(self) -> int:
+        return len(self._runs)
+
+    async def register(self, agent_run_id: str, active_key: Optional[str] = None) -> asyncio.Event:
+        """
+        Start tracking a run.
+
+        Args:
+            agent_run_id: The agent run to dispatch control signals to
+            active_key: Redis key whose TTL the heartbeat keeps refreshed
+
+        Returns:
+            Event that is set when a STOP signal arrives for the run
+        """
+        async with self._lock:
+            await self._ensure_started()
+            run = _ActiveRun(active_key)
+            self._runs[agent_run_id] = run
+        logger.debug(f"Registered agent run {agent_run_id} for control signals ({len(self._runs)} active)")
+        return run.stop_event
+
+    async def unregister(self, agent_run_id: str) -> None:
+        """Stop tracking a run; shuts the listener down once no runs remain."""
+        async with self._lock:
+            self._runs.pop(agent_run_id, None)
+            if not self._runs:
+                await self._shutdown()
+
+    def dispatch(self, channel: str, data: str) -> None:
+        """Route a control message received on ``channel`` to its run."""
+        # Channel format: agent_run:{agent_run_id}:control[:{instance_id}]
+        parts = channel.split(":")
+        if len(parts) < 3 or parts[0] != "agent_run" or parts[2] != "control":
+            return
+        if len(parts) == 4 and parts[3] != self.instance_id:
+            return
+        if data != "STOP":
+            return
+
+        run = self._runs.get(parts[1])
+        if run and not run.stop_event.is_set():
+            logger.info(f"Received STOP signal for agent run {parts[1]} (Instance: {self.instance_id})")
+            run.stop_event.set()
+
+    async def _ensure_started(self) -> None:
+        if self._listener and not self._listener.done():
+            return
+        await self._subscribe()
+        self._listener = asyncio.create_task(self._listen())
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def _subscribe(self) -> None:
+        self._pubsub = await redis.create_pubsub()
+        try:
+            await retry(lambda: self._pubsub.psubscribe(CONTROL_PATTERN))
+        except Exception as e:
+            logger.error(f"Redis failed to subscribe to control channels: {e}", exc_info=True)
+            raise
+        logger.debug(f"Pattern-subscribed to control channels: {CONTROL_PATTERN}")
+
+    async def _close_pubsub(self) -> None:
+        if self._pubsub:
+            try:
+                await self._pubsub.punsubscribe()
+                await self._pubsub.close()
+            except Exception as e:
+                logger.warning(f"Error closing control pubsub: {str(e)}")
+            self._pubsub = None
+
+    async def _shutdown(self) -> None:
+        for task in (self._listener, self._heartbeat):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._listener = None
+        self._heartbeat = None
+        await self._close_pubsub()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if not message or message.get("type") != "pmessage":
+                        continue
+                    channel = message.get("channel")
+                    data = message.get("data")
+                    if isinstance(channel, bytes): channel = channel.decode('utf-8')
+                    if isinstance(data, bytes): data = data.decode('utf-8')
+                    self.dispatch(channel, data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Control channel listener failed, resubscribing: {e}", exc_info=True)
+
+            await self._close_pubsub()
+            await asyncio.sleep(RECONNECT_DELAY)
+            try:
+                await self._subscribe()
+            except Exception:
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            await self.refresh_ttls()
+
+    async def refresh_ttls(self) -> None:
+        """Refresh the TTL of every active run key in one pipelined request."""
+        keys = [run.active_key for run in self._runs.values() if run.active_key]
+        if not keys:
+            return
+        try:
+            pipe = await redis.pipeline()
+            for key in keys:
+                pipe.expire(key, redis.REDIS_KEY_TTL)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to refresh TTL for {len(keys)} active run keys: {e}")
+
+
+# Shared multiplexer for this worker process
+run_control = RunControlMultiplexer()
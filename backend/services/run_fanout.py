@@ -0,0 +1,268 @@
+"""
+Per-process fan-out hub for SSE viewers of agent runs.
+
+Every browser tab following /agent-run/{id}/stream used to open its own pair
+of pub/sub connections and run its own list reads. The hub keeps one Redis
+follower per agent run per API worker: it reads the run's output once (list +
+pub/sub, or Redis Streams when AGENT_RUN_TRANSPORT=stream), stores the most
+recent responses in a ring buffer and wakes every local viewer.
+
+Viewers keep their own cursor into the ring, so a response is stored once no
+matter how many viewers there are. A viewer that falls behind the ring is
+handled by its slow-consumer policy:
+
+- "resync": re-read the missed responses from Redis and carry on
+- "disconnect": end the viewer's stream with an error status
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from services import redis
+from services import run_stream
+from utils.logger import logger
+
+DEFAULT_RING_SIZE = 2000
+CONTROL_SIGNALS = ("STOP", "END_STREAM", "ERROR")
+
+SLOW_CONSUMER_RESYNC = "resync"
+SLOW_CONSUMER_DISCONNECT = "disconnect"
+
+
+class RunFanout:
+    """Shared follower and ring buffer for one agent run."""
+
+    def __init__(self, agent_run_id: str, ring_size: int = DEFAULT_RING_SIZE):
+        self.agent_run_id = agent_run_id
+        self.ring_size = ring_size
+        # Holds between ring_size and 2 * ring_size of the latest responses
+        self.ring: List[Dict[str, Any]] = []
+        # Sequence number of the next response; equals the run's response count
+        self.next_seq = 0
+        self.viewers = 0
+        # Set once the backlog present at start has been loaded
+        self.ready = asyncio.Event()
+        # Control signal ("STOP", "END_STREAM", "ERROR") once the run's output has ended
+        self.control_signal: Optional[str] = None
+        self.error: Optional[str] = None
+
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest response still in the ring."""
+        return self.next_seq - len(self.ring)
+
+    @property
+    def finished(self) -> bool:
+        return self.control_signal is not None or self.error is not None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._follow())
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def wait_for_change(self) -> None:
+        """Wait until new responses arrive or the run's output ends."""
+        changed = self._changed
+        await changed.wait()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def _append(self, response: Dict[str, Any]) -> None:
+        self.ring.append(response)
+        self.next_seq += 1
+        if len(self.ring) >= 2 * self.ring_size:
+            # Trim in bulk so appends and indexed reads stay O(1) amortized
+            del self.ring[:len(self.ring) - self.ring_size]
+
+    async def read_all(self) -> List[Dict[str, Any]]:
+        """Read every response of the run directly from Redis."""
+        if run_stream.use_streams():
+            return await run_stream.read_all_responses(self.agent_run_id)
+        all_responses_json = await redis.lrange(f"agent_run:{self.agent_run_id}:responses", 0, -1)
+        return [json.loads(r) for r in all_responses_json]
+
+    async def _follow(self) -> None:
+        try:
+            if run_stream.use_streams():
+                await self._follow_stream()
+            else:
+                await self._follow_list()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Fan-out follower for agent run {self.agent_run_id} failed: {e}", exc_info=True)
+            self.error = str(e)
+        finally:
+            self.ready.set()
+            self._notify()
+
+    async def _follow_list(self) -> None:
+        response_list_key = f"agent_run:{self.agent_run_id}:responses"
+        response_channel = f"agent_run:{self.agent_run_id}:new_response"
+        control_channel = f"agent_run:{self.agent_run_id}:control"
+
+        async def read_new() -> None:
+            new_responses_json = await redis.lrange(response_list_key, self.next_seq, -1)
+            for response_json in new_responses_json:
+                self._append(json.loads(response_json))
+            if new_responses_json:
+                self._notify()
+
+        # Subscribe before the initial read so no notification is missed
+        pubsub = await redis.create_pubsub()
+        try:
+            await pubsub.subscribe(response_channel, control_channel)
+            await read_new()
+            self.ready.set()
+            self._notify()
+
+            async for message in pubsub.listen():
+                if not message or message.get("type") != "message":
+                    continue
+                channel = message.get("channel")
+                data = message.get("data")
+                if isinstance(data, bytes): data = data.decode('utf-8')
+
+                if channel == response_channel and data == "new":
+                    await read_new()
+                elif channel == control_channel and data in CONTROL_SIGNALS:
+                    logger.info(f"Received control signal '{data}' for {self.agent_run_id}")
+                    await read_new()
+                    self.control_signal = data
+                    return
+        finally:
+            try:
+                await pubsub.unsubscribe()
+                await pubsub.close()
+            except Exception as e:
+                logger.warning(f"Error closing fan-out pubsub for {self.agent_run_id}: {str(e)}")
+
+    async def _follow_stream(self) -> None:
+        stream_key = run_stream.response_stream_key(self.agent_run_id)
+        last_id = "0"
+        for entry_id, fields in await redis.xrange(stream_key):
+            last_id = entry_id
+            if run_stream.CONTROL_FIELD in fields:
+                self.control_signal = fields[run_stream.CONTROL_FIELD]
+                return
+            self._append(json.loads(fields[run_stream.DATA_FIELD]))
+        self.ready.set()
+        self._notify()
+
+        async for _, response, control_signal in run_stream.read_responses(self.agent_run_id, last_id):
+            if control_signal:
+                logger.info(f"Received control signal '{control_signal}' for {self.agent_run_id}")
+                self.control_signal = control_signal
+                return
+            self._append(response)
+            self._notify()
+
+
+class RunFanoutHub:
+    """Process-wide registry of RunFanout followers, keyed by agent_run_id."""
+
+    def __init__(self, ring_size: int = DEFAULT_RING_SIZE):
+        self.ring_size = ring_size
+        self._runs: Dict[str, RunFanout] = {}
+
+    def _acquire(self, agent_run_id: str) -> RunFanout:
+        fanout = self._runs.get(agent_run_id)
+        if fanout is None:
+            fanout = RunFanout(agent_run_id, self.ring_size)
+            self._runs[agent_run_id] = fanout
+            fanout.start()
+            logger.debug(f"Started fan-out follower for agent run {agent_run_id}")
+        fanout.viewers += 1
+        return fanout
+
+    async def _release(self, fanout: RunFanout) -> None:
+        fanout.viewers -= 1
+        if fanout.viewers > 0:
+            return
+        if self._runs.get(fanout.agent_run_id) is fanout:
+            del self._runs[fanout.agent_run_id]
+        await fanout.stop()
+        logger.debug(f"Stopped fan-out follower for agent run {fanout.agent_run_id}")
+
+    @property
+    def active_runs(self) -> int:
+        return len(self._runs)
+
+    async def subscribe(
+        self,
+        agent_run_id: str,
+        start_seq: int = 0,
+        slow_consumer_policy: str = SLOW_CONSUMER_RESYNC,
+        on_ready=None,
+    ) -> AsyncGenerator[Tuple[int, Optional[Dict[str, Any]], Optional[str]], None]:
+        """
+        Follow an agent run's responses from ``start_seq``.
+
+        Args:
+            agent_run_id: The agent run to follow
+            start_seq: Index of the first response to deliver
+            slow_consumer_policy: "resync" or "disconnect"
+            on_ready: Optional async callable invoked once the backlog present
+                      at subscription time has been delivered. Returning False
+                      ends the subscription.
+
+        Yields:
+            Tuples of (seq, response, control_signal); exactly one of
+            response and control_signal is set. Failures are reported as an
+            "ERROR" control signal.
+        """
+        fanout = self._acquire(agent_run_id)
+        seq = start_seq
+        try:
+            await fanout.ready.wait()
+            backlog_end = fanout.next_seq
+
+            while True:
+                if seq < fanout.first_seq:
+                    if slow_consumer_policy == SLOW_CONSUMER_DISCONNECT:
+                        logger.warning(f"Viewer of {agent_run_id} fell {fanout.first_seq - seq} responses behind; disconnecting")
+                        yield seq, None, "ERROR"
+                        return
+                    # Catch up on what the ring no longer holds
+                    missed = (await fanout.read_all())[seq:fanout.first_seq]
+                    for response in missed:
+                        yield seq, response, None
+                        seq += 1
+                    seq = max(seq, fanout.first_seq)
+                    continue
+
+                if seq < fanout.next_seq:
+                    response = fanout.ring[seq - fanout.first_seq]
+                    yield seq, response, None
+                    seq += 1
+                    continue
+
+                if on_ready is not None and seq >= backlog_end:
+                    callback, on_ready = on_ready, None
+                    if await callback() is False:
+                        return
+                    continue
+
+                if fanout.finished:
+                    yield seq, None, fanout.control_signal or "ERROR"
+                    return
+
+                await fanout.wait_for_change()
+        finally:
+            await self._release(fanout)
+
+
+# Shared hub for this API worker
+hub = RunFanoutHub()
@@ -0,0 +1,104 @@
+"""
+Redis Streams transport for agent run output.
+
+An alternative to the list + pub/sub transport, enabled with
+AGENT_RUN_TRANSPORT=stream. Every response is appended to the run's stream
+with XADD, and viewers read it with XREAD BLOCK starting from the last entry
+ID they have seen. A notification no longer makes every viewer re-read the
+tail of a list, and a reconnecting client can resume from its last ID.
+
+Control signals (STOP, END_STREAM, ERROR) are appended to the same stream, so
+one blocking read per viewer covers both responses and control.
+"""
+
+import json
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from services import redis
+from services.response_writer import RunResponseWriter
+from utils.config import config
+from utils.logger import logger
+
+# Keep stream reads below the Redis client's 5 s socket timeout
+STREAM_BLOCK_MS = 2000
+# Approximate cap on entries kept per run
+STREAM_MAX_LEN = 100_000
+
+CONTROL_FIELD = "control"
+DATA_FIELD = "data"
+
+
+def use_streams() -> bool:
+    """Whether agent run output is transported through Redis Streams."""
+    return (config.AGENT_RUN_TRANSPORT or "list").lower() == "stream"
+
+
+def response_stream_key(agent_run_id: str) -> str:
+    return f"agent_run:{agent_run_id}:stream"
+
+
+class RunStreamWriter(RunResponseWriter):
+    """Response writer that appends batches to a Redis stream with pipelined XADDs."""
+
+    def __init__(self, agent_run_id: str, **kwargs):
+        super().__init__(response_stream_key(agent_run_id), None, **kwargs)
+
+    async def _send_batch(self, batch: List[str]) -> None:
+        pipe = await redis.pipeline(transaction=True)
+        for response_json in batch:
+            pipe.xadd(self.response_list_key, {DATA_FIELD: response_json}, maxlen=STREAM_MAX_LEN, approximate=True)
+        await pipe.execute()
+
+
+async def publish_control(agent_run_id: str, signal: str) -> None:
+    """Append a control signal to the run's stream."""
+    await redis.xadd(response_stream_key(agent_run_id), {CONTROL_FIELD: signal}, maxlen=STREAM_MAX_LEN)
+
+
+def _parse_entry(fields: Dict[str, str]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Split a stream entry into (response, control_signal)."""
+    if CONTROL_FIELD in fields:
+        return None, fields[CONTROL_FIELD]
+    return json.loads(fields[DATA_FIELD]), None
+
+
+async def read_all_responses(agent_run_id: str) -> List[Dict[str, Any]]:
+    """Read every response stored in the run's stream, skipping control entries."""
+    entries = await redis.xrange(response_stream_key(agent_run_id))
+    responses = []
+    for _, fields in entries:
+        response, _ = _parse_entry(fields)
+        if response is not None:
+            responses.append(response)
+    return responses
+
+
+async def read_responses(
+    agent_run_id: str,
+    last_id: str = "0",
+    block_ms: int = STREAM_BLOCK_MS,
+) -> AsyncGenerator[Tuple[str, Optional[Dict[str, Any]], Optional[str]], None]:
+    """
+    Follow the run's stream from ``last_id`` until a control signal arrives.
+
+    Yields:
+        Tuples of (entry_id, response, control_signal); exactly one of
+        response and control_signal is set.
+    """
+    stream_key = response_stream_key(agent_run_id)
+    while True:
+        result = await redis.xread({stream_key: last_id}, block=block_ms)
+        if not result:
+            continue
+
+        for _, entries in result:
+            for entry_id, fields in entries:
+                last_id = entry_id
+                try:
+                    response, control_signal = _parse_entry(fields)
+                except (KeyError, json.JSONDecodeError) as e:
+                    logger.warning(f"Skipping malformed stream entry {entry_id} for {agent_run_id}: {e}")
+                    continue
+                yield entry_id, response, control_signal
+                if control_signal:
+                    return
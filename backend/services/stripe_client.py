@@ -0,0 +1,150 @@
+"""
+Non-blocking, cached access to Stripe.
+
+The stripe SDK is synchronous, so every call made from a request handler or
+the agent loop used to block the event loop for a full Stripe round trip.
+run_sync runs SDK calls in a small thread pool and records their latency.
+
+The active subscriptions of a customer are looked up on almost every billing
+path. SubscriptionCache keeps them in Redis, shared by API and agent workers,
+for SUBSCRIPTION_TTL seconds; stripe_webhook drops a customer's entry when one
+of their subscriptions changes. Concurrent lookups of the same customer in a
+process share a single Stripe request.
+
+Set STRIPE_API_BASE to point the SDK at a local fake Stripe server such as
+stripe-mock.
+"""
+
+import asyncio
+import functools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, TypeVar
+
+import stripe
+from prometheus_client import Counter, Histogram
+
+from services import redis
+from utils.config import config
+from utils.logger import logger
+
+T = TypeVar("T")
+
+MAX_WORKERS = 16  # concurrent Stripe calls per process
+SUBSCRIPTION_TTL = 300  # seconds a customer's subscriptions are cached
+
+STRIPE_CALL_SECONDS = Histogram(
+    "stripe_call_seconds",
+    "Latency of Stripe API calls",
+    ["operation"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+STRIPE_CALL_FAILURES = Counter(
+    "stripe_call_failures_total",
+    "Stripe API calls that raised",
+    ["operation"],
+)
+SUBSCRIPTION_CACHE_LOOKUPS = Counter(
+    "stripe_subscription_cache_lookups_total",
+    "Subscription lookups by result: hit, miss or coalesced (joined an in-flight miss)",
+    ["result"],
+)
+
+stripe.api_key = config.STRIPE_SECRET_KEY
+if config.STRIPE_API_BASE:
+    stripe.api_base = config.STRIPE_API_BASE
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="stripe")
+
+
+async def run_sync(operation: str, fn: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run a blocking Stripe SDK call in the shared thread pool.
+
+    Args:
+        operation: Name recorded in the latency metrics, e.g. "Subscription.modify"
+        fn: The SDK callable
+
+    Returns:
+        The result of ``fn(*args, **kwargs)``
+    """
+    start = time.monotonic()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+    except Exception:
+        STRIPE_CALL_FAILURES.labels(operation).inc()
+        raise
+    finally:
+        STRIPE_CALL_SECONDS.labels(operation).observe(time.monotonic() - start)
+
+
+def _to_plain(value: Any) -> Any:
+    """Convert Stripe objects into plain dicts and lists that round-trip through JSON."""
+    return json.loads(json.dumps(value, default=str))
+
+
+class SubscriptionCache:
+    """Per-customer cache of active Stripe subscriptions."""
+
+    def __init__(self, ttl: int = SUBSCRIPTION_TTL):
+        self.ttl = ttl
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def _key(customer_id: str) -> str:
+        return f"stripe:subscriptions:{customer_id}"
+
+    async def list_active(self, customer_id: str) -> List[Dict[str, Any]]:
+        """Get the active subscriptions of a customer as plain dicts."""
+        try:
+            cached = await redis.get(self._key(customer_id))
+        except Exception as e:
+            logger.warning(f"Subscription cache unavailable: {str(e)}")
+            cached = None
+        if cached is not None:
+            SUBSCRIPTION_CACHE_LOOKUPS.labels("hit").inc()
+            return json.loads(cached)
+
+        loading = self._loading.get(customer_id)
+        if loading is None:
+            SUBSCRIPTION_CACHE_LOOKUPS.labels("miss").inc()
+            loading = asyncio.ensure_future(self._load(customer_id))
+            self._loading[customer_id] = loading
+            loading.add_done_callback(lambda done: self._forget(customer_id, done))
+        else:
+            SUBSCRIPTION_CACHE_LOOKUPS.labels("coalesced").inc()
+        # A cancelled caller must not cancel the lookup other callers are waiting on
+        return await asyncio.shield(loading)
+
+    async def _load(self, customer_id: str) -> List[Dict[str, Any]]:
+        subscriptions = await run_sync(
+            "Subscription.list",
+            stripe.Subscription.list,
+            customer=customer_id,
+            status='active'
+        )
+        data = _to_plain(subscriptions.get('data', []) if subscriptions else [])
+        if self._loading.get(customer_id) is not asyncio.current_task():
+            # Invalidated while the lookup was in flight; the result may predate the change
+            return data
+        try:
+            await redis.set(self._key(customer_id), json.dumps(data), ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Failed to cache subscriptions of customer {customer_id}: {str(e)}")
+        return data
+
+    def _forget(self, customer_id: str, loading: asyncio.Future) -> None:
+        if self._loading.get(customer_id) is loading:
+            del self._loading[customer_id]
+
+    async def invalidate(self, customer_id: str) -> None:
+        """Forget a customer's subscriptions, e.g. after a subscription event."""
+        # A lookup started before the change must not be joined by later callers
+        self._loading.pop(customer_id, None)
+        await redis.delete(self._key(customer_id))
+
+
+# Shared cache for this process
+subscription_cache = SubscriptionCache()
@@ -0,0 +1,89 @@
+"""
+Content-addressed cache of web search and scrape results.
+
+Agents often repeat the same Tavily query or scrape the same page, within a
+run and across runs. Results are cached in Redis under a hash of the request
+(the query and its options, or the URL and scrape formats), shared by all
+workers:
+
+- entries expire after the TTL given by the caller
+- results larger than MAX_ENTRY_BYTES are not cached
+- an index sorted by write time keeps at most MAX_ENTRIES entries per kind;
+  the oldest entries are evicted first
+"""
+
+import hashlib
+import json
+import time
+from typing import Any, Dict, Optional
+
+from services import redis
+from utils.logger import logger
+
+MAX_ENTRIES = 5000  # cached results per kind
+MAX_ENTRY_BYTES = 512 * 1024  # largest result that is cached
+
+
+def _index_key(kind: str) -> str:
+    return f"webcache:{kind}:index"
+
+
+class WebResultCache:
+    """Redis cache of web results of one kind, e.g. "search" or "scrape"."""
+
+    def __init__(self, kind: str, ttl: int, max_entries: int = MAX_ENTRIES, max_entry_bytes: int = MAX_ENTRY_BYTES):
+        self.kind = kind
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_entry_bytes = max_entry_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, request: Dict[str, Any]) -> str:
+        request_json = json.dumps(request, sort_keys=True, default=str)
+        digest = hashlib.sha256(request_json.encode()).hexdigest()[:32]
+        return f"webcache:{self.kind}:{digest}"
+
+    async def get(self, request: Dict[str, Any]) -> Optional[Any]:
+        """Cached result of a request, or None."""
+        try:
+            cached = await redis.get(self.key(request))
+        except Exception as e:
+            logger.warning(f"Web {self.kind} cache unavailable: {str(e)}")
+            return None
+        if cached is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(cached)
+
+    async def put(self, request: Dict[str, Any], result: Any) -> None:
+        """Cache the result of a request, evicting the oldest entries above max_entries."""
+        value = json.dumps(result, ensure_ascii=False)
+        if len(value.encode()) > self.max_entry_bytes:
+            return
+        key = self.key(request)
+        index = _index_key(self.kind)
+        now = time.time()
+        try:
+            pipe = await redis.pipeline()
+            pipe.set(key, value, ex=self.ttl)
+            pipe.zadd(index, {key: now})
+            # Entries older than the TTL have already expired
+            pipe.zremrangebyscore(index, "-inf", now - self.ttl)
+            pipe.zcard(index)
+            *_, size = await pipe.execute()
+            if size > self.max_entries:
+                await self._evict(index, size - self.max_entries)
+        except Exception as e:
+            logger.warning(f"Failed to cache web {self.kind} result: {str(e)}")
+
+    async def _evict(self, index: str, count: int) -> None:
+        pipe = await redis.pipeline()
+        pipe.zpopmin(index, count)
+        oldest, = await pipe.execute()
+        if oldest:
+            pipe = await redis.pipeline()
+            for key, _ in oldest:
+                pipe.delete(key)
+            await pipe.execute()
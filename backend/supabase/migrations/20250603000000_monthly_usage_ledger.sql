@@ -0,0 +1,142 @@
+BEGIN;
+
+-- Month-to-date agent run usage per account, maintained as runs finish
+CREATE TABLE IF NOT EXISTS monthly_usage (
+    account_id UUID NOT NULL REFERENCES basejump.accounts(id) ON DELETE CASCADE,
+    month DATE NOT NULL,
+    seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    run_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (account_id, month)
+);
+
+-- Billed duration of a finished run; NULL until the run is recorded in monthly_usage
+ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS usage_seconds DOUBLE PRECISION;
+
+CREATE INDEX IF NOT EXISTS idx_agent_runs_started_at ON agent_runs(started_at);
+
+ALTER TABLE monthly_usage ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS monthly_usage_select_own ON monthly_usage;
+CREATE POLICY monthly_usage_select_own ON monthly_usage
+    FOR SELECT
+    USING (basejump.has_role_on_account(account_id));
+
+-- Billed duration of a run: runs longer than 4 hours are treated as errors and not billed
+CREATE OR REPLACE FUNCTION agent_run_usage_seconds(p_started_at TIMESTAMPTZ, p_completed_at TIMESTAMPTZ)
+RETURNS DOUBLE PRECISION
+IMMUTABLE
+LANGUAGE sql
+AS $$
+    SELECT CASE
+        WHEN EXTRACT(EPOCH FROM (p_completed_at - p_started_at)) > 14400 THEN 0
+        ELSE GREATEST(EXTRACT(EPOCH FROM (p_completed_at - p_started_at)), 0)
+    END::DOUBLE PRECISION;
+$$;
+
+-- Add a finished run to the ledger. Each run is recorded once; returns NULL
+-- if the run is not finished or was already recorded.
+CREATE OR REPLACE FUNCTION record_agent_run_usage(p_agent_run_id UUID)
+RETURNS JSONB
+SECURITY DEFINER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_account_id UUID;
+    v_started_at TIMESTAMPTZ;
+    v_seconds DOUBLE PRECISION;
+    v_month DATE;
+BEGIN
+    UPDATE agent_runs
+    SET usage_seconds = agent_run_usage_seconds(started_at, completed_at)
+    WHERE id = p_agent_run_id
+        AND usage_seconds IS NULL
+        AND completed_at IS NOT NULL
+        AND status IN ('completed', 'failed', 'stopped')
+    RETURNING started_at, usage_seconds INTO v_started_at, v_seconds;
+
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT t.account_id INTO v_account_id
+    FROM agent_runs r
+    JOIN threads t ON t.thread_id = r.thread_id
+    WHERE r.id = p_agent_run_id;
+
+    IF v_account_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    v_month := date_trunc('month', v_started_at AT TIME ZONE 'UTC')::DATE;
+
+    INSERT INTO monthly_usage AS u (account_id, month, seconds, run_count)
+    VALUES (v_account_id, v_month, v_seconds, 1)
+    ON CONFLICT (account_id, month) DO UPDATE
+    SET seconds = u.seconds + EXCLUDED.seconds,
+        run_count = u.run_count + 1,
+        updated_at = NOW();
+
+    RETURN jsonb_build_object(
+        'account_id', v_account_id,
+        'started_at', v_started_at,
+        'seconds', v_seconds
+    );
+END;
+$$;
+
+-- Rebuild the ledger of a month from agent_runs, for all accounts or one.
+-- Returns the number of accounts with usage in that month.
+CREATE OR REPLACE FUNCTION rebuild_monthly_usage(p_month DATE, p_account_id UUID DEFAULT NULL)
+RETURNS INTEGER
+SECURITY DEFINER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_start TIMESTAMPTZ := date_trunc('month', p_month::TIMESTAMP) AT TIME ZONE 'UTC';
+    v_end TIMESTAMPTZ := (date_trunc('month', p_month::TIMESTAMP) + INTERVAL '1 month') AT TIME ZONE 'UTC';
+    v_accounts INTEGER;
+BEGIN
+    UPDATE agent_runs r
+    SET usage_seconds = CASE
+        WHEN r.completed_at IS NOT NULL AND r.status IN ('completed', 'failed', 'stopped')
+            THEN agent_run_usage_seconds(r.started_at, r.completed_at)
+        ELSE NULL
+    END
+    FROM threads t
+    WHERE t.thread_id = r.thread_id
+        AND r.started_at >= v_start
+        AND r.started_at < v_end
+        AND (p_account_id IS NULL OR t.account_id = p_account_id);
+
+    DELETE FROM monthly_usage
+    WHERE month = v_start::DATE
+        AND (p_account_id IS NULL OR account_id = p_account_id);
+
+    INSERT INTO monthly_usage (account_id, month, seconds, run_count)
+    SELECT t.account_id, v_start::DATE, SUM(r.usage_seconds), COUNT(*)
+    FROM agent_runs r
+    JOIN threads t ON t.thread_id = r.thread_id
+    WHERE r.usage_seconds IS NOT NULL
+        AND r.started_at >= v_start
+        AND r.started_at < v_end
+        AND (p_account_id IS NULL OR t.account_id = p_account_id)
+    GROUP BY t.account_id;
+
+    GET DIAGNOSTICS v_accounts = ROW_COUNT;
+    RETURN v_accounts;
+END;
+$$;
+
+REVOKE ALL ON FUNCTION record_agent_run_usage(UUID) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION rebuild_monthly_usage(DATE, UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION record_agent_run_usage(UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION rebuild_monthly_usage(DATE, UUID) TO service_role;
+
+GRANT SELECT ON TABLE monthly_usage TO authenticated;
+GRANT ALL PRIVILEGES ON TABLE monthly_usage TO service_role;
+
+-- Backfill the current month
+SELECT rebuild_monthly_usage(date_trunc('month', NOW() AT TIME ZONE 'UTC')::DATE);
+
+COMMIT;
@@ -0,0 +1,75 @@
+BEGIN;
+
+-- Latest message of a type in a thread (latest assistant/tool/user, browser_state, image_context)
+CREATE INDEX IF NOT EXISTS idx_messages_thread_type_created_at ON messages(thread_id, type, created_at DESC);
+
+-- Everything an agent run iteration reads before calling the LLM, in one round trip:
+-- the type of the latest assistant/tool/user message, the LLM messages created
+-- after p_since (all of them if NULL), the latest browser_state and the latest
+-- image_context. The image_context row is deleted as it is read, so it is
+-- shown to the LLM once. If the latest message is from the assistant the run
+-- stops, and neither the browser state nor the image context are read.
+CREATE OR REPLACE FUNCTION get_agent_iteration_context(p_thread_id UUID, p_since TIMESTAMPTZ DEFAULT NULL)
+RETURNS JSONB
+SECURITY DEFINER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_latest_type TEXT;
+    v_messages JSONB;
+    v_browser_state JSONB;
+    v_image_context JSONB;
+BEGIN
+    SELECT type INTO v_latest_type
+    FROM messages
+    WHERE thread_id = p_thread_id
+        AND type IN ('assistant', 'tool', 'user')
+    ORDER BY created_at DESC
+    LIMIT 1;
+
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+        'message_id', m.message_id,
+        'type', m.type,
+        'content', m.content,
+        'created_at', m.created_at
+    ) ORDER BY m.created_at), '[]'::JSONB)
+    INTO v_messages
+    FROM messages m
+    WHERE m.thread_id = p_thread_id
+        AND m.is_llm_message = TRUE
+        AND (p_since IS NULL OR m.created_at > p_since);
+
+    IF v_latest_type IS DISTINCT FROM 'assistant' THEN
+        SELECT content INTO v_browser_state
+        FROM messages
+        WHERE thread_id = p_thread_id
+            AND type = 'browser_state'
+        ORDER BY created_at DESC
+        LIMIT 1;
+
+        DELETE FROM messages
+        WHERE message_id = (
+            SELECT message_id
+            FROM messages
+            WHERE thread_id = p_thread_id
+                AND type = 'image_context'
+            ORDER BY created_at DESC
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING content INTO v_image_context;
+    END IF;
+
+    RETURN jsonb_build_object(
+        'latest_message_type', v_latest_type,
+        'messages', v_messages,
+        'browser_state', v_browser_state,
+        'image_context', v_image_context
+    );
+END;
+$$;
+
+REVOKE ALL ON FUNCTION get_agent_iteration_context(UUID, TIMESTAMPTZ) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION get_agent_iteration_context(UUID, TIMESTAMPTZ) TO service_role;
+
+COMMIT;
@@ -0,0 +1,145 @@
+BEGIN;
+
+-- Tools enabled on an agent, as filtered by GET /agents: 'mcp:<name>' for each
+-- configured MCP server and 'agentpress:<tool>' for each enabled AgentPress tool
+CREATE OR REPLACE FUNCTION agent_enabled_tools(p_configured_mcps JSONB, p_agentpress_tools JSONB)
+RETURNS TEXT[]
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT COALESCE(array_agg(DISTINCT tool ORDER BY tool), '{}')
+    FROM (
+        SELECT 'mcp:' || (mcp->>'name') AS tool
+        FROM jsonb_array_elements(CASE WHEN jsonb_typeof(p_configured_mcps) = 'array' THEN p_configured_mcps ELSE '[]'::JSONB END) AS mcp
+        WHERE jsonb_typeof(mcp) = 'object' AND mcp->>'name' IS NOT NULL
+        UNION ALL
+        SELECT 'agentpress:' || tool.key
+        FROM jsonb_each(CASE WHEN jsonb_typeof(p_agentpress_tools) = 'object' THEN p_agentpress_tools ELSE '{}'::JSONB END) AS tool
+        WHERE jsonb_typeof(tool.value) = 'object' AND tool.value->'enabled' = 'true'::JSONB
+    ) tools;
+$$;
+
+-- Configured MCP servers plus enabled AgentPress tools
+CREATE OR REPLACE FUNCTION agent_tools_count(p_configured_mcps JSONB, p_agentpress_tools JSONB)
+RETURNS INTEGER
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT (CASE WHEN jsonb_typeof(p_configured_mcps) = 'array' THEN jsonb_array_length(p_configured_mcps) ELSE 0 END)
+        + (
+            SELECT count(*)::INTEGER
+            FROM jsonb_each(CASE WHEN jsonb_typeof(p_agentpress_tools) = 'object' THEN p_agentpress_tools ELSE '{}'::JSONB END) AS tool
+            WHERE jsonb_typeof(tool.value) = 'object' AND tool.value->'enabled' = 'true'::JSONB
+        );
+$$;
+
+-- Derived columns, kept up to date by Postgres on every insert and update
+ALTER TABLE agents ADD COLUMN IF NOT EXISTS enabled_tools TEXT[]
+    GENERATED ALWAYS AS (agent_enabled_tools(configured_mcps, agentpress_tools)) STORED;
+ALTER TABLE agents ADD COLUMN IF NOT EXISTS tools_count INTEGER
+    GENERATED ALWAYS AS (agent_tools_count(configured_mcps, agentpress_tools)) STORED;
+ALTER TABLE agents ADD COLUMN IF NOT EXISTS has_mcp_tools BOOLEAN
+    GENERATED ALWAYS AS (CASE WHEN jsonb_typeof(configured_mcps) = 'array' THEN jsonb_array_length(configured_mcps) > 0 ELSE false END) STORED;
+ALTER TABLE agents ADD COLUMN IF NOT EXISTS has_agentpress_tools BOOLEAN
+    GENERATED ALWAYS AS (CASE WHEN jsonb_typeof(agentpress_tools) = 'object' THEN jsonb_path_exists(agentpress_tools, '$.* ? (@.enabled == true)') ELSE false END) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_agents_enabled_tools ON agents USING gin(enabled_tools);
+
+-- Keyset pagination compares (sort value, agent_id) rows, which never match a
+-- NULL sort value. name is NOT NULL and agent_tools_count never returns NULL
+UPDATE agents SET created_at = NOW() WHERE created_at IS NULL;
+UPDATE agents SET updated_at = created_at WHERE updated_at IS NULL;
+ALTER TABLE agents ALTER COLUMN created_at SET NOT NULL;
+ALTER TABLE agents ALTER COLUMN updated_at SET NOT NULL;
+
+-- One index per sort order of GET /agents; agent_id breaks ties for keyset pagination
+CREATE INDEX IF NOT EXISTS idx_agents_account_created_at ON agents(account_id, created_at, agent_id);
+CREATE INDEX IF NOT EXISTS idx_agents_account_updated_at ON agents(account_id, updated_at, agent_id);
+CREATE INDEX IF NOT EXISTS idx_agents_account_name ON agents(account_id, name, agent_id);
+CREATE INDEX IF NOT EXISTS idx_agents_account_tools_count ON agents(account_id, tools_count, agent_id);
+
+-- A page of an account's agents, without their system prompts, in one round trip.
+-- The page starts after (p_after_value, p_after_id) in sort order if given
+-- (keyset pagination), otherwise at p_offset. The total number of matching
+-- agents is returned only if p_with_count is set.
+CREATE OR REPLACE FUNCTION list_agents(
+    p_account_id UUID,
+    p_limit INTEGER DEFAULT 20,
+    p_offset INTEGER DEFAULT 0,
+    p_search TEXT DEFAULT NULL,
+    p_sort_by TEXT DEFAULT 'created_at',
+    p_sort_desc BOOLEAN DEFAULT true,
+    p_is_default BOOLEAN DEFAULT NULL,
+    p_has_mcp_tools BOOLEAN DEFAULT NULL,
+    p_has_agentpress_tools BOOLEAN DEFAULT NULL,
+    p_tools TEXT[] DEFAULT NULL,
+    p_after_value TEXT DEFAULT NULL,
+    p_after_id UUID DEFAULT NULL,
+    p_with_count BOOLEAN DEFAULT true
+)
+RETURNS JSONB
+SECURITY DEFINER
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    v_sort_by TEXT := COALESCE(p_sort_by, 'created_at');
+    v_sort_type TEXT;
+    v_direction TEXT := CASE WHEN p_sort_desc THEN 'DESC' ELSE 'ASC' END;
+    v_filters TEXT;
+    v_agents JSONB;
+    v_total BIGINT;
+BEGIN
+    IF p_after_id IS NOT NULL AND p_after_value IS NULL THEN
+        RAISE EXCEPTION 'p_after_value is required with p_after_id';
+    END IF;
+
+    v_sort_type := CASE v_sort_by
+        WHEN 'name' THEN 'VARCHAR'
+        WHEN 'updated_at' THEN 'TIMESTAMPTZ'
+        WHEN 'tools_count' THEN 'INTEGER'
+        ELSE 'TIMESTAMPTZ'
+    END;
+    IF v_sort_by NOT IN ('name', 'updated_at', 'tools_count') THEN
+        v_sort_by := 'created_at';
+    END IF;
+
+    v_filters := '
+        WHERE a.account_id = $1
+            AND ($2::TEXT IS NULL OR a.name ILIKE ''%'' || $2 || ''%'' OR a.description ILIKE ''%'' || $2 || ''%'')
+            AND ($3::BOOLEAN IS NULL OR a.is_default = $3)
+            AND ($4::BOOLEAN IS NULL OR a.has_mcp_tools = $4)
+            AND ($5::BOOLEAN IS NULL OR a.has_agentpress_tools = $5)
+            AND ($6::TEXT[] IS NULL OR a.enabled_tools && $6)';
+
+    IF p_with_count THEN
+        EXECUTE 'SELECT count(*) FROM agents a' || v_filters
+        INTO v_total
+        USING p_account_id, p_search, p_is_default, p_has_mcp_tools, p_has_agentpress_tools, p_tools;
+    END IF;
+
+    EXECUTE format(
+        'SELECT COALESCE(jsonb_agg(to_jsonb(page) ORDER BY page.%1$I %2$s, page.agent_id %2$s), ''[]''::JSONB)
+        FROM (
+            SELECT a.agent_id, a.account_id, a.name, a.description, a.configured_mcps, a.custom_mcps,
+                a.agentpress_tools, a.is_default, a.is_public, a.marketplace_published_at, a.download_count,
+                a.tags, a.avatar, a.avatar_color, a.tools_count, a.created_at, a.updated_at
+            FROM agents a %3$s
+                AND ($10::UUID IS NULL OR (a.%1$I, a.agent_id) %4$s ($9::%5$s, $10))
+            ORDER BY a.%1$I %2$s, a.agent_id %2$s
+            LIMIT $7 OFFSET $8
+        ) page',
+        v_sort_by, v_direction, v_filters, CASE WHEN p_sort_desc THEN '<' ELSE '>' END, v_sort_type
+    )
+    INTO v_agents
+    USING p_account_id, p_search, p_is_default, p_has_mcp_tools, p_has_agentpress_tools, p_tools,
+        p_limit, CASE WHEN p_after_id IS NULL THEN p_offset ELSE 0 END, p_after_value, p_after_id;
+
+    RETURN jsonb_build_object('agents', v_agents, 'total', v_total);
+END;
+$$;
+
+REVOKE ALL ON FUNCTION list_agents(UUID, INTEGER, INTEGER, TEXT, TEXT, BOOLEAN, BOOLEAN, BOOLEAN, BOOLEAN, TEXT[], TEXT, UUID, BOOLEAN) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION list_agents(UUID, INTEGER, INTEGER, TEXT, TEXT, BOOLEAN, BOOLEAN, BOOLEAN, BOOLEAN, TEXT[], TEXT, UUID, BOOLEAN) TO service_role;
+
+COMMIT;
@@ -0,0 +1,72 @@
+import pytest
+
+from agent.agent_list import InvalidCursor, build_request, decode_cursor, encode_cursor
+
+ACCOUNT = "11111111-1111-1111-1111-111111111111"
+LAST_AGENT = {"agent_id": "22222222-2222-2222-2222-222222222222", "tools_count": 3,
+              "created_at": "2025-06-01T10:00:00.5+00:00"}
+
+
+def test_filters_and_sort_become_list_agents_parameters():
+    request = build_request(ACCOUNT, page=3, limit=10, sort_by="tools_count", sort_order="asc",
+                            has_mcp_tools=True, tools="mcp:exa, agentpress:sb_files_tool,")
+
+    assert request.params == {
+        "p_account_id": ACCOUNT,
+        "p_limit": 11,
+        "p_offset": 20,
+        "p_search": None,
+        "p_sort_by": "tools_count",
+        "p_sort_desc": False,
+        "p_is_default": None,
+        "p_has_mcp_tools": True,
+        "p_has_agentpress_tools": None,
+        "p_tools": ["mcp:exa", "agentpress:sb_files_tool"],
+        "p_after_value": None,
+        "p_after_id": None,
+        "p_with_count": True,
+    }
+    assert build_request(ACCOUNT, sort_by="popularity").params["p_sort_by"] == "created_at"
+
+
+def test_cursor_continues_after_the_last_agent_without_counting_again():
+    first = build_request(ACCOUNT, limit=10, sort_by="tools_count", tools="mcp:exa")
+    cursor = first.next_cursor(LAST_AGENT, total=42)
+    assert decode_cursor(cursor) == decode_cursor(encode_cursor(decode_cursor(cursor)))
+
+    second = build_request(ACCOUNT, page=1, limit=10, sort_by="tools_count", tools="mcp:exa", cursor=cursor)
+    assert (second.page, second.total) == (2, 42)
+    assert second.params["p_after_value"] == "3"
+    assert second.params["p_after_id"] == LAST_AGENT["agent_id"]
+    assert second.params["p_offset"] == 10 and not second.params["p_with_count"]
+    assert decode_cursor(second.next_cursor(LAST_AGENT, total=42))["page"] == 3
+
+
+def test_cursor_of_another_query_is_rejected():
+    cursor = build_request(ACCOUNT, limit=10).next_cursor(LAST_AGENT, total=42)
+
+    with pytest.raises(InvalidCursor, match="does not match"):
+        build_request(ACCOUNT, limit=10, search="research", cursor=cursor)
+    with pytest.raises(InvalidCursor, match="does not match"):
+        build_request(ACCOUNT, limit=20, cursor=cursor)
+
+
+@pytest.mark.parametrize("payload", [
+    {"page": "2"},
+    {"page": 1},
+    {"total": None},
+    {"v": None},
+    {"id": "not-a-uuid"},
+])
+def test_malformed_cursors_are_rejected(payload):
+    valid = decode_cursor(build_request(ACCOUNT).next_cursor(LAST_AGENT, total=42))
+
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor({**valid, **payload}))
+    for cursor in ("not base64!", encode_cursor([1, 2])):
+        with pytest.raises(InvalidCursor):
+            decode_cursor(cursor)
+
+
+def test_no_cursor_for_a_missing_sort_value():
+    assert build_request(ACCOUNT).next_cursor({**LAST_AGENT, "created_at": None}, total=42) is None
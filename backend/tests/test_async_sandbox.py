@@ -0,0 +1,63 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("daytona_sdk")
+
+from sandbox import async_sandbox
+from sandbox.async_sandbox import AsyncSandbox
+
+
+class FakeFileSystem:
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.threads = set()
+        self._lock = threading.Lock()
+
+    def download_file(self, path):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.threads.add(threading.get_ident())
+        time.sleep(0.02)
+        with self._lock:
+            self.active -= 1
+        return path.encode()
+
+
+class FakeSandbox:
+    def __init__(self, sandbox_id):
+        self.id = sandbox_id
+        self.state = "started"
+        self.fs = FakeFileSystem()
+        self.process = object()
+
+
+def test_calls_run_off_the_event_loop_with_a_per_sandbox_limit(monkeypatch):
+    monkeypatch.setattr(async_sandbox, "MAX_CALLS_PER_SANDBOX", 2)
+    sdk_sandbox = FakeSandbox("sb-1")
+    sandbox = AsyncSandbox(sdk_sandbox)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        ticker_task = asyncio.create_task(ticker())
+        contents = await asyncio.gather(*(sandbox.fs.download_file(f"/workspace/{n}") for n in range(6)))
+        ticker_task.cancel()
+        return contents, ticks
+
+    contents, ticks = asyncio.run(run())
+    assert contents == [f"/workspace/{n}".encode() for n in range(6)]
+    assert sdk_sandbox.fs.max_active == 2
+    assert threading.get_ident() not in sdk_sandbox.fs.threads
+    # The loop kept running while the blocking calls were in flight
+    assert ticks > 5
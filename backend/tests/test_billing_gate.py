@@ -0,0 +1,128 @@
+import asyncio
+from datetime import datetime, timezone
+
+from services import billing_gate
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = str(value)
+        self.ttls[key] = ex
+        return True
+
+    def expire_now(self, key):
+        self.data.pop(key, None)
+        self.ttls.pop(key, None)
+
+    async def eval(self, script, keys, args):
+        # The add_run_usage script, run atomically like on the server
+        assert "EXISTS" in script and "INCRBYFLOAT" in script
+        key, (amount, ttl) = keys[0], args
+        if key not in self.data:
+            return 0
+        await self.incrbyfloat(key, amount)
+        if self.ttls.get(key) is None:
+            self.ttls[key] = ttl
+        return 1
+
+    async def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    async def delete(self, key):
+        return 1 if self.data.pop(key, None) is not None else 0
+
+    async def incrbyfloat(self, key, amount):
+        self.data[key] = str(float(self.data.get(key, 0)) + amount)
+        return float(self.data[key])
+
+    async def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, fake):
+        self.fake = fake
+        self.commands = []
+
+    def get(self, key):
+        self.commands.append(self.fake.get(key))
+
+    def set(self, key, value, ex=None, nx=False):
+        self.commands.append(self.fake.set(key, value, ex=ex, nx=nx))
+
+    async def execute(self):
+        return [await command for command in self.commands]
+
+
+def _patch_redis(monkeypatch):
+    fake = FakeRedis()
+    for name in ("set", "get", "delete", "eval", "pipeline"):
+        monkeypatch.setattr(billing_gate.redis, name, getattr(fake, name))
+    return fake
+
+
+def test_usage_counter_is_only_incremented_once_seeded(monkeypatch):
+    _patch_redis(monkeypatch)
+    now = datetime.now(timezone.utc)
+
+    async def run():
+        assert await billing_gate.read_state("acc") == (None, None)
+        # Runs finishing before the counter is seeded are left to the seed
+        assert not await billing_gate.add_run_usage("acc", now, 30)
+        await billing_gate.store_plan("acc", {"price_id": "p", "plan_name": "free", "minutes_limit": 60})
+        assert await billing_gate.seed_usage("acc", 600.0) == 600.0
+        assert await billing_gate.seed_usage("acc", 0.0) == 600.0
+        assert await billing_gate.add_run_usage("acc", now, 120)
+        return await billing_gate.read_state("acc")
+
+    plan, used_seconds = asyncio.run(run())
+    assert plan["minutes_limit"] == 60
+    assert used_seconds == 720.0
+
+
+def test_invalidated_state_is_not_served(monkeypatch):
+    _patch_redis(monkeypatch)
+
+    async def run():
+        await billing_gate.store_plan("acc", {"price_id": "p", "plan_name": "free", "minutes_limit": 60})
+        await billing_gate.seed_usage("acc", 60.0)
+        await billing_gate.invalidate_plan("acc")
+        await billing_gate.invalidate_usage("acc")
+        return await billing_gate.read_state("acc")
+
+    assert asyncio.run(run()) == (None, None)
+
+
+def test_evaluate_adds_the_callers_run_up_to_the_cap():
+    plan = {"price_id": "p", "plan_name": "free", "minutes_limit": 60}
+
+    assert billing_gate.evaluate(plan, 3000, active_seconds=500)[0]
+    assert not billing_gate.evaluate(plan, 3000, active_seconds=600)[0]
+    assert not billing_gate.evaluate(plan, 3600)[0]
+    assert billing_gate.evaluate(plan, 0, active_seconds=10 ** 6)[0]
+    assert billing_gate.evaluate({"minutes_limit": billing_gate.UNLIMITED}, 10 ** 9)[0]
+
+
+def test_expired_counter_is_not_recreated_without_ttl(monkeypatch):
+    fake = _patch_redis(monkeypatch)
+    now = datetime.now(timezone.utc)
+    key = billing_gate.usage_key("acc", now)
+
+    async def run():
+        await billing_gate.seed_usage("acc", 600.0)
+        assert await billing_gate.add_run_usage("acc", now, 60)
+        # The counter expires while a run finishes
+        fake.expire_now(key)
+        assert not await billing_gate.add_run_usage("acc", now, 30)
+        assert key not in fake.data
+        # The next seed counts the run from the ledger
+        return await billing_gate.seed_usage("acc", 690.0)
+
+    assert asyncio.run(run()) == 690.0
+    assert fake.ttls[key] == billing_gate.USAGE_TTL
@@ -0,0 +1,101 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("daytona_sdk")
+
+from sandbox import browser_channel
+from sandbox.browser_channel import BrowserChannel, BrowserChannelUnavailable, BrowserActionFailed
+
+
+class FakePreviewLink:
+    url = "https://8003-sandbox.proxy.test/"
+    token = "preview-token"
+
+
+class FakeSandbox:
+    def __init__(self, sandbox_id="sandbox-1"):
+        self.id = sandbox_id
+        self.preview_lookups = 0
+
+    async def get_preview_link(self, port):
+        self.preview_lookups += 1
+        return FakePreviewLink()
+
+
+@pytest.fixture(autouse=True)
+def reset_channel_state():
+    browser_channel._preview_links.clear()
+    browser_channel._unavailable_until.clear()
+    yield
+    browser_channel._preview_links.clear()
+    browser_channel._unavailable_until.clear()
+
+
+def _use_transport(monkeypatch, handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(browser_channel, "get_http_client", lambda *args, **kwargs: client)
+
+
+def test_request_uses_cached_preview_link_and_decodes_gzip(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        body = gzip.compress(json.dumps({"success": True, "screenshot_base64": "A" * 4096}).encode())
+        return httpx.Response(200, content=body, headers={"Content-Encoding": "gzip"})
+
+    _use_transport(monkeypatch, handler)
+    sandbox = FakeSandbox()
+
+    async def run():
+        channel = BrowserChannel(sandbox)
+        first = await channel.request("navigate_to", {"url": "https://example.com"})
+        second = await channel.request("wait", {"seconds": 0})
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first["success"] and len(first["screenshot_base64"]) == 4096
+    assert second["success"]
+    assert sandbox.preview_lookups == 1
+    assert str(requests[0].url) == "https://8003-sandbox.proxy.test/api/automation/navigate_to"
+    assert requests[0].headers["x-daytona-preview-token"] == "preview-token"
+    assert json.loads(requests[0].content) == {"url": "https://example.com"}
+
+
+@pytest.mark.parametrize("failure", ["proxy", "connect"])
+def test_unreachable_browser_api_disables_channel(monkeypatch, failure):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if failure == "connect":
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(403, text="Invalid preview token")
+
+    _use_transport(monkeypatch, handler)
+    channel = BrowserChannel(FakeSandbox())
+
+    with pytest.raises(BrowserChannelUnavailable):
+        asyncio.run(channel.request("wait", {"seconds": 0}))
+    assert not channel.available
+    assert "sandbox-1" not in browser_channel._preview_links
+
+    # Skipped without another attempt until RETRY_AFTER has passed
+    with pytest.raises(BrowserChannelUnavailable):
+        asyncio.run(channel.request("wait", {"seconds": 0}))
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("status", [500, 502, 504])
+def test_server_errors_are_failures_not_a_fallback(monkeypatch, status):
+    # A proxy 502/504 may come after the click reached the browser API
+    _use_transport(monkeypatch, lambda request: httpx.Response(status, text="Gateway Timeout"))
+    channel = BrowserChannel(FakeSandbox())
+
+    with pytest.raises(BrowserActionFailed, match=str(status)):
+        asyncio.run(channel.request("click_element", {"index": 1}))
+    assert channel.available
@@ -0,0 +1,50 @@
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from utils.image_utils import decode_base64_image, image_hash_distance
+
+
+def _encode(image: Image.Image, image_format: str) -> str:
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+@pytest.mark.parametrize("image_format", ["JPEG", "PNG", "WEBP"])
+def test_valid_image_is_decoded_once_with_its_format(image_format):
+    data = _encode(Image.new("RGB", (64, 32), color="red"), image_format)
+
+    image_data, detected = decode_base64_image(f"data:image/x;base64,{data}")
+    assert detected == image_format
+    assert image_data == base64.b64decode(data)
+
+
+@pytest.mark.parametrize("data, error", [
+    ("", "empty or too short"),
+    ("data:image/png;base64", "Invalid data URL format"),
+    ("not*valid*base64!!", "Base64 decoding failed"),
+    ("QUJD", "too short"),
+    (base64.b64encode(b"not an image at all").decode(), "Invalid image data"),
+])
+def test_invalid_data_is_rejected(data, error):
+    with pytest.raises(ValueError, match=error):
+        decode_base64_image(data)
+
+
+def test_limits_are_enforced():
+    data = _encode(Image.new("RGB", (64, 64)), "PNG")
+    with pytest.raises(ValueError, match="exceeds limit"):
+        decode_base64_image(data, max_size_mb=0.00001)
+
+    data = _encode(Image.new("1", (9000, 1)), "PNG")
+    with pytest.raises(ValueError, match="exceed limit"):
+        decode_base64_image(data)
+
+
+def test_image_hash_distance_counts_differing_bits():
+    assert image_hash_distance("00ff", "00ff") == 0
+    assert image_hash_distance("00ff", "01fe") == 2
+    assert image_hash_distance("00ff", "00ff00") == 16
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from services import marketplace_cache
+from services.marketplace_cache import MarketplaceCache, MarketplaceSnapshot
+
+
+AGENTS = [
+    {"agent_id": "a", "name": "Researcher", "description": "Finds papers", "tags": ["research"],
+     "download_count": 5, "marketplace_published_at": "2025-06-01T10:00:00+00:00", "creator_name": "Ada"},
+    {"agent_id": "b", "name": "coder", "description": "Writes code", "tags": ["dev", "research"],
+     "download_count": 20, "marketplace_published_at": "2025-06-03T10:00:00+00:00", "creator_name": "Linus"},
+    {"agent_id": "c", "name": "Analyst", "description": None, "tags": ["data"],
+     "download_count": 5, "marketplace_published_at": "2025-06-02T10:00:00+00:00", "creator_name": "Ada"},
+]
+
+
+def ids(agents):
+    return [agent["agent_id"] for agent in agents]
+
+
+def test_snapshot_sorts_and_filters_all_agents():
+    snapshot = MarketplaceSnapshot(AGENTS, version=1, built_at=0)
+
+    assert ids(snapshot.query(0, 10)[0]) == ["b", "c", "a"]
+    # Equal download counts are ordered newest first
+    assert ids(snapshot.query(0, 10, sort_by="most_downloaded")[0]) == ["b", "c", "a"]
+    assert ids(snapshot.query(0, 10, sort_by="name")[0]) == ["c", "b", "a"]
+
+    assert ids(snapshot.query(0, 10, tags=["research"])[0]) == ["b", "a"]
+    # Search covers name, description and tags
+    assert ids(snapshot.query(0, 10, search="DATA")[0]) == ["c"]
+    assert ids(snapshot.query(0, 10, search="code")[0]) == ["b"]
+    assert ids(snapshot.query(0, 10, creator="ada", sort_by="name")[0]) == ["c", "a"]
+
+    page, total = snapshot.query(1, 1, sort_by="name")
+    assert ids(page) == ["b"] and total == 3
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+        return queue
+
+    async def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = str(value)
+        return True
+
+    def delete(self, key):
+        return 1 if self.data.pop(key, None) is not None else 0
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+        return int(self.data[key])
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    redis = FakeRedis()
+
+    async def pipeline(transaction=False):
+        return FakePipeline(redis)
+
+    async def set(key, value, ex=None, nx=False):
+        return redis.set(key, value, ex=ex, nx=nx)
+
+    async def delete(key):
+        return redis.delete(key)
+
+    monkeypatch.setattr(marketplace_cache.redis, "pipeline", pipeline)
+    monkeypatch.setattr(marketplace_cache.redis, "set", set)
+    monkeypatch.setattr(marketplace_cache.redis, "delete", delete)
+    return redis
+
+
+def test_workers_share_the_snapshot_until_it_is_invalidated(fake_redis, monkeypatch):
+    loads = []
+
+    async def load_agents():
+        loads.append(1)
+        return list(AGENTS)
+
+    first, second = MarketplaceCache(load_agents), MarketplaceCache(load_agents)
+
+    async def run():
+        await first.get_snapshot()
+        await first.get_snapshot()
+        shared = await second.get_snapshot()
+        assert len(loads) == 1 and ids(shared.agents) == ["a", "b", "c"]
+
+        await first.invalidate()
+        # The other worker notices the new version at its next check
+        monkeypatch.setattr(marketplace_cache, "VERSION_CHECK_INTERVAL", 0)
+        rebuilt = await second.get_snapshot()
+        assert rebuilt.version == 1
+        await first.get_snapshot()
+
+    asyncio.run(run())
+    assert len(loads) == 2
+    assert (first.rebuilds, second.rebuilds) == (1, 1)
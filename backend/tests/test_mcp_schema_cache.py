@@ -0,0 +1,82 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from mcp_local import schema_cache
+from mcp_local.schema_cache import ToolSchemaCache
+
+
+class FakePool:
+    def __init__(self):
+        self.listings = 0
+        self.description = "v1"
+
+    async def list_tools(self, key, opener):
+        self.listings += 1
+        await asyncio.sleep(0.01)
+        tool = SimpleNamespace(name="search", description=self.description, inputSchema={"type": "object"})
+        return SimpleNamespace(tools=[tool])
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(schema_cache, "mcp_session_pool", pool)
+    return pool
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    data = {}
+
+    async def get(key, default=None):
+        return data.get(key, default)
+
+    async def set(key, value, ex=None, nx=False):
+        data[key] = value
+        return True
+
+    async def delete(key):
+        return 1 if data.pop(key, None) is not None else 0
+
+    monkeypatch.setattr(schema_cache.redis, "get", get)
+    monkeypatch.setattr(schema_cache.redis, "set", set)
+    monkeypatch.setattr(schema_cache.redis, "delete", delete)
+    return data
+
+
+def test_concurrent_misses_share_one_listing_and_are_cached(fake_pool, fake_redis):
+    cache = ToolSchemaCache()
+
+    async def run():
+        results = await asyncio.gather(*(cache.get_tools("http:exa:abc", None) for _ in range(5)))
+        results.append(await cache.get_tools("http:exa:abc", None))
+        return results
+
+    results = asyncio.run(run())
+    assert fake_pool.listings == 1
+    assert all(result == [{"name": "search", "description": "v1", "inputSchema": {"type": "object"}}] for result in results)
+    assert (cache.hits, cache.misses) == (1, 5)
+
+
+def test_stale_entry_is_served_and_refreshed_in_the_background(fake_pool, fake_redis):
+    cache = ToolSchemaCache(refresh_after=60)
+
+    async def run():
+        await cache.get_tools("k", None)
+        entry = json.loads(fake_redis["mcp:tools:k"])
+        entry["fetched_at"] -= 120
+        fake_redis["mcp:tools:k"] = json.dumps(entry)
+        fake_pool.description = "v2"
+
+        stale = await cache.get_tools("k", None)
+        await asyncio.sleep(0.05)
+        fresh = await cache.get_tools("k", None)
+        return stale, fresh
+
+    stale, fresh = asyncio.run(run())
+    assert stale[0]["description"] == "v1"
+    assert fresh[0]["description"] == "v2"
+    assert fake_pool.listings == 2
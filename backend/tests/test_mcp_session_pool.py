@@ -0,0 +1,105 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from mcp_local.session_pool import MCPSessionPool, McpError, session_key
+
+
+class FakeSession:
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.calls = 0
+        self.fail_next = None
+
+    async def call_tool(self, name, arguments):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        self.calls += 1
+        if self.fail_next:
+            error, self.fail_next = self.fail_next, None
+            raise error
+        return f"{name}:{arguments['x']}"
+
+    async def send_ping(self):
+        pass
+
+
+class FakeServer:
+    def __init__(self):
+        self.opened = 0
+        self.closed = 0
+        self.sessions = []
+
+    @asynccontextmanager
+    async def open(self):
+        self.opened += 1
+        await asyncio.sleep(0.01)
+        session = FakeSession()
+        self.sessions.append(session)
+        try:
+            yield session
+        finally:
+            self.closed += 1
+
+
+def test_session_is_opened_once_and_reused():
+    server = FakeServer()
+    pool = MCPSessionPool(max_calls_per_session=2)
+    key = session_key("http", "https://mcp.example.com", {"token": "a"})
+
+    async def run():
+        results = await asyncio.gather(*(pool.call_tool(key, server.open, "search", {"x": n}) for n in range(6)))
+        results.append(await pool.call_tool(key, server.open, "search", {"x": 6}))
+        await pool.close_all()
+        return results
+
+    results = asyncio.run(run())
+    assert results == [f"search:{n}" for n in range(7)]
+    assert server.opened == 1
+    assert server.closed == 1
+    assert server.sessions[0].max_active == 2
+
+
+def test_broken_session_is_replaced_but_protocol_errors_keep_it():
+    server = FakeServer()
+    pool = MCPSessionPool()
+    key = session_key("stdio", "npx", {"args": ["server"]})
+
+    async def run():
+        await pool.call_tool(key, server.open, "t", {"x": 1})
+        server.sessions[0].fail_next = McpError("invalid params")
+        with pytest.raises(McpError):
+            await pool.call_tool(key, server.open, "t", {"x": 2})
+        server.sessions[0].fail_next = ConnectionError("transport closed")
+        with pytest.raises(ConnectionError):
+            await pool.call_tool(key, server.open, "t", {"x": 3})
+        assert await pool.call_tool(key, server.open, "t", {"x": 4}) == "t:4"
+        await pool.close_all()
+
+    asyncio.run(run())
+    assert server.opened == 2
+    assert server.closed == 2
+
+
+def test_idle_sessions_are_evicted():
+    server = FakeServer()
+    pool = MCPSessionPool(idle_timeout=0.01)
+
+    async def run():
+        await pool.call_tool("a", server.open, "t", {"x": 1})
+        assert len(pool) == 1
+        # The background reaper closes the session once it is idle
+        await asyncio.sleep(0.05)
+        return len(pool)
+
+    assert asyncio.run(run()) == 0
+    assert server.closed == 1
+
+
+def test_session_key_depends_on_config():
+    assert session_key("http", "u", {"a": 1, "b": 2}) == session_key("http", "u", {"b": 2, "a": 1})
+    assert session_key("http", "u", {"a": 1}) != session_key("http", "u", {"a": 2})
@@ -0,0 +1,185 @@
+import asyncio
+import json
+
+from agentpress.message_cache import ThreadMessageCache
+
+
+class FakeQuery:
+    def __init__(self, table):
+        self.table = table
+        self.cursor = None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    def gt(self, column, value):
+        assert column == "created_at"
+        self.cursor = value
+        return self
+
+    def order(self, column):
+        return self
+
+    async def execute(self):
+        self.table.cursors.append(self.cursor)
+        rows = [row for row in self.table.rows if self.cursor is None or row["created_at"] > self.cursor]
+        return type("Result", (), {"data": rows})()
+
+
+class FakeTable:
+    def __init__(self):
+        self.rows = []
+        self.cursors = []
+
+    def insert(self, message_id, created_at, content, type="assistant"):
+        row = {"message_id": message_id, "type": type, "created_at": created_at, "content": json.dumps(content)}
+        self.rows.append(row)
+        return row
+
+
+class FakeDB:
+    def __init__(self, table):
+        self.table = table
+
+    @property
+    async def client(self):
+        table = self.table
+        return type("Client", (), {"table": lambda self, name: FakeQuery(table)})()
+
+
+def test_only_new_rows_are_fetched():
+    table = FakeTable()
+    cache = ThreadMessageCache(FakeDB(table))
+    table.insert("m1", "2025-01-01T00:00:01+00:00", {"role": "user", "content": "hi"})
+
+    async def run():
+        first = [r["message_id"] for r in await cache.get_rows("t1")]
+        cache.add_row("t1", table.insert("m2", "2025-01-01T00:00:02+00:00", {"role": "assistant", "content": "hello"}))
+        table.insert("m3", "2025-01-01T00:00:03.5+00:00", {"role": "user", "content": "more"})
+        second = await cache.get_rows("t1")
+        return first, [r["message_id"] for r in second]
+
+    first, second = asyncio.run(run())
+    assert first == ["m1"]
+    assert second == ["m1", "m2", "m3"]
+    assert table.cursors == [None, "2025-01-01T00:00:02+00:00"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_invalidate_forces_full_reload():
+    table = FakeTable()
+    cache = ThreadMessageCache(FakeDB(table))
+    table.insert("m1", "2025-01-01T00:00:01+00:00", {"role": "user", "content": "hi"})
+
+    async def run():
+        await cache.get_rows("t1")
+        cache.invalidate("t1")
+        return await cache.get_rows("t1")
+
+    rows = asyncio.run(run())
+    assert [r["content"]["content"] for r in rows] == ["hi"]
+    assert table.cursors == [None, None]
+    assert cache.misses == 2
+
+
+class FakeLatestQuery(FakeQuery):
+    """FakeQuery with the builder methods of the separate iteration context queries."""
+
+    def in_(self, column, values):
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def limit(self, count):
+        return self
+
+    def delete(self):
+        return self
+
+
+class FakeRPCClient:
+    """Client whose get_agent_iteration_context call answers from a FakeTable."""
+
+    def __init__(self, table, fail=False):
+        self.rows_table = table
+        self.fail = fail
+        self.calls = []
+
+    def rpc(self, name, params):
+        assert name == "get_agent_iteration_context"
+        self.calls.append(params)
+        table, fail = self.rows_table, self.fail
+
+        async def execute():
+            if fail:
+                raise RuntimeError("function get_agent_iteration_context does not exist")
+            since = params["p_since"]
+            rows = [row for row in table.rows if since is None or row["created_at"] > since]
+            return type("Result", (), {"data": {
+                "latest_message_type": table.rows[-1]["type"] if table.rows else None,
+                "messages": rows,
+                "browser_state": {"url": "https://example.com"},
+                "image_context": json.dumps({"file_path": "a.png"}),
+            }})()
+        return type("Call", (), {"execute": staticmethod(execute)})()
+
+    def table(self, name):
+        return FakeLatestQuery(self.rows_table)
+
+
+class FakeRPCDB:
+    def __init__(self, client):
+        self._client = client
+
+    @property
+    async def client(self):
+        return self._client
+
+
+def test_iteration_context_prefetches_rows_for_the_next_read():
+    table = FakeTable()
+    client = FakeRPCClient(table)
+    cache = ThreadMessageCache(FakeRPCDB(client))
+    table.insert("m1", "2025-01-01T00:00:01+00:00", {"role": "user", "content": "hi"}, type="user")
+
+    async def run():
+        context = await cache.get_iteration_context("t1")
+        first = [r["message_id"] for r in await cache.get_rows("t1")]
+        table.insert("m2", "2025-01-01T00:00:02+00:00", {"role": "assistant", "content": "hello"})
+        second_context = await cache.get_iteration_context("t1")
+        second = [r["message_id"] for r in await cache.get_rows("t1")]
+        return context, first, second_context, second
+
+    context, first, second_context, second = asyncio.run(run())
+    assert context == {
+        "latest_message_type": "user",
+        "browser_state": {"url": "https://example.com"},
+        "image_context": {"file_path": "a.png"},
+    }
+    assert second_context["latest_message_type"] == "assistant"
+    assert first == ["m1"]
+    assert second == ["m1", "m2"]
+    # Rows came with the context; get_rows made no queries of its own
+    assert [call["p_since"] for call in client.calls] == [None, "2025-01-01T00:00:01+00:00"]
+    assert table.cursors == []
+
+
+def test_iteration_context_falls_back_to_separate_queries():
+    table = FakeTable()
+    cache = ThreadMessageCache(FakeRPCDB(FakeRPCClient(table, fail=True)))
+    table.insert("m1", "2025-01-01T00:00:01+00:00", {"role": "user", "content": "hi"}, type="user")
+
+    async def run():
+        context = await cache.get_iteration_context("t1")
+        rows = await cache.get_rows("t1")
+        return context, [r["message_id"] for r in rows]
+
+    context, rows = asyncio.run(run())
+    assert context["latest_message_type"] == "user"
+    assert rows == ["m1"]
+    # Latest message, browser state, image context, its delete, and get_rows' own query
+    assert len(table.cursors) == 5
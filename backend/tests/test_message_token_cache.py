@@ -0,0 +1,52 @@
+from agentpress.token_cache import MessageTokenCache
+
+
+class CountingTokenizer:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, model, messages):
+        self.calls += 1
+        return sum(len(str(m.get("content", ""))) // 4 + 3 for m in messages)
+
+
+def test_unchanged_messages_are_counted_once():
+    tokenizer = CountingTokenizer()
+    cache = MessageTokenCache(tokenizer)
+    messages = [
+        {"role": "user", "content": "a" * 400, "message_id": "m1"},
+        {"role": "assistant", "content": "b" * 800, "message_id": "m2"},
+    ]
+
+    first = cache.count_messages("gpt-4o", messages)
+    second = cache.count_messages("gpt-4o", messages)
+
+    assert first == second == 306
+    assert tokenizer.calls == 2
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_key_includes_content_and_model():
+    tokenizer = CountingTokenizer()
+    cache = MessageTokenCache(tokenizer)
+    message = {"role": "user", "content": "a" * 400, "message_id": "m1"}
+    truncated = dict(message, content="a" * 40)
+
+    assert cache.count("gpt-4o", message) == 103
+    assert cache.count("gpt-4o", truncated) == 13
+    assert cache.count("claude-sonnet-4", message) == 103
+    assert tokenizer.calls == 3
+
+
+def test_least_recently_used_entries_are_evicted():
+    tokenizer = CountingTokenizer()
+    cache = MessageTokenCache(tokenizer, max_entries=2)
+    messages = [{"role": "user", "content": str(n), "message_id": f"m{n}"} for n in range(3)]
+
+    for message in messages:
+        cache.count("gpt-4o", message)
+    cache.count("gpt-4o", messages[2])
+    cache.count("gpt-4o", messages[0])
+
+    assert len(cache) == 2
+    assert tokenizer.calls == 4
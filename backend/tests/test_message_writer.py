@@ -0,0 +1,118 @@
+import asyncio
+
+from agentpress import message_writer
+from agentpress.message_writer import MessageWriter, DURABILITY_SYNC
+
+
+class FakeQuery:
+    def __init__(self, calls, method, rows):
+        self.calls = calls
+        self.method = method
+        self.rows = rows
+
+    async def execute(self):
+        rows = self.rows if isinstance(self.rows, list) else [self.rows]
+        self.calls.append((self.method, [row["content"] for row in rows]))
+        return type("Result", (), {"data": rows})()
+
+
+class FakeTable:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def insert(self, row, returning=None):
+        return FakeQuery(self.calls, "insert", row)
+
+    def upsert(self, rows, on_conflict=None, ignore_duplicates=False, returning=None):
+        return FakeQuery(self.calls, "upsert", rows)
+
+
+class FakeDB:
+    def __init__(self):
+        self.calls = []
+
+    @property
+    async def client(self):
+        calls = self.calls
+        return type("Client", (), {"table": lambda self, name: FakeTable(calls)})()
+
+
+def status(writer, status_type):
+    return writer.build_row("t1", "status", {"status_type": status_type}, False, None)
+
+
+def test_status_rows_are_batched_until_the_next_llm_message():
+    db = FakeDB()
+
+    async def run():
+        writer = MessageWriter(db, flush_interval=10)
+        await writer.enqueue(status(writer, "thread_run_start"))
+        await writer.enqueue(status(writer, "assistant_response_start"))
+        assert db.calls == []
+        await writer.insert(writer.build_row("t1", "assistant", "hi", True, None))
+        await writer.enqueue(status(writer, "tool_started"))
+        await writer.enqueue(status(writer, "thread_run_end"))
+        await writer.close()
+
+    asyncio.run(run())
+    assert db.calls == [
+        ("upsert", [{"status_type": "thread_run_start"}, {"status_type": "assistant_response_start"}]),
+        ("insert", ["hi"]),
+        ("upsert", [{"status_type": "tool_started"}, {"status_type": "thread_run_end"}]),
+    ]
+
+
+def test_timer_flushes_buffered_rows():
+    db = FakeDB()
+
+    async def run():
+        writer = MessageWriter(db, flush_interval=0.01)
+        await writer.enqueue(status(writer, "tool_started"))
+        await asyncio.sleep(0.05)
+        return writer.pending
+
+    assert asyncio.run(run()) == 0
+    assert db.calls == [("upsert", [{"status_type": "tool_started"}])]
+
+
+def test_all_rows_get_increasing_timestamps_from_one_clock():
+    writer = MessageWriter(FakeDB())
+    rows = [status(writer, "tool_started") for _ in range(50)]
+    rows.append(writer.build_row("t1", "assistant", "hi", True, None))
+    rows.extend(status(writer, "tool_completed") for _ in range(49))
+
+    assert [row["created_at"] for row in rows] == sorted({row["created_at"] for row in rows})
+    assert len({row["message_id"] for row in rows}) == 100
+
+    sync_writer = MessageWriter(FakeDB(), durability=DURABILITY_SYNC)
+    row = status(sync_writer, "tool_started")
+    assert not sync_writer.defers(row) and "created_at" in row
+
+
+def test_failed_batch_is_kept_and_does_not_fail_other_inserts(monkeypatch):
+    db = FakeDB()
+    failing = [True]
+
+    async def send_once(fn, max_attempts=3, delay_seconds=1):
+        if failing[0]:
+            raise ConnectionError("database down")
+        return await fn()
+
+    monkeypatch.setattr(message_writer, "retry", send_once)
+
+    async def run():
+        writer = MessageWriter(db, flush_interval=10)
+        await writer.enqueue(status(writer, "tool_started"))
+        await writer.insert(writer.build_row("t1", "tool", "result", True, None))
+        assert writer.pending == 1
+
+        failing[0] = False
+        await writer.enqueue(status(writer, "tool_completed"))
+        await writer.close()
+        return writer.pending
+
+    assert asyncio.run(run()) == 0
+    assert db.calls == [
+        ("insert", ["result"]),
+        ("upsert", [{"status_type": "tool_started"}, {"status_type": "tool_completed"}]),
+    ]
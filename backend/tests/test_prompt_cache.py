@@ -0,0 +1,50 @@
+from agentpress.prompt_cache import SystemPromptCache, prompt_key
+
+
+def test_same_configuration_reuses_the_built_prompt():
+    cache = SystemPromptCache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return "You are an agent." + " tools" * 3
+
+    first = cache.get_or_build(prompt_key("run_agent", False, True, "default", None), build)
+    second = cache.get_or_build(prompt_key("run_agent", False, True, "default", None), build)
+    other = cache.get_or_build(prompt_key("run_agent", False, True, ("custom", "Be brief."), None), lambda: "Be brief.")
+
+    assert second is first and second.content is first.content
+    assert other.content == "Be brief."
+    assert len(builds) == 1
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_token_counts_are_computed_once_per_model():
+    calls = []
+
+    def token_counter(model, messages):
+        calls.append(model)
+        return len(messages[0]["content"].split())
+
+    prompt = SystemPromptCache().get_or_build(prompt_key("p"), lambda: "one two three")
+    assert prompt.count_tokens("model-a", token_counter) == 3
+    assert prompt.count_tokens("model-a", token_counter) == 3
+    assert prompt.count_tokens("model-b", token_counter) == 3
+    assert calls == ["model-a", "model-b"]
+
+    # Callers get their own message dict; modifying it leaves the cache intact
+    message = prompt.message()
+    message["content"] = [{"type": "text", "text": message["content"], "cache_control": {"type": "ephemeral"}}]
+    assert prompt.message() == {"role": "system", "content": "one two three"}
+
+
+def test_least_recently_used_prompts_are_evicted():
+    cache = SystemPromptCache(max_entries=2)
+    cache.get_or_build("a", lambda: "A")
+    cache.get_or_build("b", lambda: "B")
+    cache.get_or_build("a", lambda: "A2")
+    cache.get_or_build("c", lambda: "C")
+
+    assert len(cache) == 2
+    assert cache.get_or_build("a", lambda: "A3").content == "A"
+    assert cache.get_or_build("b", lambda: "B2").content == "B2"
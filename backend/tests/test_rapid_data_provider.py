@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from agent.tools.data_providers import RapidDataProviderBase as base
+from agent.tools.data_providers.RapidDataProviderBase import RapidDataProviderBase
+
+
+class FakeProvider(RapidDataProviderBase):
+    def __init__(self):
+        super().__init__("https://fake.p.rapidapi.com", {
+            "item": {"route": "/item", "method": "GET", "name": "Item", "description": "", "payload": {"id": "Item id"}},
+            "search": {"route": "/search", "method": "POST", "name": "Search", "description": "", "payload": {"q": "Query"}},
+        })
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    state = {"requests": [], "failures": 0, "active": 0, "max_active": 0}
+
+    async def handler(request):
+        state["requests"].append(request)
+        state["active"] += 1
+        state["max_active"] = max(state["max_active"], state["active"])
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        if state["failures"]:
+            state["failures"] -= 1
+            return httpx.Response(503)
+        if request.method == "GET":
+            return httpx.Response(200, json={"id": request.url.params["id"]})
+        return httpx.Response(200, json={"q": json.loads(request.content)["q"]})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(base, "get_http_client", lambda *args, **kwargs: client)
+    monkeypatch.setattr(base, "RETRY_BACKOFF", 0)
+    return state
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    data = {}
+
+    async def get(key, default=None):
+        return data.get(key, default)
+
+    async def set(key, value, ex=None, nx=False):
+        data[key] = value
+        return True
+
+    monkeypatch.setattr(base.redis, "get", get)
+    monkeypatch.setattr(base.redis, "set", set)
+    return data
+
+
+def test_responses_are_cached_by_route_and_payload(fake_api, fake_redis):
+    provider = FakeProvider()
+
+    async def run():
+        return [
+            await provider.call_endpoint("item", {"id": "1"}),
+            await provider.call_endpoint("/item", {"id": "1"}),
+            await provider.call_endpoint("item", {"id": "2"}),
+            await provider.call_endpoint("search", {"q": "x"}),
+        ]
+
+    assert asyncio.run(run()) == [{"id": "1"}, {"id": "1"}, {"id": "2"}, {"q": "x"}]
+    assert len(fake_api["requests"]) == 3
+
+
+def test_server_errors_are_retried(fake_api, fake_redis):
+    fake_api["failures"] = 2
+    assert asyncio.run(FakeProvider().call_endpoint("item", {"id": "1"})) == {"id": "1"}
+    assert len(fake_api["requests"]) == 3
+
+
+def test_batch_calls_run_concurrently_and_report_errors(fake_api, fake_redis, monkeypatch):
+    monkeypatch.setattr(base, "MAX_CONCURRENT_CALLS", 3)
+    calls = [("item", {"id": str(n)}) for n in range(6)] + [("missing", None)]
+
+    results = asyncio.run(FakeProvider().call_endpoints(calls))
+    assert results[:6] == [{"id": str(n)} for n in range(6)]
+    assert isinstance(results[6], ValueError)
+    assert fake_api["max_active"] == 3
@@ -0,0 +1,148 @@
+import asyncio
+import json
+
+from services import response_writer
+from services.response_writer import RunResponseWriter
+
+
+class FakePipeline:
+    def __init__(self, store):
+        self.store = store
+        self.commands = []
+
+    def rpush(self, key, *values):
+        self.commands.append(("rpush", key, values))
+
+    def publish(self, channel, message):
+        self.commands.append(("publish", channel, message))
+
+    async def execute(self):
+        self.store.append(self.commands)
+
+
+def _patch_pipeline(monkeypatch):
+    executed = []
+
+    async def fake_pipeline(transaction=False):
+        return FakePipeline(executed)
+
+    monkeypatch.setattr(response_writer.redis, "pipeline", fake_pipeline)
+    return executed
+
+
+def _written(executed):
+    return [json.loads(value) for batch in executed for value in batch[0][2]]
+
+
+def test_coalesces_responses_into_one_batch(monkeypatch):
+    executed = _patch_pipeline(monkeypatch)
+
+    async def run():
+        writer = RunResponseWriter("list", "channel", flush_interval=0.01)
+        for i in range(10):
+            await writer.write({"type": "assistant", "n": i})
+        await asyncio.sleep(0.05)
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(run())
+    assert len(executed) == 1
+    assert executed[0][0][0] == "rpush"
+    assert executed[0][1] == ("publish", "channel", "new")
+    assert [r["n"] for r in _written(executed)] == list(range(10))
+    assert writer.batches_written == 1
+    assert writer.max_batch_written == 10
+
+
+def test_terminal_status_flushes_before_returning(monkeypatch):
+    executed = _patch_pipeline(monkeypatch)
+
+    async def run():
+        writer = RunResponseWriter("list", "channel", flush_interval=10)
+        await writer.write({"type": "assistant", "n": 0})
+        await writer.write({"type": "status", "status": "completed"})
+        flushed = len(executed)
+        await writer.close()
+        return flushed
+
+    assert asyncio.run(run()) == 1
+    assert _written(executed)[-1]["status"] == "completed"
+
+
+def test_batches_respect_size_limit_and_order(monkeypatch):
+    executed = _patch_pipeline(monkeypatch)
+
+    async def run():
+        writer = RunResponseWriter("list", "channel", max_batch_size=4, max_pending=8, flush_interval=10)
+        for i in range(20):
+            await writer.write({"n": i})
+        await writer.close()
+
+    asyncio.run(run())
+    assert all(len(batch[0][2]) <= 4 for batch in executed)
+    assert [r["n"] for r in _written(executed)] == list(range(20))
+
+
+def test_failed_batch_is_kept_and_fails_the_next_write(monkeypatch):
+    executed = _patch_pipeline(monkeypatch)
+    failing = [True]
+
+    async def send_once(fn, max_attempts=3, delay_seconds=1):
+        if failing[0]:
+            raise ConnectionError("redis down")
+        return await fn()
+
+    monkeypatch.setattr(response_writer, "retry", send_once)
+
+    async def run():
+        writer = RunResponseWriter("list", "channel", flush_interval=0.01)
+        await writer.write({"n": 0})
+        await writer.write({"n": 1})
+        await asyncio.sleep(0.05)
+        try:
+            await writer.write({"n": 2})
+        except ConnectionError:
+            pass
+        else:
+            raise AssertionError("write() should raise the flush error")
+
+        failing[0] = False
+        try:
+            await writer.close()
+        except ConnectionError:
+            pass
+        else:
+            raise AssertionError("close() should raise the flush error")
+        return writer
+
+    writer = asyncio.run(run())
+    # The failed batch is sent by close(), not lost
+    assert [r["n"] for r in _written(executed)] == [0, 1]
+    assert writer.failed_batches == 1 and writer.responses_written == 2
+
+
+def test_close_waits_for_a_batch_being_sent(monkeypatch):
+    executed = []
+    sending = asyncio.Event()
+
+    class SlowPipeline(FakePipeline):
+        async def execute(self):
+            sending.set()
+            await asyncio.sleep(0.05)
+            await super().execute()
+
+    async def slow_pipeline(transaction=False):
+        return SlowPipeline(executed)
+
+    monkeypatch.setattr(response_writer.redis, "pipeline", slow_pipeline)
+
+    async def run():
+        writer = RunResponseWriter("list", "channel", flush_interval=0)
+        await writer.write({"n": 0})
+        await sending.wait()
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(run())
+    assert [r["n"] for r in _written(executed)] == [0]
+    assert writer.responses_written == 1 and writer.batches_written == 1
@@ -0,0 +1,86 @@
+import asyncio
+
+from services import run_control as run_control_module
+from services.run_control import RunControlMultiplexer
+
+
+class FakePubSub:
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.patterns = []
+
+    async def psubscribe(self, *patterns):
+        self.patterns.extend(patterns)
+
+    async def punsubscribe(self, *patterns):
+        self.patterns = []
+
+    async def close(self):
+        pass
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+
+class FakePipeline:
+    def __init__(self, expired):
+        self.expired = expired
+
+    def expire(self, key, ttl):
+        self.expired.append(key)
+
+    async def execute(self):
+        pass
+
+
+def _patch_redis(monkeypatch):
+    pubsubs = []
+    expired = []
+
+    async def create_pubsub():
+        pubsubs.append(FakePubSub())
+        return pubsubs[-1]
+
+    async def pipeline(transaction=False):
+        return FakePipeline(expired)
+
+    monkeypatch.setattr(run_control_module.redis, "create_pubsub", create_pubsub)
+    monkeypatch.setattr(run_control_module.redis, "pipeline", pipeline)
+    return pubsubs, expired
+
+
+def test_stop_is_dispatched_to_the_matching_run(monkeypatch):
+    pubsubs, _ = _patch_redis(monkeypatch)
+
+    async def run():
+        control = RunControlMultiplexer(instance_id="inst")
+        stop_a = await control.register("run-a", "active_run:inst:run-a")
+        stop_b = await control.register("run-b", "active_run:inst:run-b")
+        queue = pubsubs[0].queue
+        await queue.put({"type": "pmessage", "channel": "agent_run:run-a:control", "data": "END_STREAM"})
+        await queue.put({"type": "pmessage", "channel": "agent_run:run-b:control:other", "data": "STOP"})
+        await queue.put({"type": "pmessage", "channel": "agent_run:run-a:control:inst", "data": "STOP"})
+        await asyncio.sleep(0.01)
+        result = (stop_a.is_set(), stop_b.is_set(), len(pubsubs))
+        await control.unregister("run-a")
+        await control.unregister("run-b")
+        return result
+
+    assert asyncio.run(run()) == (True, False, 1)
+
+
+def test_heartbeat_refreshes_all_active_keys_in_one_pipeline(monkeypatch):
+    _, expired = _patch_redis(monkeypatch)
+
+    async def run():
+        control = RunControlMultiplexer()
+        await control.register("run-a", "active_run:single:run-a")
+        await control.register("run-b", "active_run:single:run-b")
+        await control.refresh_ttls()
+        await control.unregister("run-a")
+        await control.unregister("run-b")
+        return control.active_runs
+
+    assert asyncio.run(run()) == 0
+    assert expired == ["active_run:single:run-a", "active_run:single:run-b"]
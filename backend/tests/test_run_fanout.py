@@ -0,0 +1,112 @@
+import asyncio
+import json
+
+from services import run_fanout
+from services.run_fanout import RunFanoutHub, SLOW_CONSUMER_DISCONNECT
+
+
+class FakeRedis:
+    """Just enough of the list + pub/sub transport for the fan-out follower."""
+
+    def __init__(self):
+        self.responses = []
+        self.pubsubs = []
+        self.lrange_calls = 0
+
+    async def lrange(self, key, start, end):
+        self.lrange_calls += 1
+        return self.responses[start:]
+
+    async def create_pubsub(self):
+        pubsub = FakePubSub()
+        self.pubsubs.append(pubsub)
+        return pubsub
+
+    async def push(self, response):
+        self.responses.append(json.dumps(response))
+        for pubsub in self.pubsubs:
+            await pubsub.queue.put({"type": "message", "channel": "agent_run:run-1:new_response", "data": "new"})
+
+    async def control(self, signal):
+        for pubsub in self.pubsubs:
+            await pubsub.queue.put({"type": "message", "channel": "agent_run:run-1:control", "data": signal})
+
+
+class FakePubSub:
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, *channels):
+        pass
+
+    async def unsubscribe(self, *channels):
+        pass
+
+    async def close(self):
+        pass
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+
+def _patch_redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(run_fanout.redis, "lrange", fake.lrange)
+    monkeypatch.setattr(run_fanout.redis, "create_pubsub", fake.create_pubsub)
+    monkeypatch.setattr(run_fanout.run_stream, "use_streams", lambda: False)
+    return fake
+
+
+async def _collect(hub, **kwargs):
+    items = []
+    async for _, response, control in hub.subscribe("run-1", **kwargs):
+        items.append(control or response["n"])
+    return items
+
+
+def test_viewers_share_one_subscription(monkeypatch):
+    fake = _patch_redis(monkeypatch)
+
+    async def run():
+        hub = RunFanoutHub()
+        await fake.push({"n": 0})
+        viewers = [asyncio.create_task(_collect(hub)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        for n in range(1, 4):
+            await fake.push({"n": n})
+        await fake.control("END_STREAM")
+        results = await asyncio.gather(*viewers)
+        return hub, results
+
+    hub, results = asyncio.run(run())
+    assert all(result == [0, 1, 2, 3, "END_STREAM"] for result in results)
+    assert len(fake.pubsubs) == 1
+    assert hub.active_runs == 0
+
+
+def test_slow_consumer_disconnect_policy(monkeypatch):
+    fake = _patch_redis(monkeypatch)
+
+    async def run():
+        hub = RunFanoutHub(ring_size=2)
+        for n in range(10):
+            await fake.push({"n": n})
+        return await _collect(hub, start_seq=0, slow_consumer_policy=SLOW_CONSUMER_DISCONNECT)
+
+    assert asyncio.run(run()) == ["ERROR"]
+
+
+def test_slow_consumer_resync_policy(monkeypatch):
+    fake = _patch_redis(monkeypatch)
+
+    async def run():
+        hub = RunFanoutHub(ring_size=2)
+        for n in range(10):
+            await fake.push({"n": n})
+        viewer = asyncio.create_task(_collect(hub))
+        await asyncio.sleep(0.01)
+        await fake.control("STOP")
+        return await viewer
+
+    assert asyncio.run(run()) == list(range(10)) + ["STOP"]
@@ -0,0 +1,41 @@
+import asyncio
+import json
+
+from services import run_stream
+
+
+ENTRIES = [
+    ("1-0", {"data": json.dumps({"type": "assistant", "n": 0})}),
+    ("2-0", {"data": json.dumps({"type": "assistant", "n": 1})}),
+    ("3-0", {"control": "END_STREAM"}),
+]
+
+
+def test_read_all_responses_skips_control_entries(monkeypatch):
+    async def fake_xrange(key, min="-", max="+", count=None):
+        assert key == "agent_run:run-1:stream"
+        return ENTRIES
+
+    monkeypatch.setattr(run_stream.redis, "xrange", fake_xrange)
+    responses = asyncio.run(run_stream.read_all_responses("run-1"))
+    assert [r["n"] for r in responses] == [0, 1]
+
+
+def test_read_responses_resumes_from_last_id(monkeypatch):
+    requested_ids = []
+    batches = [[], [ENTRIES[0]], ENTRIES[1:]]
+
+    async def fake_xread(streams, count=None, block=None):
+        requested_ids.append(streams["agent_run:run-1:stream"])
+        entries = batches.pop(0)
+        return [("agent_run:run-1:stream", entries)] if entries else []
+
+    monkeypatch.setattr(run_stream.redis, "xread", fake_xread)
+
+    async def collect():
+        return [item async for item in run_stream.read_responses("run-1", "0")]
+
+    items = asyncio.run(collect())
+    assert [entry_id for entry_id, _, _ in items] == ["1-0", "2-0", "3-0"]
+    assert items[-1][2] == "END_STREAM"
+    assert requested_ids == ["0", "0", "1-0"]
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("daytona_sdk")
+
+from daytona_sdk import SandboxState
+
+from sandbox import registry as registry_module
+from sandbox.registry import SandboxRegistry
+
+
+class FakeSandbox:
+    def __init__(self, sandbox_id, state):
+        self.id = sandbox_id
+        self.state = state
+
+
+def _patch_loader(monkeypatch, state=SandboxState.STARTED):
+    calls = []
+
+    async def get_or_start_sandbox(sandbox_id):
+        calls.append(sandbox_id)
+        await asyncio.sleep(0.01)
+        return FakeSandbox(sandbox_id, state)
+
+    monkeypatch.setattr(registry_module, "get_or_start_sandbox", get_or_start_sandbox)
+    return calls
+
+
+def test_concurrent_gets_share_one_start(monkeypatch):
+    calls = _patch_loader(monkeypatch)
+    registry = SandboxRegistry()
+
+    async def run():
+        sandboxes = await asyncio.gather(*(registry.get("sb-1") for _ in range(6)))
+        sandboxes.append(await registry.get("sb-1"))
+        return sandboxes
+
+    sandboxes = asyncio.run(run())
+    assert calls == ["sb-1"]
+    assert all(sandbox is sandboxes[0] for sandbox in sandboxes)
+    assert registry.state("sb-1") == SandboxState.STARTED
+
+
+def test_expired_and_unstarted_sandboxes_are_reloaded(monkeypatch):
+    calls = _patch_loader(monkeypatch, state=SandboxState.STARTING)
+    registry = SandboxRegistry()
+
+    async def run():
+        await registry.get("sb-1")
+        await registry.get("sb-1")
+
+    asyncio.run(run())
+    assert calls == ["sb-1", "sb-1"]
+    assert registry.state("sb-1") is None
+
+
+def test_remembered_project_skips_the_lookup():
+    registry = SandboxRegistry()
+    registry.remember_project("p-1", {"id": "sb-1", "pass": "secret"})
+
+    class NoDB:
+        @property
+        async def client(self):
+            raise AssertionError("project lookup should be cached")
+
+    info = asyncio.run(registry.get_project_sandbox_info("p-1", NoDB()))
+    assert info["id"] == "sb-1"
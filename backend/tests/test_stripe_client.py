@@ -0,0 +1,91 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+stripe = pytest.importorskip("stripe")
+
+from services import stripe_client
+from services.stripe_client import SubscriptionCache
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        FakeStripeHandler.requests.append(self.path)
+        time.sleep(0.05)
+        body = json.dumps({
+            "object": "list",
+            "url": "/v1/subscriptions",
+            "has_more": False,
+            "data": [{"id": "sub_1", "object": "subscription", "customer": "cus_1", "status": "active"}],
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_stripe(monkeypatch):
+    FakeStripeHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeStripeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(stripe, "api_base", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(stripe, "api_key", "sk_test_fake")
+    yield FakeStripeHandler.requests
+    server.shutdown()
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    data = {}
+
+    async def get(key, default=None):
+        return data.get(key, default)
+
+    async def set(key, value, ex=None, nx=False):
+        data[key] = value
+        return True
+
+    async def delete(key):
+        return 1 if data.pop(key, None) is not None else 0
+
+    monkeypatch.setattr(stripe_client.redis, "get", get)
+    monkeypatch.setattr(stripe_client.redis, "set", set)
+    monkeypatch.setattr(stripe_client.redis, "delete", delete)
+    return data
+
+
+def test_concurrent_lookups_share_one_request_and_are_cached(fake_stripe, fake_redis):
+    cache = SubscriptionCache()
+
+    async def run():
+        results = await asyncio.gather(*(cache.list_active("cus_1") for _ in range(5)))
+        results.append(await cache.list_active("cus_1"))
+        return results
+
+    results = asyncio.run(run())
+    assert len(fake_stripe) == 1
+    assert all(result == [results[0][0]] for result in results)
+    assert results[0][0]["id"] == "sub_1"
+
+
+def test_invalidate_forces_a_fresh_lookup(fake_stripe, fake_redis):
+    cache = SubscriptionCache()
+
+    async def run():
+        await cache.list_active("cus_1")
+        await cache.invalidate("cus_1")
+        await cache.list_active("cus_1")
+
+    asyncio.run(run())
+    assert len(fake_stripe) == 2
@@ -0,0 +1,71 @@
+from agentpress.tool import Tool, ToolSchema, SchemaType, openapi_schema, xml_schema
+from agentpress.tool_registry import ToolRegistry
+
+
+class EchoTool(Tool):
+    @openapi_schema({
+        "type": "function",
+        "function": {
+            "name": "echo",
+            "parameters": {
+                "type": "object",
+                "properties": {"text": {"type": "string"}, "repeat": {"type": "integer"}},
+                "required": ["text"]
+            }
+        }
+    })
+    @xml_schema(tag_name="echo", mappings=[{"param_name": "text", "node_type": "content", "path": "."}])
+    async def echo(self, text: str, repeat: int = 1):
+        return self.success_response(text * repeat)
+
+    @xml_schema(tag_name="shout", mappings=[{"param_name": "text", "node_type": "content", "path": "."}])
+    async def shout(self, text: str):
+        return self.success_response(text.upper())
+
+
+class DynamicTool(Tool):
+    """Adds functions after registration, like MCPToolWrapper."""
+
+    def add_function(self, name):
+        async def function(**kwargs):
+            return self.success_response(name)
+        setattr(self, name, function)
+        self._schemas[name] = [ToolSchema(
+            schema_type=SchemaType.OPENAPI,
+            schema={"type": "function", "function": {"name": name, "parameters": {"type": "object", "properties": {}}}}
+        )]
+
+
+def test_registration_compiles_entries_with_parameters_and_mappings():
+    registry = ToolRegistry()
+    registry.register_tool(EchoTool)
+
+    echo = registry.get_entry("echo")
+    assert echo.parameters == frozenset({"text", "repeat"})
+    assert echo.required == ("text",)
+    assert echo.xml_tag_name == "echo"
+    assert [m.param_name for m in echo.xml_mappings] == ["text"]
+    assert echo.function.__self__ is echo.instance
+
+    shout = registry.get_entry("shout")
+    assert shout.required == () and shout.xml_tag_name == "shout"
+    assert registry.get_entry("missing") is None
+
+    functions = registry.get_available_functions()
+    assert set(functions) == {"echo", "shout"}
+    # The same compiled mapping is returned on every call
+    assert registry.get_available_functions() is functions
+    assert registry.compile_seconds > 0
+
+
+def test_functions_added_later_are_compiled_in():
+    registry = ToolRegistry()
+    registry.register_tool(EchoTool)
+    assert registry.get_entry("search") is None
+
+    instance = DynamicTool()
+    instance.add_function("search")
+    registry.register_functions(instance, instance.get_schemas())
+
+    assert registry.get_entry("search").instance is instance
+    assert "echo" in registry.get_available_functions()
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from services import web_cache
+from services.web_cache import WebResultCache
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+        return queue
+
+    async def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.zsets = {}
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        return True
+
+    def delete(self, key):
+        return 1 if self.data.pop(key, None) is not None else 0
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zremrangebyscore(self, key, low, high):
+        zset = self.zsets.get(key, {})
+        for member in [m for m, score in zset.items() if score <= high]:
+            del zset[member]
+
+    def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    def zpopmin(self, key, count):
+        zset = self.zsets.get(key, {})
+        oldest = sorted(zset.items(), key=lambda item: item[1])[:count]
+        for member, _ in oldest:
+            del zset[member]
+        return oldest
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    redis = FakeRedis()
+
+    async def get(key, default=None):
+        return redis.data.get(key, default)
+
+    async def pipeline(transaction=False):
+        return FakePipeline(redis)
+
+    monkeypatch.setattr(web_cache.redis, "get", get)
+    monkeypatch.setattr(web_cache.redis, "pipeline", pipeline)
+    return redis
+
+
+def test_results_are_keyed_by_request_content(fake_redis):
+    cache = WebResultCache("search", ttl=60)
+
+    async def run():
+        await cache.put({"query": "a", "max_results": 5}, {"results": [1]})
+        return (
+            await cache.get({"max_results": 5, "query": "a"}),
+            await cache.get({"query": "a", "max_results": 10}),
+        )
+
+    assert asyncio.run(run()) == ({"results": [1]}, None)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_oldest_entries_are_evicted_and_large_results_skipped(fake_redis, monkeypatch):
+    cache = WebResultCache("scrape", ttl=60, max_entries=2, max_entry_bytes=100)
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(web_cache.time, "time", lambda: next(clock))
+
+    async def run():
+        for n in range(3):
+            await cache.put({"url": n}, {"text": n})
+        await cache.put({"url": "big"}, {"text": "x" * 200})
+        return [await cache.get({"url": url}) for url in (0, 1, 2, "big")]
+
+    assert asyncio.run(run()) == [None, {"text": 1}, {"text": 2}, None]
+    assert len(fake_redis.data) == 2
@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from agentpress.xml_stream_scanner import XMLStreamScanner
+
+
+LEGACY_TAGS = ["ask", "complete", "create-file", "web-search"]
+
+CONTENT = (
+    "Let me start. <b>not a tool</b> "
+    "<function_calls>\n<invoke name=\"create_file\">\n"
+    "<parameter name=\"file_path\">a.html</parameter>\n"
+    "<parameter name=\"file_contents\"><ask>inside a parameter</ask></parameter>\n"
+    "</invoke>\n</function_calls>\n"
+    "Then <ask attachments='a.txt'>outer <ask>nested</ask> tail</ask> "
+    "and an <asking> lookalike, then "
+    "<create-file file_path=\"b.txt\">body</create-file>"
+)
+
+EXPECTED = [
+    "<function_calls>\n<invoke name=\"create_file\">\n"
+    "<parameter name=\"file_path\">a.html</parameter>\n"
+    "<parameter name=\"file_contents\"><ask>inside a parameter</ask></parameter>\n"
+    "</invoke>\n</function_calls>",
+    "<ask attachments='a.txt'>outer <ask>nested</ask> tail</ask>",
+    "<create-file file_path=\"b.txt\">body</create-file>",
+]
+
+
+def _feed_in_pieces(scanner, content, sizes):
+    chunks = []
+    pos = 0
+    for size in sizes:
+        chunks.extend(scanner.feed(content[pos:pos + size]))
+        pos += size
+        if pos >= len(content):
+            break
+    return chunks
+
+
+def test_whole_content():
+    scanner = XMLStreamScanner(LEGACY_TAGS)
+    assert scanner.feed(CONTENT) == EXPECTED
+
+
+def test_single_character_deltas():
+    scanner = XMLStreamScanner(LEGACY_TAGS)
+    assert _feed_in_pieces(scanner, CONTENT, [1] * len(CONTENT)) == EXPECTED
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_delta_boundaries(seed):
+    rng = random.Random(seed)
+    sizes = [rng.randint(1, 12) for _ in range(len(CONTENT))]
+    scanner = XMLStreamScanner(LEGACY_TAGS)
+    assert _feed_in_pieces(scanner, CONTENT, sizes) == EXPECTED
+
+
+def test_blocks_emitted_exactly_once():
+    scanner = XMLStreamScanner(LEGACY_TAGS)
+    first = scanner.feed("<function_calls>x</function_calls>")
+    assert first == ["<function_calls>x</function_calls>"]
+    assert scanner.feed(" more text") == []
+    assert scanner.feed("<complete></complete>") == ["<complete></complete>"]
+
+
+def test_incomplete_block_is_not_emitted():
+    scanner = XMLStreamScanner(LEGACY_TAGS)
+    assert scanner.feed("<function_calls>\n<invoke name=\"ask\">") == []
+    assert scanner.feed("</invoke>\n</function_") == []
+    assert scanner.feed("calls>") == ["<function_calls>\n<invoke name=\"ask\"></invoke>\n</function_calls>"]
+
+
+def test_function_calls_supersedes_unclosed_legacy_tag():
+    scanner = XMLStreamScanner(LEGACY_TAGS)
+    content = "I will use <ask> later. <function_calls>call</function_calls>"
+    assert scanner.feed(content) == ["<function_calls>call</function_calls>"]
+
+
+def test_unregistered_tags_are_ignored():
+    scanner = XMLStreamScanner()
+    assert scanner.feed("<ask>question</ask>") == []
@@ -136,6 +136,13 @@ class Configuration:
     REDIS_PASSWORD: str
     REDIS_SSL: bool = True
     
+    # Agent run output transport: "list" (Redis list + pub/sub) or "stream" (Redis Streams)
+    AGENT_RUN_TRANSPORT: Optional[str] = "list"
+
+    # Status message persistence: "terminal" (batch status rows, flush terminal statuses
+    # synchronously) or "sync" (insert every message before add_message returns)
+    MESSAGE_DURABILITY: Optional[str] = "terminal"
+    
     # Daytona sandbox configuration
     DAYTONA_API_KEY: str
     DAYTONA_SERVER_URL: str
@@ -153,6 +160,7 @@ class Configuration:
     STRIPE_WEBHOOK_SECRET: Optional[str] = None
     STRIPE_DEFAULT_PLAN_ID: Optional[str] = None
     STRIPE_DEFAULT_TRIAL_DAYS: int = 14
+    STRIPE_API_BASE: Optional[str] = None  # e.g. a local stripe-mock server for tests
     
     # Stripe Product IDs - All valid GOATA product IDs
     # Since you only have production environment, using same IDs for both staging and production
@@ -0,0 +1,83 @@
+"""
+Decoding and validation of base64 encoded images.
+"""
+
+import base64
+import binascii
+import io
+from typing import Tuple
+
+from PIL import Image
+
+from utils.logger import logger
+
+SUPPORTED_IMAGE_FORMATS = {'JPEG', 'PNG', 'GIF', 'BMP', 'WEBP', 'TIFF'}
+MAX_IMAGE_DIMENSION = 8192  # 8K resolution limit
+
+
+def decode_base64_image(base64_data: str, max_size_mb: int = 10) -> Tuple[bytes, str]:
+    """Decode and validate base64 image data in a single pass.
+
+    The data is decoded once; the image header gives the format and
+    dimensions and ``verify()`` checks the rest of the file, without
+    decoding any pixels.
+
+    Args:
+        base64_data (str): Base64 encoded image data (with or without data URL prefix)
+        max_size_mb (int): Maximum allowed image size in megabytes
+
+    Returns:
+        Tuple[bytes, str]: The image bytes and their PIL format, e.g. "JPEG"
+
+    Raises:
+        ValueError: If the data is not a valid, supported image within the limits
+    """
+    if not base64_data or len(base64_data) < 10:
+        raise ValueError("Base64 string is empty or too short")
+
+    # Remove data URL prefix if present (data:image/jpeg;base64,...)
+    if base64_data.startswith('data:'):
+        if ',' not in base64_data:
+            raise ValueError("Invalid data URL format")
+        base64_data = base64_data.split(',', 1)[1]
+
+    # Strict decoding rejects characters outside the base64 alphabet and bad padding
+    try:
+        image_data = base64.b64decode(base64_data, validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Base64 decoding failed: {str(e)}")
+
+    if len(image_data) == 0:
+        raise ValueError("Decoded image data is empty")
+
+    max_size_bytes = max_size_mb * 1024 * 1024
+    if len(image_data) > max_size_bytes:
+        raise ValueError(f"Image size ({len(image_data)} bytes) exceeds limit ({max_size_bytes} bytes)")
+
+    try:
+        with Image.open(io.BytesIO(image_data)) as img:
+            image_format = img.format
+            width, height = img.size
+            img.verify()
+    except Exception as e:
+        raise ValueError(f"Invalid image data: {str(e)}")
+
+    if image_format not in SUPPORTED_IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format: {image_format}")
+    if width > MAX_IMAGE_DIMENSION or height > MAX_IMAGE_DIMENSION:
+        raise ValueError(f"Image dimensions ({width}x{height}) exceed limit ({MAX_IMAGE_DIMENSION}x{MAX_IMAGE_DIMENSION})")
+    if width < 1 or height < 1:
+        raise ValueError(f"Invalid image dimensions: {width}x{height}")
+
+    logger.debug(f"Valid image detected: {image_format}, {width}x{height}, {len(image_data)} bytes")
+    return image_data, image_format
+
+
+def image_hash_distance(hash_a: str, hash_b: str) -> int:
+    """Number of differing bits between two hex encoded perceptual hashes.
+
+    Hashes of different lengths are treated as entirely different.
+    """
+    if len(hash_a) != len(hash_b):
+        return len(hash_a) * 4
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
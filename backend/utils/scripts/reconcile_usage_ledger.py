@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Script to reconcile the monthly_usage ledger with agent_runs.
+
+Runs are added to the ledger as they finish. This script marks stuck runs
+(running for more than an hour) as failed and rebuilds the ledger from
+agent_runs, which also picks up runs whose status update did not record them.
+Run it periodically, e.g. hourly from cron. Until it is scheduled, stuck runs
+are still marked as failed per account when calculate_monthly_usage finds them.
+
+Usage:
+    # Reconcile the current month for all accounts
+    python backend/utils/scripts/reconcile_usage_ledger.py
+
+    # Reconcile a past month
+    python backend/utils/scripts/reconcile_usage_ledger.py --month 2025-05
+
+    # Reconcile one account
+    python backend/utils/scripts/reconcile_usage_ledger.py --account-id abc123
+"""
+
+import argparse
+import asyncio
+import sys
+import os
+from datetime import datetime, timezone
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from services.supabase import DBConnection
+from services.billing import fail_stuck_agent_runs, rebuild_monthly_usage
+from utils.logger import logger
+
+async def reconcile(month: str = None, account_id: str = None):
+    """Mark stuck runs as failed and rebuild the ledger of a month."""
+    db = DBConnection()
+    try:
+        await db.initialize()
+        client = await db.client
+
+        stuck_count = await fail_stuck_agent_runs(client)
+        logger.info(f"Marked {stuck_count} stuck agent runs as failed")
+
+        month_date = datetime.strptime(month, '%Y-%m').date() if month else datetime.now(timezone.utc).date()
+        accounts = await rebuild_monthly_usage(client, month_date, account_id)
+        logger.info(f"Rebuilt usage ledger for {month_date.strftime('%Y-%m')}: {accounts} accounts with usage")
+    finally:
+        await DBConnection.disconnect()
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconcile the monthly usage ledger with agent_runs')
+    parser.add_argument('--month', help='Month to rebuild as YYYY-MM (default: current month)')
+    parser.add_argument('--account-id', help='Only rebuild the usage of this account')
+    args = parser.parse_args()
+
+    asyncio.run(reconcile(args.month, args.account_id))
+
+if __name__ == "__main__":
+    main()
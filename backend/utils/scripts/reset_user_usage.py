@@ -28,7 +28,7 @@ from typing import List, Dict, Optional
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from services.supabase import DBConnection
-from services.billing import calculate_monthly_usage, get_user_subscription, SUBSCRIPTION_TIERS
+from services.billing import calculate_monthly_usage, get_user_subscription, rebuild_monthly_usage, SUBSCRIPTION_TIERS
 from utils.logger import logger
 from utils.config import config
 
@@ -234,7 +234,8 @@ async def reset_user_usage(client, user_id: str):
         
         print(f"✅ Successfully marked {len(run_ids)} runs as failed.")
         
-        # Recalculate usage
+        # Rebuild the usage ledger and recalculate usage
+        await rebuild_monthly_usage(client, account_id=user_id)
         new_usage = await calculate_monthly_usage(client, user_id)
         print(f"📊 New usage calculation: {new_usage:.2f} minutes")
         